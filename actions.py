@@ -0,0 +1,89 @@
+# actions.py
+#
+# قاموس مشترك لخطوات الجلسة (actions): كل اسم -> رقم صغير (uint16) ثابت طول عمر
+# الـ process، والطبقات تشتغل على الأرقام بدل الـ strings:
+#   - الجلسة = array('H') (summarize_session في app.py) ومنها sequence_risk ونماذج التنقل
+#   - سيكوانسات الاحتيال المخزنة في الـ graph = bytes (2 byte لكل خطوة) والتشابه عليها
+#   - حساس / استكشافي = flags لكل رقم (bytearray) بدل hash الـ string في set
+#
+# - 0 محجوز (مو action: بداية الجلسة في sequence_model.py)، 1 = UNKNOWN
+# - طلبات /evaluate ما تضيف أسماء (ولا نماذج التنقل اللي تتعلم منها): action ما شفناه
+#   = UNKNOWN، وما يطابق أي خطوة مخزنة (sequence_index.comparable). الإضافة بس من
+#   register_fraud_case والـ actions المعروفة وقت الإقلاع، لين MAX_ACTIONS (بعدها UNKNOWN)
+# - الأرقام بالذاكرة بس: الـ log والـ snapshots فيها الأسماء، فكل process له أرقامه
+
+import threading
+from array import array
+
+START = 0
+UNKNOWN = 1
+# uint16، والاسم الأطول من MAX_ACTION_LENGTH ما يدخل القاموس (UNKNOWN)
+MAX_ACTIONS = 0xFFFF
+MAX_ACTION_LENGTH = 64
+
+# flags
+SENSITIVE = 1
+EXPLORATION = 2
+
+
+class ActionVocabulary:
+    """أسماء الـ actions <-> أرقام + flags لكل رقم."""
+
+    def __init__(self, max_actions=MAX_ACTIONS):
+        self.max_actions = max_actions
+        self.codes = {}                         # اسم -> رقم
+        self.names = ["<start>", "<unknown>"]   # رقم -> اسم
+        self.flags = bytearray(2)               # رقم -> SENSITIVE | EXPLORATION
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, action):
+        """رقم الـ action، ونضيفه لو جديد (UNKNOWN لو القاموس ممتلي أو الاسم طويل)."""
+        code = self.codes.get(action)
+        if code is None:
+            if len(action) > MAX_ACTION_LENGTH:
+                return UNKNOWN
+            with self._lock:
+                code = self.codes.get(action)
+                if code is None:
+                    if len(self.names) >= self.max_actions:
+                        return UNKNOWN
+                    code = len(self.names)
+                    # names و flags قبل codes: اللي يلقى الرقم يلقى اسمه و flags حقه
+                    self.names.append(action)
+                    self.flags.append(0)
+                    self.codes[action] = code
+        return code
+
+    def encode(self, actions, intern=False):
+        """
+        الأسماء كـ array('H'). intern=False (التقييم): اسم جديد = UNKNOWN بدون ما يدخل
+        القاموس، عشان طلبات /evaluate ما تكبّره.
+        """
+        get = self.codes.get
+        if intern:
+            codes = [get(action) for action in actions]
+            if None in codes:
+                codes = [self.intern(action) if code is None else code for action, code in zip(actions, codes)]
+            return array("H", codes)
+        return array("H", [get(action, UNKNOWN) for action in actions])
+
+    def decode(self, codes):
+        """الأرقام (array / bytes بصيغة 'H') -> tuple أسماء."""
+        if isinstance(codes, (bytes, bytearray)):
+            codes = memoryview(codes).cast("H")
+        names = self.names
+        return tuple(names[code] for code in codes)
+
+    def mark(self, actions, flag):
+        """نضيف الأسماء (لو جديدة) ونحط عليها flag."""
+        for action in actions:
+            code = self.intern(action)
+            if code != UNKNOWN:
+                self.flags[code] |= flag
+
+
+# القاموس المشترك لكل الـ process (app.py، الـ graph، نماذج التنقل)
+vocabulary = ActionVocabulary()
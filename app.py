@@ -1,17 +1,106 @@
+import atexit
+import gc
+import json
+import hmac
+import os
+import random
+import threading
+import time
+from array import array
+from typing import NamedTuple
+
 from flask import Flask, request, jsonify
 import numpy as np
-import joblib
+from bisect import bisect_left
 from difflib import SequenceMatcher
 
+from actions import EXPLORATION, SENSITIVE, UNKNOWN, vocabulary
+from case_queue import CaseQueue, CasesFailed
+from fraud_graph import ASSET_KINDS, KIND_BITS, RING_MIN_ASSETS, FraudGraph
+from graph_store import GraphStore
+from compiled_models import self_check_rows
+from metrics import Metrics, render_histogram, render_samples
+from model_registry import ModelRegistry
+from score_table import model_risk_parts, nn_risk_part
+from profiles import SNAPSHOT_NAME as PROFILE_SNAPSHOT_NAME, ProfileStore
+from sequence_index import comparable
+from sequence_model import SequenceModels
+from velocity import VelocityStore
+
 # ================== APP & MODELS ==================
 
+_startup_began = time.perf_counter()
 app = Flask(__name__)
 
-# تحميل النماذج المدربة من train_model.py
-rf_model = joblib.load("models/security_risk_model.pkl")
-iso_model = joblib.load("models/isolation_forest_model.pkl")
-nn_model = joblib.load("models/neural_network_model.pkl")
-scaler = joblib.load("models/scaler.pkl")
+# النماذج المدربة من train_model.py (pickles حق sklearn)
+MODELS_DIR = "models"
+
+# نسخة مضغوطة (جداول NumPy مسطحة) من RF و IsolationForest - نتائجها مطابقة تماماً
+# لـ sklearn لكن بدون overhead كل نداء. RAQEEB_COMPILED_TREES=0 يرجّعنا لـ sklearn.
+USE_COMPILED_TREES = os.environ.get("RAQEEB_COMPILED_TREES", "1") != "0"
+
+# الشبكة العصبية: الـ scaler مدموج في الطبقة الأولى + forward pass بـ NumPy.
+# RAQEEB_FUSED_MLP=0 يرجّعنا لـ scaler.transform + nn_model.predict_proba.
+USE_FUSED_MLP = os.environ.get("RAQEEB_FUSED_MLP", "1") != "0"
+
+# جدول نقاط ML محسوب مسبقاً (score_table.py، train_model.py يبنيه جنب الـ bundle):
+# المعاملات اللي features حقتها داخل الشبكة تاخذ نقاط RF و IsolationForest منه (نفس
+# الأشجار بالضبط) بدل تشغيلها، والـ MLP حي. RAQEEB_SCORE_TABLE=0 = النماذج الحقيقية دايماً.
+USE_SCORE_TABLE = os.environ.get("RAQEEB_SCORE_TABLE", "1") != "0"
+
+# الإقلاع السريع:
+#   RAQEEB_MODEL_BUNDLE   الـ model bundle (model_bundle.py): النماذج الثلاثة كجداول NumPy
+#                         تنفتح بـ mmap بدون sklearn ولا joblib. train_model.py يكتبه، ولو
+#                         ما هو موجود أو أقدم من الـ pickles ننبنيه منها ("" = pickles دايماً)
+#   RAQEEB_LAZY_STARTUP   1 = تحميل النماذج والـ warm-up في thread خلفي بعد الـ import؛
+#                         /health يرجع 503 لين يخلص، وأي طلب قبلها ينتظر التحميل
+MODEL_BUNDLE = os.environ.get("RAQEEB_MODEL_BUNDLE", "models/raqeeb_models.bundle")
+LAZY_STARTUP = os.environ.get("RAQEEB_LAZY_STARTUP", "0") == "1"
+
+# تحديث النماذج بدون restart (model_registry.py): النسخة الجديدة تنحمّل وتتفحص في
+# thread خلفي وتتبدل مرة وحدة، والطلبات الشغالة تكمل على القديمة.
+#   RAQEEB_MODEL_WATCH_SECONDS  كل كم ثانية نشيك ملفات النماذج ونعيد التحميل لو تغيرت (0 = بدون)
+#   RAQEEB_SHADOW_SAMPLE_RATE   نسبة الطلبات اللي يتقيّم عليها نموذج shadow (الافتراضي لـ /admin/models/reload)
+#   RAQEEB_ADMIN_TOKEN          لو موجود، /admin/* يطلب Authorization: Bearer <token>
+MODEL_WATCH_SECONDS = float(os.environ.get("RAQEEB_MODEL_WATCH_SECONDS", "0"))
+SHADOW_SAMPLE_RATE = float(os.environ.get("RAQEEB_SHADOW_SAMPLE_RATE", "0.1"))
+ADMIN_TOKEN = os.environ.get("RAQEEB_ADMIN_TOKEN", "")
+
+registry = ModelRegistry(
+    MODELS_DIR,
+    MODEL_BUNDLE,
+    compiled_trees=USE_COMPILED_TREES,
+    fused_mlp=USE_FUSED_MLP,
+    score_table=USE_SCORE_TABLE,
+)
+
+# حالة الإقلاع اللي يرجعها /health (مصدر النماذج ووقت تحميلها من registry.active)
+model_status = {
+    "ready": False,
+    "mode": "lazy" if LAZY_STARTUP else "eager",
+}
+
+# المقاييس اللي يرجعها /metrics (metrics.py): وقت كل طبقة وكل نموذج + عدد القرارات
+# والأسباب. التسجيل = perf_counter_ns حول كل طبقة + append واحد لكل معاملة.
+#   RAQEEB_METRICS                     0 = بدون تسجيل (الـ endpoint يرجع الـ gauges بس)
+#   RAQEEB_METRICS_GRAPH_SCAN_SECONDS  أقل مدة بين حسابين لتوزيع عدد السيكوانسات
+#                                      لكل asset (يمر على كل الـ graph تحت الـ lock)
+METRICS_ENABLED = os.environ.get("RAQEEB_METRICS", "1") != "0"
+METRICS_GRAPH_SCAN_SECONDS = float(os.environ.get("RAQEEB_METRICS_GRAPH_SCAN_SECONDS", "60"))
+metrics = Metrics(
+    transaction_layers=("behavior", "sequence", "graph"),
+    batch_layers=("ai",),
+    models=("rf", "iso", "mlp"),
+)
+
+
+def _ms_since(started):
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def load_models():
+    """النسخة active من النماذج (تنحمّل مرة وحدة: الإقلاع أو أول طلب)."""
+    return registry.ensure_loaded()
 
 
 # Allow CORS for local dashboard
@@ -33,12 +122,172 @@ user_normal_sequences = {
 
 # ================== FRAUD GRAPH (Asset-Centric) ==================
 
-# نخزن هنا الـ IPs / devices / doc_hashes اللي شاركت في معاملات احتيال مؤكدة
-risky_assets = {
-    "ip": {},         # ip -> {"fraud_count": int, "last_sequences": [list[str], ...]}
-    "device_id": {},  # device_id -> نفس الفكرة
-    "doc_hash": {},   # doc_hash -> نفس الفكرة
-}
+# نخزن هنا الـ IPs / devices / doc_hashes اللي شاركت في معاملات احتيال مؤكدة.
+# الحدود قابلة للتعديل بـ env:
+#   RAQEEB_GRAPH_MAX_SEQUENCES  سيكوانسات مميزة لكل asset (ring buffer)
+#   RAQEEB_GRAPH_TTL_HOURS      aging: asset ما انضاف له احتيال خلال المدة ينشال (0 = بدون)
+#   RAQEEB_GRAPH_EVICT_SECONDS  كل كم ثانية نشيل المنتهية بدون ما ننتظر حالة جديدة
+#   RAQEEB_GRAPH_MAX_ASSETS     أقصى عدد assets (0 = بدون)
+#   RAQEEB_GRAPH_MEMORY_MB      memory budget تقريبي للـ graph (0 = بدون)
+#   RAQEEB_GRAPH_RING_HOPS      أبعد مسافة (روابط) من مركز حلقة احتيال تضيف نقاط (-1 = بدون)
+#   RAQEEB_GRAPH_WRITER_YIELD_US  دفعات التأكيد تترك الـ GIL لـ /evaluate كل كذا µs من الشغل
+_graph_ttl_hours = float(os.environ.get("RAQEEB_GRAPH_TTL_HOURS", "0"))
+_graph_max_assets = int(os.environ.get("RAQEEB_GRAPH_MAX_ASSETS", "0"))
+_graph_memory_mb = float(os.environ.get("RAQEEB_GRAPH_MEMORY_MB", "512"))
+GRAPH_EVICT_SECONDS = float(os.environ.get("RAQEEB_GRAPH_EVICT_SECONDS", "60"))
+
+fraud_graph = FraudGraph(
+    max_sequences_per_asset=int(os.environ.get("RAQEEB_GRAPH_MAX_SEQUENCES", "256")),
+    asset_ttl_seconds=_graph_ttl_hours * 3600 or None,
+    max_assets=_graph_max_assets or None,
+    memory_budget_bytes=int(_graph_memory_mb * 1024 * 1024) or None,
+    ring_max_hops=int(os.environ.get("RAQEEB_GRAPH_RING_HOPS", "2")),
+    writer_yield_seconds=float(os.environ.get("RAQEEB_GRAPH_WRITER_YIELD_US", "100")) / 1e6,
+)
+
+# تخزين دائم (append-only log + snapshots) عشان الـ graph ينجو من الـ restart،
+# ومشترك بين كل الـ worker processes (gunicorn -w N) اللي تفتح نفس المجلد:
+#   RAQEEB_GRAPH_DIR             مجلد الـ log والـ snapshots ("" = بالذاكرة بس)
+#   RAQEEB_GRAPH_FSYNC_MS        كل كم ms نسوي fsync للـ log (0 = مع كل حالة)
+#   RAQEEB_GRAPH_SNAPSHOT_EVERY  عدد الحالات بين كل snapshot
+#   RAQEEB_GRAPH_SYNC_MS         كل كم ms نطبق الحالات اللي أكدتها workers ثانية
+_graph_dir = os.environ.get("RAQEEB_GRAPH_DIR", "data/fraud_graph")
+
+graph_store = None
+if _graph_dir:
+    graph_store = GraphStore(
+        fraud_graph,
+        _graph_dir,
+        snapshot_every=int(os.environ.get("RAQEEB_GRAPH_SNAPSHOT_EVERY", "100000")),
+        fsync_interval=float(os.environ.get("RAQEEB_GRAPH_FSYNC_MS", "50")) / 1000,
+        poll_interval=float(os.environ.get("RAQEEB_GRAPH_SYNC_MS", "100")) / 1000,
+        evict_interval=GRAPH_EVICT_SECONDS,
+    )
+    _restore = graph_store.open()
+    print(
+        f"[raqeeb] fraud graph restored from {_graph_dir}: {_restore['assets']} assets "
+        f"(snapshot lsn {_restore['snapshot_lsn']} + {_restore['replayed_cases']} logged cases) "
+        f"in {_restore['total_seconds']}s"
+    )
+    atexit.register(graph_store.close)
+
+
+def _graph_aging_loop():
+    """بدون graph_store: نشيل الـ assets المنتهية كل GRAPH_EVICT_SECONDS (مع الـ store، thread حقه يسويها)."""
+    while True:
+        time.sleep(GRAPH_EVICT_SECONDS)
+        fraud_graph.evict_expired()
+
+
+if graph_store is None and fraud_graph.asset_ttl_seconds is not None and GRAPH_EVICT_SECONDS > 0:
+    threading.Thread(target=_graph_aging_loop, name="raqeeb-graph-aging", daemon=True).start()
+
+# ================== VELOCITY (عدادات السرعة بالسيرفر) ==================
+
+# كل /evaluate يتسجل لـ user_id و ip_address و device_id في عدادات منزلقة (velocity.py)
+# لآخر دقيقة / ساعة / 24 ساعة، و ops_last_24h = الأكبر من اللي أرسله الـ client
+# وعداد السيرفر (الـ client يقدر يرفعه بس ما يقدر ينزله).
+#   RAQEEB_VELOCITY             0 = بدون عدادات (ops_last_24h من الـ client بس)
+#   RAQEEB_VELOCITY_MAX_KEYS    أقصى عدد مفاتيح (0 = بدون)، الأقدم تحديثاً ينشال أول
+#   RAQEEB_VELOCITY_MEMORY_MB   memory budget تقريبي للعدادات (0 = بدون)
+VELOCITY_ENABLED = os.environ.get("RAQEEB_VELOCITY", "1") != "0"
+velocity = VelocityStore(
+    max_keys=int(os.environ.get("RAQEEB_VELOCITY_MAX_KEYS", "0")) or None,
+    memory_budget_bytes=int(float(os.environ.get("RAQEEB_VELOCITY_MEMORY_MB", "256")) * 1024 * 1024) or None,
+)
+
+# عتبات إشارات السرعة في طبقة السلوك (العدد يشمل المعاملة الحالية)
+USER_BURST_PER_MINUTE = 6       # عمليات نفس المستخدم في دقيقة
+IP_OPS_PER_HOUR = 60            # عمليات من نفس الـ IP في ساعة (كل المستخدمين)
+DEVICE_OPS_PER_HOUR = 30        # عمليات من نفس الجهاز في ساعة (كل المستخدمين)
+
+# ================== USER PROFILES (الأجهزة وآخر موقع لكل مستخدم) ==================
+
+# profiles.py: لكل user_id الأجهزة المعروفة وآخر موقع تقريبي. قبل التقييم نحسب منها
+# device_is_known (لو فيه device_id) و location_change_km (لو فيه latitude / longitude)
+# بدل قيم الـ client، وبعده نتعلم الجهاز والموقع (إلا لو القرار BLOCK_REVIEW).
+# مستخدم جديد أو حقل ناقص -> قيمة الـ client زي ما هي.
+#   RAQEEB_PROFILES                  0 = بدون (القيمتين من الـ client)
+#   RAQEEB_PROFILE_MAX_USERS         أقصى عدد مستخدمين (33 byte لكل خانة، الخانات >= max / 0.7)؛ الأقدم نشاطاً ينشال أول
+#   RAQEEB_PROFILE_INACTIVE_DAYS     المستخدم اللي ما له نشاط من هالمدة ينشال (0 = بدون)
+#   RAQEEB_PROFILE_DIR               مجلد الـ snapshot ("" = بالذاكرة بس)
+#   RAQEEB_PROFILE_SNAPSHOT_SECONDS  كل كم ثانية نكتب snapshot (لو فيه تحديثات) ونشيل غير النشطين
+PROFILES_ENABLED = os.environ.get("RAQEEB_PROFILES", "1") != "0"
+_profile_inactive_days = float(os.environ.get("RAQEEB_PROFILE_INACTIVE_DAYS", "90"))
+_profile_dir = os.environ.get("RAQEEB_PROFILE_DIR", "data/profiles")
+PROFILE_SNAPSHOT_SECONDS = float(os.environ.get("RAQEEB_PROFILE_SNAPSHOT_SECONDS", "300"))
+# القرارات اللي ما نتعلم منها جهاز ولا موقع (معاملة محظورة ما تصير "معروفة")
+PROFILE_SKIP_DECISIONS = ("BLOCK_REVIEW",)
+
+profiles = ProfileStore(
+    max_users=int(os.environ.get("RAQEEB_PROFILE_MAX_USERS", "1000000")),
+    inactive_seconds=_profile_inactive_days * 86400 or None,
+)
+_profile_snapshot_path = os.path.join(_profile_dir, PROFILE_SNAPSHOT_NAME) if _profile_dir else None
+_profile_snapshot_state = {"updates": 0}
+
+
+def snapshot_profiles(force=False):
+    """نشيل غير النشطين ونكتب snapshot لو تغير شي من آخر مرة."""
+    profiles.evict_inactive()
+    if force or profiles.updates != _profile_snapshot_state["updates"]:
+        _profile_snapshot_state["updates"] = profiles.updates
+        profiles.snapshot(_profile_snapshot_path)
+
+
+def _profile_snapshot_loop():
+    while True:
+        time.sleep(PROFILE_SNAPSHOT_SECONDS)
+        try:
+            snapshot_profiles()
+        except OSError as exc:
+            print(f"[raqeeb] profile snapshot failed: {exc}")
+
+
+if PROFILES_ENABLED and _profile_snapshot_path:
+    if os.path.exists(_profile_snapshot_path):
+        _restore_started = time.perf_counter()
+        try:
+            _restored_users = profiles.restore(_profile_snapshot_path)
+            print(f"[raqeeb] user profiles restored from {_profile_snapshot_path}: {_restored_users} users "
+                  f"in {time.perf_counter() - _restore_started:.2f}s")
+        except (OSError, ValueError, KeyError) as exc:
+            print(f"[raqeeb] ignoring profile snapshot {_profile_snapshot_path}: {exc}")
+    _profile_snapshot_state["updates"] = profiles.updates
+    threading.Thread(target=_profile_snapshot_loop, name="raqeeb-profiles", daemon=True).start()
+    atexit.register(snapshot_profiles)
+
+# ================== SEQUENCE MODELS (نمط تنقل كل مستخدم) ==================
+
+# sequence_model.py: انتقالات action -> action لكل مستخدم (+ نموذج عام) نتعلمها من
+# الجلسات اللي قرارها ALLOW، و sequence_risk يطلع sequence_drift لو surprise الجلسة
+# (متوسط -log P لانتقالاتها) أعلى من المعتاد للمستخدم بـ SEQUENCE_DRIFT_MARGIN.
+# user_normal_sequences فوق تدخل كأنماط معروفة وقت الإقلاع.
+#   RAQEEB_SEQUENCE_MODEL                0 = بدون (طبقة السيكوانس بالقواعد بس)
+#   RAQEEB_SEQUENCE_MAX_USERS            أقصى عدد مستخدمين (~0.9 KB لكل واحد كحد أقصى)؛ الأقدم تعلماً ينشال أول
+#   RAQEEB_SEQUENCE_INACTIVE_DAYS        المستخدم اللي ما تعلمنا منه من هالمدة ينشال (0 = بدون)
+SEQUENCE_MODEL_ENABLED = os.environ.get("RAQEEB_SEQUENCE_MODEL", "1") != "0"
+sequence_models = SequenceModels(
+    max_users=int(os.environ.get("RAQEEB_SEQUENCE_MAX_USERS", "500000")) or None,
+    inactive_seconds=float(os.environ.get("RAQEEB_SEQUENCE_INACTIVE_DAYS", "90")) * 86400 or None,
+)
+# نتعلم بس من الجلسات المسموحة (ALERT وفوق ممكن تكون احتيال)
+SEQUENCE_LEARN_DECISIONS = ("ALLOW",)
+# كم nat (متوسط -log P لكل انتقال) فوق المعتاد عشان نعتبرها drift، والنقاط
+SEQUENCE_DRIFT_MARGIN = 1.5
+SEQUENCE_DRIFT_POINTS = 8
+# الأنماط المعروفة تنحسب كأنها كم جلسة (يكفي عشان نموذج المستخدم يشتغل)
+SEQUENCE_SEED_SESSIONS = 5
+
+if SEQUENCE_MODEL_ENABLED:
+    for _user_id, _normal in user_normal_sequences.items():
+        sequence_models.learn(_user_id, vocabulary.encode(_normal, intern=True), weight=SEQUENCE_SEED_SESSIONS)
+
+# الحد الأدنى للتشابه مع سيكوانس احتيال سابق عشان نضيف نقاط
+SEQUENCE_SIMILARITY_THRESHOLD = 0.6
+
+# نقاط القرب من حلقة احتيال حسب المسافة (روابط) لأقرب asset متكرر فيها
+RING_PROXIMITY_POINTS = (10, 7, 4)
 
 
 def normalize_sequence(seq):
@@ -69,59 +318,44 @@ def register_fraud_case(ip=None, device_id=None, doc_hash=None, session_sequence
     نحفظ الـ assets اللي شاركت في معاملة نعتبرها احتيال مؤكّد.
     نحفظ أيضاً العلاقات بين الـ assets (مثلاً نفس الـ IP استخدم نفس الـ Device).
     """
-    seq = normalize_sequence(session_sequence)
-
-    # IP
-    if ip:
-        stats = risky_assets["ip"].setdefault(ip, {
-            "fraud_count": 0,
-            "last_sequences": [],
-            "related_devices": [],
-            "related_docs": []
-        })
-        stats["fraud_count"] += 1
-        if seq:
-            stats["last_sequences"].append(seq)
-        if device_id and device_id not in stats["related_devices"]:
-            stats["related_devices"].append(device_id)
-        if doc_hash and doc_hash not in stats["related_docs"]:
-            stats["related_docs"].append(doc_hash)
-
-    # Device
-    if device_id:
-        stats = risky_assets["device_id"].setdefault(device_id, {
-            "fraud_count": 0,
-            "last_sequences": [],
-            "related_ips": [],
-            "related_docs": []
-        })
-        stats["fraud_count"] += 1
-        if seq:
-            stats["last_sequences"].append(seq)
-        if ip and ip not in stats["related_ips"]:
-            stats["related_ips"].append(ip)
-        if doc_hash and doc_hash not in stats["related_docs"]:
-            stats["related_docs"].append(doc_hash)
-
-    # Document hash
-    if doc_hash:
-        stats = risky_assets["doc_hash"].setdefault(doc_hash, {
-            "fraud_count": 0,
-            "last_sequences": [],
-            "related_ips": [],
-            "related_devices": []
-        })
-        stats["fraud_count"] += 1
-        if seq:
-            stats["last_sequences"].append(seq)
-        if ip and ip not in stats["related_ips"]:
-            stats["related_ips"].append(ip)
-        if device_id and device_id not in stats["related_devices"]:
-            stats["related_devices"].append(device_id)
+    (graph_store or fraud_graph).register_case(
+        ip=ip,
+        device_id=device_id,
+        doc_hash=doc_hash,
+        sequence=normalize_sequence(session_sequence),
+    )
+
+
+def register_fraud_cases(cases):
+    """
+    دفعة حالات [(ip, device_id, doc_hash, session_sequence)] بنفس الترتيب (writer طابور
+    التأكيد): lock واحد للـ graph وwrite واحد للـ log. نرجّع version الـ graph بعدها.
+    """
+    target = graph_store or fraud_graph
+    target.register_cases([
+        (ip, device_id, doc_hash, normalize_sequence(session_sequence))
+        for ip, device_id, doc_hash, session_sequence in cases
+    ])
+    return target.version
+
+
+def freeze_long_lived():
+    """
+    الـ graph ملايين objects عايشة طول عمر الـ process، والـ full collection (gen 2) يمر
+    عليها كلها وهو ماسك الـ GIL (مئات ms يوقف فيها /evaluate). مرة وحدة بعد الإقلاع
+    (الـ graph المحمّل والنماذج): full collection أول ثم permanent generation اللي الـ gc
+    ما يمر عليه. الـ graph بدون reference cycles، فاللي ينحذف منه ينمسح بالـ refcount عادي.
+    مو بعد كل دفعة ولا في handler: اللي يتجمد ما ينجمع أبد، فأي cycle ميت وقتها
+    (tracebacks، frames) يصير تسريب.
+    """
+    if GC_FREEZE:
+        gc.collect()
+        gc.freeze()
 
 
 def compute_graph_risk(ip=None, device_id=None, doc_hash=None, session_sequence=None):
     """
+    session_sequence: list/str أو SessionSummary محسوب مسبقاً.
     نحسب Network / Graph Risk على أساس:
       - كم مرة هذا الـ IP شارك في fraud cases سابقة
       - كم مرة هذا الـ device_id شارك
@@ -137,25 +371,32 @@ def compute_graph_risk(ip=None, device_id=None, doc_hash=None, session_sequence=
     reason_codes = []
     reason_details = []
 
-    current_seq = normalize_sequence(session_sequence)
+    summary = summarize_session(session_sequence)
+    codes = summary.codes
+
+    # matcher واحد للجلسة الحالية (أرقام actions.py) نعيد استخدامه مع مرشحي الـ SequenceIndex
+    # (السيكوانسات المخزنة normalized من register_fraud_case بنفس القاموس)، والخطوات
+    # اللي ما نعرفها ما تطابق شي (comparable)
+    matcher = SequenceMatcher(None, comparable(codes))
+
+    # نسخة واحدة ثابتة من الـ graph للطلب كله (بدون lock): تأكيدات تنكتب بنفس الوقت
+    # ما تغير شي وسط الطلب، وكل حالة تبان كاملة أو ما تبان
+    graph = fraud_graph.view
 
     # ---- IP ----
-    ip_info = risky_assets["ip"].get(ip)
-    if ip and ip_info and ip_info["fraud_count"] > 0:
+    ip_info = graph.get("ip", ip)
+    if ip_info and ip_info.fraud_count > 0:
         # زيادة الوزن: 10 → 12 نقطة لكل حالة احتيال
-        add = min(12 * ip_info["fraud_count"], 35)
+        add = min(12 * ip_info.fraud_count, 35)
         total_risk += add
         reason_codes.append("shared_ip_with_high_risk")
         reason_details.append(
-            f"IP {ip} شارك في {ip_info['fraud_count']} معاملات احتيال مؤكدة (+{add} نقاط مخاطرة)."
+            f"IP {ip} شارك في {ip_info.fraud_count} معاملات احتيال مؤكدة (+{add} نقاط مخاطرة)."
         )
 
-        best_sim = 0.0
-        for fraud_seq in ip_info["last_sequences"]:
-            sim = sequence_similarity(current_seq, fraud_seq)
-            best_sim = max(best_sim, sim)
+        best_sim = ip_info.best_similarity(codes, SEQUENCE_SIMILARITY_THRESHOLD, matcher)
 
-        if best_sim >= 0.6:
+        if best_sim >= SEQUENCE_SIMILARITY_THRESHOLD:
             # زيادة وزن التشابه: 5 → 8 نقاط
             extra = 8
             total_risk += extra
@@ -165,22 +406,19 @@ def compute_graph_risk(ip=None, device_id=None, doc_hash=None, session_sequence=
             )
 
     # ---- Device ID ----
-    dev_info = risky_assets["device_id"].get(device_id)
-    if device_id and dev_info and dev_info["fraud_count"] > 0:
+    dev_info = graph.get("device_id", device_id)
+    if dev_info and dev_info.fraud_count > 0:
         # زيادة الوزن: 12 → 18 نقطة لكل حالة احتيال (الجهاز أهم من IP)
-        add = min(18 * dev_info["fraud_count"], 40)
+        add = min(18 * dev_info.fraud_count, 40)
         total_risk += add
         reason_codes.append("shared_device_with_high_risk")
         reason_details.append(
-            f"الجهاز {device_id} مرتبط بـ {dev_info['fraud_count']} معاملات احتيال مؤكدة (+{add} نقاط)."
+            f"الجهاز {device_id} مرتبط بـ {dev_info.fraud_count} معاملات احتيال مؤكدة (+{add} نقاط)."
         )
 
-        best_sim = 0.0
-        for fraud_seq in dev_info["last_sequences"]:
-            sim = sequence_similarity(current_seq, fraud_seq)
-            best_sim = max(best_sim, sim)
+        best_sim = dev_info.best_similarity(codes, SEQUENCE_SIMILARITY_THRESHOLD, matcher)
 
-        if best_sim >= 0.6:
+        if best_sim >= SEQUENCE_SIMILARITY_THRESHOLD:
             # زيادة وزن التشابه: 5 → 8 نقاط
             extra = 8
             total_risk += extra
@@ -190,22 +428,19 @@ def compute_graph_risk(ip=None, device_id=None, doc_hash=None, session_sequence=
             )
 
     # ---- Document Hash ----
-    doc_info = risky_assets["doc_hash"].get(doc_hash)
-    if doc_hash and doc_info and doc_info["fraud_count"] > 0:
+    doc_info = graph.get("doc_hash", doc_hash)
+    if doc_info and doc_info.fraud_count > 0:
         # زيادة الوزن: 8 → 12 نقطة لكل حالة احتيال
-        add = min(12 * doc_info["fraud_count"], 30)
+        add = min(12 * doc_info.fraud_count, 30)
         total_risk += add
         reason_codes.append("shared_doc_with_high_risk")
         reason_details.append(
-            f"تم إعادة استخدام نفس بصمة الوثيقة {doc_hash} في {doc_info['fraud_count']} معاملات احتيال (+{add} نقاط)."
+            f"تم إعادة استخدام نفس بصمة الوثيقة {doc_hash} في {doc_info.fraud_count} معاملات احتيال (+{add} نقاط)."
         )
 
-        best_sim = 0.0
-        for fraud_seq in doc_info["last_sequences"]:
-            sim = sequence_similarity(current_seq, fraud_seq)
-            best_sim = max(best_sim, sim)
+        best_sim = doc_info.best_similarity(codes, SEQUENCE_SIMILARITY_THRESHOLD, matcher)
 
-        if best_sim >= 0.6:
+        if best_sim >= SEQUENCE_SIMILARITY_THRESHOLD:
             # زيادة وزن التشابه: 5 → 8 نقاط
             extra = 8
             total_risk += extra
@@ -214,6 +449,20 @@ def compute_graph_risk(ip=None, device_id=None, doc_hash=None, session_sequence=
                 f"مسار الجلسة الحالية مشابه ({int(best_sim*100)}٪) لمسارات احتيال سابقة لوثائق مماثلة (+{extra} نقاط)."
             )
 
+    # ---- Fraud ring (cluster) ----
+    # الطلب قريب من حلقة احتيال حتى لو الـ assets نفسها قليلة الحالات:
+    # ring_hops + حجم الـ cluster محسوبة مسبقاً في الـ graph -> O(1) بدون traversal
+    ring = graph.nearest_ring(info for info in (ip_info, dev_info, doc_info) if info)
+    if ring:
+        hops, cluster = ring
+        add = RING_PROXIMITY_POINTS[min(hops, len(RING_PROXIMITY_POINTS) - 1)]
+        total_risk += add
+        reason_codes.append("near_fraud_ring")
+        reason_details.append(
+            f"الطلب مرتبط بشبكة احتيال (cluster #{cluster.id}: {cluster.size} assets و"
+            f" {cluster.fraud_count} مشاركة احتيال) على بعد {hops} رابط من asset متكرر (+{add} نقاط)."
+        )
+
     # زيادة السقف: 40 → 50 نقطة (لأن Graph risk إشارة قوية جداً)
     total_risk = min(total_risk, 50)
     return total_risk, reason_codes, reason_details
@@ -233,6 +482,12 @@ def explain_reason(reason: str) -> str:
         return "الخدمة المطلوبة ذات حساسية عالية (مثل تجديد هوية أو تفويض مركبة)."
     if reason == "high_frequency_ops":
         return "عدد العمليات في آخر 24 ساعة أعلى من المعتاد."
+    if reason == "burst_ops_last_minute":
+        return "عدد كبير من العمليات لنفس الحساب خلال آخر دقيقة، وهذا أقرب لسلوك آلي."
+    if reason == "high_velocity_ip":
+        return "نفس عنوان الـ IP نفّذ عدداً كبيراً من العمليات خلال آخر ساعة."
+    if reason == "high_velocity_device":
+        return "نفس الجهاز نفّذ عدداً كبيراً من العمليات خلال آخر ساعة."
 
     # أسباب AI / شذوذ
     if reason.startswith("ml_supervised_high_risk_proba:"):
@@ -261,6 +516,8 @@ def explain_reason(reason: str) -> str:
         return "الجلسة تحتوي على عدد كبير من الخطوات والعمليات، وهذا سلوك غير معتاد."
     if reason == "rare_navigation_pattern":
         return "مسار الجلسة خطي بدون أي استكشاف للواجهات، وهو أقرب لسلوك آلي من سلوك مستخدم بشري."
+    if reason == "sequence_drift":
+        return "مسار التنقل في هذه الجلسة مختلف بشكل واضح عن النمط المعتاد لهذا المستخدم."
 
 
     # لو ما عرفناه، رجّعيه زي ما هو
@@ -351,68 +608,75 @@ def compute_behavior_risk(req):
             risk += 8  # كان 15، نخففه - الخدمة الحساسة بحد ذاتها مو مبرر للحظر
         reasons.append("sensitive_service")
 
+    # 6) عدادات السرعة من السيرفر (apply_velocity) - موجودة بس للطلبات الحية
+    counts = req.get("velocity")
+    if counts:
+        if counts["user_1m"] >= USER_BURST_PER_MINUTE:
+            risk += 10
+            reasons.append("burst_ops_last_minute")
+        if counts["ip_1h"] >= IP_OPS_PER_HOUR:
+            risk += 8
+            reasons.append("high_velocity_ip")
+        if counts["device_1h"] >= DEVICE_OPS_PER_HOUR:
+            risk += 8
+            reasons.append("high_velocity_device")
+
     # سقف للـ behavior risk (عشان ما يسيطر على السكور الكلي)
     # خففنا من 60 إلى 50 لتوازن أفضل مع الطبقات الأخرى
     return min(risk, 50), reasons
 
-def ai_anomaly_score(req):
+def build_model_features(req):
     """
-    نحسب AI risk باستخدام 3 نماذج:
-      - RandomForestClassifier (إشرافي)
-      - IsolationForest (كشف شذوذ)
-      - MLPClassifier (شبكة عصبية)
-    على 8 features:
+    نبني الـ feature vector (8 قيم) بنفس ترتيب التدريب:
       device_is_known, location_change_km, hour_of_day, ops_last_24h,
       is_sensitive_service, session_length, sensitive_count, repeated_flag
     """
-    # 1) استنتاج ملخص الجلسة من السيكوانس الحقيقية
-    seq = req.get("session_sequence", []) or []
-    if isinstance(seq, str):
-        seq = [s.strip() for s in seq.split(",") if s.strip()]
-
-    session_length = len(seq)
-    sensitive_count = sum(1 for a in seq if a in SENSITIVE_ACTIONS)
-    repeated_flag = 1 if (seq.count("login") >= 3 or seq.count("payment") >= 2) else 0
+    # ملخص الجلسة (محسوب مرة وحدة في parse_transaction لو موجود)
+    summary = req.get("session_summary") or summarize_session(req.get("session_sequence"))
 
-    # 2) بناء الـ feature vector بنفس ترتيب التدريب
-    x = np.array([[
+    return [
         int(req["device_is_known"]),
         float(req["location_change_km"]),
         float(req["hour_of_day"]),
         float(req["ops_last_24h"]),
         int(req["is_sensitive_service"]),
-        float(session_length),
-        float(sensitive_count),
-        float(repeated_flag),
-    ]])
+        float(summary.length),
+        float(summary.sensitive_count),
+        float(summary.repeated_flag),
+    ]
 
-    reasons = []
 
-    # ----- 2.1 RandomForest (إشرافي) -----
-    proba_risky = rf_model.predict_proba(x)[0][1]
-    rf_risk = int(proba_risky * 25)
-    # خفض العتبة من 0.6 إلى 0.5 لتقليل False Negatives
-    if proba_risky > 0.5:
-        reasons.append(f"ml_supervised_high_risk_proba:{round(proba_risky, 2)}")
-
-    # ----- 2.2 IsolationForest (أنومالي) -----
-    iso_pred = iso_model.predict(x)[0]       # -1 = anomaly, 1 = normal
-    iso_score = iso_model.decision_function(x)[0]
-    iso_risk = 0
-    if iso_pred == -1:
-        iso_risk = min(int(abs(iso_score) * 80), 25)
-        reasons.append("ml_unsupervised_anomaly_detected")
-
-    # ----- 2.3 MLP Neural Network -----
-    x_scaled = scaler.transform(x)
-    nn_pred_proba = nn_model.predict_proba(x_scaled)[0][1]
-    nn_risk = int(nn_pred_proba * 25)
-    # خفض العتبة من 0.6 إلى 0.5 لتقليل False Negatives
-    if nn_pred_proba > 0.5:
-        reasons.append(f"ml_nn_high_risk_proba:{round(nn_pred_proba, 2)}")
+def predict_model_outputs(X, observe=True, models=None):
+    """
+    نشغّل كل نموذج مرة وحدة على مصفوفة N×8 كاملة (بدل نداء لكل معاملة).
+    نرجّع مصفوفات بطول N:
+      proba_risky (RF), iso_pred (-1/1), iso_score, nn_proba (MLP)
+    observe: نسجل وقت كل نموذج في /metrics (الـ warm-up ما يسجل).
+    models: ModelSet معيّن (الـ shadow مثلاً)؛ الافتراضي النسخة active وقت النداء.
+    """
+    models = models or load_models()
+    started = time.perf_counter_ns()
+    proba_risky = models.predict_rf(X)
+    rf_done = time.perf_counter_ns()
+    iso_pred, iso_score = models.predict_iso(X)   # -1 = anomaly, 1 = normal
+    iso_done = time.perf_counter_ns()
+    nn_proba = models.predict_nn(X)
+    if observe and METRICS_ENABLED:
+        metrics.record_models(
+            (rf_done - started, iso_done - rf_done, time.perf_counter_ns() - iso_done), len(X)
+        )
+    return proba_risky, iso_pred, iso_score, nn_proba
+
+
+def combine_ai_risk(req, rf, iso, nn):
+    """
+    نحوّل نقاط النماذج الثلاثة لمعاملة وحدة إلى (ai_risk, reasons).
+    rf / iso / nn = (risk، reason أو None) من model_risk_parts أو من جدول النقاط.
+    """
+    reasons = [reason for _, reason in (rf, iso, nn) if reason]
 
     # ----- 2.4 تجميع مخاطرة الـ AI -----
-    total_ai_risk = min(rf_risk + iso_risk + nn_risk, 40)
+    total_ai_risk = min(rf[0] + iso[0] + nn[0], 40)
     
     # 🔹 Boost AI risk إذا فيه إشارات سلوكية قوية (حتى لو النماذج ما رصدتها بقوة)
     # هذا يضمن إن AI risk يساهم حتى في الحالات اللي النماذج ما توقعتها بدقة
@@ -442,6 +706,63 @@ def ai_anomaly_score(req):
     return total_ai_risk, reasons
 
 
+def ai_anomaly_score(req):
+    """
+    نحسب AI risk باستخدام 3 نماذج:
+      - RandomForestClassifier (إشرافي)
+      - IsolationForest (كشف شذوذ)
+      - MLPClassifier (شبكة عصبية)
+    على 8 features:
+      device_is_known, location_change_km, hour_of_day, ops_last_24h,
+      is_sensitive_service, session_length, sensitive_count, repeated_flag
+    """
+    return ai_anomaly_scores_batch([req])[0]
+
+
+def ai_anomaly_scores_batch(reqs, observe=True, models=None):
+    """
+    نفس ai_anomaly_score لكن لمجموعة معاملات:
+    المعاملات اللي features حقتها داخل جدول النقاط (score_table.py) ناخذ نقاط الغابتين
+    منه والـ MLP حي (مصفوفة وحدة لها كلها)، والباقي نبني لها مصفوفة وحدة ونشغّل كل نموذج
+    مرة وحدة عليها،
+    ثم نجمع النتيجة لكل معاملة بنفس منطق المعاملة الفردية.
+    وقت طبقة ai في /metrics = وقت الـ batch كامل مقسوم على عدد المعاملات.
+    """
+    if not reqs:
+        return []
+
+    started = time.perf_counter_ns()
+    models = models or load_models()
+    rows = [build_model_features(req) for req in reqs]
+    parts = [None] * len(rows)
+    live = range(len(rows))
+    table = models.score_table
+    if table is not None:
+        for i, row in enumerate(rows):
+            index = table.index_of(row)
+            if index is not None:
+                parts[i] = table.parts(index)
+        hits = [i for i, part in enumerate(parts) if part is not None]
+        live = [i for i, part in enumerate(parts) if part is None]
+        if hits:
+            nn_proba = models.predict_nn(np.array([rows[i] for i in hits]))
+            for k, i in enumerate(hits):
+                parts[i] = (*parts[i], nn_risk_part(nn_proba[k]))
+        if observe and METRICS_ENABLED:
+            metrics.record_table(len(hits), len(live))
+
+    if live:
+        X = np.array([rows[i] for i in live])
+        proba_risky, iso_pred, iso_score, nn_proba = predict_model_outputs(X, observe, models)
+        for k, i in enumerate(live):
+            parts[i] = model_risk_parts(proba_risky[k], iso_pred[k], iso_score[k], nn_proba[k])
+
+    results = [combine_ai_risk(req, *part) for req, part in zip(reqs, parts)]
+    if observe and METRICS_ENABLED:
+        metrics.record_batch_layer("ai", (time.perf_counter_ns() - started) // len(reqs), len(reqs))
+    return results
+
+
 SENSITIVE_ACTIONS = {
     "renew_id",
     "vehicle_registration",
@@ -468,9 +789,88 @@ NON_SENSITIVE_ACTIONS = {
     "logout",
 }
 
+# صفحات "استكشافية" (تصفح عادي) - غيابها في جلسة طويلة يشبه سلوك بوت
+EXPLORATION_ACTIONS = {"home", "view_personal_data", "services"}
+
+# الـ actions المعروفة في القاموس المشترك (أرقام ثابتة) مع flags حقها، والطبقات
+# تفحص vocabulary.flags[code] بدل الـ sets
+vocabulary.mark(sorted(NON_SENSITIVE_ACTIONS), 0)
+vocabulary.mark(sorted(SENSITIVE_ACTIONS), SENSITIVE)
+vocabulary.mark(sorted(EXPLORATION_ACTIONS), EXPLORATION)
+LOGIN, PAYMENT, VERIFY_OTP = (vocabulary.intern(action) for action in ("login", "payment", "verify_otp"))
+
+
 def is_sensitive_action(action):
     return action in SENSITIVE_ACTIONS
 
+
+# ================== SESSION SUMMARY ==================
+
+class SessionSummary(NamedTuple):
+    """ملخص الجلسة - نحسبه مرة وحدة لكل طلب ونمرره لكل الطبقات."""
+    tokens: list            # الخطوات بعد normalize_sequence
+    codes: array            # نفس الخطوات بأرقام actions.py (array('H')، UNKNOWN للجديد)
+    counts: dict            # رقم الـ action -> عدد مرات الظهور
+    sensitive_count: int    # عدد الخدمات الحساسة
+    first_two: tuple        # أرقام أول خطوتين (لنمط sensitive_too_early)
+    has_exploration: bool   # فيه صفحة من EXPLORATION_ACTIONS؟
+    length: int
+
+    @property
+    def repeated_flag(self):
+        """1 لو فيه تكرار login/payment بشكل مريب (نفس feature التدريب)."""
+        counts = self.counts
+        return 1 if (counts.get(LOGIN, 0) >= 3 or counts.get(PAYMENT, 0) >= 2) else 0
+
+
+def summarize_session(seq):
+    """
+    نمشي على السيكوانس مرة وحدة (O(len)) ونطلع كل اللي تحتاجه الطبقات الأربع:
+    hash واحد لكل خطوة (رقمها في القاموس) وبعدها كل شي على الأرقام.
+    seq: list أو "a,b,c" أو SessionSummary جاهز (نرجعه زي ما هو).
+    """
+    if isinstance(seq, SessionSummary):
+        return seq
+
+    if not seq:
+        raw = []
+    elif isinstance(seq, str):
+        raw = seq.split(",")
+    else:
+        raw = seq
+
+    tokens = []
+    codes = array("H")
+    counts = {}
+    sensitive_count = 0
+    has_exploration = False
+    code_of = vocabulary.codes.get
+    flags = vocabulary.flags
+    for item in raw:
+        action = item.strip() if isinstance(item, str) else str(item).strip()
+        if not action:
+            continue
+        tokens.append(action)
+        code = code_of(action, UNKNOWN)
+        codes.append(code)
+        counts[code] = counts.get(code, 0) + 1
+        flag = flags[code]
+        if flag & SENSITIVE:
+            sensitive_count += 1
+        elif flag & EXPLORATION:
+            has_exploration = True
+
+    return SessionSummary(
+        tokens=tokens,
+        codes=codes,
+        counts=counts,
+        sensitive_count=sensitive_count,
+        first_two=tuple(codes[:2]),
+        has_exploration=has_exploration,
+        length=len(tokens),
+    )
+
+
 def sequence_risk(user_id, seq):
     """
     تحليل تسلسل الجلسة - طبقة خفيفة (0–30 نقطة تقريباً)
@@ -479,46 +879,54 @@ def sequence_risk(user_id, seq):
       - كثرة الخدمات الحساسة
       - الوصول السريع لخدمة حساسة
       - مسار خطي بدون استكشاف (نمط آلي / attack path)
+      - مسار مختلف عن نمط تنقل المستخدم نفسه (sequence_drift من sequence_model.py)
+    seq: list/str أو SessionSummary محسوب مسبقاً.
     """
     risk, reasons = 0, []
+    summary = summarize_session(seq)
+    counts = summary.counts
 
     # 1) تكرار تسجيل الدخول أو الدفع بشكل مبالغ فيه
-    if seq.count("login") >= 3 or seq.count("payment") >= 2:
+    if summary.repeated_flag:
         risk += 8
         reasons.append("repeated_actions")
 
     # 1-b) محاولات OTP متكررة (تشبه brute-force أو misuse)
-    otp_count = seq.count("verify_otp")
+    otp_count = counts.get(VERIFY_OTP, 0)
     if otp_count >= 3:
         # 3 محاولات أو أكثر في نفس الجلسة = سلوك مريب
         risk += 6
         reasons.append("too_many_otp_challenges")
 
     # 2) أكثر من خدمة حساسة في نفس الجلسة
-    sensitive_count = sum(1 for a in seq if is_sensitive_action(a))
-    if sensitive_count >= 2:
+    if summary.sensitive_count >= 2:
         risk += 8
         reasons.append("multiple_sensitive_services")
 
     # 3) خدمة حساسة مباشرة بعد تسجيل الدخول (بدون أي تصفح)
-    if len(seq) > 1 and seq[0] == "login" and seq[1] in SENSITIVE_ACTIONS:
+    first_two = summary.first_two
+    if len(first_two) > 1 and first_two[0] == LOGIN and vocabulary.flags[first_two[1]] & SENSITIVE:
         risk += 10
         reasons.append("sensitive_too_early")
 
     # 4) جلسة طويلة جداً (حوسة / كثرة خطوات)
-    if len(seq) >= 7:
+    if summary.length >= 7:
         risk += 4
         reasons.append("long_session_many_ops")
 
     # 5) Rare navigation pattern (بدون صفحات غير حساسة = يشبه سلوك بوت)
-    non_sensitive_steps = ["home", "view_personal_data", "services"]
-    has_exploration = any(a in non_sensitive_steps for a in seq)
-
     # لو طول السلسلة >= 5 وما فيه أي صفحة استكشافية → نعتبره نمط نادر
-    if not has_exploration and len(seq) >= 5:
+    if not summary.has_exploration and summary.length >= 5:
         risk += 7
         reasons.append("rare_navigation_pattern")
 
+    # 6) Drift عن نمط المستخدم (أو النمط العام لو ما له تاريخ كافي)، O(len)
+    if SEQUENCE_MODEL_ENABLED:
+        surprise, typical = sequence_models.surprise(user_id, summary.codes)
+        if surprise is not None and surprise - typical >= SEQUENCE_DRIFT_MARGIN:
+            risk += SEQUENCE_DRIFT_POINTS
+            reasons.append("sequence_drift")
+
     # سقف للـ sequence layer عشان ما تحرق السكور الكلي
     return min(risk, 30), reasons
 
@@ -536,15 +944,23 @@ def final_decision(score):
 
 
 # ================== API ENDPOINT ==================
-@app.route("/graph-data", methods=["GET"])
-def graph_data():
+# (kind في الـ graph، type في الرد، بادئة الـ label)
+GRAPH_NODE_KINDS = (("ip", "ip", "IP"), ("device_id", "device", "Device"), ("doc_hash", "doc", "Doc"))
+
+# آخر رد كامل لـ /graph-data (JSON جاهز) - يتبني من جديد بس لما يتغير version الـ graph
+_graph_body_cache = {"version": None, "body": None}
+
+
+def build_graph_payload(changes):
     """
     نبني graph يظهر:
     1. العقد (Nodes): IPs, Devices, Docs (مع حجم حسب fraud_count)
     2. الروابط (Links):
        - Asset-to-Asset: عندما IP و Device و Doc يظهرون معاً في نفس fraud case
        - Asset-to-Sequence: عندما asset يستخدم sequence معينة
-    3. Clusters: assets مرتبطة ببعض = fraud network
+    3. Clusters: assets مرتبطة ببعض = fraud network (cluster في كل عقدة + clusters)
+    changes = fraud_graph.changes_since(...): كل الـ graph أو اللي تغير بس،
+    فتكلفة الرد على قد التغيير مو على قد حجم الـ graph.
     """
     nodes = []
     links = []
@@ -554,113 +970,52 @@ def graph_data():
     existing_ids = set()
 
     # Helper to add unique node with metadata
-    def add_node(node_id, label, ntype, fraud_count=0):
+    def add_node(node_id, label, ntype, fraud_count=0, cluster_id=None):
         if node_id not in existing_ids:
             nodes.append({
                 "id": node_id,
                 "label": label,
                 "type": ntype,
                 "fraud_count": fraud_count,
-                "size": min(8 + fraud_count * 3, 30)  # حجم العقدة حسب عدد الاحتيالات
+                "size": min(8 + fraud_count * 3, 30),  # حجم العقدة حسب عدد الاحتيالات
+                "cluster": cluster_id,
             })
             existing_ids.add(node_id)
 
-    # 1) إضافة IPs مع fraud_count
-    for ip, details in risky_assets["ip"].items():
-        add_node(ip, f"IP: {ip}", "ip", details["fraud_count"])
-        
-        # ربط IP مع Devices المرتبطة
-        for device in details.get("related_devices", []):
-            if device in risky_assets["device_id"]:
-                link_key = (ip, device, "ip-device")
-                if link_key not in link_set:
-                    links.append({
-                        "source": ip,
-                        "target": device,
-                        "type": "asset-asset",
-                        "strength": 1
-                    })
-                    link_set.add(link_key)
-        
-        # ربط IP مع Docs المرتبطة
-        for doc in details.get("related_docs", []):
-            if doc in risky_assets["doc_hash"]:
-                link_key = (ip, doc, "ip-doc")
-                if link_key not in link_set:
-                    links.append({
-                        "source": ip,
-                        "target": doc,
-                        "type": "asset-asset",
-                        "strength": 1
-                    })
-                    link_set.add(link_key)
-
-    # 2) إضافة Devices مع fraud_count
-    for dev, details in risky_assets["device_id"].items():
-        add_node(dev, f"Device: {dev}", "device", details["fraud_count"])
-        
-        # ربط Device مع IPs المرتبطة (لو ما ربطناه قبل)
-        for ip_addr in details.get("related_ips", []):
-            if ip_addr in risky_assets["ip"]:
-                link_key = (ip_addr, dev, "ip-device")
-                if link_key not in link_set:
-                    links.append({
-                        "source": ip_addr,
-                        "target": dev,
-                        "type": "asset-asset",
-                        "strength": 1
-                    })
-                    link_set.add(link_key)
-        
-        # ربط Device مع Docs المرتبطة
-        for doc in details.get("related_docs", []):
-            if doc in risky_assets["doc_hash"]:
-                link_key = (dev, doc, "device-doc")
-                if link_key not in link_set:
-                    links.append({
-                        "source": dev,
-                        "target": doc,
-                        "type": "asset-asset",
-                        "strength": 1
-                    })
-                    link_set.add(link_key)
-
-    # 3) إضافة Docs مع fraud_count
-    for doc, details in risky_assets["doc_hash"].items():
-        add_node(doc, f"Doc: {doc}", "doc", details["fraud_count"])
-        
-        # ربط Doc مع IPs و Devices (لو ما ربطناه قبل)
-        for ip_addr in details.get("related_ips", []):
-            if ip_addr in risky_assets["ip"]:
-                link_key = (ip_addr, doc, "ip-doc")
-                if link_key not in link_set:
-                    links.append({
-                        "source": ip_addr,
-                        "target": doc,
-                        "type": "asset-asset",
-                        "strength": 1
-                    })
-                    link_set.add(link_key)
-        
-        for device in details.get("related_devices", []):
-            if device in risky_assets["device_id"]:
-                link_key = (device, doc, "device-doc")
-                if link_key not in link_set:
-                    links.append({
-                        "source": device,
-                        "target": doc,
-                        "type": "asset-asset",
-                        "strength": 1
-                    })
-                    link_set.add(link_key)
-
-    # 4) إضافة Sequences كعقد منفصلة (اختياري - يمكن إخفاؤها)
+    # 1) العقد + الروابط لكل نوع: IPs ثم Devices ثم Docs
+    # (الرابط له اتجاه ثابت ip -> device -> doc عشان ما يتكرر من الطرفين)
+    # الطرف الثاني موجود؟ من الـ view بنفس version الـ changes (مو الـ graph وهو يتعدل)
+    view = changes["view"]
+    for kind, ntype, label in GRAPH_NODE_KINDS:
+        for key, fraud_count, _, related, cluster_id in changes["assets"][kind]:
+            add_node(key, f"{label}: {key}", ntype, fraud_count, cluster_id)
+
+            for other, _, _ in GRAPH_NODE_KINDS:
+                if other == kind:
+                    continue
+                bit = KIND_BITS[other]
+                forward = ASSET_KINDS.index(kind) < ASSET_KINDS.index(other)
+                for other_key, bits in related.items():
+                    if not bits & bit or not view.contains(other, other_key):
+                        continue
+                    source, target = (key, other_key) if forward else (other_key, key)
+                    link_key = (source, target)
+                    if link_key not in link_set:
+                        links.append({
+                            "source": source,
+                            "target": target,
+                            "type": "asset-asset",
+                            "strength": 1
+                        })
+                        link_set.add(link_key)
+
+    # 2) إضافة Sequences كعقد منفصلة (اختياري - يمكن إخفاؤها)
     # نضيف sequence summary كعقدة واحدة لكل asset
-    for ip, details in risky_assets["ip"].items():
-        if details["last_sequences"]:
+    for ip, _, sequence_total, _, cluster_id in changes["assets"]["ip"]:
+        if sequence_total:
             seq_id = f"seq_{ip}"
-            seq_label = f"Seq: {len(details['last_sequences'])} patterns"
-            add_node(seq_id, seq_label, "sequence", len(details["last_sequences"]))
+            seq_label = f"Seq: {sequence_total} patterns"
+            add_node(seq_id, seq_label, "sequence", sequence_total, cluster_id)
             links.append({
                 "source": ip,
                 "target": seq_id,
@@ -668,60 +1023,189 @@ def graph_data():
                 "strength": 0.5
             })
 
-    return jsonify({
+    payload = {
         "nodes": nodes,
         "links": links,
         "stats": {
-            "total_ips": len(risky_assets["ip"]),
-            "total_devices": len(risky_assets["device_id"]),
-            "total_docs": len(risky_assets["doc_hash"]),
-            "total_fraud_cases": sum(
-                d["fraud_count"] for d in risky_assets["ip"].values()
-            )
-        }
-    })
+            "total_ips": changes["counts"]["ip"],
+            "total_devices": changes["counts"]["device_id"],
+            "total_docs": changes["counts"]["doc_hash"],
+            "total_fraud_cases": changes["totals"]["ip"],
+        },
+        # 3) Clusters: assets مرتبطة ببعض = fraud network (union-find في الـ graph)
+        "clusters": [
+            {"id": c.id, "size": c.size, "fraud_count": c.fraud_count, "ring": c.size >= RING_MIN_ASSETS}
+            for c in changes["clusters"].values()
+        ],
+        "version": changes["version"],
+        "full": changes["full"],
+    }
+    if not changes["full"]:
+        # عقد انحذفت (TTL / LRU): الـ frontend يشيلها مع روابطها (و seq_ حق الـ IP)
+        # قبل ما يضيف nodes/links (asset انحذف ثم رجع يكون في الاثنين)
+        removed = []
+        for kind, key in changes["removed"]:
+            removed.append(key)
+            if kind == "ip":
+                removed.append(f"seq_{key}")
+        payload["removed"] = removed
+        # clusters اندمجت: العقد اللي عند الـ frontend بالـ id القديم تنتقل للجديد
+        payload["merged_clusters"] = [list(pair) for pair in changes["merged"]]
+    return payload
 
 
-@app.route("/evaluate", methods=["POST"])
-def evaluate():
-    req = request.json or {}
+@app.route("/graph-data", methods=["GET"])
+def graph_data():
+    """
+    الـ graph للـ dashboard مع version (الـ lsn لو الـ graph دائم):
+      - ETag = version: If-None-Match بنفس الـ version -> 304 بدون body
+      - ?since=<version>: العقد والروابط اللي انضافت/تغيرت بعده + removed
+        (لو الـ version أقدم من اللي نتذكره نرجع الـ graph كامل مع full=true)
+      - بدون since: الـ graph كامل، من cache لين يتغير الـ version
+    """
+    since = request.args.get("since", type=int)
+    version = fraud_graph.version
+    if request.if_none_match.contains(f"g{version}") or since == version:
+        response = app.response_class(status=304)
+        response.set_etag(f"g{version}")
+        return response
+
+    body = None
+    if since is None:
+        cached = _graph_body_cache
+        if cached["version"] == version:
+            body = cached["body"]
+    if body is None:
+        changes = fraud_graph.changes_since(since)
+        body = json.dumps(build_graph_payload(changes), ensure_ascii=False, separators=(",", ":"))
+        version = changes["version"]
+        if changes["full"]:
+            _graph_body_cache.update(version=version, body=body)
+
+    response = app.response_class(body, mimetype="application/json")
+    response.set_etag(f"g{version}")
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
-    # إقراء الحقول الأساسية من الـ frontend
-    user_id = req.get("user_id", "U1")
-    device_is_known = bool(req.get("device_is_known", True))
-    location_change_km = float(req.get("location_change_km", 0))
-    hour_of_day = int(req.get("hour_of_day", 12))
-    ops_last_24h = int(req.get("ops_last_24h", 0))
-    is_sensitive_service = bool(req.get("is_sensitive_service", False))
-    session_sequence = req.get("session_sequence", [])
 
-    # حقول الـ graph الجديدة
-    ip_address = req.get("ip_address")
-    device_id = req.get("device_id")
-    doc_hash = req.get("doc_hash")
+def _optional_float(value):
+    return None if value is None or value == "" else float(value)
+
 
-    # نبني object موحد نمرره للفانكشنات
-    features = {
-        "user_id": user_id,
-        "device_is_known": device_is_known,
-        "location_change_km": location_change_km,
-        "hour_of_day": hour_of_day,
-        "ops_last_24h": ops_last_24h,
-        "is_sensitive_service": is_sensitive_service,
-        "session_sequence": session_sequence,
+def parse_transaction(req):
+    """نقرأ حقول المعاملة من الـ request ونرجّع object موحد نمرره للفانكشنات."""
+    # إقراء الحقول الأساسية من الـ frontend
+    return {
+        "user_id": req.get("user_id", "U1"),
+        "device_is_known": bool(req.get("device_is_known", True)),
+        "location_change_km": float(req.get("location_change_km", 0)),
+        "hour_of_day": int(req.get("hour_of_day", 12)),
+        "ops_last_24h": int(req.get("ops_last_24h", 0)),
+        # موقع تقريبي اختياري (درجات) لحساب location_change_km من ملف المستخدم
+        "latitude": _optional_float(req.get("latitude")),
+        "longitude": _optional_float(req.get("longitude")),
+        "is_sensitive_service": bool(req.get("is_sensitive_service", False)),
+        "session_sequence": req.get("session_sequence", []),
+        # ملخص الجلسة - pass واحد على السيكوانس تستخدمه كل الطبقات
+        "session_summary": summarize_session(req.get("session_sequence", [])),
+        # حقول الـ graph الجديدة
+        "ip_address": req.get("ip_address"),
+        "device_id": req.get("device_id"),
+        "doc_hash": req.get("doc_hash"),
     }
 
+
+def apply_velocity(batch):
+    """
+    نسجل المعاملات (بالترتيب) في عدادات السرعة ونحط النتيجة في features كل وحدة:
+    velocity = {user_1m, user_1h, user_24h, ip_1h, device_1h} (تشمل المعاملة نفسها)،
+    و ops_last_24h = max(قيمة الـ client، عمليات المستخدم السابقة في آخر 24 ساعة).
+    """
+    if not VELOCITY_ENABLED or not batch:
+        return
+    keys = []
+    for features in batch:
+        keys += (
+            ("user", features["user_id"]),
+            ("ip", features["ip_address"]),
+            ("device_id", features["device_id"]),
+        )
+    counts = velocity.observe(keys)
+    minute, hour, day = (velocity.window_names.index(name) for name in ("1m", "1h", "24h"))
+    for i, features in enumerate(batch):
+        user, ip, device = counts[3 * i:3 * i + 3]
+        features["velocity"] = {
+            "user_1m": user[minute] if user else 0,
+            "user_1h": user[hour] if user else 0,
+            "user_24h": user[day] if user else 0,
+            "ip_1h": ip[hour] if ip else 0,
+            "device_1h": device[hour] if device else 0,
+        }
+        if user:
+            features["ops_last_24h"] = max(features["ops_last_24h"], user[day] - 1)
+
+
+def apply_profiles(batch):
+    """device_is_known و location_change_km من ملف كل مستخدم (لو نقدر نحسبها)."""
+    if not PROFILES_ENABLED:
+        return
+    for features in batch:
+        known, distance = profiles.lookup(
+            features["user_id"], features["device_id"], features["latitude"], features["longitude"]
+        )
+        if known is not None:
+            features["device_is_known"] = known
+        if distance is not None:
+            features["location_change_km"] = distance
+
+
+def learn_profiles(batch, results):
+    """بعد التقييم: الجهاز والموقع يدخلون ملف المستخدم (إلا للقرارات المحظورة)."""
+    if not PROFILES_ENABLED:
+        return
+    for features, result in zip(batch, results):
+        if result["decision"] not in PROFILE_SKIP_DECISIONS:
+            profiles.update(features["user_id"], features["device_id"], features["latitude"], features["longitude"])
+
+
+def learn_sequences(batch, results):
+    """
+    بعد التقييم: الجلسات المسموحة تدخل نموذج تنقل المستخدم. بدون ما تضيف للقاموس:
+    /evaluate بدون auth، وأسماء الـ client تملّيه (بعدها حتى سيكوانسات الاحتيال المؤكدة
+    تصير UNKNOWN). خطوة ما نعرفها = UNKNOWN في النموذج.
+    """
+    if not SEQUENCE_MODEL_ENABLED:
+        return
+    for features, result in zip(batch, results):
+        if result["decision"] in SEQUENCE_LEARN_DECISIONS:
+            sequence_models.learn(features["user_id"], features["session_summary"].codes)
+
+
+def score_transaction(features, ai_result, observe=True):
+    """
+    نجمع الطبقات الأربع لمعاملة وحدة ونرجّع نفس شكل رد /evaluate.
+    ai_result = (ai_risk, ai_reasons) محسوبة مسبقاً (فردي أو batch)،
+    فوقت طبقة ai يتسجل في ai_anomaly_scores_batch.
+    observe: نسجل وقت الطبقات والقرار والأسباب في /metrics.
+    """
+    user_id = features["user_id"]
+    summary = features["session_summary"]
+
     # ----- الطبقات الأربع -----
+    started = time.perf_counter_ns()
     behavior_risk, behavior_reasons = compute_behavior_risk(features)
-    ai_risk, ai_reasons = ai_anomaly_score(features)
-    seq_risk_val, seq_reasons = sequence_risk(user_id, session_sequence)
+    behavior_done = time.perf_counter_ns()
+    ai_risk, ai_reasons = ai_result
+    seq_risk_val, seq_reasons = sequence_risk(user_id, summary)
+    sequence_done = time.perf_counter_ns()
 
     graph_risk, graph_reason_codes, graph_reason_details = compute_graph_risk(
-        ip=ip_address,
-        device_id=device_id,
-        doc_hash=doc_hash,
-        session_sequence=session_sequence,
+        ip=features["ip_address"],
+        device_id=features["device_id"],
+        doc_hash=features["doc_hash"],
+        session_sequence=summary,
     )
+    graph_done = time.perf_counter_ns()
 
     # ----- مجموع المخاطر -----
     total_risk = behavior_risk + ai_risk + seq_risk_val + graph_risk
@@ -731,6 +1215,13 @@ def evaluate():
     # ----- أسباب المخاطرة -----
     reasons = behavior_reasons + ai_reasons + seq_reasons + graph_reason_codes
 
+    if observe and METRICS_ENABLED:
+        metrics.record_transaction(
+            (behavior_done - started, sequence_done - behavior_done, graph_done - sequence_done),
+            decision,
+            reasons,
+        )
+
     # الأسباب النصية:
     reason_details = []
 
@@ -741,7 +1232,7 @@ def evaluate():
     # Graph: نستخدم النصوص التفصيلية اللي رجعناها من compute_graph_risk
     reason_details.extend(graph_reason_details)
 
-    return jsonify({
+    return {
         "behavior_risk": behavior_risk,
         "ai_risk": ai_risk,
         "sequence_risk": seq_risk_val,
@@ -750,13 +1241,209 @@ def evaluate():
         "decision": decision,
         "reasons": reasons,
         "reason_details": reason_details,
-    })
+    }
+
+
+def shadow_compare(batch, results):
+    """
+    لو فيه نموذج shadow (model_registry.py): نسبة registry.shadow_rate من المعاملات
+    تتقيّم فيه كمان - طبقة ai بس، والباقي من نتيجة الطلب نفسه - ونسجل في /metrics
+    وقته الإضافي والقرار اللي كان بيطلع معه. رد الطلب ما يتغير.
+    """
+    shadow, rate = registry.shadow, registry.shadow_rate
+    if shadow is None or not METRICS_ENABLED:
+        return
+    sampled = [i for i in range(len(batch)) if random.random() < rate]
+    if not sampled:
+        return
+
+    started = time.perf_counter_ns()
+    shadow_ai = ai_anomaly_scores_batch([batch[i] for i in sampled], observe=False, models=shadow)
+    elapsed = time.perf_counter_ns() - started
+
+    decisions = []
+    for i, (ai_risk, _) in zip(sampled, shadow_ai):
+        result = results[i]
+        total_risk = result["behavior_risk"] + ai_risk + result["sequence_risk"] + result["graph_risk"]
+        decisions.append((result["decision"], final_decision(min(int(round(total_risk)), 100))))
+    metrics.record_shadow(shadow.version, elapsed // len(sampled), decisions)
+
+
+@app.route("/evaluate", methods=["POST"])
+def evaluate():
+    features = parse_transaction(request.json or {})
+    apply_velocity([features])
+    apply_profiles([features])
+    result = score_transaction(features, ai_anomaly_score(features))
+    learn_profiles([features], [result])
+    learn_sequences([features], [result])
+    shadow_compare([features], [result])
+    return jsonify(result)
+
+
+# أقصى عدد معاملات في طلب batch واحد
+MAX_BATCH_SIZE = 1000
+
+
+@app.route("/evaluate-batch", methods=["POST"])
+def evaluate_batch():
+    """
+    تقييم مجموعة معاملات في طلب واحد (الـ gateway يجمعها micro-batches).
+    الـ body: إما list من المعاملات أو {"transactions": [...]}.
+    النتيجة لكل معاملة = نتيجة /evaluate لو انرسلت بالترتيب وحدة وحدة: التقييم والتعلم
+    (ملف المستخدم، نموذج تنقله والنموذج العام) معاملة معاملة بالترتيب، ونماذج الـ ML
+    batch على كل المعاملات اللي features حقتها صارت معروفة (ready_after).
+    """
+    body = request.json
+    if isinstance(body, dict):
+        body = body.get("transactions")
+    if not isinstance(body, list):
+        return jsonify({"error": "expected a list of transactions"}), 400
+    if len(body) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"batch too large (max {MAX_BATCH_SIZE})"}), 413
+
+    # النتائج بنفس ترتيب الطلب: معاملة خربانة = 400 للـ batch كله مع رقمها
+    batch = []
+    for i, req in enumerate(body):
+        if not isinstance(req, dict):
+            return jsonify({"error": "expected a JSON object", "index": i}), 400
+        try:
+            batch.append(parse_transaction(req))
+        except (TypeError, ValueError) as exc:
+            return jsonify({"error": str(exc), "index": i}), 400
+    apply_velocity(batch)
+    ready, after = ready_after(batch)
+    ai_results = [None] * len(batch)
+    results = []
+    for i, features in enumerate(batch):
+        if ai_results[i] is None:
+            part = [batch[j] for j in ready]
+            apply_profiles(part)
+            for j, ai_result in zip(ready, ai_anomaly_scores_batch(part)):
+                ai_results[j] = ai_result
+            ready = []
+        result = score_transaction(features, ai_results[i])
+        learn_profiles([features], [result])
+        learn_sequences([features], [result])
+        results.append(result)
+        if i in after:
+            ready.append(after[i])
+    shadow_compare(batch, results)
+    return jsonify({"results": results})
+
+
+def ready_after(batch):
+    """
+    features المعاملة (device_is_known و location_change_km من ملف المستخدم) تنعرف
+    بعد ما نتعلم من معاملة نفس المستخدم اللي قبلها في الـ batch. نرجّع (أرقام المعاملات
+    الجاهزة من البداية، {رقم: رقم معاملة نفس المستخدم اللي بعدها}).
+    بدون ملفات المستخدمين: كلها جاهزة (ML مرة وحدة للـ batch).
+    """
+    if not PROFILES_ENABLED:
+        return list(range(len(batch))), {}
+    ready, after, last = [], {}, {}
+    for i, features in enumerate(batch):
+        previous = last.get(features["user_id"])
+        if previous is None:
+            ready.append(i)
+        else:
+            after[previous] = i
+        last[features["user_id"]] = i
+    return ready, after
+
+# ================== CONFIRMATION QUEUE ==================
+
+# التأكيدات (فردي أو bulk) تدخل طابور بـ writer واحد يطبقها على الـ graph دفعات
+# (case_queue.py)، فالـ handler ما يعدل الـ graph بنفسه وموجات التأكيد ما تزاحم /evaluate:
+#   RAQEEB_CONFIRM_BATCH       أقصى حالات في دفعة وحدة
+#   RAQEEB_CONFIRM_QUEUE_MAX   أقصى حالات تنتظر (فوقها 503)
+#   RAQEEB_CONFIRM_PAUSE_MS    راحة للـ writer بين الدفعات لو الطابور كبير (0 = بدون)
+#   RAQEEB_GC_FREEZE           0 = بدون gc.freeze() بعد الإقلاع (freeze_long_lived)
+confirm_queue = CaseQueue(
+    register_fraud_cases,
+    batch_size=int(os.environ.get("RAQEEB_CONFIRM_BATCH", "1000")),
+    max_pending=int(os.environ.get("RAQEEB_CONFIRM_QUEUE_MAX", "1000000")),
+    pause_seconds=float(os.environ.get("RAQEEB_CONFIRM_PAUSE_MS", "0")) / 1000,
+)
+atexit.register(confirm_queue.close)   # قبل graph_store.close (atexit بالعكس)
+GC_FREEZE = os.environ.get("RAQEEB_GC_FREEZE", "1") != "0"
+
+# أقصى حالات في طلب /confirm-fraud/bulk واحد، وأطول انتظار بـ ?wait=
+MAX_CONFIRM_BULK = 100_000
+MAX_CONFIRM_WAIT_SECONDS = 30.0
+MAX_REPORTED_ERRORS = 100
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines")
+
+
+def parse_case(req):
+    """طلب تأكيد -> (ip, device_id, doc_hash, session_sequence). ValueError لو ناقص."""
+    if not isinstance(req, dict):
+        raise ValueError("expected a JSON object")
+    ip = req.get("ip_address")
+    device_id = req.get("device_id")
+    doc_hash = req.get("doc_hash")
+    if not (ip or device_id or doc_hash):
+        raise ValueError("one of ip_address, device_id or doc_hash is required")
+    return ip, device_id, doc_hash, req.get("session_sequence", [])
+
+
+def _wait_seconds():
+    """?wait=<ثواني> (حد أقصى MAX_CONFIRM_WAIT_SECONDS)، 0 = ما ننتظر."""
+    try:
+        wait = float(request.args.get("wait", 0))
+    except ValueError:
+        return 0.0
+    return min(max(wait, 0.0), MAX_CONFIRM_WAIT_SECONDS)
+
+
+def _wait_for(ticket, wait):
+    """?wait= على ticket: ننتظر بس، والفشل (CasesFailed) يطلع في status."""
+    try:
+        confirm_queue.wait(ticket, wait)
+    except CasesFailed:
+        pass
+
+
+def _bulk_cases():
+    """
+    الحالات من body الطلب: JSON array أو {"cases": [...]} أو NDJSON (سطر لكل حالة).
+    نرجّع ([الحالات الصالحة بالترتيب], [أخطاء {"index", "error"}]) أو (None, رسالة الخطأ).
+    """
+    items = None if request.mimetype in NDJSON_TYPES else request.get_json(force=True, silent=True)
+    ndjson = items is None
+    if ndjson:
+        # NDJSON: كل سطر ينقرى لحاله تحت، واللي ما ينقرى يطلع في errors بدون ما يوقف الباقي
+        items = [line for line in request.get_data().splitlines() if line.strip()]
+    elif isinstance(items, dict):
+        items = items.get("cases")
+    if not isinstance(items, list) or not items:
+        return None, "expected NDJSON or a JSON array of cases"
+    if len(items) > MAX_CONFIRM_BULK:
+        return None, f"too many cases (max {MAX_CONFIRM_BULK})"
+
+    # آلاف الأسطر Python خالص: نترك الـ GIL لـ /evaluate بنفس ميزانية الـ writer
+    clock = time.perf_counter
+    budget = fraud_graph.writer_yield_seconds
+    held = clock()
+    cases, errors = [], []
+    for i, item in enumerate(items):
+        if clock() - held >= budget:
+            time.sleep(0)
+            held = clock()
+        try:
+            cases.append(parse_case(json.loads(item) if ndjson else item))
+        except ValueError as exc:
+            errors.append({"index": i, "error": str(exc)})
+    return cases, errors
+
 
 @app.route("/confirm-fraud", methods=["POST"])
 def confirm_fraud():
     """
     هذا الاندبوينت يُستخدم بعد التحقق البشري من الحالة.
     نعلم من خلاله الرسم الشبكي أن هذا الـ IP / Device / Doc مرتبط فعليًا بحالة احتيال مؤكدة.
+    الحالة تمر من طابور التأكيد وننتظر لين تنطبق (نفس الرد القديم + graph_version).
+    لو دفعتها فشلت (مثلاً الـ log ما انكتب) = 500 مع failed، مو registered.
     """
     req = request.json or {}
 
@@ -765,14 +1452,280 @@ def confirm_fraud():
     doc_hash = req.get("doc_hash")
     session_sequence = req.get("session_sequence", [])
 
-    register_fraud_case(
-        ip=ip,
-        device_id=device_id,
-        doc_hash=doc_hash,
-        session_sequence=session_sequence,
+    ticket = confirm_queue.submit([(ip, device_id, doc_hash, session_sequence)])
+    if ticket is None:
+        return jsonify({"error": "confirmation queue is full"}), 503
+    try:
+        version = confirm_queue.wait(ticket, MAX_CONFIRM_WAIT_SECONDS)
+    except CasesFailed as exc:
+        return jsonify({"error": "confirmation failed", "ticket": ticket, "failed": exc.failed}), 500
+    if version is None:
+        return jsonify({"status": "queued", "ticket": ticket}), 202
+
+    return jsonify({"status": "registered", "graph_version": version})
+
+
+@app.route("/confirm-fraud/bulk", methods=["POST"])
+def confirm_fraud_bulk():
+    """
+    تأكيد حالات كثيرة في طلب واحد (بعد كل شفت مراجعة). الحالات الصالحة تدخل الطابور
+    بترتيبها والغلط يرجع في errors. الرد فوراً (202) بـ ticket؛ مع ?wait=<ثواني>
+    ننتظر لين تنطبق (200 + graph_version، أو 500 لو حالات منها فشلت: applied / failed).
+    """
+    cases, errors = _bulk_cases()
+    if cases is None:
+        return jsonify({"error": errors}), (413 if errors.startswith("too many") else 400)
+    rejected = {"rejected": len(errors), "errors": errors[:MAX_REPORTED_ERRORS]}
+    if not cases:
+        return jsonify({"error": "no valid cases", **rejected}), 400
+
+    ticket = confirm_queue.submit(cases)
+    if ticket is None:
+        return jsonify({"error": "confirmation queue is full", "pending": len(confirm_queue)}), 503
+    wait = _wait_seconds()
+    if wait:
+        _wait_for(ticket, wait)
+
+    body = {"accepted": len(cases), **rejected}
+    body.update(confirm_queue.status(ticket, size=len(cases)))
+    if not body["done"]:
+        return jsonify(body), 202
+    return jsonify(body), (500 if body["failed"] else 200)
+
+
+@app.route("/confirm-fraud/bulk/<int:ticket>", methods=["GET"])
+def confirm_fraud_bulk_status(ticket):
+    """حالة ticket: done لما كل حالاته خلصت، كم انطبق وكم فشل، و graph_version وقتها (مع ?wait= ننتظر)."""
+    wait = _wait_seconds()
+    if wait:
+        _wait_for(ticket, wait)
+    return jsonify(confirm_queue.status(ticket))
+
+
+# ================== STARTUP / HEALTH ==================
+
+# معاملة مصطنعة للـ warm-up: تمر على كل الطبقات (بدون ما تسجل شي في الـ graph)
+WARMUP_TRANSACTION = {
+    "user_id": "warmup",
+    "device_is_known": False,
+    "location_change_km": 800,
+    "hour_of_day": 3,
+    "ops_last_24h": 12,
+    "is_sensitive_service": True,
+    "session_sequence": ["login", "renew_id", "upload_doc", "payment"],
+    "ip_address": "0.0.0.0",
+    "device_id": "warmup",
+    "doc_hash": "warmup",
+}
+
+
+def warm_up():
+    """
+    قبل ما نعلن الجاهزية: معاملة مصطنعة عبر score_transaction + batch عشوائي
+    يمر على أغلب عقد الأشجار، فصفحات الـ mmap والـ buffers وأول نداءات NumPy
+    تصير هنا مو على أول طلب حقيقي.
+    """
+    started = time.perf_counter()
+    features = parse_transaction(WARMUP_TRANSACTION)
+    score_transaction(features, ai_anomaly_scores_batch([features], observe=False)[0], observe=False)
+    predict_model_outputs(self_check_rows(), observe=False)
+    model_status["warmup_ms"] = _ms_since(started)
+
+
+def _startup():
+    load_models()
+    warm_up()
+    freeze_long_lived()   # الـ graph المحمّل والنماذج
+    model_status["startup_ms"] = _ms_since(_startup_began)
+    model_status["ready"] = True
+    if MODEL_WATCH_SECONDS > 0:
+        registry.watch(MODEL_WATCH_SECONDS)
+
+
+@app.route("/health", methods=["GET"])
+def health():
+    """
+    readiness probe: 200 بعد تحميل النماذج والـ warm-up، وقبلها 503.
+    نرجّع وقت تحميل كل نموذج ومصدره (mmap من الـ cache أو pickle).
+    """
+    body = dict(model_status)
+    body["graph_version"] = fraud_graph.version
+    active = registry.active
+    if active is not None:
+        body.update(active.info, sklearn_loaded=active.sklearn is not None)
+    return jsonify(body), (200 if model_status["ready"] else 503)
+
+
+# ================== ADMIN: MODEL REGISTRY ==================
+
+def _admin_denied():
+    """رد 401 لو RAQEEB_ADMIN_TOKEN موجود والطلب ما فيه نفس الـ Bearer token."""
+    if not ADMIN_TOKEN:
+        return None
+    supplied = request.headers.get("Authorization", "")
+    if hmac.compare_digest(supplied.encode(), f"Bearer {ADMIN_TOKEN}".encode()):
+        return None
+    return jsonify({"error": "unauthorized"}), 401
+
+
+@app.route("/admin/models", methods=["GET"])
+def admin_models():
+    """النسخة active والـ shadow (لو فيه) وحالة آخر تحميل."""
+    return _admin_denied() or jsonify(registry.describe())
+
+
+@app.route("/admin/models/reload", methods=["POST"])
+def admin_models_reload():
+    """
+    نحمّل نسخة جديدة من الـ models (أو مجلد داخله) في الخلفية.
+    الـ body (كله اختياري): {"models_dir", "shadow": true, "sample_rate", "wait": true}
+    shadow = تتقيّم على sample_rate من الطلبات بدون ما تغيّر القرار، لين /admin/models/promote.
+    """
+    denied = _admin_denied()
+    if denied:
+        return denied
+    body = request.json or {}
+
+    models_root = os.path.realpath(MODELS_DIR)
+    models_dir = os.path.realpath(body.get("models_dir") or MODELS_DIR)
+    if os.path.commonpath([models_root, models_dir]) != models_root:
+        return jsonify({"error": f"models_dir must be inside {MODELS_DIR}"}), 400
+    try:
+        sample_rate = float(body.get("sample_rate", SHADOW_SAMPLE_RATE))
+    except (TypeError, ValueError):
+        sample_rate = -1
+    if not 0 <= sample_rate <= 1:
+        return jsonify({"error": "sample_rate must be between 0 and 1"}), 400
+
+    wait = bool(body.get("wait", False))
+    if not registry.reload(models_dir, shadow=bool(body.get("shadow", False)), sample_rate=sample_rate, wait=wait):
+        return jsonify({"error": "a model reload is already running"}), 409
+    if wait and registry.last_error:
+        return jsonify(dict(registry.describe(), status="failed")), 422
+    return jsonify(dict(registry.describe(), status="loaded" if wait else "loading")), (200 if wait else 202)
+
+
+@app.route("/admin/models/promote", methods=["POST"])
+def admin_models_promote():
+    """نموذج الـ shadow يصير active."""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    if not registry.promote():
+        return jsonify({"error": "no shadow models loaded"}), 409
+    return jsonify(registry.describe())
+
+
+@app.route("/admin/models/shadow", methods=["DELETE"])
+def admin_models_shadow():
+    """نوقف تقييم الـ shadow ونرميه."""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    registry.drop_shadow()
+    return jsonify(registry.describe())
+
+
+# ================== METRICS ==================
+
+# حدود توزيع عدد السيكوانسات المخزنة لكل asset (last_sequences)
+SEQUENCE_COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+_sequence_counts_cache = {"version": None, "at": 0.0, "lines": []}
+
+
+def sequence_count_lines():
+    """
+    histogram عدد السيكوانسات لكل asset حسب النوع. يمر على كل الـ graph، فنعيد
+    حسابه بس لو تغير الـ version ومرت METRICS_GRAPH_SCAN_SECONDS من آخر مرة.
+    """
+    cached = _sequence_counts_cache
+    version = fraud_graph.version
+    if cached["version"] == version or time.monotonic() - cached["at"] < METRICS_GRAPH_SCAN_SECONDS:
+        if cached["version"] is not None:
+            return cached["lines"]
+
+    histograms = {}
+    for kind, counts in fraud_graph.sequence_length_counts().items():
+        buckets = [0] * (len(SEQUENCE_COUNT_BUCKETS) + 1)
+        for length, n_assets in counts.items():
+            buckets[bisect_left(SEQUENCE_COUNT_BUCKETS, length)] += n_assets
+        histograms[kind] = (SEQUENCE_COUNT_BUCKETS, buckets, sum(k * n for k, n in counts.items()))
+    lines = render_histogram(
+        "raqeeb_graph_asset_sequences", "Stored fraud sequences per graph asset", "kind", histograms, scale=1
+    )
+    cached.update(version=version, at=time.monotonic(), lines=lines)
+    return lines
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """
+    المقاييس بصيغة Prometheus text: وقت كل طبقة وكل نموذج (histograms)، عدد
+    القرارات وأكواد الأسباب، وحجم الـ graph وتوزيع عدد السيكوانسات لكل asset.
+    """
+    lines = metrics.render()
+    lines += render_samples(
+        "raqeeb_graph_assets", "gauge", "Assets in the fraud graph",
+        [({"kind": kind}, len(records)) for kind, records in fraud_graph.assets.items()],
     )
+    lines += render_samples(
+        "raqeeb_graph_fraud_cases", "gauge", "Sum of fraud_count per asset kind",
+        [({"kind": kind}, total) for kind, total in fraud_graph.fraud_totals.items()],
+    )
+    lines += render_samples(
+        "raqeeb_graph_sequences", "gauge", "Distinct fraud sequences in the shared pool",
+        [({}, len(fraud_graph.sequence_pool))],
+    )
+    lines += render_samples(
+        "raqeeb_graph_approx_bytes", "gauge", "Estimated fraud graph memory", [({}, fraud_graph.approx_bytes)]
+    )
+    lines += render_samples("raqeeb_graph_version", "gauge", "Fraud graph version", [({}, fraud_graph.version)])
+    lines += render_samples("raqeeb_confirm_queue_pending", "gauge", "Fraud confirmations waiting", [({}, len(confirm_queue))])
+    lines += render_samples(
+        "raqeeb_confirm_cases_total", "counter", "Fraud confirmations through the queue",
+        [({"status": "accepted"}, confirm_queue.accepted),
+         ({"status": "applied"}, confirm_queue.applied - confirm_queue.failed),
+         ({"status": "failed"}, confirm_queue.failed)],
+    )
+    lines += render_samples(
+        "raqeeb_confirm_batches_total", "counter", "Batches applied by the confirmation writer", [({}, confirm_queue.batches)]
+    )
+    lines += render_samples(
+        "raqeeb_graph_evicted_assets_total", "counter", "Assets evicted by TTL or memory limits",
+        [({}, fraud_graph.evicted_assets)],
+    )
+    lines += sequence_count_lines()
+    lines += render_samples("raqeeb_profile_users", "gauge", "Users with a device / location profile", [({}, len(profiles))])
+    lines += render_samples(
+        "raqeeb_profile_heavy_users", "gauge", "Users whose devices moved to a Bloom filter", [({}, len(profiles.blooms))]
+    )
+    lines += render_samples(
+        "raqeeb_profile_evicted_users_total", "counter", "Profiles dropped when inactive or over max users",
+        [({}, profiles.evicted_users)],
+    )
+    lines += render_samples("raqeeb_sequence_users", "gauge", "Users with a navigation model", [({}, len(sequence_models))])
+    lines += render_samples(
+        "raqeeb_sequence_actions", "gauge", "Interned session actions", [({}, len(vocabulary))]
+    )
+    lines += render_samples(
+        "raqeeb_sequence_evicted_users_total", "counter", "Navigation models dropped when inactive or over max users",
+        [({}, sequence_models.evicted_users)],
+    )
+    lines += render_samples("raqeeb_velocity_keys", "gauge", "Keys with velocity counters", [({}, len(velocity))])
+    lines += render_samples(
+        "raqeeb_velocity_evicted_keys_total", "counter", "Velocity keys dropped when idle or over the memory limits",
+        [({}, velocity.evicted_keys)],
+    )
+    lines += render_samples("raqeeb_ready", "gauge", "Models loaded and warmed up", [({}, int(model_status["ready"]))])
+    return app.response_class("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+
+if LAZY_STARTUP:
+    threading.Thread(target=_startup, name="raqeeb-startup", daemon=True).start()
+else:
+    _startup()
 
-    return jsonify({"status": "registered"})
 
 if __name__ == "__main__":
     app.run(debug=True)
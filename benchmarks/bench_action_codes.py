@@ -0,0 +1,194 @@
+# benchmarks/bench_action_codes.py
+#
+# قاموس الـ actions (actions.py): الجلسات والسيكوانسات المخزنة أرقام uint16 بدل strings:
+#   memory  = bytes لكل سيكوانس مخزن (tracemalloc): tuple من strings (الشكل القديم - كل
+#             string جاي من JSON الطلب) مقابل bytes بالقاموس، ومقابل تقدير SequencePool
+#   layers  = p50 (أقل قيمة من جولات قصيرة) لـ summarize_session و sequence_risk و
+#             compute_graph_risk على graph فيه GRAPH_CASES حالة، و "session path" = كل اللي
+#             يصير للجلسة في /evaluate (ملخص + الطبقتين + learn_sequences)، مع نماذج التنقل
+#             وبدونها (rules)
+# مع --before (checkout ثاني للمشروع، مثلاً git worktree على commit قبل القاموس) نشغل
+# layers على النسختين بالتناوب كـ subprocess ونطبع الفرق - الـ API نفسه في النسختين.
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/bench_action_codes.py
+#   git worktree add /tmp/raqeeb-before <commit> && python benchmarks/bench_action_codes.py --before /tmp/raqeeb-before
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SEED = 23
+STORED_SEQUENCES = 100_000
+GRAPH_CASES = 20_000
+QUERIES = 5_000
+ROUNDS = 40
+ROUND_SIZE = 500
+ALTERNATIONS = 2
+USERS = 1_000
+
+ACTIONS = ["login", "home", "services", "view_personal_data", "search", "inquiry", "view", "upload_doc",
+           "payment", "logout", "verify_otp", "change_phone", "change_password", "add_beneficiary",
+           "transfer_funds", "update_profile", "view_statement", "open_ticket", "download_doc", "settings"]
+
+
+def random_sequence(rng):
+    return [rng.choice(ACTIONS) for _ in range(rng.randint(3, 10))]
+
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used, kept
+
+
+def check_memory(rng):
+    sys.path.insert(0, ROOT)
+    from actions import vocabulary
+    from sequence_index import SequencePool
+
+    sequences = [random_sequence(rng) for _ in range(STORED_SEQUENCES)]
+    # كل طلب يجي بـ strings جديدة من json.loads، والـ pool القديم يحفظ الـ tuple زي ما هو
+    payloads = [json.dumps(seq) for seq in sequences]
+    vocabulary.encode(ACTIONS, intern=True)
+
+    def strings():
+        pool, ids = [], {}
+        for payload in payloads:
+            key = tuple(json.loads(payload))
+            if key not in ids:
+                ids[key] = len(pool)
+                pool.append(key)
+        return pool, ids
+
+    def codes():
+        pool, ids = [], {}
+        for payload in payloads:
+            key = vocabulary.encode(json.loads(payload), intern=True).tobytes()
+            if key not in ids:
+                ids[key] = len(pool)
+                pool.append(key)
+        return pool, ids
+
+    old, (pool, _) = measure(strings)
+    distinct = len(pool)
+    new, _ = measure(codes)
+    sequence_pool = SequencePool()
+    for seq in sequences:
+        sequence_pool.acquire(vocabulary.encode(seq, intern=True).tobytes())
+    counts_row = sequence_pool.counts.shape[1] * sequence_pool.counts.itemsize
+    estimated = sequence_pool.approx_bytes() / len(sequence_pool) - counts_row
+    tokens = sum(len(seq) for seq in pool) / distinct
+    print(f"  {distinct} distinct sequences, {tokens:.1f} actions each: tuple of str {old / distinct:.0f} bytes, "
+          f"uint16 bytes {new / distinct:.0f} bytes per sequence (x{old / new:.1f} smaller); "
+          f"SequencePool estimate {estimated:.0f} (without the counts matrix)")
+    return new < old
+
+
+def layers(root):
+    """يشتغل داخل subprocess: root = جذر النسخة اللي نقيسها."""
+    sys.path.insert(0, root)
+    os.chdir(root)
+    os.environ["RAQEEB_GRAPH_DIR"] = ""
+    os.environ["RAQEEB_GRAPH_MEMORY_MB"] = "0"
+    import app as raqeeb
+
+    rng = random.Random(SEED)
+    for i in range(GRAPH_CASES):
+        raqeeb.register_fraud_case(ip=f"10.0.{i % 200}.{i % 7}", device_id=f"DEV-{i % 3000}",
+                                   doc_hash=f"DOC-{i % 5000}", session_sequence=random_sequence(rng))
+    # نص المعاملات assets حقها في الـ graph، والجلسات فيها action جديد أحياناً (UNKNOWN)
+    queries = []
+    for q in range(QUERIES):
+        seq = random_sequence(rng)
+        if rng.random() < 0.05:
+            seq.append(f"new_action_{rng.randrange(100)}")
+        queries.append((f"U{q % USERS}", seq, f"10.0.{rng.randrange(400)}.{rng.randrange(7)}",
+                        f"DEV-{rng.randrange(6000)}", f"DOC-{rng.randrange(10000)}"))
+    allowed = [{"decision": "ALLOW"}]
+    for user, seq, *_ in queries:
+        raqeeb.learn_sequences([{"user_id": user, "session_summary": raqeeb.summarize_session(seq)}], allowed)
+
+    def best(call):
+        fastest = float("inf")
+        for _ in range(ROUNDS):
+            for start in range(0, QUERIES, ROUND_SIZE):
+                part = queries[start:start + ROUND_SIZE]
+                started = time.perf_counter()
+                for query in part:
+                    call(*query)
+                fastest = min(fastest, (time.perf_counter() - started) / len(part) * 1e6)
+        return fastest
+
+    def session_path(user, seq, ip, device, doc):
+        """اللي يصير للجلسة في /evaluate: ملخص مرة وحدة، الطبقتين، والتعلم بعد القرار."""
+        summary = raqeeb.summarize_session(seq)
+        raqeeb.sequence_risk(user, summary)
+        raqeeb.compute_graph_risk(ip=ip, device_id=device, doc_hash=doc, session_sequence=summary)
+        raqeeb.learn_sequences([{"user_id": user, "session_summary": summary}], allowed)
+
+    results = {
+        "summarize_session": best(lambda user, seq, *_: raqeeb.summarize_session(seq)),
+        "sequence_risk": best(lambda user, seq, *_: raqeeb.sequence_risk(user, seq)),
+        "compute_graph_risk": best(lambda user, seq, ip, device, doc: raqeeb.compute_graph_risk(
+            ip=ip, device_id=device, doc_hash=doc, session_sequence=seq)),
+        "session path": best(session_path),
+    }
+    raqeeb.SEQUENCE_MODEL_ENABLED = False
+    results["sequence_risk (rules)"] = best(lambda user, seq, *_: raqeeb.sequence_risk(user, seq))
+    results["session path (rules)"] = best(session_path)
+    return results
+
+
+def run_layers(root):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--layers", root],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def check_layers(before):
+    roots = [("after", ROOT)] + ([("before", os.path.abspath(before))] if before else [])
+    results = {name: {} for name, _ in roots}
+    for _ in range(ALTERNATIONS if before else 1):
+        for name, root in roots:
+            for layer, value in run_layers(root).items():
+                results[name][layer] = min(results[name].get(layer, value), value)
+    for layer, after in results["after"].items():
+        line = f"  {layer:<22} {after:6.1f} µs"
+        if before:
+            old = results["before"][layer]
+            line += f"   before {old:6.1f} µs  ({(after - old) / old * 100:+.0f}%)"
+        print(line)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Interned action codes: memory and layer latency")
+    parser.add_argument("--before", help="checkout of the project before the vocabulary, for the layers A/B")
+    parser.add_argument("--layers", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.layers:
+        print(json.dumps(layers(args.layers)))
+        return
+
+    print("memory:")
+    ok = check_memory(random.Random(SEED))
+    print(f"layers (best of {ROUNDS} rounds, graph with {GRAPH_CASES} cases):")
+    ok &= check_layers(args.before)
+    print("action codes:", "OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
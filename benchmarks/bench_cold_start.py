@@ -0,0 +1,72 @@
+# benchmarks/bench_cold_start.py
+#
+# وقت الإقلاع البارد (process جديد لكل تشغيل) لين أول /evaluate:
+#   pickle        = RAQEEB_MODEL_BUNDLE="" : joblib.load + sklearn + بناء الجداول كل مرة (الوضع القديم)
+#   bundle        = الجداول المضغوطة من models/raqeeb_models.bundle (mmap) بدون sklearn
+#   bundle + lazy = نفس bundle والتحميل + الـ warm-up في thread خلفي (RAQEEB_LAZY_STARTUP=1)
+# import = وقت "import app"، ready = لين /health يرجع 200، first = أول /evaluate بعدها.
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/bench_cold_start.py [runs]
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+while client.get("/health").status_code != 200:
+    time.sleep(0.001)
+ready = time.perf_counter()
+client.post("/evaluate", json=app.WARMUP_TRANSACTION)
+first = time.perf_counter()
+print(json.dumps({
+    "import": imported - started,
+    "ready": ready - started,
+    "first": first - ready,
+    "sklearn": "sklearn" in sys.modules,
+}))
+"""
+
+SCENARIOS = [
+    ("pickle", {"RAQEEB_MODEL_BUNDLE": ""}),
+    ("bundle", {}),
+    ("bundle + lazy", {"RAQEEB_LAZY_STARTUP": "1"}),
+]
+
+
+def run_child(env):
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        cwd=ROOT,
+        env={**os.environ, "RAQEEB_GRAPH_DIR": "", **env},
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    run_child({})   # نتأكد إن الـ bundle مبني قبل القياس
+    print(f"{'mode':<14} {'import':>10} {'ready':>10} {'first':>10}  sklearn imported  (median of {runs})")
+    for label, env in SCENARIOS:
+        results = [run_child(env) for _ in range(runs)]
+        median = {key: statistics.median(r[key] for r in results) * 1000 for key in ("import", "ready", "first")}
+        print(
+            f"{label:<14} {median['import']:>7.0f} ms {median['ready']:>7.0f} ms {median['first']:>7.1f} ms"
+            f"  {results[0]['sklearn']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# benchmarks/bench_confirm_bulk.py
+#
+# تأكيد حالات الاحتيال دفعات (/confirm-fraud/bulk + طابور الـ writer الواحد في case_queue.py):
+#   idle    = p50/p99 لـ /evaluate لحاله (thread واحد متواصل)
+#   ingest  = CASES حالة عبر /confirm-fraud/bulk (NDJSON، BULK_SIZE لكل طلب) و /evaluate شغال
+#             بنفس الوقت من thread ثاني: سرعة التأكيد (حالات/ثانية) و p50/p99 لـ /evaluate خلالها
+#   single  = SINGLE_CASES حالة عبر /confirm-fraud (طلب لكل حالة) للمقارنة
+# الـ graph بـ GraphStore في مجلد مؤقت (الـ log والـ snapshots جزء من التكلفة)، و RAQEEB_GRAPH_MEMORY_MB=0
+# فكل الحالات تبقى: بعد النهاية لازم version الـ graph = عدد الحالات ومجموع fraud_count صحيح.
+# الهدف: p99 لـ /evaluate خلال الـ ingest ما يزيد عن MAX_P99_RATIO × p99 بدونه (exit code 1 لو أكثر).
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/bench_confirm_bulk.py [--cases 1000000]
+
+import argparse
+import json
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from bench_suite import SEED, raqeeb, synthetic_session, synthetic_transactions
+
+from graph_store import GraphStore
+
+MAX_P99_RATIO = 3.0
+BULK_SIZE = 10_000
+SINGLE_CASES = 20_000
+IDLE_REQUESTS = 5_000
+ASSET_POOLS = {"ip": 300_000, "device_id": 200_000, "doc_hash": 400_000}
+
+
+def percentile(values, q):
+    """ms"""
+    return sorted(values)[min(len(values) - 1, int(len(values) * q))] / 1e6
+
+
+def random_case(rng):
+    return {
+        "ip_address": f"10.{rng.randrange(ASSET_POOLS['ip']) // 65536}.{rng.randrange(65536)}",
+        "device_id": f"DEV-{rng.randrange(ASSET_POOLS['device_id'])}",
+        "doc_hash": f"DOC-{rng.randrange(ASSET_POOLS['doc_hash'])}",
+        "session_sequence": synthetic_session(rng, rng.randint(3, 9), rng.randint(0, 3), False),
+    }
+
+
+class EvaluateLoad(threading.Thread):
+    """/evaluate متواصل (طلب ورا طلب) لين stop، ويسجل وقت كل طلب."""
+
+    def __init__(self, client, transactions):
+        super().__init__(daemon=True)
+        self.client = client
+        self.transactions = transactions
+        self.timings = []
+        self.errors = 0
+        self._done = threading.Event()
+
+    def run(self):
+        clock = time.perf_counter_ns
+        i = 0
+        while not self._done.is_set():
+            t0 = clock()
+            response = self.client.post("/evaluate", json=self.transactions[i % len(self.transactions)])
+            self.timings.append(clock() - t0)
+            self.errors += response.status_code != 200
+            i += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+def check_idle(client, transactions):
+    load = EvaluateLoad(client, transactions)
+    load.start()
+    while len(load.timings) < IDLE_REQUESTS:
+        time.sleep(0.05)
+    load.stop()
+    p99 = percentile(load.timings, 0.99)
+    print(f"  /evaluate alone: {len(load.timings)} requests  p50 {percentile(load.timings, 0.5):.2f} ms  p99 {p99:.2f} ms")
+    return p99
+
+
+def check_ingest(client, transactions, n_cases, rng):
+    # الـ NDJSON جاهز قبل القياس (نظام إدارة الحالات process ثاني، مو على نفس الـ GIL)
+    bodies = [
+        "\n".join(json.dumps(random_case(rng)) for _ in range(min(BULK_SIZE, n_cases - first))).encode()
+        for first in range(0, n_cases, BULK_SIZE)
+    ]
+    load = EvaluateLoad(client, transactions)
+    load.start()
+    started = time.perf_counter()
+    full = 0
+    ticket = None
+    for body in bodies:
+        response = client.post("/confirm-fraud/bulk", data=body, content_type="application/x-ndjson")
+        while response.status_code == 503:   # الطابور ممتلي: نرجع بعد شوي
+            full += 1
+            time.sleep(0.05)
+            response = client.post("/confirm-fraud/bulk", data=body, content_type="application/x-ndjson")
+        ticket = response.get_json()["ticket"]
+    queued = time.perf_counter() - started
+    status = client.get(f"/confirm-fraud/bulk/{ticket}?wait=30").get_json()
+    while not status["done"]:
+        status = client.get(f"/confirm-fraud/bulk/{ticket}?wait=30").get_json()
+    elapsed = time.perf_counter() - started
+    load.stop()
+
+    queue = raqeeb.confirm_queue
+    p99 = percentile(load.timings, 0.99)
+    print(f"  {n_cases} cases in {len(bodies)} bulk requests: queued in {queued:.1f}s, applied in "
+          f"{elapsed:.1f}s ({n_cases / elapsed:,.0f} cases/s, {queue.batches} writer batches, "
+          f"{full} retries on a full queue)")
+    print(f"  /evaluate meanwhile: {len(load.timings)} requests  p50 {percentile(load.timings, 0.5):.2f} ms  "
+          f"p99 {p99:.2f} ms  max {max(load.timings) / 1e6:.1f} ms  errors {load.errors}")
+    return p99, status, load.errors
+
+
+def check_single(client, rng):
+    started = time.perf_counter()
+    for _ in range(SINGLE_CASES):
+        client.post("/confirm-fraud", json=random_case(rng))
+    elapsed = time.perf_counter() - started
+    print(f"  {SINGLE_CASES} cases one request each: {SINGLE_CASES / elapsed:,.0f} cases/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk fraud confirmation while /evaluate keeps serving")
+    parser.add_argument("--cases", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    rng = random.Random(SEED)
+    workdir = tempfile.mkdtemp(prefix="raqeeb-confirm-")
+    store = raqeeb.graph_store = GraphStore(raqeeb.fraud_graph, workdir)
+    store.open()
+    try:
+        client = raqeeb.app.test_client()
+        # نص معاملات /evaluate assets حقها من الحالات اللي بتتأكد
+        assets = (
+            [f"10.{i // 65536}.{i % 65536}" for i in range(0, ASSET_POOLS["ip"], 7)],
+            [f"DEV-{i}" for i in range(0, ASSET_POOLS["device_id"], 7)],
+            [f"DOC-{i}" for i in range(0, ASSET_POOLS["doc_hash"], 7)],
+        )
+        transactions = synthetic_transactions(2_000, rng, assets)
+        print("idle:")
+        idle_p99 = check_idle(client, transactions)
+        print("ingest:")
+        p99, status, errors = check_ingest(client, transactions, args.cases, rng)
+
+        totals = raqeeb.fraud_graph.fraud_totals
+        ok = status["done"] and errors == 0 and store.version == args.cases
+        ok &= all(total == args.cases for total in totals.values())
+        print(f"  graph version {store.version}, fraud_count totals {dict(totals)}, "
+              f"{len(raqeeb.fraud_graph)} assets: {'OK' if ok else 'WRONG'}")
+        print("single:")
+        check_single(client, rng)
+    finally:
+        store.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    limit = idle_p99 * MAX_P99_RATIO
+    ok &= p99 <= limit
+    print(f"confirm bulk: {'OK' if ok else 'FAILED'} (/evaluate p99 {p99:.2f} ms vs limit {limit:.2f} ms = "
+          f"x{MAX_P99_RATIO:g} idle)")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# benchmarks/bench_graph_data.py
+#
+# تكلفة تحديث الـ dashboard (/graph-data) لما الـ graph كبير وتغير شي بسيط:
+#   full      = بناء الرد كامل من الصفر (اللي كان يصير مع كل GET)
+#   cached    = GET بدون since والـ version ما تغير (body جاهز من الـ cache)
+#   304       = If-None-Match بنفس الـ ETag (ما تغير شي)
+#   delta     = ?since=<version> بعد حالة احتيال وحدة جديدة
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/bench_graph_data.py [cases]
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["RAQEEB_GRAPH_DIR"] = ""   # بالذاكرة بس
+
+import app as raqeeb  # noqa: E402
+
+ACTIONS = ["login", "home", "renew_id", "upload_doc", "payment", "verify_otp", "logout"]
+REPEATS = 20
+
+
+def random_case(rng, pool):
+    return dict(
+        ip=f"10.{rng.randrange(pool)}",
+        device_id=f"DEV-{rng.randrange(pool)}",
+        doc_hash=f"DOC-{rng.randrange(pool)}",
+        sequence=[rng.choice(ACTIONS) for _ in range(rng.randrange(1, 7))],
+    )
+
+
+def timed(client, url, headers=None, before=None):
+    """(متوسط ms للطلب، حجم الـ body، status) - before() يتنفذ قبل كل طلب بدون توقيت."""
+    total = 0.0
+    for _ in range(REPEATS):
+        if before:
+            before()
+        started = time.perf_counter()
+        response = client.get(url() if callable(url) else url, headers=headers)
+        total += time.perf_counter() - started
+    return total / REPEATS * 1000, len(response.data), response.status_code
+
+
+def main():
+    n_cases = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    rng = random.Random(3)
+    graph = raqeeb.fraud_graph
+    pool = n_cases // 2
+    for _ in range(n_cases):
+        graph.register_case(**random_case(rng, pool))
+    client = raqeeb.app.test_client()
+    print(f"graph: {len(graph)} assets from {n_cases} cases")
+
+    def new_case():
+        graph.register_case(**random_case(rng, pool))
+
+    rows = [
+        ("full (rebuild)", timed(client, "/graph-data", before=new_case)),
+        ("cached", timed(client, "/graph-data")),
+    ]
+    etag = client.get("/graph-data").headers["ETag"]
+    rows.append(("304 (If-None-Match)", timed(client, "/graph-data", headers={"If-None-Match": etag})))
+
+    # delta: الـ dashboard عنده version وتنضاف حالة وحدة قبل كل تحديث
+    state = {"version": graph.version}
+
+    def new_case_since():
+        state["version"] = graph.version
+        new_case()
+
+    rows.append(("delta (1 new case)", timed(
+        client, lambda: f"/graph-data?since={state['version']}", before=new_case_since
+    )))
+
+    for label, (ms, size, status) in rows:
+        print(f"{label:<22} {ms:>9.2f} ms  {size / 1024:>9.1f} KB  ({status})")
+
+
+if __name__ == "__main__":
+    main()
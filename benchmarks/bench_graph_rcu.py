@@ -0,0 +1,89 @@
+# benchmarks/bench_graph_rcu.py
+#
+# الجزء الخاص بالـ graph من /evaluate (compute_graph_risk) من أكثر من thread (Flask threaded)
+# وتأكيدات الاحتيال تنكتب بنفس الوقت (writer واحد، دفعات مثل case_queue.py):
+#   no writes    = القراء لحالهم (المرجع)
+#   rcu          = القراءة من fraud_graph.view بدون lock (الطريقة الحالية)
+#   global lock  = كل قراءة تحت نفس الـ lock حق الـ writer (الحل البديل: lock واحد كبير)
+# لكل وضع وعدد قراء: طلبات/ثانية، p50 / p99 (µs)، وكم حالة كتبها الـ writer بالثانية.
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/bench_graph_rcu.py [assets] [seconds]
+
+import random
+import sys
+import threading
+import time
+
+from bench_suite import SEED, build_graph, raqeeb, synthetic_session, synthetic_transactions
+
+READER_COUNTS = (1, 4)
+WRITE_BATCH = 100
+
+
+def run(mode, n_readers, transactions, keys, seconds):
+    graph = raqeeb.fraud_graph
+    lock = graph._lock if mode == "global lock" else None
+    stop = threading.Event()
+    timings = [[] for _ in range(n_readers)]
+    written = [0]
+
+    def reader(r):
+        clock = time.perf_counter_ns
+        out = timings[r]
+        compute = raqeeb.compute_graph_risk
+        i = r
+        while not stop.is_set():
+            tx = transactions[i % len(transactions)]
+            t0 = clock()
+            if lock is None:
+                compute(tx["ip_address"], tx["device_id"], tx["doc_hash"], tx["session_sequence"])
+            else:
+                with lock:
+                    compute(tx["ip_address"], tx["device_id"], tx["doc_hash"], tx["session_sequence"])
+            out.append(clock() - t0)
+            i += n_readers
+
+    def writer():
+        rng = random.Random(SEED + 1)
+        ips, devices, docs = keys
+        while not stop.is_set():
+            graph.register_cases([
+                (rng.choice(ips), rng.choice(devices), rng.choice(docs),
+                 synthetic_session(rng, rng.randrange(2, 9), rng.randrange(3), False))
+                for _ in range(WRITE_BATCH)
+            ])
+            written[0] += WRITE_BATCH
+
+    threads = [threading.Thread(target=reader, args=(r,)) for r in range(n_readers)]
+    if mode != "no writes":
+        threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    values = sorted(t for out in timings for t in out)
+    p50 = values[len(values) // 2] / 1e3
+    p99 = values[min(len(values) - 1, int(len(values) * 0.99))] / 1e3
+    print(f"{mode:<12} readers={n_readers}  {len(values) / seconds:>8,.0f} req/s  p50 {p50:>7.1f} µs  "
+          f"p99 {p99:>8.1f} µs  writer {written[0] / seconds:>7,.0f} cases/s")
+
+
+def main():
+    n_assets = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    rng = random.Random(SEED)
+    graph, keys, cases, _ = build_graph(n_assets, rng)
+    transactions = synthetic_transactions(2_000, rng, keys)
+    print(f"graph: {len(graph)} assets from {cases} cases, {seconds:g}s per run")
+
+    for n_readers in READER_COUNTS:
+        for mode in ("no writes", "rcu", "global lock"):
+            run(mode, n_readers, transactions, keys, seconds)
+
+
+if __name__ == "__main__":
+    main()
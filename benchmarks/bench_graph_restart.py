@@ -0,0 +1,123 @@
+# benchmarks/bench_graph_restart.py
+#
+# وقت إعادة تشغيل الـ Fraud Graph الدائم (graph_store.py) لـ graph فيه ~مليون asset:
+#   write     = تسجيل الحالات عبر GraphStore (log + fsync مجمّع)
+#   replay    = إقلاع من الـ log بس (المسار لو ما عندنا snapshot)
+#   snapshot  = كتابة snapshot للـ graph كامل
+#   restart   = إقلاع من الـ snapshot (mmap) + ذيل الـ log
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/bench_graph_restart.py            # ~1M asset
+#   python benchmarks/bench_graph_restart.py 100000     # عدد assets تقريبي أصغر
+
+import gc
+import itertools
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fraud_graph import FraudGraph  # noqa: E402
+from graph_store import GraphStore  # noqa: E402
+
+BOT_TEMPLATES = [
+    ["login", "renew_id", "upload_doc", "payment", "logout"],
+    ["login", "verify_otp", "verify_otp", "verify_otp", "issue_passport", "payment"],
+    ["login", "vehicle_registration", "payment", "payment", "logout"],
+    ["login", "register_property", "upload_doc", "renew_passport", "payment"],
+]
+ACTIONS = sorted({action for template in BOT_TEMPLATES for action in template} | {"home", "search"})
+TAIL_CASES = 10_000   # حالات بعد الـ snapshot (ذيل الـ log وقت الإقلاع)
+
+
+def bot_session(rng):
+    seq = list(rng.choice(BOT_TEMPLATES))
+    for _ in range(rng.randint(0, 2)):
+        seq.insert(rng.randrange(len(seq) + 1), rng.choice(ACTIONS))
+    return seq
+
+
+def make_cases(target_assets, seed=7):
+    """
+    حالات عشوائية: كل نوع asset من pool بحجم ثابت، وعدد الحالات محسوب عشان
+    عدد الـ assets المميزة ~ target_assets (pool * (1 - e^-cases/pool) لكل نوع).
+    """
+    rng = random.Random(seed)
+    pool = int(target_assets / 3 / (1 - math.exp(-1.5)))
+    n_cases = int(pool * 1.5)
+    for _ in range(n_cases):
+        yield (
+            f"10.{rng.randrange(pool)}",
+            f"DEV-{rng.randrange(pool)}",
+            f"DOC-{rng.randrange(pool)}",
+            bot_session(rng),
+        )
+
+
+def open_store(directory, snapshot_every):
+    graph = FraudGraph(max_sequences_per_asset=256)
+    store = GraphStore(graph, directory, snapshot_every=snapshot_every, fsync_interval=0.05)
+    started = time.perf_counter()
+    stats = store.open()
+    return store, stats, time.perf_counter() - started
+
+
+def dir_size_mb(directory):
+    return sum(
+        os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+    ) / 1e6
+
+
+def main():
+    target = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    directory = tempfile.mkdtemp(prefix="raqeeb-graph-")
+    never = 10**12
+    try:
+        store, _, _ = open_store(directory, never)
+        started = time.perf_counter()
+        n_cases = 0
+        for case in make_cases(target):
+            store.register_case(*case)
+            n_cases += 1
+        write_seconds = time.perf_counter() - started
+        n_assets = len(store.graph)
+        store.close()
+        print(f"graph: {n_assets} assets from {n_cases} cases")
+        print(f"write:    {n_cases / write_seconds:>10.0f} cases/s   log {dir_size_mb(directory):.1f} MB")
+        del store
+        gc.collect()
+
+        # إقلاع من الـ log كامل (بدون snapshot)
+        store, stats, seconds = open_store(directory, never)
+        print(f"replay:   {seconds:>10.2f} s         ({stats['replayed_cases']} cases)")
+
+        started = time.perf_counter()
+        store.snapshot()
+        snapshot_seconds = time.perf_counter() - started
+        print(f"snapshot: {snapshot_seconds:>10.2f} s         files {dir_size_mb(directory):.1f} MB")
+
+        for case in itertools.islice(make_cases(target, seed=99), TAIL_CASES):
+            store.register_case(*case)
+        store.close()
+        del store
+        gc.collect()
+
+        # إقلاع من الـ snapshot + ذيل الـ log
+        store, stats, seconds = open_store(directory, never)
+        print(
+            f"restart:  {seconds:>10.2f} s         (snapshot {stats['snapshot_load_seconds']} s"
+            f" + {stats['replayed_cases']} tail cases {stats['replay_seconds']} s,"
+            f" {stats['assets']} assets)"
+        )
+        store.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# benchmarks/bench_graph_similarity.py
+#
+# latency البحث عن أعلى تشابه لما asset واحد يجمع آلاف سيكوانسات احتيال:
+#   linear  = المسار القديم (SequenceMatcher على كل last_sequences)
+#   indexed = SequenceIndex بدون حد (dedup + upper bound + ratio للمرشحين فقط)
+# (في app.py الـ index كمان محدود بـ RAQEEB_GRAPH_MAX_SEQUENCES، هنا نقيسه بدون حد)
+#
+# workloads:
+#   bot    = سيكوانسات من قوالب هجوم قليلة مع تعديلات بسيطة (الحالة الواقعية)
+#   random = كل سيكوانس عشوائي بالكامل (أسوأ حالة للـ dedup والـ bound)
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/bench_graph_similarity.py
+
+import os
+import random
+import sys
+import time
+from difflib import SequenceMatcher
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from actions import vocabulary  # noqa: E402
+from sequence_index import SequenceIndex  # noqa: E402
+
+ACTIONS = [
+    "login", "home", "services", "view_personal_data", "search", "inquiry",
+    "renew_id", "issue_passport", "renew_passport", "vehicle_registration",
+    "issue_work_permit", "register_property", "upload_doc", "payment",
+    "verify_otp", "logout",
+]
+SIZES = [10, 100, 1_000, 10_000, 20_000]
+QUERIES = 200
+
+
+BOT_TEMPLATES = [
+    ["login", "renew_id", "upload_doc", "payment", "logout"],
+    ["login", "verify_otp", "verify_otp", "verify_otp", "issue_passport", "payment"],
+    ["login", "vehicle_registration", "payment", "payment", "logout"],
+    ["login", "register_property", "upload_doc", "renew_passport", "payment"],
+]
+
+
+def random_session(rng):
+    return [rng.choice(ACTIONS) for _ in range(rng.randint(3, 12))]
+
+
+def bot_session(rng):
+    seq = list(rng.choice(BOT_TEMPLATES))
+    for _ in range(rng.randint(0, 2)):
+        pos = rng.randrange(len(seq) + 1)
+        if rng.random() < 0.5 and pos < len(seq):
+            seq[pos] = rng.choice(ACTIONS)
+        else:
+            seq.insert(pos, rng.choice(ACTIONS))
+    return seq
+
+
+def linear_best_similarity(current, sequences):
+    best = 0.0
+    for fraud_seq in sequences:
+        best = max(best, SequenceMatcher(None, current, fraud_seq).ratio())
+    return best
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def run(name, make_session):
+    rng = random.Random(42)
+    queries = [make_session(rng) for _ in range(QUERIES)]
+
+    print(f"\n[{name}]")
+    print(f"{'sequences':>10} {'distinct':>9} {'linear us':>11} {'indexed us':>11}")
+    for size in SIZES:
+        sequences = [make_session(rng) for _ in range(size)]
+        index = SequenceIndex()
+        for seq in sequences:
+            index.add(vocabulary.encode(seq, intern=True).tobytes())
+
+        # الـ index يقارن أرقام القاموس (summarize_session يحولها مرة وحدة لكل طلب)
+        encoded = [vocabulary.encode(q) for q in queries]
+        linear_queries = queries if size <= 1_000 else queries[:10]
+        linear_us = timed(lambda q: linear_best_similarity(q, sequences), linear_queries)
+        indexed_us = timed(lambda q: index.best_similarity(q, 0.6), encoded)
+        print(f"{size:>10} {len(index):>9} {linear_us:>11.1f} {indexed_us:>11.1f}")
+
+
+def main():
+    run("bot", bot_session)
+    run("random", random_session)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# benchmarks/bench_graph_workers.py
+#
+# الـ Fraud Graph مشترك بين أكثر من worker process (graph_store.py):
+#   visibility = حالة تتأكد في worker واحد: بعد كم ms تبان في كل الـ workers الثانيين
+#   throughput = كل الـ workers يسجلون حالات بنفس الوقت (flock على نفس الـ log)
+#   consistency = بعد ما يهدون، الـ graph في كل worker لازم يكون نفسه بالضبط
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/bench_graph_workers.py [workers] [poll_ms]
+
+import hashlib
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fraud_graph import FraudGraph  # noqa: E402
+from graph_store import GraphStore  # noqa: E402
+
+ACTIONS = ["login", "home", "renew_id", "upload_doc", "payment", "verify_otp", "logout"]
+VISIBILITY_ROUNDS = 60
+BURST_CASES = 2_000
+SNAPSHOT_EVERY = 3_000   # صغير عشان الـ workers ينتقلون بين segments أثناء الـ burst
+
+
+def random_case(rng):
+    return (
+        f"10.0.{rng.randrange(500)}",
+        f"DEV-{rng.randrange(800)}",
+        f"DOC-{rng.randrange(1000)}",
+        [rng.choice(ACTIONS) for _ in range(rng.randrange(1, 8))],
+    )
+
+
+def digest(graph):
+    state = (
+        {
+            kind: [
+                (key, r.fraud_count, r.sequence_total, r.last_seen, list(r.sequence_index), r.links)
+                for key, r in records.items()
+            ]
+            for kind, records in graph.assets.items()
+        },
+        graph._records_bytes,
+    )
+    return hashlib.sha1(repr(state).encode()).hexdigest()[:16]
+
+
+def worker(directory, poll_ms):
+    """worker واحد: ينفذ أوامر من stdin ويطبع متى شاف كل lsn جديد."""
+    graph = FraudGraph(max_sequences_per_asset=64)
+    store = GraphStore(
+        graph, directory, snapshot_every=SNAPSHOT_EVERY, poll_interval=poll_ms / 1000
+    )
+    store.open()
+    out_lock = threading.Lock()
+
+    def emit(*parts):
+        with out_lock:
+            sys.stdout.write(" ".join(map(str, parts)) + "\n")
+            sys.stdout.flush()
+
+    def watch():
+        seen = store.lsn
+        while True:
+            lsn = store.lsn
+            if lsn != seen:
+                emit("seen", lsn, time.time())
+                seen = lsn
+            time.sleep(0.001)
+
+    threading.Thread(target=watch, daemon=True).start()
+    emit("ready", store.lsn)
+
+    rng = random.Random(os.getpid())
+    for line in sys.stdin:
+        cmd, *args = line.split()
+        if cmd == "write":
+            lsn = store.register_case(*random_case(rng))
+            emit("wrote", lsn, time.time())
+        elif cmd == "burst":
+            for _ in range(int(args[0])):
+                store.register_case(*random_case(rng))
+            emit("done", store.lsn)
+        elif cmd == "digest":
+            store.refresh()
+            emit("digest", store.lsn, digest(graph))
+    store.close()
+
+
+class Worker:
+    def __init__(self, directory, poll_ms):
+        self.proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--worker", directory, str(poll_ms)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )
+        self.lines = []
+        self.cond = threading.Condition()
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for line in self.proc.stdout:
+            with self.cond:
+                self.lines.append(line.split())
+                self.cond.notify_all()
+
+    def send(self, command):
+        self.proc.stdin.write(command + "\n")
+        self.proc.stdin.flush()
+
+    def wait_for(self, kind, start=0):
+        """أول سطر من نوع kind بعد start -> (index, السطر)."""
+        with self.cond:
+            while True:
+                for i in range(start, len(self.lines)):
+                    if self.lines[i][0] == kind:
+                        return i, self.lines[i]
+                self.cond.wait()
+
+    def seen(self):
+        with self.cond:
+            return [(int(line[1]), float(line[2])) for line in self.lines if line[0] == "seen"]
+
+    def stop(self):
+        self.proc.stdin.close()
+        self.proc.wait()
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    n_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    poll_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 100
+    directory = tempfile.mkdtemp(prefix="raqeeb-workers-")
+    rng = random.Random(1)
+    workers = []
+    try:
+        workers = [Worker(directory, poll_ms) for _ in range(n_workers)]
+        for w in workers:
+            w.wait_for("ready")
+
+        # visibility: حالة وحدة في worker واحد وننتظر الباقين
+        written = []
+        for r in range(VISIBILITY_ROUNDS):
+            w = workers[r % n_workers]
+            start = len(w.lines)
+            w.send("write")
+            _, line = w.wait_for("wrote", start)
+            written.append((r % n_workers, int(line[1]), float(line[2])))
+            time.sleep(rng.uniform(0, poll_ms / 1000))
+        time.sleep(2 * poll_ms / 1000 + 0.2)
+
+        delays = []
+        for source, lsn, wrote_at in written:
+            for i, w in enumerate(workers):
+                if i == source:
+                    continue
+                seen_at = min(t for seen_lsn, t in w.seen() if seen_lsn >= lsn)
+                delays.append((seen_at - wrote_at) * 1000)
+
+        # throughput: كل الـ workers يكتبون بنفس الوقت
+        starts = [len(w.lines) for w in workers]
+        started = time.perf_counter()
+        for w in workers:
+            w.send(f"burst {BURST_CASES}")
+        for w, start in zip(workers, starts):
+            w.wait_for("done", start)
+        elapsed = time.perf_counter() - started
+
+        # consistency
+        time.sleep(2 * poll_ms / 1000 + 0.2)
+        starts = [len(w.lines) for w in workers]
+        for w in workers:
+            w.send("digest")
+        digests = [w.wait_for("digest", start)[1][1:] for w, start in zip(workers, starts)]
+
+        print(f"workers: {n_workers}, poll interval {poll_ms:.0f} ms")
+        print(
+            f"visibility: p50 {percentile(delays, 0.5):.1f} ms  p99 {percentile(delays, 0.99):.1f} ms"
+            f"  max {max(delays):.1f} ms  ({len(delays)} observations)"
+        )
+        print(f"throughput: {n_workers * BURST_CASES / elapsed:.0f} cases/s across all workers")
+        same = len({tuple(d) for d in digests}) == 1
+        print(f"consistency: lsn {digests[0][0]} in every worker, graphs {'identical' if same else 'DIFFER'}")
+    finally:
+        for w in workers:
+            w.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--worker":
+        worker(sys.argv[2], float(sys.argv[3]))
+    else:
+        main()
@@ -0,0 +1,92 @@
+# benchmarks/bench_metrics_overhead.py
+#
+# كم يكلف تسجيل /metrics لكل طلب:
+#   record   = التسجيل لحاله لطلب /evaluate واحد: 10 نداءات perf_counter_ns + record_transaction
+#              + record_models + record_batch_layer (بنفس القرارات والأسباب اللي تطلع من
+#              المعاملات)، مع التجميع (flush) مقسوم على الطلبات
+#   on / off = score_transaction + ai_anomaly_score لنفس المعاملات مع RAQEEB_METRICS وبدونه
+#              (بالتناوب، median) - الفرق يغرق في ضجيج الـ CPU غالباً، فالحد على record
+# الهدف: record تحت MAX_OVERHEAD_US (exit code 1 لو أكثر).
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/bench_metrics_overhead.py
+
+import random
+import statistics
+import sys
+import time
+
+from bench_suite import SEED, raqeeb, synthetic_transactions
+
+from metrics import Metrics
+
+MAX_OVERHEAD_US = 5.0
+N_TRANSACTIONS = 2_000
+ROUNDS = 7
+
+
+def record_cost_us(samples):
+    """أفضل وقت (µs لكل طلب) للتسجيل + التجميع، على Metrics بنفس شكل app.metrics."""
+    registry = Metrics(("behavior", "sequence", "graph"), ("ai",), ("rf", "iso", "mlp"))
+    clock = time.perf_counter_ns
+    record_us = flush_us = None
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        for decision, reasons in samples:
+            # نفس نداءات الساعة في ai_anomaly_scores_batch و predict_model_outputs و score_transaction
+            ai_started = clock()
+            t0 = clock()
+            t1 = clock()
+            t2 = clock()
+            registry.record_models((t1 - t0, t2 - t1, clock() - t2), 1)
+            registry.record_batch_layer("ai", clock() - ai_started, 1)
+            t3 = clock()
+            t4 = clock()
+            t5 = clock()
+            registry.record_transaction((t4 - t3, t5 - t4, clock() - t5), decision, reasons)
+        recorded = time.perf_counter()
+        registry.flush()
+        flushed = time.perf_counter()
+        record = (recorded - started) / len(samples) * 1e6
+        flush = (flushed - recorded) / len(samples) * 1e6
+        if record_us is None or record + flush < record_us + flush_us:
+            record_us, flush_us = record, flush
+    return record_us, flush_us
+
+
+def evaluate_us(batch):
+    started = time.perf_counter()
+    for features in batch:
+        raqeeb.score_transaction(features, raqeeb.ai_anomaly_score(features))
+    return (time.perf_counter() - started) / len(batch) * 1e6
+
+
+def main():
+    rng = random.Random(SEED)
+    batch = [raqeeb.parse_transaction(tx) for tx in synthetic_transactions(N_TRANSACTIONS, rng)]
+    results = [raqeeb.score_transaction(f, raqeeb.ai_anomaly_score(f)) for f in batch]
+    samples = [(r["decision"], r["reasons"]) for r in results]
+    reasons_per_tx = statistics.mean(len(r) for _, r in samples)
+
+    record, flush = record_cost_us(samples)
+    timings = {True: [], False: []}
+    for _ in range(ROUNDS):
+        for enabled in (True, False):
+            raqeeb.METRICS_ENABLED = enabled
+            timings[enabled].append(evaluate_us(batch))
+    raqeeb.METRICS_ENABLED = True
+    on, off = statistics.median(timings[True]), statistics.median(timings[False])
+
+    print(f"{N_TRANSACTIONS} transactions, {reasons_per_tx:.1f} reasons each, best/median of {ROUNDS}")
+    print(f"in the request:     {record:6.2f} µs / request")
+    print(f"flush (scrape):     {flush:6.2f} µs / request")
+    print(f"total:              {record + flush:6.2f} µs / request (limit {MAX_OVERHEAD_US:g} µs)")
+    print(f"evaluate, metrics:  {on:6.1f} µs / request")
+    print(f"evaluate, disabled: {off:6.1f} µs / request  (diff {on - off:+.1f} µs, noise included)")
+    ok = record + flush <= MAX_OVERHEAD_US
+    print("metrics overhead:", "OK" if ok else "TOO HIGH")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# benchmarks/bench_profiles.py
+#
+# ملفات المستخدمين (profiles.py) على 10M مستخدم:
+#   restore  = snapshot مصطنع بـ 10M مستخدم (جهاز معروف + موقع لكل واحد) -> restore: الوقت والذاكرة
+#   request  = lookup قبل التقييم + update بعده لمستخدمين موجودين (جهاز معروف / جديد) وجدد: p50/p99
+#   evict    = الجدول ممتلي (max_users): المستخدم الجديد يشيل EVICT_FRACTION من الأقدم نشاطاً، كم يوقف
+#   snapshot = كتابة snapshot للـ 10M وحجمه
+#   bloom    = heavy user بـ BLOOM_DEVICES جهاز: نسبة false positive لأجهزة ما شافها
+# الهدف: lookup + update تحت MAX_REQUEST_P50_US (exit code 1 لو أكثر).
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/bench_profiles.py [--users 10000000]
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+
+from profiles import (  # noqa: E402
+    EXACT_DEVICES,
+    GEO_SCALE,
+    SNAPSHOT_FORMAT,
+    ProfileStore,
+    device_fingerprint,
+    user_key,
+)
+
+MAX_REQUEST_P50_US = 20.0
+REQUESTS = 200_000
+BLOOM_DEVICES = 30
+SEED = 99
+NOW = 1_760_000_000
+
+
+def synthetic_snapshot(path, n_users, rng):
+    """snapshot بنفس صيغة ProfileStore.snapshot: U<i> بجهاز DEV-<i> وموقع داخل السعودية."""
+    started = time.perf_counter()
+    keys = np.fromiter((user_key(f"U{i}") for i in range(n_users)), np.uint64, n_users)
+    devices = np.zeros((n_users, EXACT_DEVICES), np.uint32)
+    devices[:, 0] = np.fromiter((device_fingerprint(f"DEV-{i}") for i in range(n_users)), np.uint32, n_users)
+    hashed = time.perf_counter() - started
+    np.savez(
+        path,
+        format=np.array(SNAPSHOT_FORMAT),
+        keys=keys,
+        last_seen=rng.integers(NOW - 80 * 86400, NOW, n_users).astype(np.uint32),
+        lat=(rng.uniform(17, 31, n_users) * GEO_SCALE).astype(np.int16),
+        lon=(rng.uniform(36, 55, n_users) * GEO_SCALE).astype(np.int16),
+        n_devices=np.ones(n_users, np.uint8),
+        devices=devices,
+        bloom_keys=np.zeros(0, np.uint64),
+        bloom_bits=np.zeros((0, 64), np.uint8),
+    )
+    return hashed
+
+
+def percentile(values, q):
+    return sorted(values)[min(len(values) - 1, int(len(values) * q))] / 1000
+
+
+def check_requests(store, n_users, rng):
+    """lookup + update مثل /evaluate: 80% جهاز معروف، 15% جهاز جديد، 5% مستخدم جديد."""
+    clock = time.perf_counter_ns
+    timings = {"known device": [], "new device": [], "new user": []}
+    wrong = 0
+    for r in range(REQUESTS):
+        roll = rng.random()
+        i = int(rng.integers(n_users))
+        if roll < 0.80:
+            kind, user, device = "known device", f"U{i}", f"DEV-{i}"
+        elif roll < 0.95:
+            kind, user, device = "new device", f"U{i}", f"NEW-{r}"
+        else:
+            kind, user, device = "new user", f"NEW-U{r}", f"NEW-{r}"
+        lat, lon = 24.7 + rng.random(), 46.7 + rng.random()
+        t0 = clock()
+        known, _ = store.lookup(user, device, lat, lon)
+        store.update(user, device, lat, lon, now=NOW + r)
+        timings[kind].append(clock() - t0)
+        expected = {"known device": True, "new device": False, "new user": None}[kind]
+        wrong += known != expected
+    for kind, values in timings.items():
+        print(f"  {kind:<13} {len(values):>7} requests  p50 {percentile(values, 0.5):6.1f} µs  "
+              f"p99 {percentile(values, 0.99):7.1f} µs  max {max(values) / 1e6:7.1f} ms")
+    everything = [value for values in timings.values() for value in values]
+    p50 = percentile(everything, 0.5)
+    print(f"  all: p50 {p50:.1f} µs, wrong device answers {wrong}")
+    return p50, wrong
+
+
+def check_eviction(store):
+    """الجدول ممتلي: أول مستخدم جديد يدفع ثمن الحذف (vectorized على كل الأعمدة)."""
+    store.max_users = len(store)
+    before = len(store)
+    started = time.perf_counter()
+    store.update("EVICTION-TRIGGER", "DEV", now=NOW + REQUESTS)
+    pause = time.perf_counter() - started
+    ok = len(store) < before and store.lookup("EVICTION-TRIGGER", "DEV")[0] is True
+    print(f"  table full at {before} users: new user evicted {store.evicted_users} oldest in {pause * 1000:.0f} ms, "
+          f"{len(store)} left, {store.tombstones} tombstones")
+    return ok
+
+
+def check_bloom():
+    store = ProfileStore(max_users=16)
+    for i in range(BLOOM_DEVICES):
+        store.update("heavy", f"HEAVY-DEV-{i}", now=NOW)
+    known = all(store.lookup("heavy", f"HEAVY-DEV-{i}")[0] for i in range(BLOOM_DEVICES))
+    trials = 100_000
+    false_positive = sum(store.lookup("heavy", f"OTHER-{i}")[0] for i in range(trials)) / trials
+    print(f"  heavy user with {BLOOM_DEVICES} devices: all known {known}, "
+          f"false positive rate {false_positive * 100:.2f}% on {trials} unseen devices")
+    return known
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile store at millions of users")
+    parser.add_argument("--users", type=int, default=10_000_000)
+    args = parser.parse_args()
+    rng = np.random.default_rng(SEED)
+
+    workdir = tempfile.mkdtemp(prefix="raqeeb-profiles-")
+    try:
+        source = os.path.join(workdir, "synthetic.npz")
+        hashed = synthetic_snapshot(source, args.users, rng)
+        store = ProfileStore(max_users=args.users + REQUESTS, inactive_seconds=90 * 86400)
+        started = time.perf_counter()
+        store.restore(source)
+        restored = time.perf_counter() - started
+        print(f"restore: {len(store)} users in {restored:.2f}s (hashing the ids took {hashed:.1f}s), "
+              f"{store.capacity} slots, {store.approx_bytes / 2**20:.0f} MB "
+              f"({store.approx_bytes / len(store):.0f} bytes per user)")
+
+        print("request:")
+        p50, wrong = check_requests(store, args.users, rng)
+        print("evict:")
+        evicted = check_eviction(store)
+
+        path = os.path.join(workdir, "profiles.npz")
+        started = time.perf_counter()
+        written = store.snapshot(path)
+        print(f"snapshot: {written} users in {time.perf_counter() - started:.2f}s, "
+              f"{os.path.getsize(path) / 2**20:.0f} MB on disk")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print("bloom:")
+    ok = check_bloom() and evicted
+    ok &= p50 <= MAX_REQUEST_P50_US and wrong == 0
+    print(f"profiles: {'OK' if ok else 'FAILED'} (lookup + update p50 limit {MAX_REQUEST_P50_US:g} µs)")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# benchmarks/bench_sequence_model.py
+#
+# نماذج التنقل لكل مستخدم (sequence_model.py):
+#   history   = تكلفة الطلب (surprise قبل التقييم + learn بعده) لمستخدم تعلمنا منه 0 .. 100k جلسة:
+#               لازم تكون ثابتة مهما طال التاريخ (الجدول محدود بـ MAX_SLOTS والـ aging)، وحجم جدوله
+#   detection = مستخدمين بأنماط تنقل خاصة فيهم: كم مرة يطلع sequence_drift لجلسات من نمطهم،
+#               من نمط مستخدم ثاني، وجلسات عشوائية
+#   memory    = bytes لكل مستخدم (tracemalloc) مقابل التقدير، و max_users ما يتجاوز
+#   evaluate  = كم يضيف النموذج لـ sequence_risk، و learn_sequences لكل طلب
+# الهدف: p50 لأطول تاريخ ما يزيد عن MAX_HISTORY_RATIO × p50 لمستخدم بـ 10 جلسات (exit code 1 لو أكثر).
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/bench_sequence_model.py [--requests 20000]
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+
+from bench_suite import SEED, raqeeb, synthetic_transactions
+
+from actions import vocabulary
+from sequence_model import SequenceModels
+
+HISTORY_SIZES = (0, 10, 100, 1_000, 10_000, 100_000)
+MAX_HISTORY_RATIO = 1.5
+DETECTION_USERS = 2_000
+DETECTION_HISTORY = 30
+MEMORY_USERS = 50_000
+
+ACTIONS = sorted(raqeeb.SENSITIVE_ACTIONS | raqeeb.EXPLORATION_ACTIONS) + ["search", "inquiry", "view", "logout"]
+
+
+def habits(rng, n=3):
+    """أنماط تنقل مستخدم: n مسار ثابت يبدأ بـ login."""
+    return [["login"] + rng.sample(ACTIONS, rng.randint(2, 6)) for _ in range(n)]
+
+
+def session(rng, paths):
+    """جلسة (أرقام القاموس) من أنماط المستخدم، و 10% فيها خطوة عشوائية زيادة."""
+    steps = list(rng.choice(paths))
+    if rng.random() < 0.1:
+        steps.insert(rng.randint(1, len(steps)), rng.choice(ACTIONS))
+    return vocabulary.encode(steps, intern=True)
+
+
+def random_session(rng):
+    return vocabulary.encode(["login"] + [rng.choice(ACTIONS) for _ in range(rng.randint(2, 7))], intern=True)
+
+
+def percentile(values, q):
+    return sorted(values)[min(len(values) - 1, int(len(values) * q))] / 1000
+
+
+def check_history(requests, rng):
+    models = SequenceModels()
+    background = [habits(rng) for _ in range(200)]
+    for i in range(5_000):
+        models.learn(f"B{i % 200}", session(rng, background[i % 200]))
+    clock = time.perf_counter_ns
+    p50s = {}
+    for history in HISTORY_SIZES:
+        user = f"H{history}"
+        paths = habits(rng)
+        started = time.perf_counter()
+        for _ in range(history):
+            models.learn(user, session(rng, paths))
+        filled = time.perf_counter() - started
+        sessions = [session(rng, paths) for _ in range(requests)]
+        timings = []
+        for steps in sessions:
+            t0 = clock()
+            models.surprise(user, steps)
+            models.learn(user, steps)
+            timings.append(clock() - t0)
+        p50s[history] = percentile(timings, 0.5)
+        print(f"  {history:>7} sessions learned ({filled:5.1f}s)  p50 {p50s[history]:6.1f} µs  "
+              f"p99 {percentile(timings, 0.99):6.1f} µs  table {models.user_bytes(user)} bytes")
+    baseline = p50s[10]
+    worst = max(p50s[h] for h in HISTORY_SIZES if h >= 10)
+    ok = worst <= baseline * MAX_HISTORY_RATIO
+    print(f"history: {'OK' if ok else 'GROWS WITH HISTORY'} (worst p50 {worst:.1f} µs vs {baseline:.1f} µs "
+          f"at 10 sessions, limit x{MAX_HISTORY_RATIO:g})")
+    return ok
+
+
+def check_detection(rng):
+    margin = raqeeb.SEQUENCE_DRIFT_MARGIN
+    models = SequenceModels()
+    users = [habits(rng) for _ in range(DETECTION_USERS)]
+    for _ in range(DETECTION_HISTORY):
+        for u, paths in enumerate(users):
+            models.learn(f"U{u}", session(rng, paths))
+
+    def drift_rate(make):
+        hits = 0
+        for u in range(DETECTION_USERS):
+            surprise, typical = models.surprise(f"U{u}", make(u))
+            hits += surprise is not None and surprise - typical >= margin
+        return hits / DETECTION_USERS
+
+    own = drift_rate(lambda u: session(rng, users[u]))
+    other = drift_rate(lambda u: session(rng, users[(u + 1) % DETECTION_USERS]))
+    noise = drift_rate(lambda u: random_session(rng))
+    print(f"  {DETECTION_USERS} users x {DETECTION_HISTORY} sessions, margin {margin:g}: sequence_drift on "
+          f"own habits {own * 100:.1f}%, another user's habits {other * 100:.1f}%, random {noise * 100:.1f}%")
+    new_user = models.surprise("NEW", session(rng, users[0]))[0] is not None
+    print(f"  user without history falls back to the global model: {new_user}")
+    return new_user
+
+
+def check_memory(rng):
+    paths = habits(rng)
+    sessions = [session(rng, paths) for _ in range(64)]
+    models = SequenceModels(max_users=MEMORY_USERS)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(MEMORY_USERS):
+        for steps in sessions[i % 60:i % 60 + 4]:
+            models.learn(f"U{i}", steps, now=i)
+    per_user = (tracemalloc.get_traced_memory()[0] - before) / len(models)
+    tracemalloc.stop()
+    estimated = (models.approx_bytes - len(models.global_counts) * 4) / len(models)
+    for i in range(MEMORY_USERS, 3 * MEMORY_USERS):
+        models.learn(f"U{i}", sessions[i % 64], now=i)
+    ok = len(models) == MEMORY_USERS and models.evicted_users == 2 * MEMORY_USERS
+    print(f"  {per_user:.0f} bytes per user measured, {estimated:.0f} estimated; {3 * MEMORY_USERS} users into "
+          f"max_users={MEMORY_USERS} -> {len(models)} kept, {models.evicted_users} evicted")
+    idle = SequenceModels(inactive_seconds=3600)
+    idle.learn("old", sessions[0], now=0)
+    idle.learn("new", sessions[1], now=3601)
+    ok &= len(idle) == 1
+    print(f"  inactive user dropped: {len(idle) == 1}")
+    print(f"memory: {'OK' if ok else 'FAILED'}")
+    return ok
+
+
+def check_evaluate(rng):
+    batch = [raqeeb.parse_transaction(tx) for tx in synthetic_transactions(5_000, rng)]
+    for features in batch:
+        raqeeb.sequence_models.learn(features["user_id"], features["session_summary"].codes)
+    timings = {}
+    for enabled in (False, True):
+        raqeeb.SEQUENCE_MODEL_ENABLED = enabled
+        started = time.perf_counter()
+        for features in batch:
+            raqeeb.sequence_risk(features["user_id"], features["session_summary"])
+        timings[enabled] = (time.perf_counter() - started) / len(batch) * 1e6
+    allowed = [{"decision": "ALLOW"}] * len(batch)
+    started = time.perf_counter()
+    raqeeb.learn_sequences(batch, allowed)
+    learn = (time.perf_counter() - started) / len(batch) * 1e6
+    print(f"  sequence_risk {timings[False]:.1f} µs rules only, {timings[True]:.1f} µs with the model; "
+          f"learn_sequences {learn:.1f} µs per /evaluate")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-user navigation model cost, detection and memory")
+    parser.add_argument("--requests", type=int, default=20_000)
+    args = parser.parse_args()
+
+    rng = random.Random(SEED)
+    print("history:")
+    ok = check_history(args.requests, rng)
+    print("detection:")
+    ok &= check_detection(rng)
+    print("memory:")
+    ok &= check_memory(rng)
+    print("evaluate:")
+    ok &= check_evaluate(rng)
+    print("sequence model:", "OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+# benchmarks/bench_suite.py
+#
+# benchmark suite قابل للإعادة (seeds ثابتة) لكل طبقة لحالها + الـ end-to-end:
+#   behavior            compute_behavior_risk
+#   ai / ai.<model>     ai_anomaly_score كامل، وكل نموذج (rf / iso / mlp) على صف واحد
+#   sequence            sequence_risk
+#   graph.risk@N        compute_graph_risk على graph فيه N asset (10² .. 10⁶)
+#   graph.build@N       register_fraud_case لين يوصل الـ graph لـ N asset (لكل حالة)
+#   graph_data@N        GET /graph-data كامل (بناء الـ payload + JSON بدون cache)
+#   evaluate            POST /evaluate عبر Flask test client
+#   evaluate_batch      POST /evaluate-batch بـ 100 معاملة (throughput بالمعاملات)
+#
+# المعاملات من generate_synthetic_data (train_model.py) + مولد جلسات و assets
+# متوافق معها. لكل benchmark: p50 / p99 / mean (µs)، throughput، و peak memory
+# (tracemalloc: أعلى allocation أثناء النداء). النتائج JSON؛ مع --baseline نقارن
+# ونعلم أي benchmark صار أبطأ من الـ tolerance (exit code 1).
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/bench_suite.py --out bench.json
+#   python benchmarks/bench_suite.py --quick --baseline bench.json
+#   python benchmarks/bench_suite.py --graph-sizes 100,10000 --only graph
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ["RAQEEB_GRAPH_DIR"] = ""            # بالذاكرة بس
+os.environ["RAQEEB_GRAPH_MEMORY_MB"] = "0"     # الـ graph الكبير ما ينقص بسبب الـ budget
+
+import numpy as np  # noqa: E402
+
+import app as raqeeb  # noqa: E402
+from fraud_graph import FraudGraph  # noqa: E402
+from train_model import generate_synthetic_data  # noqa: E402
+
+SEED = 2024
+GRAPH_SIZES = (100, 1_000, 10_000, 100_000, 1_000_000)
+GRAPH_DATA_MAX = 100_000      # /graph-data كامل فوق هذا ياخذ ثواني لكل طلب
+EVALUATE_GRAPH_SIZE = 10_000
+BATCH_SIZE = 100
+GRAPH_HIT_RATE = 0.5          # نسبة المعاملات اللي assets حقها في الـ graph
+PEAK_CALLS = 20               # كم نداء نشغل تحت tracemalloc لقياس الـ peak
+
+BROWSE_ACTIONS = ["home", "services", "view_personal_data", "search", "inquiry", "view"]
+OTHER_ACTIONS = ["upload_doc", "payment", "logout"]
+SENSITIVE_ACTIONS = sorted(raqeeb.SENSITIVE_ACTIONS)
+
+
+# ---------- synthetic data ----------
+
+def synthetic_session(rng, length, sensitive_count, repeated):
+    """جلسة بطول length فيها sensitive_count خدمة حساسة، وتكرار login لو repeated."""
+    length = max(int(length), 1)
+    steps = ["login"]
+    steps += rng.choices(SENSITIVE_ACTIONS, k=int(sensitive_count))
+    if repeated:
+        steps += ["login", "login"]
+    while len(steps) < length:
+        steps.append(rng.choice(BROWSE_ACTIONS + OTHER_ACTIONS))
+    head, tail = steps[:1], steps[1:]
+    rng.shuffle(tail)
+    return head + tail
+
+
+def synthetic_transactions(n, rng, assets=None):
+    """معاملات /evaluate من generate_synthetic_data؛ assets: (ips, devices, docs) من الـ graph."""
+    X, _ = generate_synthetic_data(n_samples=n, random_state=rng.randrange(2**31))
+    transactions = []
+    for i, row in enumerate(X):
+        device_known, location, hour, ops, sensitive, length, sensitive_count, repeated = row
+        hit = assets is not None and rng.random() < GRAPH_HIT_RATE
+        transactions.append({
+            "user_id": f"U{rng.randrange(10_000)}",
+            "device_is_known": bool(device_known),
+            "location_change_km": float(location),
+            "hour_of_day": int(hour),
+            "ops_last_24h": int(ops),
+            "is_sensitive_service": bool(sensitive),
+            "session_sequence": synthetic_session(rng, length, sensitive_count, repeated),
+            "ip_address": rng.choice(assets[0]) if hit else f"198.51.{i % 256}.{rng.randrange(256)}",
+            "device_id": rng.choice(assets[1]) if hit else f"NEW-DEV-{i}",
+            "doc_hash": rng.choice(assets[2]) if hit else f"NEW-DOC-{i}",
+        })
+    return transactions
+
+
+def build_graph(n_assets, rng):
+    """graph بـ n_assets تقريباً: حالات احتيال بـ assets مشتركة (ip / device / doc)."""
+    graph = FraudGraph(max_sequences_per_asset=raqeeb.fraud_graph.max_sequences_per_asset)
+    raqeeb.fraud_graph = graph
+    pool = max(n_assets // 3, 1)
+    cases = 0
+    started = time.perf_counter()
+    while len(graph) < n_assets:
+        raqeeb.register_fraud_case(
+            ip=f"10.{cases // 65536}.{cases // 256 % 256}.{cases % 256}",
+            device_id=f"DEV-{rng.randrange(pool)}",
+            doc_hash=f"DOC-{rng.randrange(pool)}",
+            session_sequence=synthetic_session(rng, rng.randrange(2, 9), rng.randrange(3), rng.random() < 0.3),
+        )
+        cases += 1
+    seconds = time.perf_counter() - started
+    keys = tuple(list(graph.assets[kind]) for kind in ("ip", "device_id", "doc_hash"))
+    return graph, keys, cases, seconds
+
+
+# ---------- measurement ----------
+
+def percentile(sorted_values, q):
+    return sorted_values[min(int(len(sorted_values) * q), len(sorted_values) - 1)]
+
+
+def measure(fn, inputs, budget, min_iters=5, max_iters=200_000, items_per_call=1):
+    """fn(x) على inputs بالدور لين يخلص الوقت (budget ثانية): latency + throughput + peak memory."""
+    for x in inputs[:3]:   # warm-up
+        fn(x)
+    gc.collect()
+    times = []
+    started = time.perf_counter()
+    i = 0
+    while i < min_iters or (i < max_iters and time.perf_counter() - started < budget):
+        x = inputs[i % len(inputs)]
+        t0 = time.perf_counter_ns()
+        fn(x)
+        times.append(time.perf_counter_ns() - t0)
+        i += 1
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    for x in inputs[:min(PEAK_CALLS, max(min_iters, 1))]:
+        fn(x)
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+
+    times.sort()
+    mean = sum(times) / len(times)
+    return {
+        "n": len(times),
+        "p50_us": round(percentile(times, 0.50) / 1000, 2),
+        "p99_us": round(percentile(times, 0.99) / 1000, 2),
+        "mean_us": round(mean / 1000, 2),
+        "throughput_per_s": round(items_per_call * 1e9 / mean, 1),
+        "peak_alloc_kb": round(peak / 1024, 1),
+    }
+
+
+# ---------- benchmarks ----------
+
+def bench_layers(results, rng, budget):
+    transactions = synthetic_transactions(2_000, rng)
+    features = [raqeeb.parse_transaction(tx) for tx in transactions]
+    rows = [np.array([raqeeb.build_model_features(f)]) for f in features]
+
+    results["behavior"] = measure(raqeeb.compute_behavior_risk, features, budget)
+    results["ai"] = measure(raqeeb.ai_anomaly_score, features, budget)
+
+    models = raqeeb.load_models()
+    rf, iso, mlp = models.predict_rf, models.predict_iso, models.predict_nn
+    results["ai.rf"] = measure(rf, rows, budget)
+    results["ai.iso"] = measure(iso, rows, budget)
+    results["ai.mlp"] = measure(mlp, rows, budget)
+
+    results["sequence"] = measure(
+        lambda f: raqeeb.sequence_risk(f["user_id"], f["session_summary"]), features, budget
+    )
+
+
+def bench_graph(results, rng, budget, sizes, graph_data_max, evaluate_size, run_evaluate):
+    client = raqeeb.app.test_client()
+    for size in sizes:
+        graph, keys, cases, seconds = build_graph(size, rng)
+        rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        results[f"graph.build@{size}"] = {
+            "assets": len(graph),
+            "cases": cases,
+            "seconds": round(seconds, 2),
+            "mean_us": round(seconds / cases * 1e6, 2),
+            "throughput_per_s": round(cases / seconds, 1),
+            "approx_mb": round(graph.approx_bytes / 2**20, 1),
+            "max_rss_mb": round(rss_mb, 1),
+        }
+
+        features = [raqeeb.parse_transaction(tx) for tx in synthetic_transactions(2_000, rng, keys)]
+        results[f"graph.risk@{size}"] = measure(
+            lambda f: raqeeb.compute_graph_risk(
+                ip=f["ip_address"], device_id=f["device_id"], doc_hash=f["doc_hash"],
+                session_sequence=f["session_summary"],
+            ),
+            features,
+            budget,
+        )
+
+        if size <= graph_data_max:
+            def graph_data(_):
+                raqeeb._graph_body_cache.update(version=None, body=None)   # بناء كامل كل مرة
+                return client.get("/graph-data").data
+            results[f"graph_data@{size}"] = measure(graph_data, [None], budget, min_iters=3)
+
+        if run_evaluate and size == evaluate_size:
+            bench_evaluate(results, rng, budget, client, keys)
+        del graph, keys, features
+        raqeeb.fraud_graph = FraudGraph()
+        gc.collect()
+
+
+def bench_evaluate(results, rng, budget, client, keys):
+    transactions = synthetic_transactions(2_000, rng, keys)
+    results["evaluate"] = measure(lambda tx: client.post("/evaluate", json=tx), transactions, budget)
+    batches = [transactions[i:i + BATCH_SIZE] for i in range(0, len(transactions), BATCH_SIZE)]
+    results["evaluate_batch"] = measure(
+        lambda batch: client.post("/evaluate-batch", json=batch), batches, budget, items_per_call=BATCH_SIZE
+    )
+
+
+# ---------- baseline ----------
+
+def compare(results, baseline, tolerance):
+    """benchmarks اللي p50 (أو mean لـ graph.build) حقها زاد أكثر من tolerance."""
+    regressions = []
+    print(f"\n{'benchmark':<22} {'baseline':>12} {'now':>12} {'ratio':>7}")
+    for name, now in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        key = "p50_us" if "p50_us" in now else "mean_us"
+        ratio = now[key] / base[key] if base[key] else 1.0
+        flag = "  REGRESSION" if ratio > tolerance else ""
+        print(f"{name:<22} {base[key]:>9.1f} us {now[key]:>9.1f} us {ratio:>6.2f}x{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def environment(args):
+    return {
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "seed": SEED,
+        "compiled_trees": raqeeb.load_models().info["compiled_trees"],
+        "fused_mlp": raqeeb.load_models().info["fused_mlp"],
+        "args": vars(args),
+    }
+
+
+def print_results(results):
+    print(f"{'benchmark':<22} {'p50':>10} {'p99':>10} {'throughput':>14} {'peak alloc':>12}")
+    for name, r in results.items():
+        if "p50_us" in r:
+            print(f"{name:<22} {r['p50_us']:>7.1f} us {r['p99_us']:>7.1f} us {r['throughput_per_s']:>11.0f}/s "
+                  f"{r['peak_alloc_kb']:>9.1f} KB")
+        else:
+            print(f"{name:<22} {r['mean_us']:>7.1f} us/case  {r['assets']} assets, {r['cases']} cases in "
+                  f"{r['seconds']}s, ~{r['approx_mb']} MB (max RSS {r['max_rss_mb']} MB)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Per-layer latency and end-to-end throughput benchmarks.")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--baseline", help="compare against an earlier results JSON")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="flag p50 slowdowns above this ratio")
+    parser.add_argument("--quick", action="store_true", help="graph sizes up to 10^4 and a shorter time budget")
+    parser.add_argument("--graph-sizes", help="comma-separated asset counts (default 10^2..10^6)")
+    parser.add_argument("--budget", type=float, help="seconds per benchmark (default 2, quick 0.5)")
+    parser.add_argument("--only", choices=["layers", "graph"], help="run one group only")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    budget = args.budget or (0.5 if args.quick else 2.0)
+    if args.graph_sizes:
+        sizes = [int(size) for size in args.graph_sizes.split(",")]
+    else:
+        sizes = [size for size in GRAPH_SIZES if not args.quick or size <= 10_000]
+
+    rng = random.Random(SEED)
+    np.random.seed(SEED)
+    raqeeb.load_models()
+    results = {}
+    if args.only in (None, "layers"):
+        bench_layers(results, rng, budget)
+    if args.only in (None, "graph"):
+        evaluate_size = min(sizes, key=lambda size: abs(size - EVALUATE_GRAPH_SIZE))
+        bench_graph(results, rng, budget, sizes, GRAPH_DATA_MAX, evaluate_size, args.only is None)
+
+    print_results(results)
+    report = {"environment": environment(args), "results": results}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nresults written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.tolerance}x: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nno regressions")
+
+
+if __name__ == "__main__":
+    main()
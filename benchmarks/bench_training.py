@@ -0,0 +1,80 @@
+# benchmarks/bench_training.py
+#
+# وقت التدريب (process جديد لكل تشغيل، wall-clock مع الـ imports) ودقة النماذج الناتجة:
+#   sequential   = --workers 1 --n-jobs 1 بدون cache: نفس السكربت القديم (وحدة ورا الثانية، core واحد)
+#   parallel     = الثلاثة في process pool + الأشجار بـ n_jobs=-1، الـ dataset يتولد ويتحفظ
+#   parallel+cache = نفس parallel والـ dataset من الـ cache
+#   refresh      = --refresh بـ REFRESH_ROWS صف جديد (+50 شجرة لكل غابة، 20 epoch للـ MLP)
+# النماذج الكاملة لازم تطلع نفسها في كل الأوضاع (نفس payload_sha256 في الـ bundle).
+# كل شي في مجلد مؤقت (models/ الأصلي ما يتغير).
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/bench_training.py [--samples 4000]
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from model_bundle import BUNDLE_NAME, read_manifest  # noqa: E402
+
+REFRESH_ROWS = 20_000
+
+
+def run(workdir, *args):
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, os.path.join(ROOT, "train_model.py"), "--models-dir", "models",
+         "--cache-dir", "cache", "--no-score-table", *args],
+        cwd=workdir, check=True, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - started
+    return elapsed, read_manifest(os.path.join(workdir, "models", BUNDLE_NAME))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--samples", type=int, default=4000)
+    args = parser.parse_args()
+    samples = ["--samples", str(args.samples)]
+
+    workdir = tempfile.mkdtemp(prefix="raqeeb-train-")
+    try:
+        subprocess.run(
+            [sys.executable, os.path.join(ROOT, "train_model.py"), "--generate", "new_rows",
+             "--samples", str(REFRESH_ROWS), "--seed", "7"],
+            cwd=workdir, check=True, capture_output=True,
+        )
+        runs = [
+            ("sequential", run(workdir, *samples, "--workers", "1", "--n-jobs", "1", "--cache-dir", "")),
+            ("parallel", run(workdir, *samples)),
+            ("parallel+cache", run(workdir, *samples)),
+            (f"refresh +{REFRESH_ROWS // 1000}k", run(workdir, *samples, "--refresh", "--data", "new_rows")),
+        ]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{args.samples} samples, {os.cpu_count()} CPU(s)")
+    print(f"{'mode':<16} {'wall':>7}  {'rf fit':>7} {'iso fit':>7} {'nn fit':>7}  "
+          f"{'rf acc':>7} {'mlp acc':>7} {'iso anom':>8}  trees")
+    for label, (elapsed, manifest) in runs:
+        t = manifest["training"]
+        fit = t["fit_seconds"]
+        print(f"{label:<16} {elapsed:>6.2f}s  {fit['rf']:>6.2f}s {fit['iso']:>6.2f}s {fit['nn']:>6.2f}s  "
+              f"{t['rf_accuracy'] * 100:>6.2f}% {t['mlp_accuracy'] * 100:>6.2f}% {t['iso_anomaly_rate'] * 100:>7.2f}%  "
+              f"{t['rf_trees']}/{t['iso_trees']}")
+
+    full = [manifest["payload_sha256"] for _, (_, manifest) in runs[:3]]
+    ok = len(set(full)) == 1
+    print("full training gives identical models in every mode:", "OK" if ok else "MISMATCH")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# benchmarks/bench_velocity.py
+#
+# عدادات السرعة (velocity.py) تحت ضغط:
+#   throughput = مليون معاملة (user + ip + device لكل وحدة) بوقت مصطنع بمعدل 50k معاملة/ثانية،
+#                مفاتيح كثيرة (200k user، 50k ip، 200k device): تحديثات المفاتيح / ثانية + p99
+#   accuracy   = مقارنة العدادات بالعدد الدقيق (قائمة الأوقات + bisect) لمفاتيح بمعدلات مختلفة:
+#                الخطأ لازم يكون ضمن bucket واحد من كل نافذة
+#   memory     = bytes لكل مفتاح (tracemalloc) مقابل التقدير، و max_keys ما يتجاوز
+#   evaluate   = كم يضيف apply_velocity لطلب /evaluate
+# الهدف: MIN_KEY_UPDATES_PER_SECOND على الأقل (exit code 1 لو أقل أو لو الخطأ برّا الحد).
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/bench_velocity.py [--transactions 1000000]
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from bisect import bisect_left
+
+from bench_suite import SEED, raqeeb, synthetic_transactions
+
+from velocity import VelocityStore
+
+MIN_KEY_UPDATES_PER_SECOND = 50_000
+TRAFFIC_PER_SECOND = 50_000
+KEY_POPULATION = {"user": 200_000, "ip": 50_000, "device_id": 200_000}
+MEMORY_KEYS = 100_000
+
+
+def traffic(n, rng):
+    """keys لـ observe لكل معاملة (بدون بناء strings وقت القياس)."""
+    users = [f"U{i}" for i in range(KEY_POPULATION["user"])]
+    ips = [f"10.{i >> 16}.{(i >> 8) & 255}.{i & 255}" for i in range(KEY_POPULATION["ip"])]
+    devices = [f"DEV-{i}" for i in range(KEY_POPULATION["device_id"])]
+    return [
+        (("user", rng.choice(users)), ("ip", rng.choice(ips)), ("device_id", rng.choice(devices)))
+        for _ in range(n)
+    ]
+
+
+def check_throughput(n, rng):
+    store = VelocityStore()
+    keys = traffic(n, rng)
+    step = 1 / TRAFFIC_PER_SECOND
+    latencies = []
+    clock = time.perf_counter_ns
+    started = time.perf_counter()
+    for i, tx in enumerate(keys):
+        t0 = clock()
+        store.observe(tx, i * step)
+        latencies.append(clock() - t0)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    updates = 3 * n / elapsed
+    print(f"throughput: {n} transactions ({n * step:.0f}s of traffic at {TRAFFIC_PER_SECOND}/s), {len(store)} keys")
+    print(f"  {n / elapsed:10.0f} transactions/s  {updates:10.0f} key updates/s  "
+          f"p50 {latencies[n // 2] / 1000:.1f} µs  p99 {latencies[int(n * 0.99)] / 1000:.1f} µs per transaction")
+    ok = updates >= MIN_KEY_UPDATES_PER_SECOND
+    print(f"throughput: {'OK' if ok else 'TOO SLOW'} (min {MIN_KEY_UPDATES_PER_SECOND} key updates/s)")
+    return ok
+
+
+def check_accuracy(rng):
+    """
+    معدلات من عملية كل ساعة لين 10 بالثانية بوقت مصطنع. بداية النافذة الفعلية بين
+    now - seconds و now - seconds + bucket، فالعداد بين العدد الدقيق ناقص عمليات
+    الـ bucket الأقدم وبين العدد الدقيق.
+    """
+    store = VelocityStore()
+    ok = True
+    for key, rate, limit in (("slow", 1 / 3600, 2 * 86400), ("steady", 0.05, 2 * 86400),
+                             ("busy", 2.0, 86400), ("burst", 10.0, 6 * 3600)):
+        times = []
+        now = 0.0
+        worst = [0] * len(store.windows)
+        while now < limit:
+            now += rng.expovariate(rate)
+            times.append(now)
+            got = store.observe((("user", key),), now)[0]
+            for w, (_, seconds, buckets) in enumerate(store.windows):
+                exact = len(times) - bisect_left(times, now - seconds)
+                lower = len(times) - bisect_left(times, now - seconds + seconds / buckets)
+                ok &= lower <= got[w] <= exact
+                worst[w] = max(worst[w], exact - got[w])
+        print(f"  {key:<7} {len(times):>7} ops, max (exact - counter) per window: "
+              + ", ".join(f"{name} {err}" for (name, _, _), err in zip(store.windows, worst)))
+    print(f"accuracy: {'OK' if ok else 'OUT OF BOUNDS'} (within the oldest bucket of each window)")
+    return ok
+
+
+def check_memory():
+    store = VelocityStore(max_keys=MEMORY_KEYS)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(MEMORY_KEYS):
+        store.observe((("user", f"U{i}"),), i * 1e-3)
+    per_key = (tracemalloc.get_traced_memory()[0] - before) / len(store)
+    tracemalloc.stop()
+    for i in range(MEMORY_KEYS, 3 * MEMORY_KEYS):
+        store.observe((("user", f"U{i}"),), i * 1e-3)
+    ok = len(store) == MEMORY_KEYS and store.evicted_keys == 2 * MEMORY_KEYS
+    print(f"  {per_key:.0f} bytes per key measured, {store.key_bytes} estimated; "
+          f"{3 * MEMORY_KEYS} keys into max_keys={MEMORY_KEYS} -> {len(store)} kept, {store.evicted_keys} evicted")
+    idle = VelocityStore()
+    idle.observe((("user", "old"),), 0.0)
+    idle.observe((("user", "new"),), idle.idle_seconds + 1)
+    ok &= len(idle) == 1
+    print(f"  idle key dropped after {idle.idle_seconds}s: {len(idle) == 1}")
+    print(f"memory: {'OK' if ok else 'FAILED'}")
+    return ok
+
+
+def check_evaluate(rng):
+    batch = [raqeeb.parse_transaction(tx) for tx in synthetic_transactions(5_000, rng)]
+    started = time.perf_counter()
+    for features in batch:
+        raqeeb.apply_velocity([features])
+    per_tx = (time.perf_counter() - started) / len(batch) * 1e6
+    print(f"  apply_velocity: {per_tx:.1f} µs per /evaluate")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Velocity counter throughput, accuracy and memory")
+    parser.add_argument("--transactions", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    rng = random.Random(SEED)
+    ok = check_throughput(args.transactions, rng)
+    ok &= check_accuracy(rng)
+    ok &= check_memory()
+    ok &= check_evaluate(rng)
+    print("velocity:", "OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# benchmarks/check_evaluate_batch.py
+#
+# فحص /evaluate-batch مقابل /evaluate: نفس المعاملات (مستخدمين يتكررون داخل الـ batch،
+# أجهزة ومواقع جديدة، جلسات يتعلم منها نموذج التنقل) مرة وحدة وحدة بـ /evaluate ومرة
+# batches بـ /evaluate-batch، كل مرة في process جديد (ملفات مستخدمين ونماذج وعدادات فاضية
+# في مجلد مؤقت). كل رد لازم يطابق. أولها حالة المراجعة: مستخدم واحد بمعاملتين على جهاز
+# جديد D2 في نفس الـ batch (الثانية لازم تشوف D2 معروف).
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/check_evaluate_batch.py [transactions]
+
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ACTIONS = ["login", "home", "renew_id", "upload_doc", "payment", "verify_otp", "logout", "services"]
+BATCH_SIZE = 50
+
+
+def transactions(n):
+    rng = random.Random(7)
+    base = {
+        "device_is_known": True, "location_change_km": 0, "hour_of_day": 10, "ops_last_24h": 1,
+        "is_sensitive_service": False, "session_sequence": ["login", "home", "logout"],
+        "ip_address": "10.1.1.1", "latitude": 24.7, "longitude": 46.7,
+    }
+    txs = [
+        {**base, "user_id": "U-review", "device_id": "D1"},
+        {**base, "user_id": "U-review", "device_id": "D2"},
+        {**base, "user_id": "U-review", "device_id": "D2"},
+    ]
+    while len(txs) < n:
+        txs.append({
+            "user_id": f"U{rng.randrange(40)}",
+            "device_is_known": rng.random() < 0.5,
+            "location_change_km": rng.choice([0, 5, 800]),
+            "hour_of_day": rng.randrange(24),
+            "ops_last_24h": rng.randrange(10),
+            "is_sensitive_service": rng.random() < 0.4,
+            "session_sequence": [rng.choice(ACTIONS) for _ in range(rng.randrange(2, 8))],
+            "ip_address": f"10.0.{rng.randrange(50)}",
+            "device_id": f"DEV-{rng.randrange(60)}",
+            "doc_hash": f"DOC-{rng.randrange(50)}",
+            "latitude": rng.choice([24.7, 21.5, 26.4]),
+            "longitude": rng.choice([46.7, 39.2, 50.1]),
+        })
+    return txs
+
+
+def run(mode, n):
+    """نفّذ المعاملات في هذا الـ process (بيئته فاضية) ونطبع الردود JSON."""
+    import app as raqeeb
+
+    client = raqeeb.app.test_client()
+    txs = transactions(n)
+    if mode == "sequential":
+        results = [client.post("/evaluate", json=tx).get_json() for tx in txs]
+    else:
+        results = []
+        for start in range(0, n, BATCH_SIZE):
+            results += client.post("/evaluate-batch", json=txs[start:start + BATCH_SIZE]).get_json()["results"]
+    print(json.dumps(results))
+
+
+def evaluate(mode, n):
+    workdir = tempfile.mkdtemp(prefix="raqeeb-batch-")
+    env = {
+        **os.environ,
+        "RAQEEB_GRAPH_DIR": os.path.join(workdir, "graph"),
+        "RAQEEB_PROFILE_DIR": os.path.join(workdir, "profiles"),
+        "RAQEEB_METRICS": "0",
+    }
+    try:
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run", mode, str(n)],
+            cwd=ROOT, env=env, check=True, capture_output=True, text=True,
+        ).stdout
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    if sys.argv[1:2] == ["--run"]:
+        run(sys.argv[2], int(sys.argv[3]))
+        return
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000
+    sequential = evaluate("sequential", n)
+    batched = evaluate("batch", n)
+    mismatches = [i for i, (a, b) in enumerate(zip(sequential, batched)) if a != b]
+    ok = len(sequential) == len(batched) == n and not mismatches
+    review = [r["behavior_risk"] for r in batched[1:3]]
+    print(f"{n} transactions in batches of {BATCH_SIZE}  {len(mismatches)} mismatches  "
+          f"(same user, new device D2 twice: behavior {review})")
+    for i in mismatches[:5]:
+        print(f"    #{i}: /evaluate {sequential[i]['decision']} {sequential[i]['reasons']}"
+              f"  batch {batched[i]['decision']} {batched[i]['reasons']}")
+    print("evaluate batch:", "OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# benchmarks/check_graph_clusters.py
+#
+# فحص الـ clusters و ring_hops اللي تتحدث مع كل حالة (fraud_graph.py) مقابل
+# حساب كامل من الصفر (connected components + BFS من المراكز) على نفس الـ graph:
+#   بدون حذف  = لازم تطابق بالضبط بعد كل دفعة حالات
+#   مع LRU    = الحذف ما يقسم cluster (أشباح لين إعادة البناء)، بس الحجم ومجموع
+#               fraud_count لكل cluster دايماً صح، و ring_hops بالضبط (الحذف يعيد حسابها)
+#   مركز انتهى = حالة المراجعة: مركز حلقة انتهى الـ TTL حقه وأجهزته باقية (انضافت لها
+#               حالات من IPs ثانية): ما يبقى ring_hops ولا nearest_ring يشير لحلقة بدون مركز
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/check_graph_clusters.py [cases]
+
+import os
+import random
+import sys
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fraud_graph  # noqa: E402
+from fraud_graph import ASSET_KINDS, KINDS_OF_BITS, FraudGraph  # noqa: E402
+
+CHECK_EVERY = 100
+
+
+def reference(graph):
+    """(component لكل asset، ring_hops لكل asset) محسوبة من الروابط مباشرة."""
+    nodes = [(kind, key) for kind in ASSET_KINDS for key in graph.assets[kind]]
+    neighbors = {node: [] for node in nodes}
+    for kind, key in nodes:
+        for other_key, bits in graph.assets[kind][key].links.items():
+            for other in KINDS_OF_BITS[bits]:
+                if other_key in graph.assets[other]:
+                    neighbors[(kind, key)].append((other, other_key))
+
+    component = {}
+    for node in nodes:
+        if node in component:
+            continue
+        component[node] = node
+        stack = [node]
+        while stack:
+            for other in neighbors[stack.pop()]:
+                if other not in component:
+                    component[other] = node
+                    stack.append(other)
+
+    hops = {node: fraud_graph.NO_RING_HOPS for node in nodes}
+    queue = deque()
+    for kind, key in nodes:
+        if graph.assets[kind][key].fraud_count >= fraud_graph.RING_HUB_FRAUD:
+            hops[(kind, key)] = 0
+            queue.append((kind, key))
+    while queue:
+        node = queue.popleft()
+        if hops[node] + 1 > graph.ring_max_hops:
+            continue
+        for other in neighbors[node]:
+            if hops[node] + 1 < hops[other]:
+                hops[other] = hops[node] + 1
+                queue.append(other)
+    return component, hops
+
+
+def check(graph, exact):
+    component, hops = reference(graph)
+    ok = True
+
+    members = {}
+    for (kind, key), root in component.items():
+        members.setdefault(root, []).append(graph.assets[kind][key])
+    for records in members.values():
+        ids = {graph.cluster(record).id for record in records}
+        if exact and len(ids) != 1:
+            ok = False
+
+    # حجم ومجموع fraud_count لكل cluster id (حتى مع الأشباح)
+    totals = {}
+    for records in graph.assets.values():
+        for record in records.values():
+            cluster = graph.cluster(record)
+            size, fraud, _ = totals.get(cluster.id, (0, 0, cluster))
+            totals[cluster.id] = (size + 1, fraud + record.fraud_count, cluster)
+    for size, fraud, cluster in totals.values():
+        ok &= size == cluster.size and fraud == cluster.fraud_count
+
+    for (kind, key), expected in hops.items():
+        ok &= graph.assets[kind][key].ring_hops == expected
+    return ok
+
+
+def run(n_cases, max_assets, rng, keys=150):
+    graph = FraudGraph(max_assets=max_assets)
+    ok = True
+    for i in range(n_cases):
+        graph.register_case(
+            rng.choice([None, f"10.0.{rng.randrange(keys)}"]),
+            rng.choice([None, f"DEV-{rng.randrange(keys)}"]),
+            rng.choice([None, f"DOC-{rng.randrange(keys)}"]),
+            ["login", "payment"],
+        )
+        if i % CHECK_EVERY == 0:
+            ok &= check(graph, exact=max_assets is None)
+    rebuilt = check(graph, exact=max_assets is None)
+    graph._rebuild_clusters()
+    rebuilt &= check(graph, exact=True)
+    label = f"max_assets={max_assets}" if max_assets else "unbounded"
+    label += f" keys={keys}"
+    print(
+        f"{label:<26} {len(graph):>4} assets, {graph.evicted_assets:>5} evicted"
+        f"  incremental {'OK' if ok else 'MISMATCH'}  rebuild {'OK' if rebuilt else 'MISMATCH'}"
+    )
+    return ok and rebuilt
+
+
+def run_aged_hub():
+    now = [0.0]
+    graph = FraudGraph(asset_ttl_seconds=100, clock=lambda: now[0])
+    for i in range(fraud_graph.RING_HUB_FRAUD):
+        graph.register_case("hub-ip", f"DEV-{i}", f"DOC-{i}", ["login", "payment"], now=0)
+    now[0] = 90
+    for i in range(fraud_graph.RING_HUB_FRAUD):
+        graph.register_case(f"10.9.{i}", f"DEV-{i}", None, ["login"], now=90)
+    ring_before = graph.view.nearest_ring([graph.view.get("device_id", "DEV-0")])
+    now[0] = 150
+    graph.evict_expired()
+    device = graph.view.get("device_id", "DEV-0")
+    ring_after = graph.view.nearest_ring([device])
+    ok = ring_before is not None and ring_after is None and check(graph, exact=False)
+    print(
+        f"{'aged-out hub':<26} ring before {ring_before and ring_before[0]} hops, after {ring_after}, "
+        f"device ring_hops {device.ring_hops}  {'OK' if ok else 'MISMATCH'}"
+    )
+    return ok
+
+
+def main():
+    n_cases = int(sys.argv[1]) if len(sys.argv) > 1 else 3_000
+    rng = random.Random(11)
+    fraud_graph.CLUSTER_REBUILD_MIN = 20   # نخلي إعادة البناء تصير أثناء الفحص
+    ok = run(n_cases, None, rng)
+    ok &= run(n_cases, 60, rng)
+    ok &= run(n_cases, 60, rng, keys=30)   # مراكز كثير: الحذف يمس مسارات لها
+    ok &= run_aged_hub()
+    print("clusters:", "OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
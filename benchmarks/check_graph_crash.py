@@ -0,0 +1,221 @@
+# benchmarks/check_graph_crash.py
+#
+# فحص crash consistency للـ Fraud Graph الدائم (graph_store.py):
+#   kill      = عملية تكتب حالات (مع snapshots بالخلفية) وننهيها بـ SIGKILL في وقت
+#               عشوائي؛ بعد الإقلاع لازم يرجع الـ graph مطابق بالضبط لتطبيق أول
+#               lsn حالة، وما نخسر أي حالة رجعت للـ caller (الكتابة قبل الـ ack)
+#   torn      = record ناقص / بايتات عشوائية في آخر الـ log (انقطاع كهرباء وسط الكتابة)
+#   snapshot  = آخر snapshot خربان أو snapshot مؤقت ما كمل -> نرجع للي قبله + الـ log
+#   reload    = process متأخر عن الـ log يعيد البناء وهو شغال (الـ graph فيه حالات): بدون
+#               snapshot من الـ log كامل بدون ما تنحسب الحالات مرتين، وبدون snapshot ولا
+#               log من lsn 1 يرفض ويبقى على الـ graph والـ lsn اللي عنده
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/check_graph_crash.py [rounds]
+
+import itertools
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fraud_graph import FraudGraph  # noqa: E402
+from graph_store import GraphStore  # noqa: E402
+
+ACTIONS = ["login", "home", "renew_id", "upload_doc", "payment", "verify_otp", "logout"]
+MAX_SEQUENCES = 8
+SNAPSHOT_EVERY = 700
+
+
+def case(i):
+    """الحالة رقم i (lsn = i) - نفسها في العملية اللي تنقتل وفي المرجع."""
+    rng = random.Random(i)
+    return (
+        f"10.0.{rng.randrange(300)}" if rng.random() < 0.95 else None,
+        f"DEV-{rng.randrange(400)}" if rng.random() < 0.9 else None,
+        f"DOC-{rng.randrange(500)}",
+        [rng.choice(ACTIONS) for _ in range(rng.randrange(0, 7))],
+    )
+
+
+def open_store(directory):
+    graph = FraudGraph(max_sequences_per_asset=MAX_SEQUENCES)
+    store = GraphStore(graph, directory, snapshot_every=SNAPSHOT_EVERY, fsync_interval=0.01)
+    # وقت كل حالة = رقمها (lsn) عشان المرجع يطلع مطابق
+    graph.clock = lambda: float(store.lsn + 1)
+    store.open()
+    return store
+
+
+def reference(n_cases):
+    graph = FraudGraph(max_sequences_per_asset=MAX_SEQUENCES)
+    for i in range(1, n_cases + 1):
+        graph.register_case(*case(i), now=float(i))
+    return graph
+
+
+def fingerprint(graph):
+    """
+    كل حالة الـ graph بشكل قابل للمقارنة (بالترتيب: LRU مهم).
+    (approx_bytes الكامل ما ندخله: الـ snapshot يضغط الـ slots الفاضية في الـ pool)
+    """
+    pool = graph.sequence_pool
+    return (
+        {
+            kind: [
+                (key, r.fraud_count, r.sequence_total, r.last_seen, list(r.sequence_index), r.links,
+                 graph.cluster(r), r.ring_hops)
+                for key, r in records.items()
+            ]
+            for kind, records in graph.assets.items()
+        },
+        len(pool),
+        pool.token_count,
+        graph._records_bytes,
+        graph._next_cluster_id,
+    )
+
+
+def recover(directory):
+    graph = FraudGraph(max_sequences_per_asset=MAX_SEQUENCES)
+    store = GraphStore(graph, directory, snapshot_every=10**12)
+    store.open()
+    store.close()
+    return store
+
+
+def check_recovered(directory, label, min_lsn=0):
+    store = recover(directory)
+    ok = store.lsn >= min_lsn and fingerprint(store.graph) == fingerprint(reference(store.lsn))
+    print(
+        f"{label:<28} lsn {store.lsn:>6} (acked {min_lsn:>6}, snapshot {store.stats['snapshot_lsn']:>6})"
+        f"  {'OK' if ok else 'MISMATCH'}"
+    )
+    return ok
+
+
+def child(directory):
+    """العملية اللي تنقتل: تكتب حالات للأبد وتطبع lsn كل حالة بعد ما ترجع."""
+    store = open_store(directory)
+    for i in itertools.count(store.lsn + 1):
+        lsn = store.register_case(*case(i))
+        sys.stdout.write(f"{lsn}\n")
+        sys.stdout.flush()
+
+
+def run_kill(directory, rng):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--child", directory],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    time.sleep(rng.uniform(0.3, 1.5))
+    proc.send_signal(signal.SIGKILL)
+    output, _ = proc.communicate()
+    acked = [int(line) for line in output.split()]
+    return acked[-1] if acked else 0
+
+
+def run_torn(directory, rng):
+    """نقص آخر segment في مكان عشوائي أو نلصق بايتات عشوائية في آخره."""
+    segments = sorted(name for name in os.listdir(directory) if name.endswith(".log"))
+    path = os.path.join(directory, segments[-1])
+    size = os.path.getsize(path)
+    if size and rng.random() < 0.5:
+        os.truncate(path, rng.randrange(size))
+        return "torn tail (truncated)"
+    with open(path, "ab") as f:
+        f.write(rng.randbytes(rng.randrange(1, 64)))
+    return "torn tail (garbage)"
+
+
+def run_bad_snapshot(directory, rng):
+    """نخرب آخر snapshot ونترك snapshot مؤقت ناقص (crash وسط كتابة snapshot)."""
+    snapshots = sorted(name for name in os.listdir(directory) if name.endswith(".bin"))
+    if not snapshots:
+        return None
+    path = os.path.join(directory, snapshots[-1])
+    with open(path, "r+b") as f:
+        f.seek(rng.randrange(os.path.getsize(path)))
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    with open(path + ".tmp", "wb") as f:
+        f.write(rng.randbytes(100))
+    return "corrupt latest snapshot"
+
+
+def run_reload(directory):
+    store = open_store(directory)
+    for _ in range(SNAPSHOT_EVERY // 2):
+        store.register_case(*case(store.lsn + 1))
+    with store._lock:
+        store._reload(repair=True)
+    ok = fingerprint(store.graph) == fingerprint(reference(store.lsn))
+    print(f"{'reload from the log':<28} lsn {store.lsn:>6}  {'OK' if ok else 'MISMATCH'}")
+
+    # snapshot ثم ما يبقى إلا الـ segment اللي بعده (الأول انحذف مع الـ snapshot)
+    store.snapshot()
+    store.register_case(*case(store.lsn + 1))
+    for name in os.listdir(directory):
+        if name.endswith(".bin"):
+            os.remove(os.path.join(directory, name))
+    lsn, before = store.lsn, fingerprint(store.graph)
+    try:
+        with store._lock:
+            store._reload(repair=True)
+        refused = False
+    except OSError:
+        refused = True
+    kept = refused and store.lsn == lsn and fingerprint(store.graph) == before
+    print(f"{'reload without a base':<28} lsn {store.lsn:>6}  {'refused, graph kept' if kept else 'MISMATCH'}")
+    store.close()
+    return ok and kept
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    rng = random.Random(2024)
+    directory = tempfile.mkdtemp(prefix="raqeeb-crash-")
+    ok = True
+    try:
+        for r in range(rounds):
+            acked = run_kill(directory, rng)
+            ok &= check_recovered(directory, f"kill -9 (round {r + 1})", acked)
+
+        ok &= check_recovered(directory, run_torn(directory, rng))
+        ok &= check_recovered(directory, run_torn(directory, rng))
+
+        # الـ graph بعد الفحوصات اللي فوق لازم يكون عنده snapshotين عشان نرجع للأقدم
+        store = open_store(directory)
+        for _ in range(SNAPSHOT_EVERY):
+            store.register_case(*case(store.lsn + 1))
+        store.snapshot()
+        store.close()
+        label = run_bad_snapshot(directory, rng)
+        if label:
+            ok &= check_recovered(directory, label)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    directory = tempfile.mkdtemp(prefix="raqeeb-reload-")
+    try:
+        ok &= run_reload(directory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print("crash consistency:", "OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        child(sys.argv[2])
+    else:
+        main()
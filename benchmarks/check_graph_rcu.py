@@ -0,0 +1,274 @@
+# benchmarks/check_graph_rcu.py
+#
+# فحص القراءة بدون lock من الـ Fraud Graph (GraphView في fraud_graph.py) وهو يتعدل:
+# threads تقرا fraud_graph.view (مثل /evaluate) و writer يسجل حالات بنفس الوقت
+# (register_case + دفعات register_cases) وthread ثالث ياخذ changes_since (مثل /graph-data).
+#   atomic  = كل حالة لها assets خاصة (ومجموعات حالات تدمج clusters موجودة): الـ view بـ
+#             version v لازم تطابق بالضبط الـ graph بعد أول v حالة (كل حالة كاملة أو ما
+#             تبان، الـ clusters بعد الدمج، السيكوانسات)، ونفس الـ view تعطي نفس النتيجة
+#             لو رجعنا لها بعدين، والـ version ما يرجع ورا
+#   churn   = حدود ضيقة (max_assets + ring buffer صغير) فالسيكوانسات تنشال وslots الـ pool
+#             ينعاد استخدامها: كل سيكوانس في view ماسكها قارئ (ولو نام) لازم يبقى نفسه،
+#             وbest_similarity له نفسه = 1.0
+# وبعد كل مرحلة: الـ view المنشورة (نسخ جديدة للي تغير بس) = الـ records نفسها.
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/check_graph_rcu.py [seconds]
+
+import os
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from actions import vocabulary  # noqa: E402
+from fraud_graph import ASSET_KINDS, FraudGraph  # noqa: E402
+
+ACTIONS = ["login", "home", "renew_id", "upload_doc", "payment", "verify_otp", "logout", "search"]
+READERS = 3
+GROUP = 4   # حالات كل مجموعة في atomic (assets المجموعة ما تشترك مع غيرها)
+
+
+# ---------- atomic ----------
+
+def group_cases(g):
+    """
+    4 حالات: 0 و 1 نفس الـ doc، 2 cluster لحاله، 3 تربط ip الحالة 0 بـ doc الحالة 2
+    (دمج cluster منشور في ثاني). السيكوانسات تختلف بين المجموعات، ومميزة داخل المجموعة
+    (نفس السيكوانس مرتين على الـ doc يتخزن مرة وحدة).
+    """
+    rng = random.Random(g)
+    seqs = []
+    while len(seqs) < GROUP:
+        seq = [rng.choice(ACTIONS) for _ in range(rng.randint(3, 8))]
+        if seq not in seqs:
+            seqs.append(seq)
+    return [
+        (f"ip-{g}-0", f"dev-{g}-0", f"doc-{g}-a", seqs[0]),
+        (f"ip-{g}-1", f"dev-{g}-1", f"doc-{g}-a", seqs[1]),
+        (f"ip-{g}-2", f"dev-{g}-2", f"doc-{g}-b", seqs[2]),
+        (f"ip-{g}-0", None, f"doc-{g}-b", seqs[3]),
+    ]
+
+
+def group_states():
+    """
+    states[k] = {(kind, اسم بدون رقم المجموعة): (fraud_count، عدد السيكوانسات، حجم الـ cluster،
+    fraud الـ cluster)} بعد أول k حالة من المجموعة (نفس الشكل لكل مجموعة).
+    """
+    graph = FraudGraph()
+    states = [{}]
+    for ip, device_id, doc_hash, sequence in group_cases(0):
+        graph.register_case(ip, device_id, doc_hash, sequence)
+        states.append({
+            (kind, key.split("-", 2)[2]): (
+                record.fraud_count, len(record.sequence_index),
+                graph.cluster(record).size, graph.cluster(record).fraud_count,
+            )
+            for kind, records in graph.assets.items()
+            for key, record in records.items()
+        })
+    return states
+
+
+def read_group(view, g):
+    """اللي تشوفه view للمجموعة g بنفس شكل group_states (+ تطابق السيكوانسات)."""
+    seen = {}
+    for ip, device_id, doc_hash, sequence in group_cases(g):
+        for kind, key in zip(ASSET_KINDS, (ip, device_id, doc_hash)):
+            info = view.get(kind, key)
+            if info is None or (kind, key.split("-", 2)[2]) in seen:
+                continue
+            cluster = view.cluster(info)
+            seen[(kind, key.split("-", 2)[2])] = (
+                info.fraud_count, len(info.sequence_ids) // 4, cluster.size, cluster.fraud_count,
+            )
+            # أول حالة على الـ asset (ظاهرة معه) -> سيكوانسها مطابق 100٪
+            if info.best_similarity(vocabulary.encode(sequence), 0.6) != 1.0:
+                seen["sequence"] = (kind, key)
+    return seen
+
+
+def guarded(errors, loop):
+    """thread يقرا: أي exception (قراءة نص حالة) = خطأ بدل ما يموت الـ thread بصمت."""
+    def run(*args):
+        try:
+            loop(*args)
+        except Exception as exc:
+            errors.append(f"reader crashed: {exc!r}")
+    return run
+
+
+def check_atomic(seconds):
+    graph = FraudGraph(writer_yield_seconds=0.00005)
+    states = group_states()
+    n_groups = 1_000_000
+    stop = threading.Event()
+    errors = []
+    reads = [0] * READERS
+
+    def writer():
+        rng = random.Random(1)
+        g = 0
+        while not stop.is_set() and g < n_groups:
+            batch = rng.choice((1, 1, 5, 50))
+            cases = [case for group in range(g, g + batch) for case in group_cases(group)]
+            if batch == 1:
+                for case in cases:
+                    graph.register_case(*case)
+            else:
+                graph.register_cases(cases)
+            g += batch
+
+    def reader(r):
+        rng = random.Random(100 + r)
+        last_version = 0
+        while not stop.is_set():
+            view = graph.view
+            if view.version < last_version:
+                errors.append(f"version went back {last_version} -> {view.version}")
+            last_version = view.version
+            top = view.version // GROUP + 1
+            groups = [rng.randrange(max(top - 3, 0), top + 1) for _ in range(4)] + [rng.randrange(top + 1)]
+            first = None
+            for g in groups:
+                k = min(max(view.version - g * GROUP, 0), GROUP)
+                got = read_group(view, g)
+                if got != states[k]:
+                    errors.append(f"view v{view.version} group {g}: {got} != {states[k]}")
+                if first is None:
+                    first = (g, got)
+                reads[r] += 1
+            time.sleep(0)
+            if read_group(view, first[0]) != first[1]:
+                errors.append(f"view v{view.version} changed while held (group {first[0]})")
+
+    def changes_reader():
+        while not stop.is_set():
+            changes = graph.changes_since(None)
+            view = changes["view"]
+            if view.version != changes["version"]:
+                errors.append(f"changes_since view v{view.version} != v{changes['version']}")
+            for kind, assets in changes["assets"].items():
+                if {key for key, _ in view.items(kind)} != {key for key, *_ in assets}:
+                    errors.append(f"changes_since v{view.version}: {kind} assets differ from its view")
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=writer)] + [
+        threading.Thread(target=guarded(errors, reader), args=(r,)) for r in range(READERS)
+    ] + [threading.Thread(target=guarded(errors, changes_reader))]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    ok = not errors and check_rebuilt(graph)
+    print(f"atomic  {graph.version:>7} cases  {sum(reads):>7} group reads by {READERS} readers  "
+          f"{len(errors)} errors  {'OK' if ok else 'FAILED'}")
+    for error in errors[:5]:
+        print("   ", error)
+    return ok
+
+
+# ---------- churn ----------
+
+def check_churn(seconds):
+    graph = FraudGraph(max_sequences_per_asset=3, max_assets=300)
+    rng = random.Random(3)
+    variants = [[rng.choice(ACTIONS) for _ in range(rng.randint(2, 9))] for _ in range(2_000)]
+    stop = threading.Event()
+    errors = []
+    checked = [0] * READERS
+
+    def writer():
+        rng = random.Random(2)
+        while not stop.is_set():
+            cases = [
+                (f"ip-{rng.randrange(200)}", f"dev-{rng.randrange(150)}", f"doc-{rng.randrange(250)}",
+                 rng.choice(variants))
+                for _ in range(rng.choice((1, 1, 20)))
+            ]
+            graph.register_cases(cases)
+
+    def reader(r):
+        rng = random.Random(200 + r)
+        while not stop.is_set():
+            view = graph.view
+            infos = [
+                info for info in (view.get(kind, f"{prefix}-{rng.randrange(250)}")
+                                  for kind, prefix in zip(ASSET_KINDS, ("ip", "dev", "doc")))
+                if info is not None
+            ]
+            if rng.random() < 0.05:
+                time.sleep(0.005)   # نمسك الـ view وقت أطول والـ writer يشيل سيكوانسات
+            for info in infos:
+                pool = info.pool
+                counts = pool.counts
+                for seq_id in np.frombuffer(info.sequence_ids, dtype=np.uint32).tolist():
+                    seq = pool.sequences[seq_id]
+                    if seq is None:
+                        errors.append(f"view v{view.version}: sequence {seq_id} reclaimed while referenced")
+                        continue
+                    row = counts[seq_id]
+                    if row[0] != len(seq) // 2 or row[1:].sum() != row[0]:
+                        errors.append(f"view v{view.version}: counts row {seq_id} does not match its sequence")
+                    if info.best_similarity(memoryview(seq).cast("H"), 0.6) != 1.0:
+                        errors.append(f"view v{view.version}: sequence {seq_id} not found by best_similarity")
+                    checked[r] += 1
+
+    threads = [threading.Thread(target=writer)] + [
+        threading.Thread(target=guarded(errors, reader), args=(r,)) for r in range(READERS)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    pool = graph.sequence_pool
+    ok = not errors and check_rebuilt(graph)
+    print(f"churn   {graph.version:>7} cases  {graph.evicted_assets:>7} evicted  {sum(checked):>8} sequences "
+          f"checked  pool {len(pool)} live / {len(pool.sequences)} slots  {len(errors)} errors  "
+          f"{'OK' if ok else 'FAILED'}")
+    for error in errors[:5]:
+        print("   ", error)
+    return ok
+
+
+def check_rebuilt(graph):
+    """الـ view المنشورة (نسخ جديدة للي تغير بس) = الـ records نفسها بعد ما يوقف الـ writer."""
+    with graph._lock:
+        view = graph.view
+        same = view.version == graph.version
+        for kind, records in graph.assets.items():
+            same &= {key for key, _ in view.items(kind)} == set(records)
+            for key, record in records.items():
+                info = view.get(kind, key)
+                same &= info is not None and (
+                    info.fraud_count, info.sequence_ids, info.ring_hops, info.last_seen, view.cluster(info)
+                ) == (
+                    record.fraud_count, record.sequence_index.ids.tobytes(), record.ring_hops,
+                    record.last_seen, graph.cluster(record),
+                )
+    if not same:
+        print("    published view differs from the graph records")
+    return same
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    ok = check_atomic(seconds)
+    ok &= check_churn(seconds)
+    print("graph rcu:", "OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# benchmarks/check_model_bundle.py
+#
+# فحص الـ model bundle (model_bundle.py) مقابل الـ pickles الأصلية:
+#   parity    = RF و IsolationForest مطابقة بالـ bits لـ sklearn، والـ MLP ضمن الـ tolerance
+#               (ونفس int(p * 25) المستخدم في ai_risk) على صفوف عشوائية + شبكة features
+#   no-sklearn = app.py في مجلد ما فيه إلا الـ bundle (بدون pickles) يقيّم بدون import لـ sklearn
+#   size/load = حجم الملفات على القرص ووقت التحميل في process جديد
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/check_model_bundle.py
+
+import itertools
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import joblib  # noqa: E402
+import numpy as np  # noqa: E402
+
+from compiled_models import self_check_rows  # noqa: E402
+from model_bundle import BUNDLE_NAME, SOURCE_FILES, read_bundle  # noqa: E402
+
+MODELS_DIR = os.path.join(ROOT, "models")
+BUNDLE_PATH = os.path.join(MODELS_DIR, BUNDLE_NAME)
+APP_FILES = [
+    "app.py", "compiled_models.py", "model_bundle.py", "model_registry.py", "metrics.py", "score_table.py",
+    "velocity.py", "profiles.py", "sequence_model.py", "actions.py", "fraud_graph.py", "graph_store.py",
+    "sequence_index.py", "case_queue.py",
+]
+
+LOAD_PICKLES = (
+    "import time, joblib; t = time.perf_counter()\n"
+    + "".join(f"joblib.load('models/{name}')\n" for name in SOURCE_FILES.values())
+    + "print(time.perf_counter() - t)"
+)
+LOAD_BUNDLE = (
+    "import time; t = time.perf_counter()\n"
+    "from model_bundle import read_bundle\n"
+    f"read_bundle('models/{BUNDLE_NAME}')\n"
+    "print(time.perf_counter() - t)"
+)
+SCORE_WITHOUT_SKLEARN = """
+import sys
+import app
+client = app.app.test_client()
+result = client.post("/evaluate", json=app.WARMUP_TRANSACTION).get_json()
+print(result["decision"], "sklearn" in sys.modules, "joblib" in sys.modules, app.registry.active.info["models"]["rf"]["source"])
+"""
+
+
+def feature_grid():
+    """كل تركيبات الـ features المنفصلة مع مسافات على حدود الـ thresholds."""
+    locations = [0, 1, 120, 499.5, 500, 500.5, 800, 800.5, 1200, 2000, 2499]
+    rows = itertools.product([0, 1], locations, range(0, 24, 3), range(0, 21, 4), [0, 1], [1, 4, 7, 10], [0, 2], [0, 1])
+    return np.array(list(rows), dtype=float)
+
+
+def check_parity(X):
+    sk = {name: joblib.load(os.path.join(MODELS_DIR, filename)) for name, filename in SOURCE_FILES.items()}
+    models, manifest = read_bundle(BUNDLE_PATH)
+
+    rf_ok = np.array_equal(models["rf"].predict_proba_risky(X), sk["rf"].predict_proba(X)[:, 1])
+    iso_pred, iso_score = models["iso"].predict_with_score(X)
+    iso_ok = np.array_equal(iso_pred, sk["iso"].predict(X)) and np.array_equal(iso_score, sk["iso"].decision_function(X))
+    expected_nn = sk["nn"].predict_proba(sk["scaler"].transform(X))[:, 1]
+    actual_nn = models["nn"].predict_proba_risky(X)
+    nn_diff = float(np.max(np.abs(expected_nn - actual_nn)))
+    nn_ok = nn_diff <= models["nn"].tolerance and np.array_equal(
+        (expected_nn * 25).astype(int), (actual_nn * 25).astype(int)
+    )
+    print(f"parity on {len(X)} rows: rf {'OK' if rf_ok else 'MISMATCH'}, iso {'OK' if iso_ok else 'MISMATCH'}, "
+          f"mlp {'OK' if nn_ok else 'MISMATCH'} (max diff {nn_diff:.2g})")
+    return rf_ok and iso_ok and nn_ok
+
+
+def check_without_sklearn():
+    """نشغّل app.py من مجلد فيه الكود والـ bundle بس."""
+    workdir = tempfile.mkdtemp(prefix="raqeeb-bundle-")
+    try:
+        for name in APP_FILES:
+            shutil.copy(os.path.join(ROOT, name), workdir)
+        os.makedirs(os.path.join(workdir, "models"))
+        shutil.copy(BUNDLE_PATH, os.path.join(workdir, "models"))
+        output = subprocess.run(
+            [sys.executable, "-c", SCORE_WITHOUT_SKLEARN],
+            cwd=workdir, env={**os.environ, "RAQEEB_GRAPH_DIR": ""},
+            check=True, capture_output=True, text=True,
+        ).stdout.split()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    decision, sklearn_loaded, joblib_loaded, source = output[-4:]
+    ok = sklearn_loaded == joblib_loaded == "False" and source == "bundle"
+    print(f"bundle-only deploy: decision {decision}, sklearn imported {sklearn_loaded}, "
+          f"joblib imported {joblib_loaded}  {'OK' if ok else 'FAILED'}")
+    return ok
+
+
+def load_seconds(code):
+    runs = [
+        float(subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, capture_output=True, text=True).stdout)
+        for _ in range(3)
+    ]
+    return min(runs)
+
+
+def main():
+    X = np.vstack([self_check_rows(20_000, seed=1), feature_grid()])
+    ok = check_parity(X)
+    ok &= check_without_sklearn()
+
+    pickle_bytes = sum(os.path.getsize(os.path.join(MODELS_DIR, f)) for f in SOURCE_FILES.values())
+    print(f"on disk: pickles {pickle_bytes / 1024:.0f} KB, bundle {os.path.getsize(BUNDLE_PATH) / 1024:.0f} KB")
+    print(f"load (new process, incl. imports): pickles {load_seconds(LOAD_PICKLES) * 1000:.0f} ms, "
+          f"bundle {load_seconds(LOAD_BUNDLE) * 1000:.1f} ms")
+
+    print("model bundle:", "OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+# benchmarks/check_model_reload.py
+#
+# فحص تحديث النماذج بدون restart (model_registry.py + /admin/models*)، على نسخة من
+# التطبيق في مجلد مؤقت (models/ الأصلي ما يتغير):
+#   swap     = reload لنسخة candidate (RF بعدد أشجار أقل) في الخلفية و threads ترسل
+#              /evaluate-batch طول الوقت: ولا خطأ، كل batch من نسخة وحدة، وبعد التبديل
+#              النتائج = النسخة الجديدة. نطبع p50/p99 للطلبات قبل وأثناء التحميل
+#   shadow   = candidate بالظل بنسبة 100%: القرار ما يتغير، و /metrics فيه وقته وقراراته؛ promote
+#   broken   = نسخة MLP أوزانها NaN: التحقق يرفضها (422) والنسخة الحالية تبقى
+#   watch    = RAQEEB_MODEL_WATCH_SECONDS: نكتب نماذج جديدة فوق models/ والتبديل يصير لحاله،
+#              حتى لو فيه تحميل ثاني شغال وقت ما الـ watcher يلاحظ التغيير (يعيد المرة الجاية)
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/check_model_reload.py
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import joblib  # noqa: E402
+import numpy as np  # noqa: E402
+
+from model_bundle import BUNDLE_NAME, SOURCE_FILES  # noqa: E402
+from train_model import generate_synthetic_data  # noqa: E402
+
+N_CLIENTS = 3
+BATCH_SIZE = 32
+CANDIDATE_TREES = 25
+WATCH_SECONDS = 0.2
+SEED = 1234
+SESSIONS = (
+    ["login", "home", "renew_id", "upload_doc", "logout"],
+    ["login", "renew_id", "renew_id", "payment"],
+    ["login", "issue_passport", "register_property", "renew_work_permit", "payment"],
+    ["login", "home", "services", "view", "logout"],
+)
+
+
+def write_models(directory, rf_trees=None, broken_nn=False):
+    """نسخة من models/ (pickles بدون bundle)، مع RF أقصر أو MLP خربان لو طلبنا."""
+    os.makedirs(directory, exist_ok=True)
+    for name, filename in SOURCE_FILES.items():
+        model = joblib.load(os.path.join(ROOT, "models", filename))
+        if name == "rf" and rf_trees:
+            model.estimators_ = model.estimators_[:rf_trees]
+            model.n_estimators = rf_trees
+        if name == "nn" and broken_nn:
+            model.coefs_[0] = np.full_like(model.coefs_[0], np.nan)
+        joblib.dump(model, os.path.join(directory, filename))
+
+
+def synthetic_batches(n_batches, rng):
+    """batches لـ /evaluate-batch من generate_synthetic_data (بدون assets في الـ graph)."""
+    X, _ = generate_synthetic_data(n_batches * BATCH_SIZE, random_state=SEED)
+    transactions = [
+        {
+            "user_id": f"U{rng.randrange(10_000)}",
+            "device_is_known": bool(row[0]),
+            "location_change_km": float(row[1]),
+            "hour_of_day": int(row[2]),
+            "ops_last_24h": int(row[3]),
+            "is_sensitive_service": bool(row[4]),
+            "session_sequence": rng.choice(SESSIONS),
+            "ip_address": f"198.51.{i % 256}.{rng.randrange(256)}",
+            "device_id": f"NEW-DEV-{i}",
+            "doc_hash": f"NEW-DOC-{i}",
+        }
+        for i, row in enumerate(X)
+    ]
+    return [transactions[i:i + BATCH_SIZE] for i in range(0, len(transactions), BATCH_SIZE)]
+
+
+def percentile(values, q):
+    return sorted(values)[min(len(values) - 1, int(len(values) * q))] * 1000 if values else float("nan")
+
+
+def check_swap(raqeeb, client, batches, expected):
+    """threads ترسل batches و reload يشتغل في الخلفية."""
+    errors = []
+    latencies = {"before": [], "loading": [], "after": []}
+    phase = ["before"]
+    stop = threading.Event()
+
+    def worker(k):
+        i = k
+        while not stop.is_set():
+            batch = batches[i % len(batches)]
+            started = time.perf_counter()
+            response = client.post("/evaluate-batch", json=batch)
+            latencies[phase[0]].append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+            else:
+                decisions = [r["decision"] for r in response.get_json()["results"]]
+                # batch كامل من نسخة وحدة: يطابق القديمة أو الجديدة بالكامل
+                if decisions not in (expected["old"][i % len(batches)], expected["new"][i % len(batches)]):
+                    errors.append("mixed")
+            i += N_CLIENTS
+
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(N_CLIENTS)]
+    for thread in threads:
+        thread.start()
+    time.sleep(1.0)
+    old_version = raqeeb.registry.active.version
+    phase[0] = "loading"
+    started = time.perf_counter()
+    response = client.post("/admin/models/reload", json={"models_dir": "models/candidate"})
+    while raqeeb.registry.active.version == old_version and raqeeb.registry.describe()["loading"]:
+        time.sleep(0.01)
+    swap_seconds = time.perf_counter() - started
+    phase[0] = "after"
+    time.sleep(1.0)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    for name, values in latencies.items():
+        print(f"  /evaluate-batch {name:<8} {len(values):>5} requests  p50 {percentile(values, 0.5):6.1f} ms"
+              f"  p99 {percentile(values, 0.99):6.1f} ms")
+    new_version = raqeeb.registry.active.version
+    after = [r["decision"] for r in client.post("/evaluate-batch", json=batches[0]).get_json()["results"]]
+    ok = (
+        response.status_code == 202 and not errors and new_version != old_version
+        and after == expected["new"][0]
+    )
+    print(f"  reload accepted {response.status_code}, {old_version} -> {new_version} in {swap_seconds:.2f}s, "
+          f"errors {len(errors)}, results match candidate {after == expected['new'][0]}")
+    print(f"swap: {'OK' if ok else 'FAILED'}")
+    return ok
+
+
+def check_shadow(raqeeb, client, batches):
+    """candidate بالظل: القرار من النسخة active، و /metrics يسجل قرارات الـ shadow."""
+    client.post("/admin/models/reload", json={"models_dir": "models", "wait": True})
+    active = raqeeb.registry.active.version
+    response = client.post(
+        "/admin/models/reload", json={"models_dir": "models/candidate", "shadow": True, "sample_rate": 1.0, "wait": True}
+    )
+    shadow = raqeeb.registry.shadow.version
+    scored = 0
+    for batch in batches[:20]:
+        client.post("/evaluate-batch", json=batch)
+        scored += len(batch)
+    text = client.get("/metrics").get_data(as_text=True)
+    counted = differ = 0
+    for line in text.splitlines():
+        if line.startswith("raqeeb_shadow_decisions_total{"):
+            labels, value = line.rsplit(" ", 1)
+            labels = dict(pair.split("=") for pair in labels[labels.index("{") + 1:-1].split(","))
+            if labels["version"] == f'"{shadow}"':
+                counted += float(value)
+                differ += float(value) * (labels["primary"] != labels["shadow"])
+    timed = f'raqeeb_shadow_ai_seconds_count{{version="{shadow}"}} {scored}' in text
+    unchanged = raqeeb.registry.active.version == active
+    promoted = client.post("/admin/models/promote").status_code == 200 and raqeeb.registry.active.version == shadow
+    ok = response.status_code == 200 and counted == scored and timed and unchanged and promoted
+    print(f"  shadow {shadow} on {scored} transactions: recorded {counted:.0f}, decisions differ {differ:.0f}, "
+          f"latency histogram {timed}, active unchanged {unchanged}, promoted {promoted}")
+    print(f"shadow: {'OK' if ok else 'FAILED'}")
+    return ok
+
+
+def check_broken(raqeeb, client):
+    active = raqeeb.registry.active.version
+    response = client.post("/admin/models/reload", json={"models_dir": "models/broken", "wait": True})
+    error = (raqeeb.registry.last_error or {}).get("error", "")
+    outside = client.post("/admin/models/reload", json={"models_dir": "/tmp"}).status_code
+    ok = response.status_code == 422 and raqeeb.registry.active.version == active and outside == 400
+    print(f"  broken models -> {response.status_code} ({error}), active still {raqeeb.registry.active.version}, "
+          f"dir outside models/ -> {outside}")
+    print(f"broken: {'OK' if ok else 'FAILED'}")
+    return ok
+
+
+def check_watch(raqeeb, workdir):
+    raqeeb.registry.reload("models", wait=True)
+    before = raqeeb.registry.active.version
+    raqeeb.registry.watch(WATCH_SECONDS)
+    # تحميل ثاني "شغال" خلال أول كم poll: reload يرجع False والـ watcher لازم يعيد بعدها
+    busy = raqeeb.registry._load_lock
+    busy.acquire()
+    for filename in SOURCE_FILES.values():
+        shutil.copy(os.path.join(workdir, "models", "candidate", filename), os.path.join(workdir, "models", filename))
+    started = time.perf_counter()
+    time.sleep(WATCH_SECONDS * 5)
+    busy.release()
+    while raqeeb.registry.active.version == before and time.perf_counter() - started < 30:
+        time.sleep(0.05)
+    after = raqeeb.registry.active.version
+    ok = after != before
+    print(f"  files replaced: {before} -> {after} after {time.perf_counter() - started:.2f}s "
+          f"(poll every {WATCH_SECONDS}s, another load running for the first {WATCH_SECONDS * 5:.1f}s)")
+    print(f"watch: {'OK' if ok else 'FAILED'}")
+    return ok
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix="raqeeb-reload-")
+    try:
+        for name in ("app.py", "compiled_models.py", "model_bundle.py", "model_registry.py", "metrics.py",
+                     "score_table.py", "velocity.py", "profiles.py", "sequence_model.py", "actions.py",
+                     "fraud_graph.py", "graph_store.py", "sequence_index.py", "case_queue.py"):
+            shutil.copy(os.path.join(ROOT, name), workdir)
+        write_models(os.path.join(workdir, "models"))
+        write_models(os.path.join(workdir, "models", "candidate"), rf_trees=CANDIDATE_TREES)
+        write_models(os.path.join(workdir, "models", "broken"), broken_nn=True)
+
+        os.chdir(workdir)
+        sys.path.insert(0, workdir)
+        os.environ["RAQEEB_GRAPH_DIR"] = ""
+        # نفس الـ batches تنعاد طول الفحص: عدادات السرعة وملفات المستخدمين ونماذج التنقل بتغير القرارات عن المتوقع
+        os.environ["RAQEEB_VELOCITY"] = "0"
+        os.environ["RAQEEB_PROFILES"] = "0"
+        os.environ["RAQEEB_SEQUENCE_MODEL"] = "0"
+        import app as raqeeb
+
+        batches = synthetic_batches(40, random.Random(SEED))
+
+        def decisions(models):
+            out = []
+            for batch in batches:
+                features = [raqeeb.parse_transaction(tx) for tx in batch]
+                ai = raqeeb.ai_anomaly_scores_batch(features, observe=False, models=models)
+                out.append([raqeeb.score_transaction(f, a, observe=False)["decision"] for f, a in zip(features, ai)])
+            return out
+
+        candidate = raqeeb.registry.load("models/candidate")
+        expected = {"old": decisions(raqeeb.registry.active), "new": decisions(candidate)}
+        changed = sum(a != b for old, new in zip(expected["old"], expected["new"]) for a, b in zip(old, new))
+        print(f"{os.cpu_count()} CPU(s), bundle {BUNDLE_NAME}, candidate RF {CANDIDATE_TREES} trees "
+              f"({changed} of {len(batches) * BATCH_SIZE} decisions change)")
+
+        client = raqeeb.app.test_client()
+        ok = check_swap(raqeeb, client, batches, expected)
+        ok &= check_shadow(raqeeb, client, batches)
+        ok &= check_broken(raqeeb, client)
+        ok &= check_watch(raqeeb, workdir)
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print("model reload:", "OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# benchmarks/check_score_file.py
+#
+# فحص score_file.py (التقييم offline) مقابل /evaluate-batch على نفس المعاملات
+# ونفس الـ Fraud Graph (حالات احتيال مؤكدة في مجلد graph مؤقت):
+#   jsonl     = كل سطر لازم يطابق رد الـ HTTP بالضبط (بعد شيل "row")
+#   csv       = نفس المعاملات كـ CSV -> نفس القرار والسكورات
+#   errors    = صفوف خربانة تطلع error بمكانها وما توقف الباقي
+# ونطبع rows/sec لكل عدد workers.
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/check_score_file.py [rows]
+
+import csv
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ACTIONS = ["login", "home", "renew_id", "upload_doc", "payment", "verify_otp", "logout", "services"]
+FIELDS = [
+    "user_id", "device_is_known", "location_change_km", "hour_of_day", "ops_last_24h",
+    "is_sensitive_service", "session_sequence", "ip_address", "device_id", "doc_hash",
+]
+ASSET_POOL = 400
+
+
+def transaction(rng):
+    return {
+        "user_id": f"U{rng.randrange(1000)}",
+        "device_is_known": rng.random() < 0.7,
+        "location_change_km": rng.choice([0, 5, 120, 800, 1600.5]),
+        "hour_of_day": rng.randrange(24),
+        "ops_last_24h": rng.randrange(20),
+        "is_sensitive_service": rng.random() < 0.4,
+        "session_sequence": [rng.choice(ACTIONS) for _ in range(rng.randrange(1, 9))],
+        "ip_address": f"10.0.{rng.randrange(ASSET_POOL)}",
+        "device_id": f"DEV-{rng.randrange(ASSET_POOL)}",
+        "doc_hash": f"DOC-{rng.randrange(ASSET_POOL)}",
+    }
+
+
+def csv_row(tx):
+    return {
+        **tx,
+        "device_is_known": "true" if tx["device_is_known"] else "false",
+        "is_sensitive_service": "1" if tx["is_sensitive_service"] else "0",
+        "session_sequence": ",".join(tx["session_sequence"]),
+    }
+
+
+def expected_results(graph_dir, transactions):
+    """ردود /evaluate-batch (test client) على نفس الـ graph، بدون عدادات السرعة وملفات المستخدمين (ما تنطبق offline)."""
+    os.environ["RAQEEB_GRAPH_DIR"] = graph_dir
+    os.environ["RAQEEB_VELOCITY"] = "0"
+    os.environ["RAQEEB_PROFILES"] = "0"
+    os.environ["RAQEEB_SEQUENCE_MODEL"] = "0"
+    import app as raqeeb
+
+    client = raqeeb.app.test_client()
+    results = []
+    for start in range(0, len(transactions), raqeeb.MAX_BATCH_SIZE):
+        body = transactions[start:start + raqeeb.MAX_BATCH_SIZE]
+        results.extend(client.post("/evaluate-batch", json=body).get_json()["results"])
+    raqeeb.graph_store.close()
+    return results
+
+
+def build_graph(graph_dir, rng):
+    from fraud_graph import FraudGraph
+    from graph_store import GraphStore
+
+    store = GraphStore(FraudGraph(), graph_dir)
+    store.open()
+    for _ in range(600):
+        tx = transaction(rng)
+        store.register_case(tx["ip_address"], tx["device_id"], tx["doc_hash"], tx["session_sequence"])
+    store.close()
+
+
+def score(workdir, graph_dir, name, output, workers):
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, os.path.join(ROOT, "score_file.py"), os.path.join(workdir, name),
+         os.path.join(workdir, output), "--graph-dir", graph_dir, "--workers", str(workers),
+         "--chunk-size", "500"],
+        cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    return time.perf_counter() - started
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    rng = random.Random(5)
+    workdir = tempfile.mkdtemp(prefix="raqeeb-score-")
+    graph_dir = os.path.join(workdir, "graph")
+    ok = True
+    try:
+        build_graph(graph_dir, rng)
+        transactions = [transaction(rng) for _ in range(n_rows)]
+        with open(os.path.join(workdir, "in.jsonl"), "w") as f:
+            for tx in transactions:
+                f.write(json.dumps(tx) + "\n")
+            f.write("not json\n[1, 2]\n")
+        with open(os.path.join(workdir, "in.csv"), "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(csv_row(tx) for tx in transactions)
+
+        expected = expected_results(graph_dir, transactions)
+
+        for workers in (1, 2, 4):
+            seconds = score(workdir, graph_dir, "in.jsonl", "out.jsonl", workers)
+            with open(os.path.join(workdir, "out.jsonl")) as f:
+                lines = [json.loads(line) for line in f]
+            rows = [line.pop("row") for line in lines]
+            same = lines[:n_rows] == expected and rows == list(range(1, n_rows + 3))
+            bad = [sorted(line) for line in lines[n_rows:]] == [["error"], ["error"]]
+            ok &= same and bad
+            print(
+                f"jsonl  workers={workers}  {n_rows / seconds:>8.0f} rows/sec (incl. startup)"
+                f"  {'OK' if same else 'MISMATCH'}  errors {'OK' if bad else 'MISMATCH'}"
+            )
+
+        seconds = score(workdir, graph_dir, "in.csv", "out.csv", 2)
+        with open(os.path.join(workdir, "out.csv"), newline="") as f:
+            got = [
+                (row["decision"], int(row["total_risk"]), [int(row[k]) for k in ("behavior_risk", "ai_risk", "sequence_risk", "graph_risk")],
+                 row["reasons"].split("|") if row["reasons"] else [])
+                for row in csv.DictReader(f)
+            ]
+        want = [
+            (r["decision"], r["total_risk"], [r[k] for k in ("behavior_risk", "ai_risk", "sequence_risk", "graph_risk")], r["reasons"])
+            for r in expected
+        ]
+        same = got == want
+        ok &= same
+        print(f"csv    workers=2  {n_rows / seconds:>8.0f} rows/sec (incl. startup)  {'OK' if same else 'MISMATCH'}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print("score_file:", "OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
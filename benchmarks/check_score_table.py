@@ -0,0 +1,153 @@
+# benchmarks/check_score_table.py
+#
+# فحص جدول النقاط المحسوب مسبقاً (score_table.py) مقابل النماذج الحقيقية:
+#   build     = وقت البناء وحجم الملف و validate_score_table: نقاط الغابتين لازم تطابق 100%
+#               (location على thresholds الأشجار وأي قيمة مستمرة)
+#   decisions = معاملات مصطنعة كاملة (location مستمر، جلسات، features برّا النطاق) عبر
+#               score_transaction مرة بالجدول ومرة بالنماذج: أي قرار أو ai_risk أو سبب
+#               يختلف = FAILED (exit code 1)
+#   latency   = وقت طبقة ai لكل معاملة (ai_anomaly_scores_batch بمعاملة وحدة) بالنماذج، وبالجدول
+#               للمعاملات داخل الشبكة وللي برّاها
+#
+# لو models/raqeeb_score_table.npz مو موجود نبنيه أول (نفس python score_table.py).
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/check_score_table.py [--transactions 20000]
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from score_table import SCORE_TABLE_NAME, export_score_table, read_score_table  # noqa: E402
+
+MODELS_DIR = os.path.join(ROOT, "models")
+TABLE_PATH = os.path.join(MODELS_DIR, SCORE_TABLE_NAME)
+LATENCY_ROUNDS = 2000
+SEED = 2024
+SESSIONS = (
+    ["login", "home", "renew_id", "upload_doc", "logout"],
+    ["login", "renew_id", "renew_id", "payment"],
+    ["login", "issue_passport", "register_property", "renew_work_permit", "payment"],
+    ["login", "home", "services", "view", "logout"],
+    ["login", "payment", "payment", "payment", "payment", "payment", "payment", "payment", "payment",
+     "payment", "payment", "payment"],
+)
+
+
+def synthetic_transactions(n, rng):
+    """معاملات بـ location مستمر، وحوالي 5% برّا الشبكة (ops > 20) عشان مسار الـ fallback."""
+    return [
+        {
+            "user_id": f"U{rng.randrange(10_000)}",
+            "device_is_known": rng.random() < 0.5,
+            "location_change_km": round(rng.uniform(0, 2500), 2),
+            "hour_of_day": rng.randrange(24),
+            "ops_last_24h": rng.randrange(21) if rng.random() < 0.95 else rng.randrange(21, 60),
+            "is_sensitive_service": rng.random() < 0.5,
+            "session_sequence": rng.choice(SESSIONS),
+            "ip_address": f"198.51.{i % 256}.{rng.randrange(256)}",
+            "device_id": f"NEW-DEV-{i}",
+            "doc_hash": f"NEW-DOC-{i}",
+        }
+        for i in range(n)
+    ]
+
+
+def check_build():
+    if not os.path.exists(TABLE_PATH):
+        print(f"building {TABLE_PATH} ...")
+        export_score_table(MODELS_DIR)
+    table = read_score_table(TABLE_PATH)
+    manifest = table.manifest
+    print(f"table {manifest['model_version']}: {manifest['shape'][0]} cells x {manifest['location_buckets']} "
+          f"location buckets -> {manifest['shape'][1]} entries, {os.path.getsize(TABLE_PATH) / 2**20:.1f} MB, "
+          f"built in {manifest['build_seconds']}s")
+    validation = manifest.get("validation")
+    if not validation:
+        print("  (built with --no-validate)")
+        return True
+    ok = True
+    for label in ("thresholds", "continuous"):
+        result = validation[label]
+        print(f"  {label:<10} {result['mismatches']:>6} of {validation['rows']} rows differ "
+              f"({result['mismatch_rate'] * 100:.2f}%) {result['per_model']}")
+        ok &= result["mismatches"] == 0
+    print(f"build: {'OK' if ok else 'FAILED'}")
+    return ok
+
+
+def check_decisions(raqeeb, with_table, without_table, transactions):
+    features = [raqeeb.parse_transaction(tx) for tx in transactions]
+    decisions = ai_risk = reasons = 0
+    for start in range(0, len(features), 256):
+        batch = features[start:start + 256]
+        fast = raqeeb.ai_anomaly_scores_batch(batch, observe=False, models=with_table)
+        live = raqeeb.ai_anomaly_scores_batch(batch, observe=False, models=without_table)
+        for f, a, b in zip(batch, fast, live):
+            decisions += (
+                raqeeb.score_transaction(f, a, observe=False)["decision"]
+                != raqeeb.score_transaction(f, b, observe=False)["decision"]
+            )
+            ai_risk += a[0] != b[0]
+            reasons += sorted(a[1]) != sorted(b[1])
+    hits = sum(with_table.score_table.index_of(raqeeb.build_model_features(f)) is not None for f in features)
+    n = len(features)
+    print(f"  {n} transactions, {hits} served from the table ({hits / n * 100:.1f}%)")
+    print(f"  decisions differ {decisions} ({decisions / n * 100:.2f}%), ai_risk differs {ai_risk} "
+          f"({ai_risk / n * 100:.2f}%), reasons differ {reasons} ({reasons / n * 100:.2f}%)")
+    ok = decisions == ai_risk == reasons == 0
+    print(f"decisions: {'OK' if ok else 'CHANGED'}")
+    return ok
+
+
+def check_latency(raqeeb, with_table, without_table, transactions):
+    """وقت طبقة ai بالنماذج، وبالجدول للمعاملات اللي فيه ولي برّاه (fallback) كل وحدة لحالها."""
+    features = [raqeeb.parse_transaction(tx) for tx in transactions]
+    inside = [f for f in features if with_table.score_table.index_of(raqeeb.build_model_features(f)) is not None]
+    outside = [f for f in features if with_table.score_table.index_of(raqeeb.build_model_features(f)) is None]
+    runs = (
+        ("models", without_table, features),
+        ("table (in grid)", with_table, inside),
+        ("table (fallback)", with_table, outside),
+    )
+    for label, models, sample in runs:
+        sample = sample[:LATENCY_ROUNDS]
+        raqeeb.ai_anomaly_scores_batch(sample[:1], observe=False, models=models)
+        started = time.perf_counter()
+        for f in sample:
+            raqeeb.ai_anomaly_scores_batch([f], observe=False, models=models)
+        elapsed = (time.perf_counter() - started) / len(sample)
+        print(f"  ai layer with {label:<16} {elapsed * 1e6:8.1f} µs per transaction")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the precomputed score table with the live models")
+    parser.add_argument("--transactions", type=int, default=20_000)
+    args = parser.parse_args()
+
+    ok = check_build()
+    os.chdir(ROOT)
+    os.environ["RAQEEB_GRAPH_DIR"] = ""
+    import app as raqeeb
+
+    with_table = raqeeb.load_models()
+    if with_table.score_table is None:
+        print("app did not load the score table (RAQEEB_SCORE_TABLE=0 or it failed its checks)")
+        sys.exit(1)
+    without_table = with_table._replace(score_table=None)
+    transactions = synthetic_transactions(args.transactions, random.Random(SEED))
+    ok &= check_decisions(raqeeb, with_table, without_table, transactions)
+    ok &= check_latency(raqeeb, with_table, without_table, transactions)
+
+    print("score table:", "OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
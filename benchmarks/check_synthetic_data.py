@@ -0,0 +1,151 @@
+# benchmarks/check_synthetic_data.py
+#
+# فحص generate_synthetic_data (train_model.py) بعد ما صارت الـ labels عمليات على المصفوفة:
+#   seeds   = نفس X و y بالضبط مثل الـ loop القديم (صف صف مع rng.random()) لعدة seeds وأحجام
+#   timing  = الـ loop القديم مقابل النسخة الجديدة على نفس الحجم
+#   chunked = write_synthetic_data لـ .npy (memmap) دفعة دفعة: الوقت، أعلى heap (tracemalloc،
+#             بدون صفحات الـ mmap)، الملفات = نفس الدفعات، ونفس البيانات لو نعيد التوليد
+#
+# التشغيل (من جذر المشروع):
+#   python benchmarks/check_synthetic_data.py [--rows 10000000]
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+
+from train_model import (  # noqa: E402
+    generate_synthetic_chunks,
+    generate_synthetic_data,
+    write_synthetic_data,
+)
+
+SEEDS = (0, 1, 42, 2024)
+SIZES = (1, 17, 4000, 100_000)
+TIMING_ROWS = 1_000_000
+CHECK_CHUNK_SIZE = 250_000
+
+
+def generate_synthetic_data_loop(n_samples=4000, random_state=42):
+    """النسخة القديمة كما هي (labels في loop صف صف) - المرجع للمقارنة."""
+    rng = np.random.default_rng(random_state)
+
+    device_is_known   = rng.integers(0, 2,   size=n_samples)
+    location_change   = rng.integers(0, 2001, size=n_samples)
+    hour_of_day       = rng.integers(0, 24,  size=n_samples)
+    ops_last_24h      = rng.integers(0, 21,  size=n_samples)
+    is_sensitive      = rng.integers(0, 2,   size=n_samples)
+    session_length    = rng.integers(1, 11,  size=n_samples)
+    sensitive_count   = rng.integers(0, 4,   size=n_samples)
+    repeated_flag     = rng.integers(0, 2,   size=n_samples)
+
+    X = np.vstack([
+        device_is_known, location_change, hour_of_day, ops_last_24h,
+        is_sensitive, session_length, sensitive_count, repeated_flag,
+    ]).T
+
+    y = np.zeros(n_samples, dtype=int)
+    for i in range(n_samples):
+        risk_score = 0
+        if device_is_known[i] == 0 and is_sensitive[i] == 1 and location_change[i] > 800:
+            risk_score += 3
+        if 2 <= hour_of_day[i] <= 5 and ops_last_24h[i] > 5:
+            risk_score += 2
+        if is_sensitive[i] == 1 and location_change[i] > 500:
+            risk_score += 1
+        if ops_last_24h[i] > 10:
+            risk_score += 1
+        if sensitive_count[i] >= 2:
+            risk_score += 2
+        if repeated_flag[i] == 1:
+            risk_score += 1
+        if session_length[i] >= 7:
+            risk_score += 1
+        if risk_score == 0 and rng.random() < 0.03:
+            risk_score = 1
+        y[i] = 1 if risk_score >= 2 else 0
+
+    return X, y
+
+
+def check_seeds():
+    ok = True
+    for seed in SEEDS:
+        for size in SIZES:
+            X_old, y_old = generate_synthetic_data_loop(size, seed)
+            X_new, y_new = generate_synthetic_data(size, seed)
+            same = np.array_equal(X_old, X_new) and np.array_equal(y_old, y_new) and y_old.dtype == y_new.dtype
+            ok &= same
+            if not same:
+                print(f"  MISMATCH seed={seed} n={size}")
+    print(f"seed equivalence ({len(SEEDS)} seeds x sizes {list(SIZES)}): {'OK' if ok else 'FAILED'}")
+    return ok
+
+
+def check_timing(rows):
+    started = time.perf_counter()
+    generate_synthetic_data_loop(rows)
+    loop = time.perf_counter() - started
+    started = time.perf_counter()
+    generate_synthetic_data(rows)
+    vectorized = time.perf_counter() - started
+    print(f"{rows} rows: loop {loop:.2f}s, vectorized {vectorized:.3f}s ({loop / vectorized:.0f}x)")
+
+
+def check_chunked(rows, chunk_size):
+    workdir = tempfile.mkdtemp(prefix="raqeeb-synthetic-")
+    try:
+        tracemalloc.start()
+        started = time.perf_counter()
+        X, y = write_synthetic_data(workdir, rows, chunk_size=chunk_size, random_state=7)
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        size_mb = sum(os.path.getsize(os.path.join(workdir, name)) for name in ("X.npy", "y.npy")) / 2**20
+        print(f"chunked {rows} rows (chunk {chunk_size}): {elapsed:.2f}s, {size_mb:.0f} MB on disk, "
+              f"peak heap {peak / 2**20:.0f} MB, risky {y.mean() * 100:.1f}%")
+
+        # الملفات = الدفعات نفسها، والتوليد مرة ثانية يعطي نفس الأرقام
+        check_rows = min(rows, 3 * CHECK_CHUNK_SIZE + 1234)
+        X_small, y_small = write_synthetic_data(
+            os.path.join(workdir, "small"), check_rows, chunk_size=CHECK_CHUNK_SIZE, random_state=7
+        )
+        chunks = list(generate_synthetic_chunks(check_rows, CHECK_CHUNK_SIZE, random_state=7))
+        same_chunks = np.array_equal(X_small, np.vstack([c[0] for c in chunks])) and np.array_equal(
+            y_small, np.concatenate([c[1] for c in chunks])
+        )
+        X_again, _ = next(generate_synthetic_chunks(check_rows, CHECK_CHUNK_SIZE, random_state=7))
+        repeatable = np.array_equal(X_again, chunks[0][0])
+        one_shot = generate_synthetic_data(check_rows, 7)[1].mean()
+        ok = same_chunks and repeatable and len(X) == rows
+        print(f"chunked files match chunks: {same_chunks}, repeatable: {repeatable}, "
+              f"risky rate {y_small.mean() * 100:.2f}% vs one-shot {one_shot * 100:.2f}%")
+        print(f"chunked: {'OK' if ok else 'FAILED'}")
+        return ok
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000_000, help="rows for the chunked .npy run")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    ok = check_seeds()
+    check_timing(TIMING_ROWS)
+    ok &= check_chunked(args.rows, args.chunk_size)
+    print("synthetic data:", "OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# case_queue.py
+#
+# طابور تأكيد حالات الاحتيال بـ writer واحد: /confirm-fraud و /confirm-fraud/bulk
+# يضيفون الحالات ويرجعون فوراً، و thread واحد يطبقها على الـ graph دفعات
+# (register_fraud_cases: lock واحد للـ graph وwrite + fsync واحد للـ log لكل دفعة).
+#
+# - ticket = عدد الحالات المقبولة لين آخر حالة في الطلب (يزيد بس). الطلب انطبق لما
+#   applied >= ticket، وgraph_version وقتها يشمل حالاته: اللي يبي يقيّم بعد التأكيد
+#   ينتظر wait(ticket) أو يقارن version الـ graph (/health، /metrics) بالرقم اللي رجع.
+#   done ما يعني انطبق: wait يرفع CasesFailed وstatus فيه failed لو حالات الطلب فشلت
+# - الطابور محدود (max_pending حالة): فوقه submit يرجع None والـ API يرد 503
+# - الـ writer ما يمسك الـ GIL طول الوقت: FraudGraph.register_cases يتركه كل
+#   writer_yield_seconds داخل الدفعة، وpause_seconds (اختياري) راحة بين الدفعات لو الطابور كبير
+# - الـ thread يبدأ مع أول حالة (بعد fork الـ gunicorn workers، كل process له writer)
+# - دفعة فشلت (مثلاً OSError من الـ log): حالاتها تنحسب في failed وتنطبع، والطابور يكمل
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+# كم دفعة فاشلة نتذكر عشان status يحسب الفاشل من حالات طلب معين
+MAX_FAILED_RANGES = 1_000
+# كم طلب نتذكر حجمه (ticket -> عدد حالاته) عشان wait / status بدون size
+MAX_TRACKED_REQUESTS = 100_000
+
+
+class CasesFailed(RuntimeError):
+    """حالات طلب خلصت بس دفعتها فشلت (ما انطبقت على الـ graph)."""
+
+    def __init__(self, ticket, failed):
+        super().__init__(f"{failed} cases of ticket {ticket} failed")
+        self.ticket = ticket
+        self.failed = failed
+
+
+class CaseQueue:
+    """
+    apply(cases) -> version الـ graph بعد الدفعة. cases = [(ip, device_id, doc_hash, sequence)].
+    batch_size: أقصى حالات في دفعة وحدة. max_pending: أقصى حالات تنتظر بالطابور.
+    """
+
+    def __init__(self, apply, batch_size=1_000, max_pending=1_000_000, pause_seconds=0.0):
+        self.apply = apply
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.pause_seconds = pause_seconds
+
+        self.accepted = 0        # حالات دخلت الطابور (آخر ticket)
+        self.applied = 0         # حالات خلصت (انطبقت أو فشلت)، بنفس ترتيب الـ tickets
+        self.failed = 0
+        self.batches = 0
+        self.graph_version = 0   # version الـ graph بعد آخر دفعة
+
+        self._pending = deque()
+        self._failed_ranges = deque(maxlen=MAX_FAILED_RANGES)   # (أول ticket قبل الدفعة، آخر ticket فيها)
+        self._sizes = OrderedDict()                              # ticket -> عدد حالات الطلب
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+    def __len__(self):
+        return len(self._pending)
+
+    def submit(self, cases):
+        """نضيف الحالات بالترتيب ونرجّع الـ ticket، أو None لو الطابور ممتلي."""
+        with self._cond:
+            if self._closed or len(self._pending) + len(cases) > self.max_pending:
+                return None
+            self._pending.extend(cases)
+            self.accepted += len(cases)
+            ticket = self.accepted
+            self._sizes[ticket] = len(cases)
+            if len(self._sizes) > MAX_TRACKED_REQUESTS:
+                self._sizes.popitem(last=False)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="case-queue", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        return ticket
+
+    def wait(self, ticket, timeout=None, size=None):
+        """
+        ننتظر لين حالات الـ ticket تخلص: version الـ graph بعدها، أو None لو خلص الوقت.
+        CasesFailed لو حالات منها فشلت. size مثل status.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.applied >= ticket or self._closed, timeout):
+                return None
+            if self.applied < ticket:
+                return None
+            failed = self._failed(ticket, size)
+            if failed:
+                raise CasesFailed(ticket, failed)
+            return self.graph_version
+
+    def status(self, ticket, size=None):
+        """
+        حالة طلب: done لما كل حالاته خلصت، و graph_version وقتها، وكم منها انطبق وكم فشل.
+        size = عدد حالات الطلب (آخرها ticket)؛ بدونه نستخدم حجم الطلب اللي رجع هالـ ticket
+        من submit (لو لسا نتذكره، وإلا بدون applied / failed).
+        """
+        with self._cond:
+            body = {
+                "ticket": ticket,
+                "done": self.applied >= ticket,
+                "graph_version": self.graph_version,
+                "pending": len(self._pending),
+            }
+            size = self._sizes.get(ticket) if size is None else size
+            if size is not None:
+                failed = self._failed(ticket, size)
+                body["applied"] = max(0, min(self.applied, ticket) - (ticket - size)) - failed
+                body["failed"] = failed
+            return body
+
+    def _failed(self, ticket, size):
+        """كم حالة فشلت من الطلب (ticket - size, ticket] (size None = حجمه من submit، وإلا 1)."""
+        if size is None:
+            size = self._sizes.get(ticket, 1)
+        first = ticket - size
+        return sum(max(0, min(end, ticket) - max(start, first)) for start, end in self._failed_ranges)
+
+    def close(self, timeout=None):
+        """نطبق اللي بالطابور ونوقف الـ writer (atexit)."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def _run(self):
+        pending = self._pending
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: pending or self._closed)
+                if not pending:
+                    return
+                batch = [pending.popleft() for _ in range(min(self.batch_size, len(pending)))]
+                more = bool(pending)
+
+            try:
+                version = self.apply(batch)
+                failed = 0
+            except Exception as exc:  # دفعة وحدة فاشلة ما توقف الطابور
+                print(f"[raqeeb] case queue: {len(batch)} cases failed: {exc}")
+                version, failed = None, len(batch)
+
+            with self._cond:
+                if failed:
+                    self._failed_ranges.append((self.applied, self.applied + failed))
+                self.applied += len(batch)
+                self.failed += failed
+                self.batches += 1
+                if version is not None:
+                    self.graph_version = version
+                self._cond.notify_all()
+            if more and self.pause_seconds > 0:
+                time.sleep(self.pause_seconds)
@@ -0,0 +1,407 @@
+# compiled_models.py
+#
+# نحوّل الغابات المدربة من train_model.py (RandomForest + IsolationForest)
+# إلى جداول عقد مسطحة بـ NumPy:
+#   feature / threshold / left / right / value
+# كل الأشجار في جدول واحد، والتنقل فيها لكل الأشجار ولكل الصفوف دفعة وحدة
+# (عمق الشجرة = عدد الخطوات)، بدون validation و dispatch حق sklearn لكل نداء.
+#
+# النتائج مطابقة بالضبط لـ sklearn:
+# - نحوّل X إلى float32 مثل sklearn قبل المقارنة مع الـ thresholds
+# - نجمع قيم الأوراق شجرة بشجرة بنفس الترتيب ونفس العمليات
+#
+# وللشبكة العصبية (MLP) نسوي forward pass بـ NumPy مباشرة بعد ما ندمج
+# الـ StandardScaler في أوزان الطبقة الأولى (FusedMLP).
+#
+# الجداول كلها NumPy arrays بأنواع مضغوطة (to_arrays / from_arrays)، فتنحفظ في
+# model bundle (model_bundle.py) وتنفتح بـ mmap بدون sklearn.
+
+import threading
+
+import numpy as np
+
+
+class CompiledForest:
+    """
+    جدول عقد مسطح لكل أشجار غابة مدربة.
+    الأوراق تشير لنفسها (left = right = نفس العقدة)، فالتنقل بعدد ثابت من
+    الخطوات (max_depth) يوصل كل صف لورقته في كل شجرة بدون شروط.
+    """
+
+    def __init__(self, trees, node_values, feature_maps=None):
+        feature, threshold, left, right, value, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+
+        for t, (tree, values) in enumerate(zip(trees, node_values)):
+            n_nodes = tree.node_count
+            is_leaf = tree.children_left == -1
+            node_ids = np.arange(n_nodes)
+
+            tree_feature = np.where(is_leaf, 0, tree.feature)
+            if feature_maps is not None:
+                tree_feature = np.asarray(feature_maps[t])[tree_feature]
+
+            feature.append(tree_feature)
+            threshold.append(tree.threshold)
+            left.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            right.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            value.append(values)
+            roots.append(offset)
+
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        # الـ thresholds float32: X نفسه float32، فالمقارنة مع أكبر float32 <= الـ threshold
+        # نفس النتيجة بالضبط (وأسرع من float64). قيم الأوراق تبقى float64: مجموعها لازم
+        # يطابق sklearn بالـ bits. الـ indices بـ intp (الـ fancy indexing بـ int32 ينسخ كل مرة)
+        self.feature = np.concatenate(feature).astype(np.intp)
+        self.threshold = _float32_floor(np.concatenate(threshold))
+        self.left = np.concatenate(left).astype(np.intp)
+        self.right = np.concatenate(right).astype(np.intp)
+        self.value = np.concatenate(value).astype(np.float64)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.max_depth = max_depth
+        self.n_trees = len(roots)
+
+    INDEX_FIELDS = ("feature", "left", "right", "roots")
+
+    def to_arrays(self):
+        """المصفوفات بأنواع مضغوطة للتخزين (الـ indices: uint8 / int32 بدل intp)."""
+        feature_dtype = np.uint8 if self.feature.max(initial=0) < 256 else np.int32
+        return {
+            "feature": self.feature.astype(feature_dtype),
+            "threshold": self.threshold,
+            "left": self.left.astype(np.int32),
+            "right": self.right.astype(np.int32),
+            "value": self.value,
+            "roots": self.roots.astype(np.int32),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, max_depth):
+        """عكس to_arrays: الـ thresholds والقيم تنستخدم زي ما هي (mmap)، والـ indices نرجعها intp."""
+        forest = cls.__new__(cls)
+        for name in cls.INDEX_FIELDS:
+            setattr(forest, name, arrays[name].astype(np.intp))
+        forest.threshold = arrays["threshold"]
+        forest.value = arrays["value"]
+        forest.max_depth = max_depth
+        forest.n_trees = len(forest.roots)
+        return forest
+
+    def apply(self, X):
+        """نرجّع مصفوفة (n_trees, n_samples) فيها رقم الورقة (global) لكل صف في كل شجرة."""
+        # sklearn يحوّل X إلى float32 قبل المقارنة، لازم نسوي نفس الشي
+        X = np.asarray(X, dtype=np.float32)
+        n_samples, n_features = X.shape
+        flat_X = X.ravel()
+        row_base = (np.arange(n_samples, dtype=np.intp) * n_features)[None, :]
+
+        nodes = np.repeat(self.roots[:, None], n_samples, axis=1)
+        for _ in range(self.max_depth):
+            go_left = flat_X[row_base + self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def leaf_values_sum(self, X):
+        """مجموع قيم الأوراق عبر الأشجار، شجرة بشجرة بنفس ترتيب sklearn."""
+        leaf_values = self.value[self.apply(X)]
+        total = np.zeros(leaf_values.shape[1])
+        for row in leaf_values:
+            total += row
+        return total
+
+    def grid_values_sum(self, axes, order=None):
+        """
+        نفس leaf_values_sum لكل نقاط شبكة (Cartesian product لقيم axes، قيم كل feature
+        مرتبة تصاعدياً) بدون ما نبني الصفوف: كل عقدة تقسم مدى feature واحد لجزئين
+        متصلين، فكل ورقة = block في الشبكة نضيفه بـ slicing. النتيجة مطابقة بالـ bits
+        لـ leaf_values_sum على نفس الصفوف (نفس ترتيب الجمع).
+        order: ترتيب أبعاد النتيجة (أرقام features)؛ الأبعاد الكبيرة في الآخر أسرع بكثير
+        (blocks متصلة في الذاكرة). axes دايماً بترتيب الـ features.
+        """
+        order = list(range(len(axes))) if order is None else list(order)
+        position = np.empty(len(axes), dtype=np.intp)
+        position[order] = np.arange(len(order))
+        axes = [np.asarray(axes[feature], dtype=np.float32) for feature in order]
+        shape = tuple(len(axis) for axis in axes)
+        total = np.zeros(shape)
+        full = tuple((0, n) for n in shape)
+
+        # كل نقطة تنضاف لها ورقة وحدة من كل شجرة، شجرة ورا شجرة
+        for root in self.roots:
+            stack = [(root, full)]
+            while stack:
+                node, bounds = stack.pop()
+                left, right = self.left[node], self.right[node]
+                if left == node:
+                    total[tuple(slice(lo, hi) for lo, hi in bounds)] += self.value[node]
+                    continue
+                axis = position[self.feature[node]]
+                lo, hi = bounds[axis]
+                split = lo + int(np.searchsorted(axes[axis][lo:hi], self.threshold[node], side="right"))
+                if split > lo:
+                    stack.append((left, bounds[:axis] + ((lo, split),) + bounds[axis + 1:]))
+                if split < hi:
+                    stack.append((right, bounds[:axis] + ((split, hi),) + bounds[axis + 1:]))
+        return total
+
+
+class CompiledRandomForest:
+    """RandomForestClassifier مضغوط: احتمال الكلاس risky (1) فقط."""
+
+    def __init__(self, rf_model):
+        risky_idx = list(rf_model.classes_).index(1)
+        trees = [est.tree_ for est in rf_model.estimators_]
+        self.forest = CompiledForest(
+            trees, [tree.value[:, 0, risky_idx] for tree in trees]
+        )
+
+    def to_arrays(self):
+        return self.forest.to_arrays(), {"max_depth": self.forest.max_depth}
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        model = cls.__new__(cls)
+        model.forest = CompiledForest.from_arrays(arrays, meta["max_depth"])
+        return model
+
+    def predict_proba_risky(self, X):
+        """يطابق rf_model.predict_proba(X)[:, 1]."""
+        return self.forest.leaf_values_sum(X) / self.forest.n_trees
+
+    def predict_proba_risky_grid(self, axes, order=None):
+        """predict_proba_risky لكل نقاط الشبكة (CompiledForest.grid_values_sum)."""
+        return self.forest.grid_values_sum(axes, order) / self.forest.n_trees
+
+
+class CompiledIsolationForest:
+    """
+    IsolationForest مضغوط.
+    قيمة كل ورقة = depth + average_path_length(n_samples) - 1 (نفس sklearn)،
+    ونحسب الـ prediction والـ score من نفس التنقل (بدل predict + decision_function).
+    """
+
+    def __init__(self, iso_model):
+        trees = [est.tree_ for est in iso_model.estimators_]
+        node_values = [
+            decision_path_lengths + average_path_lengths - 1.0
+            for decision_path_lengths, average_path_lengths in zip(
+                iso_model._decision_path_lengths,
+                iso_model._average_path_length_per_tree,
+            )
+        ]
+
+        feature_maps = None
+        if iso_model._max_features != iso_model.n_features_in_:
+            feature_maps = iso_model.estimators_features_
+
+        self.forest = CompiledForest(trees, node_values, feature_maps)
+        self.offset = float(iso_model.offset_)
+        self.denominator = self.forest.n_trees * _average_path_length(
+            iso_model._max_samples
+        )
+
+    def to_arrays(self):
+        meta = {"max_depth": self.forest.max_depth, "offset": self.offset, "denominator": self.denominator}
+        return self.forest.to_arrays(), meta
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        model = cls.__new__(cls)
+        model.forest = CompiledForest.from_arrays(arrays, meta["max_depth"])
+        model.offset = meta["offset"]
+        model.denominator = meta["denominator"]
+        return model
+
+    def predict_with_score(self, X):
+        """نرجّع (iso_pred, iso_score) = (predict(X), decision_function(X)) من تنقل واحد."""
+        return self._from_depths(self.forest.leaf_values_sum(X))
+
+    def predict_with_score_grid(self, axes, order=None):
+        """predict_with_score لكل نقاط الشبكة (CompiledForest.grid_values_sum)."""
+        return self._from_depths(self.forest.grid_values_sum(axes, order))
+
+    def _from_depths(self, depths):
+        if self.denominator != 0:
+            scores = 2 ** (-np.divide(depths, self.denominator))
+        else:
+            scores = 2 ** (-np.ones_like(depths))
+
+        iso_score = -scores - self.offset
+        iso_pred = np.ones_like(iso_score, dtype=int)
+        iso_pred[iso_score < 0] = -1
+        return iso_pred, iso_score
+
+
+# أقصى فرق مسموح بين FusedMLP و nn_model.predict_proba(scaler.transform(X)).
+# الفرق يجي من دمج الـ scaler في الأوزان (ترتيب عمليات مختلف) ومن
+# 1 / (1 + exp(-z)) بدل scipy expit. القرارات تعتمد على int(p * 25) و round(p, 2)
+# و p > 0.5، فما يتأثر إلا لو الاحتمال على الحد بالضبط.
+FUSED_MLP_TOLERANCE = {
+    np.float64: 1e-9,
+    np.float32: 1e-4,
+}
+
+_HIDDEN_ACTIVATIONS = {
+    "relu": lambda z: np.maximum(z, 0, out=z),
+    "tanh": lambda z: np.tanh(z, out=z),
+    "logistic": lambda z: _logistic(z),
+    "identity": lambda z: z,
+}
+
+
+class FusedMLP:
+    """
+    MLPClassifier + StandardScaler في forward pass واحد بـ NumPy:
+      (x - mean) / scale @ W1 + b1  ==  x @ (W1 / scale) + (b1 - (mean / scale) @ W1)
+    فنشيل نداء scaler.transform ونشغّل الطبقات كـ matmuls على buffers جاهزة.
+    """
+
+    def __init__(self, nn_model, scaler=None, dtype=np.float64):
+        if nn_model.out_activation_ != "logistic":
+            raise ValueError(
+                f"FusedMLP supports binary MLPClassifier only (got {nn_model.out_activation_})"
+            )
+
+        mean = scale = None
+        if scaler is not None:
+            n_features = nn_model.coefs_[0].shape[0]
+            mean = scaler.mean_ if scaler.with_mean else np.zeros(n_features)
+            scale = scaler.scale_ if scaler.with_std else np.ones(n_features)
+        self._init_weights(nn_model.coefs_, nn_model.intercepts_, nn_model.activation, mean, scale, dtype)
+
+    def _init_weights(self, coefs, intercepts, activation, mean, scale, dtype):
+        # الأوزان الأصلية (قبل الدمج) - هذي اللي تنحفظ في الـ model bundle
+        self.weights = {
+            "coefs": [np.asarray(w, dtype=np.float64) for w in coefs],
+            "intercepts": [np.asarray(b, dtype=np.float64) for b in intercepts],
+            "mean": None if mean is None else np.asarray(mean, dtype=np.float64),
+            "scale": None if scale is None else np.asarray(scale, dtype=np.float64),
+        }
+        coefs = list(self.weights["coefs"])
+        intercepts = list(self.weights["intercepts"])
+
+        # دمج الـ scaler في الطبقة الأولى (بـ float64 قبل التحويل للـ dtype النهائي)
+        if mean is not None:
+            mean, scale = self.weights["mean"], self.weights["scale"]
+            intercepts[0] = intercepts[0] - (mean / scale) @ coefs[0]
+            coefs[0] = coefs[0] / scale[:, None]
+
+        self.dtype = np.dtype(dtype).type
+        self.coefs = [w.astype(self.dtype) for w in coefs]
+        self.intercepts = [b.astype(self.dtype) for b in intercepts]
+        self.activation = activation
+        self.hidden_activation = _HIDDEN_ACTIVATIONS[activation]
+        self.tolerance = FUSED_MLP_TOLERANCE[self.dtype]
+
+        # buffers جاهزة لكل thread (Flask threaded) حسب عدد الصفوف
+        self._local = threading.local()
+
+    def to_arrays(self):
+        arrays = {}
+        for i, (w, b) in enumerate(zip(self.weights["coefs"], self.weights["intercepts"])):
+            arrays[f"coef{i}"] = w
+            arrays[f"intercept{i}"] = b
+        if self.weights["mean"] is not None:
+            arrays["scaler_mean"] = self.weights["mean"]
+            arrays["scaler_scale"] = self.weights["scale"]
+        meta = {"layers": len(self.coefs), "activation": self.activation, "dtype": np.dtype(self.dtype).name}
+        return arrays, meta
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        model = cls.__new__(cls)
+        layers = range(meta["layers"])
+        model._init_weights(
+            [arrays[f"coef{i}"] for i in layers],
+            [arrays[f"intercept{i}"] for i in layers],
+            meta["activation"],
+            arrays.get("scaler_mean"),
+            arrays.get("scaler_scale"),
+            meta["dtype"],
+        )
+        return model
+
+    def _buffers(self, n_samples):
+        cache = getattr(self._local, "buffers", None)
+        if cache is None:
+            cache = self._local.buffers = {}
+        buffers = cache.get(n_samples)
+        if buffers is None:
+            buffers = [np.empty((n_samples, w.shape[1]), dtype=self.dtype) for w in self.coefs]
+            # نحتفظ بـ buffers للأحجام الصغيرة بس (طلب فردي / micro-batch)
+            if n_samples <= 64:
+                cache[n_samples] = buffers
+        return buffers
+
+    def predict_proba_risky(self, X):
+        """يطابق nn_model.predict_proba(scaler.transform(X))[:, 1] ضمن self.tolerance."""
+        activation = np.asarray(X, dtype=self.dtype)
+        buffers = self._buffers(activation.shape[0])
+        last = len(self.coefs) - 1
+
+        for i, (w, b, out) in enumerate(zip(self.coefs, self.intercepts, buffers)):
+            np.dot(activation, w, out=out)
+            out += b
+            if i != last:
+                self.hidden_activation(out)
+            activation = out
+
+        return _logistic(activation[:, 0].astype(np.float64))
+
+
+def self_check_rows(n=512, seed=0):
+    """صفوف عشوائية بنفس نطاقات train_model.py للتحقق من المسارات السريعة (والـ warm-up)."""
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.integers(0, 2, n),
+        rng.uniform(0, 2500, n),
+        rng.integers(0, 24, n),
+        rng.integers(0, 25, n),
+        rng.integers(0, 2, n),
+        rng.integers(0, 13, n),
+        rng.integers(0, 5, n),
+        rng.integers(0, 2, n),
+    ]).astype(float)
+
+
+def check_fused_mlp(fused, nn_model, scaler, X):
+    """
+    self-check: نقارن FusedMLP مع مسار sklearn (scaler + predict_proba) على X.
+    نرجّع (ok, max_abs_diff).
+    """
+    expected = nn_model.predict_proba(scaler.transform(X))[:, 1]
+    actual = fused.predict_proba_risky(X)
+    max_diff = float(np.max(np.abs(expected - actual))) if len(X) else 0.0
+    return max_diff <= fused.tolerance, max_diff
+
+
+def _float32_floor(values):
+    """أكبر float32 <= كل قيمة (astype يقرّب للأقرب، وممكن يطلع أكبر من الـ threshold)."""
+    rounded = values.astype(np.float32)
+    above = rounded > values
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+
+def _logistic(z):
+    """sigmoid in-place (نفس scipy expit بدون الاعتماد على scipy)."""
+    np.negative(z, out=z)
+    with np.errstate(over="ignore"):  # exp(كبير) = inf -> 1 / inf = 0 صح
+        np.exp(z, out=z)
+    z += 1.0
+    np.reciprocal(z, out=z)
+    return z
+
+
+def _average_path_length(n_samples):
+    """average path length لشجرة عزل فيها n_samples (نفس معادلة sklearn)."""
+    if n_samples <= 1:
+        return 0.0
+    if n_samples == 2:
+        return 1.0
+    # نحسبها على array بعنصر واحد مثل sklearn عشان نطابق نفس الـ bits
+    n = np.array([n_samples], dtype=np.float64)
+    return float((2.0 * (np.log(n - 1.0) + np.euler_gamma) - 2.0 * (n - 1.0) / n)[0])
@@ -0,0 +1,903 @@
+# fraud_graph.py
+#
+# الـ Fraud Graph (Asset-Centric) بشكل مضغوط ومحدود الذاكرة:
+# - كل asset (ip / device_id / doc_hash) = AssetRecord بـ __slots__
+# - العلاقات بين الـ assets = dict واحد لكل asset: key -> bitmask أنواع
+#   (set-backed: عضوية O(1) + ترتيب الإضافة، وبدون dict منفصل لكل نوع)
+# - سيكوانسات الاحتيال = SequenceIndex (dedup + ring buffer محدود) فوق
+#   SequencePool مشترك: كل سيكوانس مميز يتخزن مرة وحدة في الـ graph كله،
+#   كـ bytes من أرقام القاموس المشترك (actions.py)
+# - aging: الـ assets اللي ما انضافت لها حالة احتيال من فترة (TTL) تنشال
+# - LRU: لو تجاوزنا max_assets أو memory budget نشيل الأقدم تحديثاً
+# - version: رقم يزيد مع كل تغيير (الـ lsn لو فيه GraphStore)، وكل record يحفظ
+#   آخر version تغير فيه + سجل محدود للـ assets المحذوفة -> changes_since(v)
+#   يرجّع اللي تغير بس (الـ LRU مرتب حسب التحديث فنوقف عند أول record أقدم)
+# - clusters (حلقات الاحتيال): union-find على الـ records نفسها (parent + حجم
+#   ومجموع fraud_count في الـ root)، يتحدث مع كل حالة. الحذف ما يقسم cluster:
+#   الـ record المحذوف يبقى "شبح" في السلسلة لين نعيد البناء (لما يكثرون).
+#   الـ root = parent None (مو نفسه): ما فيه reference cycles في الـ graph، فالمحذوف
+#   ينمسح بالـ refcount حتى لو انتقل لـ gc.freeze() (app.py)
+# - ring_hops: أقرب مسافة (بعدد الروابط، لحد ring_max_hops) لـ asset متكرر
+#   (fraud_count >= RING_HUB_FRAUD). الحالة تنقصها بس -> BFS محدود وقتها، والحذف
+#   يعيد حسابها للجيران اللي ممكن كانوا يوصلون للمركز عبر المحذوف (لحد ring_max_hops).
+#   الطلب يقراها O(1) بدل traversal
+# - القراءة بدون lock (RCU): /evaluate يقرا GraphView (fraud_graph.view) = الـ graph
+#   زي ما كان وقت نشرها، ما تتغير وهو يتعدل. الـ writer يعدل الـ records تحت الـ lock
+#   ويعلّم اللي تغير، وبعد كل حالة كاملة (أو كل VIEW_PUBLISH_SECONDS في الدفعات) يكتب
+#   لكل asset / cluster تغير نسخة ثابتة جديدة (tuple) برقم epoch فوق اللي قبلها
+#   (سلسلة: الأحدث أول)، وينشر GraphView جديدة (epoch + نفس الجداول) بتبديل مرجع واحد.
+#   الـ view تشوف بس النسخ اللي epoch حقها <= حقها، فكل حالة تبان كاملة أو ما تبان.
+#   النسخ القديمة تنقص من السلسلة (والسيكوانسات تنمسح من الـ pool) لما تموت كل
+#   view ممكن تحتاجها. ليش مو نسخ shards (copy-on-write): نسخ dict في CPython يلمس
+#   refcount كل عنصر فيه، وقسناه أبطأ من الـ writer نفسه بمرتين. وليش tuples مو
+#   objects: tuple كل اللي فيه أرقام / bytes / tuples يطلعه الـ GC من المتابعة، فملايين
+#   النسخ ما تزيد وقت الـ collections
+
+import threading
+import time
+import weakref
+from collections import Counter, OrderedDict, deque
+from typing import NamedTuple
+
+from actions import vocabulary
+from sequence_index import SequenceIndex, SequencePool, best_similarity
+
+ASSET_KINDS = ("ip", "device_id", "doc_hash")
+KIND_BITS = {"ip": 1, "device_id": 2, "doc_hash": 4}
+# bitmask -> الأنواع اللي فيه (للمرور على روابط asset بدون فحص كل نوع)
+KINDS_OF_BITS = [
+    tuple(kind for kind in ASSET_KINDS if bits & KIND_BITS[kind]) for bits in range(8)
+]
+
+# تقدير تقريبي للذاكرة (bytes) - يكفي لإدارة الـ budget بدون sys.getsizeof لكل شي
+ASSET_BASE_BYTES = 680        # AssetRecord + SequenceIndex + مفتاح + مدخل في الـ dicts + نسخته في الـ view
+RELATION_BYTES = 48           # مدخل في related (من الطرفين يتحسب مرتين)
+SEQUENCE_REF_BYTES = 8        # رقم السيكوانس في array('I') الـ asset + في نسخته المنشورة
+
+# كم حذف / دمج clusters نتذكر لـ changes_since (أقدم من كذا = نرجع الـ graph كامل)
+MAX_CHANGE_HISTORY = 50_000
+
+RING_HUB_FRAUD = 3            # asset بهالعدد من الحالات = مركز حلقة احتيال
+RING_MIN_ASSETS = 4           # أصغر cluster نعتبره حلقة احتيال
+NO_RING_HOPS = 255            # ring_hops لـ asset بعيد عن أي مركز
+CLUSTER_REBUILD_MIN = 1_000   # ما نعيد بناء الـ clusters عشان عدد أشباح أقل من كذا
+WRITER_YIELD_SECONDS = 0.0001 # register_cases يترك الـ GIL كل كذا (الافتراضي)
+VIEW_PUBLISH_SECONDS = 0.001  # register_cases (دفعات) ينشر view جديدة كل كذا على الأقل
+FULL_PUBLISH_RATIO = 8        # دفعة حالاتها × كذا >= عدد الـ assets: نشر كامل وحدة في آخرها
+
+
+class ClusterInfo(NamedTuple):
+    id: int
+    size: int           # عدد الـ assets الموجودة في الـ cluster
+    fraud_count: int    # مجموع fraud_count لهذي الـ assets
+
+
+class AssetRecord:
+    """asset واحد شارك في حالات احتيال مؤكدة."""
+
+    __slots__ = (
+        "fraud_count", "sequence_index", "sequence_total", "links", "last_seen", "version",
+        "parent", "cluster_id", "cluster_size", "cluster_fraud", "ring_hops",
+    )
+
+    def __init__(self, pool, max_sequences):
+        self.fraud_count = 0
+        self.sequence_index = SequenceIndex(capacity=max_sequences, pool=pool)
+        self.sequence_total = 0   # عدد السيكوانسات المسجلة (قبل الـ dedup) للعرض
+        self.links = {}           # key المرتبط -> bitmask من KIND_BITS
+        self.last_seen = 0.0
+        self.version = 0          # version الـ graph وقت آخر حالة على هذا الـ asset
+        self.parent = None        # union-find: None = root (cluster لوحده)
+        self.cluster_id = 0
+        self.cluster_size = 1
+        self.cluster_fraud = 0
+        self.ring_hops = NO_RING_HOPS
+
+    @classmethod
+    def restore(cls, sequence_index, fraud_count, sequence_total, last_seen, links):
+        """record جاهز من snapshot (graph_store) بدون المرور على register_case."""
+        record = cls.__new__(cls)
+        record.fraud_count = fraud_count
+        record.sequence_index = sequence_index
+        record.sequence_total = sequence_total
+        record.links = links
+        record.last_seen = last_seen
+        record.version = 0
+        record._reset_cluster(0)
+        return record
+
+    def _reset_cluster(self, cluster_id):
+        """cluster لوحده (union-find): root بدون parent."""
+        self.parent = None
+        self.cluster_id = cluster_id
+        self.cluster_size = 1
+        self.cluster_fraud = self.fraud_count
+        self.ring_hops = 0 if self.fraud_count >= RING_HUB_FRAUD else NO_RING_HOPS
+
+    def related(self, kind):
+        """الـ assets من نوع kind المرتبطة بهذا الـ asset (بترتيب الإضافة)."""
+        bit = KIND_BITS[kind]
+        return [key for key, bits in self.links.items() if bits & bit]
+
+    @property
+    def last_sequences(self):
+        """السيكوانسات المخزنة (مميزة، من الأقدم للأحدث)."""
+        return [list(seq) for seq in self.sequence_index]
+
+    def approx_bytes(self):
+        return (
+            ASSET_BASE_BYTES
+            + len(self.links) * RELATION_BYTES
+            + len(self.sequence_index) * SEQUENCE_REF_BYTES
+        )
+
+
+class AssetView:
+    """اللي يحتاجه /evaluate من AssetRecord كما نشرته الـ view (GraphView.get)."""
+
+    __slots__ = ("fraud_count", "sequence_ids", "ring_hops", "cluster_id", "last_seen", "pool")
+
+    def __init__(self, entry, pool):
+        _, _, self.fraud_count, self.sequence_ids, self.ring_hops, self.cluster_id, self.last_seen = entry
+        self.pool = pool
+
+    def best_similarity(self, codes, threshold=0.6, matcher=None):
+        """أعلى تشابه بين الجلسة والسيكوانسات المخزنة (sequence_index.best_similarity)."""
+        return best_similarity(self.pool, self.sequence_ids, codes, threshold, matcher)
+
+
+def _asset_entry(record, epoch, previous):
+    """
+    نسخة asset في سلسلة: (epoch، previous، fraud_count، sequence_ids (uint32 bytes من
+    الأقدم)، ring_hops، cluster_id، last_seen). cluster_id ممكن يندمج بعدين: الـ view تتبعه.
+    """
+    return (
+        epoch, previous, record.fraud_count, record.sequence_index.ids.tobytes(),
+        record.ring_hops, _find(record).cluster_id, record.last_seen,
+    )
+
+
+# نسخة انشال فيها الـ asset: (epoch، previous). نسخة cluster: (epoch، previous، value)،
+# value = (id، size، fraud_count) أو id الـ cluster اللي انضم له أو None (id ما عاد مستخدم)
+_REMOVED = 2
+
+
+class GraphView:
+    """
+    الـ graph زي ما كان وقت نشر epoch (FraudGraph.view)، للقراءة بدون lock. الطلب ياخذها
+    مرة وحدة ويقرا منها كل شي، فيشوف كل حالة كاملة أو ما يشوفها.
+    assets[kind] / clusters: key -> أحدث نسخة (الجداول نفسها مشتركة بين كل الـ views)
+    """
+
+    __slots__ = (
+        "version", "epoch", "assets", "clusters", "pool", "ttl", "clock", "ring_max_hops", "__weakref__",
+    )
+
+    def __init__(self, version, epoch, assets, clusters, pool, ttl, clock, ring_max_hops):
+        self.version = version
+        self.epoch = epoch
+        self.assets = assets
+        self.clusters = clusters
+        self.pool = pool
+        self.ttl = ttl
+        self.clock = clock
+        self.ring_max_hops = ring_max_hops
+
+    def get(self, kind, key):
+        """AssetView أو None (لو مو موجود أو انتهى الـ TTL حقه)."""
+        if not key:
+            return None
+        entry = _at(self.assets[kind].get(key), self.epoch)
+        if entry is None or len(entry) == _REMOVED:
+            return None
+        if self.ttl is not None and self.clock() - entry[6] > self.ttl:
+            return None
+        return AssetView(entry, self.pool)
+
+    def contains(self, kind, key):
+        entry = _at(self.assets[kind].get(key), self.epoch)
+        return entry is not None and len(entry) != _REMOVED
+
+    def cluster(self, info):
+        """ClusterInfo للـ cluster حق info (نتبع الـ clusters اللي اندمجت بعد نشره)."""
+        value = info.cluster_id
+        while isinstance(value, int):
+            value = _at(self.clusters[value], self.epoch)[2]
+        return ClusterInfo(*value)
+
+    def nearest_ring(self, assets):
+        """
+        أقرب حلقة احتيال لـ assets (AssetViews الموجودة في طلب واحد):
+        (ring_hops، ClusterInfo) أو None لو ما فيه مركز خلال ring_max_hops
+        أو الـ cluster أصغر من RING_MIN_ASSETS (أو ما بقى فيه احتيال يكفي لمركز). O(عدد الـ assets).
+        """
+        best = None
+        for info in assets:
+            if info.ring_hops <= self.ring_max_hops and (
+                best is None or info.ring_hops < best.ring_hops
+            ):
+                best = info
+        if best is None:
+            return None
+        cluster = self.cluster(best)
+        if cluster.size < RING_MIN_ASSETS or cluster.fraud_count < RING_HUB_FRAUD:
+            return None
+        return best.ring_hops, cluster
+
+    def items(self, kind):
+        """(key, AssetView) لكل asset من نوع kind في هالـ view (بدون TTL). O(الجدول)."""
+        epoch = self.epoch
+        pool = self.pool
+        # list() نسخة بدون ما نترك الـ GIL: الـ writer ممكن يضيف للجدول وحنا نمشي عليه
+        for key, head in list(self.assets[kind].items()):
+            entry = _at(head, epoch)
+            if entry is not None and len(entry) != _REMOVED:
+                yield key, AssetView(entry, pool)
+
+    def sequence_length_counts(self):
+        """{kind: {عدد السيكوانسات المخزنة على الـ asset: عدد الـ assets}}."""
+        return {
+            kind: Counter(len(info.sequence_ids) // 4 for _, info in self.items(kind))
+            for kind in self.assets
+        }
+
+
+class FraudGraph:
+    """
+    assets[kind][key] -> AssetRecord
+    max_sequences_per_asset: حجم الـ ring buffer للسيكوانسات المميزة لكل asset
+    asset_ttl_seconds: asset ما انضاف له احتيال خلال هالمدة ينشال (None = بدون aging)
+    max_assets / memory_budget_bytes: حدود كلية، نشيل الأقدم تحديثاً (LRU) لما نتجاوزها
+    ring_max_hops: أبعد مسافة (روابط) من مركز حلقة احتيال نتتبعها في ring_hops
+    writer_yield_seconds: register_cases (دفعات) يترك الـ GIL كل هالمدة لـ /evaluate
+    view: آخر GraphView منشورة - القراءة منها بدون lock، وكل شي ثاني للـ writer تحت الـ lock
+    """
+
+    def __init__(
+        self,
+        max_sequences_per_asset=256,
+        asset_ttl_seconds=None,
+        max_assets=None,
+        memory_budget_bytes=None,
+        clock=time.time,
+        ring_max_hops=2,
+        writer_yield_seconds=WRITER_YIELD_SECONDS,
+    ):
+        self.max_sequences_per_asset = max_sequences_per_asset
+        self.asset_ttl_seconds = asset_ttl_seconds
+        self.max_assets = max_assets
+        self.memory_budget_bytes = memory_budget_bytes
+        self.clock = clock
+        self.ring_max_hops = ring_max_hops
+        self.writer_yield_seconds = writer_yield_seconds
+
+        # لكل نوع OrderedDict مرتب من الأقدم تحديثاً للأحدث (LRU / aging)
+        self.assets = {kind: OrderedDict() for kind in ASSET_KINDS}
+        self.sequence_pool = SequencePool()
+        self.sequence_pool.deferred = True   # الـ views ممكن تشير لسيكوانس انشال
+        self._records_bytes = 0
+        self.evicted_assets = 0
+        self.fraud_totals = {kind: 0 for kind in ASSET_KINDS}   # مجموع fraud_count لكل نوع
+
+        self.version = 0
+        self._changes_floor = 0          # أقدم version نقدر نرجّع التغييرات من بعده
+        self._removed = deque()          # (version, kind, key, root وقت الحذف)
+        self._merged = deque()           # (version, cluster id اللي انضم، cluster id الباقي)
+        self._next_cluster_id = 0
+        self._cluster_ghosts = 0         # records محذوفة باقية في سلاسل الـ union-find
+        self._lock = threading.Lock()
+
+        # اللي تغير من آخر نشر: keys لكل نوع، cluster id -> record منه (None = انشال)
+        self._dirty = {kind: set() for kind in ASSET_KINDS}
+        self._dirty_clusters = {}
+        self._full_publish = False       # ids الـ clusters تغيرت كلها: ننشر كل شي من جديد
+        self._published_at = 0.0
+        # الجداول اللي تقراها الـ views: key -> سلسلة نسخ (الأحدث أول)
+        self._view_assets = {kind: {} for kind in ASSET_KINDS}
+        self._view_clusters = {}
+        self._live_views = deque()       # (weakref للـ view، epoch) بترتيب النشر
+        self._trim_queue = deque()       # (epoch، الجدول، key) لكل نسخة انكتبت فوق نسخة قبلها
+        self.view = GraphView(
+            0, 0, self._view_assets, self._view_clusters, self.sequence_pool,
+            asset_ttl_seconds, clock, ring_max_hops,
+        )
+
+    def __len__(self):
+        return sum(len(records) for records in self.assets.values())
+
+    @property
+    def approx_bytes(self):
+        """تقدير ذاكرة الـ graph: الـ records + الـ sequence pool المشترك."""
+        return self._records_bytes + self.sequence_pool.approx_bytes()
+
+    def get(self, kind, key):
+        """AssetView من الـ view المنشورة أو None (طلب فيه أكثر من قراءة ياخذ view مرة وحدة)."""
+        return self.view.get(kind, key)
+
+    def cluster(self, record):
+        """ClusterInfo للـ cluster حق record (الـ records الحية، للـ writer والفحوصات)."""
+        root = record
+        while root.parent is not None:
+            root = root.parent
+        return ClusterInfo(root.cluster_id, root.cluster_size, root.cluster_fraud)
+
+    def register_case(
+        self, ip=None, device_id=None, doc_hash=None, sequence=None, now=None, version=None
+    ):
+        """
+        نسجل حالة احتيال مؤكدة: نزيد fraud_count لكل asset، نضيف السيكوانس
+        (أسماء normalized، تدخل القاموس المشترك) ونربط الـ assets ببعض (ونفس الـ cluster).
+        now: وقت الحالة (replay من الـ log يمرر الوقت الأصلي)، الافتراضي clock().
+        version: version الـ graph بعد الحالة (GraphStore يمرر الـ lsn)، الافتراضي +1.
+        """
+        self.register_cases([(ip, device_id, doc_hash, sequence)], now=now, version=version)
+
+    def register_cases(self, cases, now=None, version=None, timestamps=None, yield_seconds=None):
+        """
+        دفعة حالات [(ip, device_id, doc_hash, sequence)] بنفس ترتيبها (الـ encode قبلها).
+        version: version الـ graph بعد أول حالة، والباقي +1 لكل حالة.
+        timestamps: وقت كل حالة (replay من الـ log) بدل now.
+        yield_seconds: بدل writer_yield_seconds (None = هو، inf = ما نترك الـ GIL).
+        الـ view تنتشر بين حالتين (كل VIEW_PUBLISH_SECONDS وفي الآخر)، مو وسط حالة.
+        """
+        encode = vocabulary.encode
+        # bytes وحدة مشتركة بين الـ assets الثلاثة لنفس الحالة
+        cases = [
+            (ip, device_id, doc_hash, encode(sequence, intern=True).tobytes() if sequence else None)
+            for ip, device_id, doc_hash, sequence in cases
+        ]
+        if now is None:
+            now = self.clock()
+
+        # كل writer_yield_seconds نترك الـ GIL: /evaluate (يقرا بدون الـ lock) يرجع من كل
+        # استدعاء numpy ويلقى الـ GIL عند الـ writer، وبدون كذا ينتظر switch interval كامل (5ms).
+        # أقل = p99 أحسن لـ /evaluate وتأكيد أبطأ
+        clock = time.perf_counter
+        budget = self.writer_yield_seconds if yield_seconds is None else yield_seconds
+        last = len(cases) - 1
+        # دفعة كبيرة على graph أصغر منها (replay الـ log وقت الإقلاع): كتابة الجداول كلها
+        # مرة وحدة في الآخر أرخص من نسخة لكل تغيير، والـ view تبقى على اللي قبل الدفعة
+        rewrite = len(cases) * FULL_PUBLISH_RATIO >= len(self)
+        held = clock()
+        for i, (ip, device_id, doc_hash, sequence) in enumerate(cases):
+            if clock() - held >= budget:
+                time.sleep(0)
+                held = clock()
+            with self._lock:
+                self._register(
+                    ip, device_id, doc_hash, sequence,
+                    now if timestamps is None else timestamps[i],
+                    None if version is None else version + i,
+                )
+                if i == last:
+                    self._full_publish |= rewrite
+                    self._publish()
+                elif not rewrite and clock() - self._published_at >= VIEW_PUBLISH_SECONDS:
+                    self._publish()
+
+    def _register(self, ip, device_id, doc_hash, sequence, now, version):
+        """حالة وحدة (sequence = bytes جاهزة). لازم self._lock."""
+        case = {"ip": ip, "device_id": device_id, "doc_hash": doc_hash}
+        self.version = self.version + 1 if version is None else max(version, self.version + 1)
+        self._evict_expired(now)
+        case_records = []
+        hubs = []
+        nearest = NO_RING_HOPS
+        first_new_cluster = self._next_cluster_id
+
+        for kind in ASSET_KINDS:
+            key = case[kind]
+            if not key:
+                continue
+
+            records = self.assets[kind]
+            record = records.get(key)
+            if record is None:
+                record = AssetRecord(self.sequence_pool, self.max_sequences_per_asset)
+                record.cluster_id = self._next_cluster_id
+                self._next_cluster_id += 1
+                records[key] = record
+                before = 0
+            else:
+                before = record.approx_bytes()
+                records.move_to_end(key)
+
+            record.fraud_count += 1
+            record.last_seen = now
+            record.version = self.version
+            self.fraud_totals[kind] += 1
+            self._dirty[kind].add(key)
+            if record.fraud_count == RING_HUB_FRAUD:
+                record.ring_hops = 0
+                hubs.append(record)
+            if record.ring_hops < nearest:
+                nearest = record.ring_hops
+            case_records.append(record)
+            if sequence:
+                record.sequence_total += 1
+                record.sequence_index.add(sequence)
+            for other, other_key in case.items():
+                if other != kind and other_key:
+                    record.links[other_key] = record.links.get(other_key, 0) | KIND_BITS[other]
+
+            self._records_bytes += record.approx_bytes() - before
+
+        if case_records:
+            root = _find(case_records[0])
+            for record in case_records[1:]:
+                other = _find(record)
+                if other is not root:
+                    root, absorbed = _merge_roots(root, other)
+                    # asset جديد من هالحالة: ما أحد شاف الـ id حقه، ما يحتاج سجل
+                    if absorbed < first_new_cluster:
+                        self._remember(self._merged, (self.version, absorbed, root.cluster_id))
+                        self._dirty_clusters[absorbed] = root
+            root.cluster_fraud += len(case_records)
+            self._dirty_clusters[root.cluster_id] = root
+        if hubs or nearest < self.ring_max_hops:   # الغالب: الحالة بعيدة عن أي مركز
+            self._relax_ring_hops(case_records, hubs, nearest)
+
+        self._enforce_limits()
+        if self._cluster_ghosts > CLUSTER_REBUILD_MIN:
+            self._maybe_rebuild_clusters()
+
+    def install(self, assets, sequence_pool, records_bytes=None, version=0, clusters=None):
+        """
+        نستبدل محتوى الـ graph بـ records جاهزة (تحميل snapshot) ثم نطبق
+        الـ TTL والحدود الحالية (ممكن تكون تغيرت من وقت الـ snapshot).
+        assets: {kind: OrderedDict key -> AssetRecord} من الأقدم تحديثاً للأحدث.
+        records_bytes: مجموع approx_bytes للـ records لو محسوب مسبقاً.
+        version: version الـ graph المحمّل (lsn الـ snapshot). التغييرات قبله
+        ما نعرفها: changes_since لأي version أقدم يرجّع الـ graph كامل.
+        clusters: (cluster ids، ring_hops) لكل نوع + (next_cluster_id، الأشباح) من
+        الـ snapshot عشان نفس الـ ids في كل process. None = نبنيها من الروابط.
+        """
+        with self._lock:
+            # نعدل نفس الـ dict الخارجي (ممكن أحد ماسك graph.assets)
+            for kind in ASSET_KINDS:
+                self.assets[kind] = assets.get(kind) or OrderedDict()
+                self.fraud_totals[kind] = sum(r.fraud_count for r in self.assets[kind].values())
+            self.sequence_pool = sequence_pool
+            sequence_pool.deferred = True
+            self.version = self._changes_floor = version
+            self._removed.clear()
+            if clusters is None:
+                self._rebuild_clusters()
+            else:
+                self._restore_clusters(*clusters)
+            if records_bytes is None:
+                records_bytes = sum(
+                    record.approx_bytes()
+                    for records in self.assets.values()
+                    for record in records.values()
+                )
+            self._records_bytes = records_bytes
+            self._evict_expired(self.clock())
+            self._enforce_limits()
+            self._maybe_rebuild_clusters()
+            self._full_publish = True
+            self._publish()
+
+    def evict_expired(self):
+        """نشيل كل الـ assets اللي انتهى الـ TTL حقها (للاستدعاء الدوري)."""
+        with self._lock:
+            evicted = self.evicted_assets
+            self.version += 1
+            self._evict_expired(self.clock())
+            if self.evicted_assets == evicted:
+                self.version -= 1   # ما تغير شي
+            self._maybe_rebuild_clusters()
+            self._publish()
+
+    def sequence_length_counts(self):
+        """
+        {kind: {عدد السيكوانسات المخزنة على الـ asset: عدد الـ assets}} من الـ view
+        (للـ /metrics، بدون lock). O(عدد الـ assets) فالـ caller يحفظ النتيجة مع الـ version.
+        """
+        return self.view.sequence_length_counts()
+
+    def changes_since(self, version=None):
+        """
+        اللي تغير في الـ graph بعد version (None = كل الـ graph):
+          {"version", "full",
+           "assets": {kind: [(key, fraud_count, sequence_total, links, cluster_id)]},
+           "removed": [(kind, key)], "merged": [(cluster id القديم، الجديد)],
+           "clusters": {cluster_id: ClusterInfo} للـ clusters اللي تخص اللي فوق}
+        full=True لو version أقدم من اللي نتذكره، أو أحدث من version الـ graph (من process
+        ثاني أو قبل restart، ما نعرف وش عنده)، أو None -> assets = كل الـ graph.
+        الأرقام والـ links نسخة تحت الـ lock (الـ caller يبني الرد بدون lock)، و "view"
+        = GraphView بنفس الـ version (مين موجود وقتها).
+        """
+        with self._lock:
+            self._publish()
+            full = version is None or not self._changes_floor <= version <= self.version
+            clusters = {}
+
+            def cluster_id(record):
+                root = _find(record)
+                if root.cluster_id not in clusters:
+                    clusters[root.cluster_id] = ClusterInfo(
+                        root.cluster_id, root.cluster_size, root.cluster_fraud
+                    )
+                return root.cluster_id
+
+            changed = {}
+            for kind, records in self.assets.items():
+                if full:
+                    items = records.items()
+                else:
+                    # records مرتبة حسب آخر تحديث: اللي تغير بعد version كلها في الآخر
+                    items = []
+                    for key in reversed(records):
+                        record = records[key]
+                        if record.version <= version:
+                            break
+                        items.append((key, record))
+                    items.reverse()
+                changed[kind] = [
+                    (key, r.fraud_count, r.sequence_total, dict(r.links), cluster_id(r))
+                    for key, r in items
+                ]
+
+            removed = []
+            merged = []
+            if not full:
+                for removed_version, kind, key, root in reversed(self._removed):
+                    if removed_version <= version:
+                        break
+                    # حتى لو رجع بعدين: روابطه القديمة راحت، والجديد موجود في assets
+                    removed.append((kind, key))
+                    cluster_id(root)   # حجم الـ cluster اللي كان فيه نقص
+                removed.reverse()
+                for merged_version, old, new in reversed(self._merged):
+                    if merged_version <= version:
+                        break
+                    merged.append((old, new))
+                merged.reverse()
+            return {
+                "version": self.version,
+                "full": full,
+                "assets": changed,
+                "removed": removed,
+                "merged": merged,
+                "clusters": clusters,
+                "counts": {kind: len(records) for kind, records in self.assets.items()},
+                "totals": dict(self.fraud_totals),
+                "view": self.view,
+            }
+
+    def _remember(self, history, entry):
+        """سجل محدود لـ changes_since: لو نسينا شي، أي version قبله يرجع full."""
+        history.append(entry)
+        if len(history) > MAX_CHANGE_HISTORY:
+            self._changes_floor = max(self._changes_floor, history.popleft()[0])
+
+    def _relax_ring_hops(self, case_records, hubs, nearest=NO_RING_HOPS):
+        """
+        ring_hops بعد حالة: مراكز جديدة (hubs = 0) وروابط جديدة بين case_records
+        (nearest = أصغر ring_hops بينها).
+        القيم تنقص بس وبحد ring_max_hops، فكل record ينفحص جيرانه مرات قليلة
+        على طول عمره (BFS محدود، مو traversal لكل حالة).
+        """
+        limit = self.ring_max_hops
+        queue = deque(hubs)
+        # assets نفس الحالة صارت على بعد رابط واحد من بعض
+        for record in case_records:
+            if nearest + 1 < record.ring_hops:
+                record.ring_hops = nearest + 1
+                queue.append(record)
+        assets = self.assets
+        while queue:
+            record = queue.popleft()
+            hops = record.ring_hops + 1
+            if hops > limit:
+                continue
+            for key, bits in record.links.items():
+                for kind in KINDS_OF_BITS[bits]:
+                    other = assets[kind].get(key)
+                    if other is not None and hops < other.ring_hops:
+                        other.ring_hops = hops
+                        self._dirty[kind].add(key)
+                        queue.append(other)
+
+    def _maybe_rebuild_clusters(self):
+        if self._cluster_ghosts > max(CLUSTER_REBUILD_MIN, len(self) // 2):
+            self._rebuild_clusters()
+
+    def _restore_clusters(self, cluster_ids, ring_hops, next_cluster_id, ghosts):
+        """clusters محفوظة: أول record بكل id يصير الـ root والباقي تحته مباشرة."""
+        roots = {}
+        for kind, records in self.assets.items():
+            for record, cluster_id, hops in zip(records.values(), cluster_ids[kind], ring_hops[kind]):
+                record.ring_hops = hops
+                root = roots.get(cluster_id)
+                if root is None:
+                    record.cluster_id = cluster_id
+                    roots[cluster_id] = record
+                else:
+                    record.parent = root
+                    root.cluster_size += 1
+                    root.cluster_fraud += record.fraud_count
+        self._next_cluster_id = next_cluster_id
+        self._cluster_ghosts = ghosts
+        self._merged.clear()
+
+    def _rebuild_clusters(self):
+        """
+        الـ clusters و ring_hops من الصفر من الروابط (snapshot أو أشباح كثير).
+        الـ cluster ids تتغير: changes_since لأي version قبل الحين يرجع full.
+        """
+        next_id = 0
+        for records in self.assets.values():
+            for record in records.values():
+                record._reset_cluster(next_id)
+                next_id += 1
+        self._next_cluster_id = next_id
+
+        hubs = []
+        for i, (kind, records) in enumerate(self.assets.items()):
+            # الروابط متماثلة: كل رابط مرة وحدة (للأنواع اللي بعد kind)
+            later = [(KIND_BITS[other], self.assets[other]) for other in ASSET_KINDS[i + 1:]]
+            for record in records.values():
+                if record.ring_hops == 0:
+                    hubs.append(record)
+                for key, bits in record.links.items():
+                    for bit, other_records in later:
+                        if bits & bit:
+                            other = other_records.get(key)
+                            if other is not None:
+                                _union(record, other)
+        self._relax_ring_hops((), hubs)   # كل الـ records بدون روابط جديدة
+
+        self._cluster_ghosts = 0
+        self._removed.clear()
+        self._merged.clear()
+        self._changes_floor = self.version
+        self._full_publish = True
+
+    def _publish(self):
+        """
+        ننشر view فيها كل اللي تغير من آخر نشر (لازم self._lock، وبين حالتين بس):
+        نسخة جديدة بـ epoch جديد لكل asset / cluster تغير، ثم تبديل self.view.
+        O(اللي تغير) مو O(الـ graph)، إلا بعد install / إعادة بناء الـ clusters.
+        """
+        old = self.view
+        dirty = self._dirty
+        if self._full_publish:
+            self._rewrite_tables(old.epoch + 1)
+        elif self.version == old.version and not self._dirty_clusters and not any(dirty.values()):
+            return
+        epoch = old.epoch + 1
+        pool = self.sequence_pool
+        queue = self._trim_queue
+
+        for kind, keys in dirty.items():
+            records = self.assets[kind]
+            table = self._view_assets[kind]
+            for key in keys:
+                head = table.get(key)
+                record = records.get(key)
+                if record is not None:
+                    table[key] = _asset_entry(record, epoch, head)
+                elif head is not None and len(head) != _REMOVED:
+                    table[key] = (epoch, head)   # انشال
+                else:
+                    continue
+                if head is not None:
+                    queue.append((epoch, table, key))
+            keys.clear()
+        clusters = self._view_clusters
+        for cluster_id, record in self._dirty_clusters.items():
+            head = clusters.get(cluster_id)
+            if record is None:
+                if head is None:
+                    continue
+                clusters[cluster_id] = (epoch, head)   # id قديم ما عاد مستخدم بعد إعادة البناء
+            else:
+                root = _find(record)   # أي record في الـ cluster
+                if root.cluster_id == cluster_id:
+                    value = (cluster_id, root.cluster_size, root.cluster_fraud)
+                else:
+                    value = root.cluster_id   # انضم لـ cluster ثاني: الـ view تحوّل له
+                clusters[cluster_id] = (epoch, head, value)
+            if head is not None:
+                queue.append((epoch, clusters, cluster_id))
+        self._dirty_clusters.clear()
+        self._full_publish = False
+
+        view = self.view = GraphView(
+            self.version, epoch, self._view_assets, clusters, pool,
+            self.asset_ttl_seconds, self.clock, self.ring_max_hops,
+        )
+        self._published_at = time.perf_counter()
+        del old
+
+        # أقدم view ممكن أحد ماسكها (القراء ماسكينها بس طول الطلب): النسخ اللي قبل آخر
+        # نسخة تشوفها ما أحد يحتاجها، والسيكوانسات اللي انشالت قبلها تنمسح من الـ pool
+        live = self._live_views
+        live.append((weakref.ref(view), epoch))
+        while live[0][0]() is None:
+            live.popleft()
+        oldest = live[0][1]
+        pool.retire(epoch)
+        pool.reclaim(oldest)
+        while queue and queue[0][0] <= oldest:
+            _, table, key = queue.popleft()
+            head = table.get(key)
+            if head is None or head[0] > oldest:
+                continue   # انمسح، أو انكتبت نسخة أحدث بعدها ولها مكانها في الطابور
+            if len(head) == _REMOVED:
+                del table[key]   # انشال قبل كل الـ views الحية
+            elif head[1] is not None:
+                table[key] = (head[0], None) + head[2:]
+
+    def _rewrite_tables(self, epoch):
+        """
+        install / إعادة بناء الـ clusters: جداول جديدة فيها كل asset وكل cluster بدون نسخ
+        قديمة (الـ views القديمة ماسكة جداولها)، واللي كان ينتظر النشر صار فيها.
+        """
+        clusters = {}
+        self._view_assets = {}
+        for kind, records in self.assets.items():
+            table = self._view_assets[kind] = {}
+            for key, record in records.items():
+                entry = table[key] = _asset_entry(record, epoch, None)
+                if entry[5] not in clusters:
+                    root = _find(record)
+                    clusters[root.cluster_id] = (epoch, None, (root.cluster_id, root.cluster_size, root.cluster_fraud))
+            self._dirty[kind].clear()
+        self._view_clusters = clusters
+        self._dirty_clusters.clear()
+        self._trim_queue.clear()
+
+    def _is_expired(self, record, now):
+        ttl = self.asset_ttl_seconds
+        return ttl is not None and now - record.last_seen > ttl
+
+    def _oldest(self):
+        """(kind, key) لأقدم asset تحديثاً عبر الأنواع الثلاثة، أو None لو الـ graph فاضي."""
+        oldest = None
+        oldest_seen = None
+        for kind, records in self.assets.items():
+            if records:
+                key = next(iter(records))
+                seen = records[key].last_seen
+                if oldest is None or seen < oldest_seen:
+                    oldest, oldest_seen = (kind, key), seen
+        return oldest
+
+    def _evict_expired(self, now):
+        # كل نوع مرتب حسب last_seen، فالمنتهية كلها في بداية كل OrderedDict
+        if self.asset_ttl_seconds is None:
+            return
+        for kind, records in self.assets.items():
+            while records:
+                key = next(iter(records))
+                if not self._is_expired(records[key], now):
+                    break
+                self._evict(kind, key)
+
+    def _enforce_limits(self):
+        max_assets = self.max_assets
+        budget = self.memory_budget_bytes
+        if max_assets is None and budget is None:
+            return
+        n_assets = len(self)
+        while (max_assets is not None and n_assets > max_assets) or (
+            budget is not None and self.approx_bytes > budget
+        ):
+            oldest = self._oldest()
+            if oldest is None:
+                break
+            self._evict(*oldest)
+            n_assets -= 1
+
+    def _evict(self, kind, key):
+        record = self.assets[kind].pop(key)
+        self._records_bytes -= record.approx_bytes()
+        self.fraud_totals[kind] -= record.fraud_count
+        record.sequence_index.clear()
+        self.evicted_assets += 1
+
+        # الـ record يبقى في سلسلة الـ union-find (شبح) لين _rebuild_clusters
+        root = _find(record)
+        root.cluster_size -= 1
+        root.cluster_fraud -= record.fraud_count
+        self._dirty[kind].add(key)
+        self._dirty_clusters[root.cluster_id] = root
+        self._cluster_ghosts += 1
+        self._remember(self._removed, (self.version, kind, key, root))
+
+        # نشيل المرجع من الـ assets المرتبطة (العلاقات متماثلة)
+        bit = KIND_BITS[kind]
+        for other_key, bits in record.links.items():
+            for other in ASSET_KINDS:
+                if not bits & KIND_BITS[other]:
+                    continue
+                other_record = self.assets[other].get(other_key)
+                if other_record is None:
+                    continue
+                other_bits = other_record.links.get(key, 0)
+                if other_bits & bit:
+                    if other_bits == bit:
+                        del other_record.links[key]
+                        self._records_bytes -= RELATION_BYTES
+                    else:
+                        other_record.links[key] = other_bits & ~bit
+        if record.ring_hops < self.ring_max_hops:
+            self._forget_ring_hops(record)
+
+    def _forget_ring_hops(self, record):
+        """
+        ring_hops بعد حذف record قريب من مركز (أو هو المركز نفسه). المتأثر = جار لمحذوف
+        أو لمتأثر و ring_hops حقه = ring_hops ذاك + 1 (يمكن أقصر مسار له للمركز يمر
+        بالمحذوف)، لحد ring_max_hops. المراكز وغير المتأثرين ما يتغيرون، فنرجّع قيم
+        المتأثرين من جيرانهم ثم BFS محدود بينهم مثل _relax_ring_hops.
+        """
+        limit = self.ring_max_hops
+        assets = self.assets
+        affected = {}
+        frontier = [record]
+        while frontier:
+            found = []
+            for current in frontier:
+                hops = current.ring_hops + 1
+                if hops > limit:
+                    continue
+                for key, bits in current.links.items():
+                    for kind in KINDS_OF_BITS[bits]:
+                        other = assets[kind].get(key)
+                        if other is not None and other.ring_hops == hops and (kind, key) not in affected:
+                            affected[kind, key] = other
+                            found.append(other)
+            frontier = found
+        if not affected:
+            return
+
+        for other in affected.values():
+            other.ring_hops = NO_RING_HOPS
+        seeds = []
+        for other in affected.values():
+            for key, bits in other.links.items():
+                for kind in KINDS_OF_BITS[bits]:
+                    neighbour = assets[kind].get(key)
+                    if neighbour is not None and neighbour.ring_hops < min(other.ring_hops - 1, limit):
+                        other.ring_hops = neighbour.ring_hops + 1
+            if other.ring_hops <= limit:
+                seeds.append(other)
+        self._relax_ring_hops((), seeds)
+        for kind, key in affected:
+            self._dirty[kind].add(key)
+
+
+def _at(entry, epoch):
+    """النسخة اللي تشوفها view بـ epoch من سلسلة تبدأ بـ entry (None لو ما فيه)."""
+    while entry is not None and entry[0] > epoch:
+        entry = entry[1]
+    return entry
+
+
+def _find(record):
+    """root الـ cluster مع path compression (للكتابة تحت الـ lock)."""
+    root = record
+    while root.parent is not None:
+        root = root.parent
+    while record is not root:
+        record.parent, record = root, record.parent
+    return root
+
+
+def _merge_roots(a, b):
+    """ندمج root a و b (الأصغر تحت الأكبر) -> (الـ root الباقي، id اللي انضم)."""
+    if a.cluster_size < b.cluster_size:
+        a, b = b, a
+    b.parent = a
+    a.cluster_size += b.cluster_size
+    a.cluster_fraud += b.cluster_fraud
+    return a, b.cluster_id
+
+
+def _union(a, b):
+    a, b = _find(a), _find(b)
+    if a is not b:
+        _merge_roots(a, b)
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import {
   Shield,
   AlertTriangle,
@@ -179,6 +179,7 @@ const renderGraph = (data) => {
 
   const nodes = data.nodes || [];
   let links = data.links || [];
+  const clusters = data.clusters || new Map();
 
   // لو ما فيه بيانات، لا تسوين شيء
   if (nodes.length === 0) {
@@ -250,6 +251,29 @@ const renderGraph = (data) => {
     .force("center", d3.forceCenter(width / 2, height / 2))
     .force("collision", d3.forceCollide().radius((d) => (d.size || 15) + 5));
 
+  // حلقات الاحتيال (clusters من الـ backend): كل حلقة تنجذب لنقطة خاصة فيها
+  const rings = Array.from(clusters.values()).filter((c) => c.ring);
+  const ringAnchor = new Map(
+    rings.map((c, i) => {
+      const angle = (2 * Math.PI * i) / rings.length;
+      const radius = rings.length > 1 ? Math.min(width, height) / 3 : 0;
+      return [c.id, [width / 2 + radius * Math.cos(angle), height / 2 + radius * Math.sin(angle)]];
+    })
+  );
+  const ringColor = d3.scaleOrdinal(d3.schemeTableau10);
+  if (ringAnchor.size > 0) {
+    const anchorStrength = (d) => (ringAnchor.has(d.cluster) ? 0.08 : 0);
+    simulation
+      .force(
+        "ringX",
+        d3.forceX((d) => (ringAnchor.get(d.cluster) || [width / 2])[0]).strength(anchorStrength)
+      )
+      .force(
+        "ringY",
+        d3.forceY((d) => (ringAnchor.get(d.cluster) || [0, height / 2])[1]).strength(anchorStrength)
+      );
+  }
+
   // الروابط
   const link = g
     .append("g")
@@ -282,17 +306,22 @@ const renderGraph = (data) => {
       if (d.type === "sequence") return "#10b981"; // أخضر = sequence
       return "#6b7280"; // رمادي = آخر
     })
-    .attr("stroke", "#fff")
-    .attr("stroke-width", 2)
+    // إطار ملوّن = عضو في حلقة احتيال
+    .attr("stroke", (d) => (ringAnchor.has(d.cluster) ? ringColor(d.cluster) : "#fff"))
+    .attr("stroke-width", (d) => (ringAnchor.has(d.cluster) ? 4 : 2))
     .style("cursor", "pointer")
     .on("mouseover", (event, d) => {
       tooltip.transition().duration(200).style("opacity", 1);
       const fraudCount = d.fraud_count || 0;
+      const cluster = clusters.get(d.cluster);
       tooltip
         .html(
           `<strong>${d.label}</strong><br/>` +
             `النوع: ${d.type === "ip" ? "عنوان IP" : d.type === "device" ? "جهاز" : d.type === "doc" ? "وثيقة" : "تسلسل"}<br/>` +
-            `عدد حالات الاحتيال: ${fraudCount}`
+            `عدد حالات الاحتيال: ${fraudCount}` +
+            (cluster && cluster.ring
+              ? `<br/>حلقة احتيال #${cluster.id}: ${cluster.size} assets`
+              : "")
         )
         .style("left", event.pageX + 10 + "px")
         .style("top", event.pageY - 10 + "px");
@@ -404,10 +433,56 @@ const App = () => {
   const [showManualForm, setShowManualForm] = useState(false);
   
   const [graphData, setGraphData] = useState(null);
+  // نسخة محلية من الـ graph: نطلب بس اللي تغير بعد آخر version (?since=)
+  const graphCache = useRef({
+    version: null,
+    nodes: new Map(),
+    links: new Map(),
+    clusters: new Map(),
+    stats: null,
+  });
   const fetchGraphData = async () => {
     try {
-      const res = await fetch("http://127.0.0.1:5000/graph-data");
-      const data = await res.json();
+      const cache = graphCache.current;
+      const url =
+        cache.version === null
+          ? "http://127.0.0.1:5000/graph-data"
+          : `http://127.0.0.1:5000/graph-data?since=${cache.version}`;
+      const res = await fetch(url);
+      // 304 = ما تغير شي من آخر مرة، نرسم من النسخة المحلية
+      if (res.status !== 304) {
+        const delta = await res.json();
+        if (delta.full) {
+          cache.nodes.clear();
+          cache.links.clear();
+          cache.clusters.clear();
+        }
+        // المحذوفة أول (asset انحذف ورجع يجي في الاثنين)
+        (delta.removed || []).forEach((id) => {
+          cache.nodes.delete(id);
+          cache.links.forEach((l, key) => {
+            if (l.source === id || l.target === id) cache.links.delete(key);
+          });
+        });
+        // clusters اندمجت (بالترتيب): العقد القديمة تاخذ الـ id الجديد
+        (delta.merged_clusters || []).forEach(([oldId, newId]) => {
+          cache.clusters.delete(oldId);
+          cache.nodes.forEach((n) => {
+            if (n.cluster === oldId) n.cluster = newId;
+          });
+        });
+        delta.nodes.forEach((n) => cache.nodes.set(n.id, { ...cache.nodes.get(n.id), ...n }));
+        (delta.clusters || []).forEach((c) => cache.clusters.set(c.id, c));
+        delta.links.forEach((l) => cache.links.set(`${l.source}|${l.target}|${l.type}`, l));
+        cache.stats = delta.stats;
+        cache.version = delta.version;
+      }
+      const data = {
+        nodes: Array.from(cache.nodes.values()),
+        links: Array.from(cache.links.values()),
+        clusters: cache.clusters,
+        stats: cache.stats,
+      };
       setGraphData(data);
       // Small delay to ensure DOM is ready
       setTimeout(() => renderGraph(data), 100);
@@ -524,6 +599,7 @@ const App = () => {
         "shared_device_with_high_risk",
         "shared_ip_with_high_risk",
         "shared_doc_with_high_risk",
+        "near_fraud_ring",
       ];
       const aiPrefixes = ["ml_", "ai_"];
 
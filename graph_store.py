@@ -0,0 +1,982 @@
+# graph_store.py
+#
+# تخزين دائم للـ Fraud Graph عشان ما نخسر حالات الاحتيال المؤكدة مع كل restart / deploy.
+#
+# - append-only log: كل حالة تنكتب كـ record ثنائي (طول + crc32) قبل ما تنطبق على
+#   الـ graph. الكتابة os.write مباشرة (تنجو من crash العملية نفسها)، والـ fsync
+#   مجمّع (group commit) كل fsync_interval ثانية من thread خلفي.
+# - snapshots: كل snapshot_every حالة نكتب الـ graph كامل بصيغة ثنائية مضغوطة
+#   (جدول strings مشترك + مصفوفات NumPy) في ملف مؤقت -> fsync -> rename،
+#   ونبدأ log segment جديد من بعده.
+# - الإقلاع: نفتح آخر snapshot سليم بـ mmap (المصفوفات views بدون نسخ)، نبني
+#   الـ records منها، ونطبق ذيل الـ log اللي بعده فقط.
+# - record ناقص أو crc غلط في آخر الـ log (انقطاع وسط الكتابة) = نهاية الـ log:
+#   نقص الملف عنده ونكمل.
+# - أكثر من process (gunicorn workers) على نفس المجلد: الكتابة تحت flock على ملف
+#   LOCK، وكل process يتابع ذيل الـ log ويطبق حالات الباقين على نسخته من الـ graph.
+#
+# الملفات في المجلد:
+#   snapshot-<lsn>.bin      الـ graph بعد تطبيق الحالة رقم lsn
+#   cases-<first_lsn>.log   الحالات من first_lsn لين بداية الـ segment اللي بعده
+#   LOCK                    قفل الكتابة بين الـ processes
+
+import contextlib
+import gc
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from itertools import chain
+from typing import NamedTuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: بدون قفل بين الـ processes
+    fcntl = None
+
+from fraud_graph import (
+    ASSET_BASE_BYTES,
+    ASSET_KINDS,
+    RELATION_BYTES,
+    SEQUENCE_REF_BYTES,
+    AssetRecord,
+    _find,
+)
+from actions import vocabulary
+from sequence_index import MAX_ACTION_COLUMNS, SequenceIndex, SequencePool
+
+SNAPSHOT_MAGIC = b"RQGSNAP1"
+SNAPSHOT_VERSION = 2     # 2: + clusters و ring_hops (نقرأ 1 ونبني الـ clusters من الروابط)
+SNAPSHOT_KEEP = 2        # نحتفظ بآخر snapshotين (لو الأخير خربان نرجع للي قبله)
+ARRAY_ALIGN = 64
+
+_RECORD_HEAD = struct.Struct("<II")       # طول الـ payload، crc32(payload)
+_CASE_HEAD = struct.Struct("<QdI")        # lsn، وقت الحالة، عدد الحقول
+_SNAPSHOT_HEAD = struct.Struct("<8sII")   # magic، طول الـ header (JSON)، crc32(header)
+
+_SNAPSHOT_NAME = re.compile(r"^snapshot-(\d{20})\.bin$")
+_SEGMENT_NAME = re.compile(r"^cases-(\d{20})\.log$")
+
+
+class SnapshotError(ValueError):
+    """snapshot ناقص أو خربان أو بصيغة ما نعرفها."""
+
+
+class StoreRecoveryError(OSError):
+    """الـ graph المحلي متأخر عن الـ log وما فيه snapshot سليم ولا log من lsn 1 نبنيه منه."""
+
+
+class LoggedCase(NamedTuple):
+    lsn: int
+    timestamp: float
+    ip: object
+    device_id: object
+    doc_hash: object
+    sequence: tuple
+
+
+# ================== LOG RECORDS ==================
+
+def _encode_text(value):
+    return str(value).encode("utf-8", "surrogatepass") if value else b""
+
+
+def encode_case(lsn, timestamp, ip, device_id, doc_hash, sequence):
+    """record واحد في الـ log: [طول، crc32] + [lsn، الوقت، عدد الحقول، أطوال الحقول، الحقول]."""
+    fields = [_encode_text(ip), _encode_text(device_id), _encode_text(doc_hash)]
+    fields.extend(_encode_text(action) for action in sequence or ())
+    payload = b"".join((
+        _CASE_HEAD.pack(lsn, timestamp, len(fields)),
+        struct.pack(f"<{len(fields)}I", *map(len, fields)),
+        *fields,
+    ))
+    return _RECORD_HEAD.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def iter_cases(data):
+    """
+    (end_offset, LoggedCase) لكل record سليم في data بالترتيب.
+    نوقف عند أول record ناقص أو crc غلط (كل اللي بعده ما نثق فيه).
+    """
+    offset = 0
+    size = len(data)
+    while offset + _RECORD_HEAD.size <= size:
+        length, crc = _RECORD_HEAD.unpack_from(data, offset)
+        start = offset + _RECORD_HEAD.size
+        end = start + length
+        if length < _CASE_HEAD.size or end > size:
+            return
+        payload = data[start:end]
+        if zlib.crc32(payload) != crc:
+            return
+
+        lsn, timestamp, n_fields = _CASE_HEAD.unpack_from(payload)
+        pos = _CASE_HEAD.size + 4 * n_fields
+        if n_fields < 3 or pos > length:
+            return
+        fields = []
+        for n in struct.unpack_from(f"<{n_fields}I", payload, _CASE_HEAD.size):
+            fields.append(payload[pos:pos + n].decode("utf-8", "surrogatepass"))
+            pos += n
+        if pos != length:
+            return
+
+        yield end, LoggedCase(
+            lsn, timestamp, fields[0] or None, fields[1] or None, fields[2] or None,
+            tuple(fields[3:]),
+        )
+        offset = end
+
+
+# ================== SNAPSHOTS ==================
+
+def write_snapshot(graph, path, lsn):
+    """نكتب الـ graph في path بشكل ذري (tmp -> fsync -> rename)."""
+    with graph._lock:
+        arrays, header = _collect_snapshot(graph, lsn)
+    _write_collected(path, arrays, header)
+
+
+def _write_collected(path, arrays, header):
+    layout = {}
+    offset = 0
+    for name, arr in arrays.items():
+        offset = _align(offset)
+        layout[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+        offset += arr.nbytes
+
+    crc = 0
+    for arr in arrays.values():
+        crc = zlib.crc32(arr.data if arr.size else b"", crc)  # الـ padding صفار ما يدخل
+    header.update(arrays=layout, data_crc32=crc)
+    header_bytes = json.dumps(header, separators=(",", ":")).encode()
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_SNAPSHOT_HEAD.pack(SNAPSHOT_MAGIC, len(header_bytes), zlib.crc32(header_bytes)))
+        f.write(header_bytes)
+        data_start = _align(_SNAPSHOT_HEAD.size + len(header_bytes))
+        f.write(b"\0" * (data_start - f.tell()))
+        for name, arr in arrays.items():
+            f.write(b"\0" * (data_start + layout[name]["offset"] - f.tell()))
+            f.write(arr.data if arr.size else b"")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(os.path.dirname(path) or ".")
+
+
+def _collect_snapshot(graph, lsn):
+    """الـ graph كمصفوفات NumPy: strings مشتركة، السيكوانسات المميزة، وأعمدة لكل نوع asset."""
+    # list comprehensions منفصلة لكل حقل (أسرع بكثير من loop واحد فيه appends)
+    columns = {}
+    link_key_lists = {}
+    for kind in ASSET_KINDS:
+        records = graph.assets[kind]
+        values = list(records.values())
+        links = [record.links for record in values]
+        indexes = [record.sequence_index.ids for record in values]
+        columns[kind] = {
+            "keys": list(map(str, records)),
+            "fraud_count": np.array([r.fraud_count for r in values], dtype=np.int64),
+            "sequence_total": np.array([r.sequence_total for r in values], dtype=np.int64),
+            "last_seen": np.array([r.last_seen for r in values], dtype=np.float64),
+            "n_sequences": np.fromiter(map(len, indexes), dtype=np.uint32, count=len(values)),
+            "sequence_ids": b"".join(map(array.tobytes, indexes)),
+            "n_links": np.fromiter(map(len, links), dtype=np.uint32, count=len(values)),
+            "link_bits": np.fromiter(
+                chain.from_iterable(map(dict.values, links)), dtype=np.uint8
+            ),
+            "cluster": np.fromiter(
+                (_find(r).cluster_id for r in values), dtype=np.int64, count=len(values)
+            ),
+            "ring_hops": np.fromiter((r.ring_hops for r in values), dtype=np.uint8, count=len(values)),
+        }
+        link_key_lists[kind] = list(map(str, chain.from_iterable(links)))
+
+    # جدول الـ strings: مفاتيح الأنواع الثلاثة بالترتيب (رقم المفتاح = مكانه)
+    # وبعدها أي string ثاني نحتاجه (actions، أو link لمفتاح مو موجود)
+    strings = []
+    for kind in ASSET_KINDS:
+        strings.extend(columns[kind]["keys"])
+    string_ids = dict(zip(strings, range(len(strings))))
+
+    def ids_of(values):
+        try:
+            return np.fromiter(map(string_ids.__getitem__, values), dtype=np.uint32, count=len(values))
+        except KeyError:
+            for value in values:
+                if value not in string_ids:
+                    string_ids[value] = len(strings)
+                    strings.append(value)
+            return ids_of(values)
+
+    # الـ pool بأرقام متتالية (من غير الـ slots الفاضية). السيكوانسات بأرقام القاموس
+    # (خاصة بالـ process) -> نكتب أسماءها في جدول الـ strings: رقم القاموس -> رقم string
+    pool = graph.sequence_pool
+    # refcount مو sequences: اللي انشال ممكن يبقى في الـ pool لين تموت الـ views (fraud_graph.py)
+    live = [seq_id for seq_id, refs in enumerate(pool.refcounts) if refs]
+    live_sequences = [pool.sequences[i] for i in live]
+    remap = np.zeros(max(len(pool.sequences), 1), dtype=np.uint32)
+    remap[live] = np.arange(len(live), dtype=np.uint32)
+    codes = np.frombuffer(b"".join(live_sequences), dtype=np.uint16)
+    used = np.unique(codes)
+    string_of_code = np.zeros(max(int(used[-1]) + 1 if used.size else 1, 1), dtype=np.uint32)
+    string_of_code[used] = ids_of([vocabulary.names[code] for code in used.tolist()])
+
+    arrays = {
+        "seq_lengths": np.fromiter((len(seq) // 2 for seq in live_sequences), dtype=np.uint32, count=len(live)),
+        "seq_tokens": string_of_code[codes],
+        "column_actions": ids_of(
+            [vocabulary.names[code] for code, _ in sorted(pool.columns.items(), key=lambda kv: kv[1])]
+        ),
+        "counts": np.ascontiguousarray(pool.counts[live]),
+    }
+
+    offset = 0
+    for kind in ASSET_KINDS:
+        column = columns[kind]
+        n_keys = len(column.pop("keys"))
+        column["keys"] = np.arange(offset, offset + n_keys, dtype=np.uint32)
+        offset += n_keys
+        column["sequence_ids"] = remap[np.frombuffer(column["sequence_ids"], dtype=np.uint32)]
+        column["link_keys"] = ids_of(link_key_lists[kind])
+        for name, arr in column.items():
+            arrays[f"{kind}/{name}"] = arr
+
+    # نص واحد مفصول بـ \0 (split سريع وقت التحميل)،
+    # ولو فيه key فيه \0 نلصقها بدون فاصل ونخزن الأطوال
+    joined = "\0".join(strings)
+    nul_safe = joined.count("\0") == max(len(strings) - 1, 0)
+    if not nul_safe:
+        joined = "".join(strings)
+    arrays["strings"] = np.frombuffer(joined.encode("utf-8", "surrogatepass"), dtype=np.uint8)
+    if not nul_safe:
+        arrays["string_lengths"] = np.array(
+            [len(s.encode("utf-8", "surrogatepass")) for s in strings], dtype=np.uint64
+        )
+
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "lsn": lsn,
+        "created": time.time(),
+        "n_strings": len(strings),
+        "nul_safe": nul_safe,
+        "ring_max_hops": graph.ring_max_hops,
+        "next_cluster_id": graph._next_cluster_id,
+        "cluster_ghosts": graph._cluster_ghosts,
+    }
+    return arrays, header
+
+
+def load_snapshot(graph, path):
+    """
+    نحمّل snapshot في graph (install يستبدل محتواه كله) ونرجّع الـ lsn حقه.
+    الملف ينفتح بـ mmap والمصفوفات views عليه، فما ننسخ إلا اللي نحتاجه
+    (مصفوفة العدّ حق الـ pool) ونبني الـ records من الـ views مباشرة.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < _SNAPSHOT_HEAD.size:
+            raise SnapshotError("truncated snapshot")
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        view = memoryview(mm)
+        header = _parse_header(view[:_SNAPSHOT_HEAD.size], _reader(view, _SNAPSHOT_HEAD.size))
+        data_start = _align(_SNAPSHOT_HEAD.size + header["_header_len"])
+
+        arrays = {}
+        crc = 0
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"], dtype=np.int64))
+            start = data_start + spec["offset"]
+            if start + count * dtype.itemsize > len(mm):
+                raise SnapshotError(f"array {name} out of bounds")
+            arr = np.frombuffer(mm, dtype=dtype, count=count, offset=start) if count else (
+                np.empty(0, dtype=dtype)
+            )
+            arrays[name] = arr.reshape(spec["shape"])
+            crc = zlib.crc32(view[start:start + count * dtype.itemsize], crc)
+        if crc != header["data_crc32"]:
+            raise SnapshotError("data checksum mismatch")
+
+        _install_snapshot(graph, header, arrays)
+        return header["lsn"]
+    finally:
+        arrays = None
+        view.release()
+        try:
+            mm.close()
+        except BufferError:
+            pass  # view لسه مستخدم في مكان - الـ GC يسكّره
+
+
+def _install_snapshot(graph, header, arrays):
+    if header["nul_safe"]:
+        strings = str(arrays["strings"], "utf-8", "surrogatepass").split("\0")
+        if header["n_strings"] == 0:
+            strings = []
+    else:
+        blob = arrays["strings"].tobytes()
+        ends = np.cumsum(arrays["string_lengths"]).tolist()
+        strings, start = [], 0
+        for end in ends:
+            strings.append(blob[start:end].decode("utf-8", "surrogatepass"))
+            start = end
+    if len(strings) != header["n_strings"]:
+        raise SnapshotError("string table size mismatch")
+
+    # السيكوانسات المميزة: أسماء الـ actions -> أرقام القاموس (مرة لكل اسم) -> bytes
+    seq_tokens = arrays["seq_tokens"]
+    used, inverse = np.unique(seq_tokens, return_inverse=True)
+    code_of = np.fromiter(
+        (vocabulary.intern(strings[string_id]) for string_id in used.tolist()), dtype=np.uint16, count=used.size
+    )
+    blob = code_of[inverse.reshape(-1)].tobytes()
+    sequences, start = [], 0
+    for end in (np.cumsum(arrays["seq_lengths"], dtype=np.int64) * 2).tolist():
+        sequences.append(blob[start:end])
+        start = end
+
+    capacity = graph.max_sequences_per_asset
+    pool = SequencePool()
+    cluster_ids, ring_hops = {}, {}
+    refcounts = np.zeros(len(sequences), dtype=np.int64)
+    assets = {}
+    records_bytes = 0
+
+    for kind in ASSET_KINDS:
+        keys = list(map(strings.__getitem__, arrays[f"{kind}/keys"].tolist()))
+        fraud_counts = arrays[f"{kind}/fraud_count"].tolist()
+        totals = arrays[f"{kind}/sequence_total"].tolist()
+        last_seen = arrays[f"{kind}/last_seen"].tolist()
+        link_keys = list(map(strings.__getitem__, arrays[f"{kind}/link_keys"].tolist()))
+        link_bits = arrays[f"{kind}/link_bits"].tolist()
+
+        n_sequences = arrays[f"{kind}/n_sequences"].astype(np.int64)
+        seq_ids = arrays[f"{kind}/sequence_ids"]
+        if capacity is not None and n_sequences.size and n_sequences.max() > capacity:
+            # الـ ring buffer صار أصغر من وقت الـ snapshot: نخلي الأحدث بس
+            starts = np.repeat(np.cumsum(n_sequences) - n_sequences, n_sequences)
+            position = np.arange(seq_ids.size) - starts
+            keep = position >= np.repeat(n_sequences - capacity, n_sequences)
+            seq_ids = seq_ids[keep]
+            n_sequences = np.minimum(n_sequences, capacity)
+        refcounts += np.bincount(seq_ids, minlength=len(sequences))[:len(sequences)]
+        records_bytes += (
+            len(keys) * ASSET_BASE_BYTES
+            + len(link_keys) * RELATION_BYTES
+            + int(n_sequences.sum()) * SEQUENCE_REF_BYTES
+        )
+
+        seq_bytes = memoryview(np.ascontiguousarray(seq_ids, dtype=np.uint32).tobytes())
+        seq_ends = np.cumsum(n_sequences) * 4
+        indexes = []
+        for start, end in zip((seq_ends - n_sequences * 4).tolist(), seq_ends.tolist()):
+            index = SequenceIndex(capacity=capacity, pool=pool)
+            index.ids.frombytes(seq_bytes[start:end])
+            indexes.append(index)
+
+        link_ends = np.cumsum(arrays[f"{kind}/n_links"], dtype=np.int64)
+        links = [
+            dict(zip(link_keys[start:end], link_bits[start:end]))
+            for start, end in zip((link_ends - arrays[f"{kind}/n_links"]).tolist(), link_ends.tolist())
+        ]
+
+        assets[kind] = OrderedDict(zip(
+            keys, map(AssetRecord.restore, indexes, fraud_counts, totals, last_seen, links)
+        ))
+        if header["version"] >= 2:
+            cluster_ids[kind] = arrays[f"{kind}/cluster"].tolist()
+            ring_hops[kind] = arrays[f"{kind}/ring_hops"].tolist()
+
+    _fill_pool(pool, sequences, refcounts.tolist(), strings, arrays)
+    clusters = None
+    if header["version"] >= 2 and header["ring_max_hops"] == graph.ring_max_hops:
+        clusters = (cluster_ids, ring_hops, header["next_cluster_id"], header["cluster_ghosts"])
+    graph.install(assets, pool, records_bytes, version=header["lsn"], clusters=clusters)
+
+
+def _fill_pool(pool, sequences, refcounts, strings, arrays):
+    """نعبي SequencePool من الـ snapshot (سيكوانس بدون مراجع بعد القص = slot فاضي)."""
+    counts = arrays["counts"]
+    width = counts.shape[1] if counts.ndim == 2 else 0
+    pool.counts = np.zeros((max(len(sequences), 16), max(width, 16)), dtype=np.int32)
+    if len(sequences):
+        pool.counts[:len(sequences), :width] = counts
+
+    pool.columns = {
+        vocabulary.intern(strings[action]): col
+        for col, action in enumerate(arrays["column_actions"].tolist(), start=1)
+    }
+    if len(pool.columns) >= MAX_ACTION_COLUMNS - 1 and sequences:
+        # الـ actions اللي ما لها عمود خاص تتوزع برقمها في القاموس، والأرقام تختلف
+        # بين الـ processes -> نعيد عدّ الصفوف بأرقام هالـ process
+        codes = np.frombuffer(b"".join(sequences), dtype=np.uint16)
+        used, inverse = np.unique(codes, return_inverse=True)
+        col_of = np.fromiter((pool.column(code) for code in used.tolist()), dtype=np.intp, count=used.size)
+        lengths = np.fromiter((len(seq) // 2 for seq in sequences), dtype=np.intp, count=len(sequences))
+        pool._reserve(len(sequences), MAX_ACTION_COLUMNS)
+        pool.counts[:len(sequences)] = 0
+        np.add.at(pool.counts, (np.repeat(np.arange(len(sequences)), lengths), col_of[inverse.reshape(-1)]), 1)
+        pool.counts[:len(sequences), 0] = lengths
+    pool.sequences = sequences
+    pool.refcounts = refcounts
+    for seq_id, (seq, refs) in enumerate(zip(sequences, refcounts)):
+        if refs:
+            pool.ids[seq] = seq_id
+            pool.token_count += len(seq) // 2
+        else:
+            sequences[seq_id] = None
+            pool.counts[seq_id] = 0
+            pool._free.append(seq_id)
+
+
+def _parse_header(head, read):
+    """header الـ snapshot (JSON) بعد التحقق من الـ magic والـ crc."""
+    if len(head) < _SNAPSHOT_HEAD.size:
+        raise SnapshotError("truncated snapshot header")
+    magic, header_len, header_crc = _SNAPSHOT_HEAD.unpack_from(head)
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotError("not a fraud graph snapshot")
+    header_bytes = bytes(read(header_len))
+    if len(header_bytes) != header_len or zlib.crc32(header_bytes) != header_crc:
+        raise SnapshotError("snapshot header checksum mismatch")
+    header = json.loads(header_bytes)
+    if header.get("version") not in (1, SNAPSHOT_VERSION):
+        raise SnapshotError(f"unsupported snapshot version {header.get('version')}")
+    header["_header_len"] = header_len
+    return header
+
+
+def _reader(view, offset):
+    return lambda n: view[offset:offset + n]
+
+
+def _align(offset):
+    return -(-offset // ARRAY_ALIGN) * ARRAY_ALIGN
+
+
+def _fsync_dir(directory):
+    """fsync للمجلد نفسه عشان الـ rename / الملفات الجديدة تثبت."""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+# ================== STORE ==================
+
+class GraphStore:
+    """
+    FraudGraph + log + snapshots في directory، مشترك بين كل الـ worker processes
+    على نفس الجهاز. كل process عنده نسخة الـ graph بالذاكرة (read cache) ويتابع الـ log:
+    - الكتابة تحت file lock (fcntl.flock): نلحق آخر الـ log، نكتب الحالة بالـ lsn
+      اللي بعده ونطبقها محلياً - فالـ lsn واحد ومرتب عبر كل الـ processes
+    - thread خلفي يشيك كل poll_interval هل الـ log تقدم (version = lsn) ويطبق
+      الحالات الجديدة، فأي تأكيد في process يوصل للباقين خلال ~poll_interval
+
+    register_case يمر من هنا بدل graph.register_case مباشرة (نفس الـ signature).
+    fsync_interval: كل كم ثانية نسوي fsync للـ log (0 = fsync مع كل حالة).
+    snapshot_every: عدد الحالات بين كل snapshot (thread خلفي).
+    evict_interval: كل كم ثانية الـ thread نفسه يشيل الـ assets اللي انتهى الـ TTL
+    حقها (graph.evict_expired)، لو الـ graph له TTL.
+    """
+
+    def __init__(
+        self, graph, directory, snapshot_every=100_000, fsync_interval=0.05, poll_interval=0.1,
+        evict_interval=60.0,
+    ):
+        self.graph = graph
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.fsync_interval = fsync_interval
+        self.poll_interval = poll_interval
+        self.evict_interval = evict_interval
+
+        self.lsn = 0              # آخر حالة مطبقة على الـ graph المحلي
+        self.snapshot_lsn = 0     # آخر حالة داخل آخر snapshot نعرف عنه
+        self.stats = {}
+
+        self._lock_fd = None      # ملف LOCK (flock بين الـ processes)
+        self._read_fd = None      # الـ segment اللي نتابعه
+        self._read_path = None
+        self._offset = 0          # لين وين طبقنا من الـ segment الحالي
+        self._write_fd = None
+        self._write_path = None
+        self._dirty = False
+        self._snapshot_due = False
+        self._closed = False
+        self._thread = None
+        self._init_locks()
+
+    def _init_locks(self):
+        self._wake = threading.Event()
+        self._lock = threading.Lock()        # الـ graph المحلي + موقع القراءة / الكتابة
+        self._sync_lock = threading.Lock()   # fsync / تبديل الـ write fd
+        self._snapshot_lock = threading.Lock()
+
+    @property
+    def version(self):
+        """يتغير مع كل حالة تنطبق على الـ graph (من هذا الـ process أو غيره)."""
+        return self.lsn
+
+    # ---------- startup ----------
+
+    def open(self):
+        """نحمّل آخر snapshot سليم + ذيل الـ log، ونبدأ المتابعة. نرجّع stats."""
+        # التحميل ينشئ ملايين objects بدون cycles: الـ GC هنا يدور على الـ heap
+        # كله مرة بعد مرة بدون فايدة (يضاعف وقت الإقلاع تقريباً)
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._open()
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def _open(self):
+        started = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_fd = os.open(os.path.join(self.directory, "LOCK"), os.O_RDWR | os.O_CREAT, 0o644)
+
+        with self._lock, self._file_lock():
+            self._remove_stale_tmp()
+            loaded, snapshot_lsn, replayed = self._recover(repair=True)
+            self._reopen_write()
+        finished = time.perf_counter()
+
+        self.stats = {
+            "assets": len(self.graph),
+            "snapshot_lsn": snapshot_lsn,
+            "replayed_cases": replayed,
+            "snapshot_load_seconds": round(loaded - started, 3),
+            "replay_seconds": round(finished - loaded, 3),
+            "total_seconds": round(finished - started, 3),
+        }
+
+        if self.lsn - self.snapshot_lsn >= self.snapshot_every:
+            self._snapshot_due = True
+        self._start_thread()
+        # gunicorn --preload وأمثاله: الـ process الجديد ما يورث الـ thread ولا الـ flock
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+        return self.stats
+
+    def _recover(self, repair, snapshot_lsn=None):
+        """
+        الـ graph من الصفر: آخر snapshot سليم + كل الـ log اللي بعده.
+        repair: (تحت الـ flock وقت الإقلاع) نقص الـ record الخربان في آخر الـ log.
+        snapshot_lsn: الـ snapshot محمّل من قبل (_reload)، None = نحمّله هنا.
+        نرجّع (وقت انتهاء تحميل الـ snapshot، الـ lsn حقه، عدد الحالات من الـ log).
+        """
+        if snapshot_lsn is None:
+            snapshot_lsn = self._load_snapshot()
+        loaded = time.perf_counter()
+
+        self.lsn = self.snapshot_lsn = snapshot_lsn
+        self._close_fd("_read_fd")
+        self._read_path = None
+        replayed = 0
+
+        segments = self._files(_SEGMENT_NAME)
+        for i, (first_lsn, path) in enumerate(segments):
+            next_first = segments[i + 1][0] if i + 1 < len(segments) else None
+            if next_first is not None and next_first - 1 <= self.lsn:
+                continue  # كله داخل الـ snapshot
+            if first_lsn > self.lsn + 1:
+                print(f"[raqeeb] fraud graph log {path} starts after lsn {self.lsn}: ignoring")
+                break
+
+            self._switch_segment(path, first_lsn)
+            data = _read_from(self._read_fd, 0)
+            applied, consumed, gap = self._apply_records(data)
+            replayed += applied
+            self._offset = consumed
+
+            if next_first is not None and not gap and consumed == len(data):
+                continue
+            if repair and (gap or consumed < len(data)):
+                print(
+                    f"[raqeeb] fraud graph log {path}: dropped {len(data) - consumed} "
+                    f"bytes after lsn {self.lsn} (incomplete write)"
+                )
+                os.truncate(path, consumed)
+                # أي segments بعد record خربان ما نقدر نطبقها بالترتيب
+                for _, later in segments[i + 1:]:
+                    os.replace(later, later + ".orphan")
+            break
+
+        if self._read_path is None:
+            if not repair:
+                return loaded, snapshot_lsn, replayed
+            path = self._segment_path(self.lsn + 1)
+            _create_file(path)
+            self._switch_segment(path, self.lsn + 1)
+        return loaded, snapshot_lsn, replayed
+
+    def _load_snapshot(self):
+        """آخر snapshot سليم في الـ graph (يستبدل محتواه كله). نرجّع الـ lsn حقه، 0 = ما فيه."""
+        for _, path in reversed(self._files(_SNAPSHOT_NAME)):
+            try:
+                return load_snapshot(self.graph, path)
+            except (SnapshotError, OSError, ValueError, KeyError) as exc:
+                print(f"[raqeeb] skipping unreadable graph snapshot {path}: {exc}")
+        return 0
+
+    def _remove_stale_tmp(self):
+        """snapshots ما كملت (crash وسط الكتابة) - ما نلمس اللي process حي لسه يكتبها."""
+        for name in os.listdir(self.directory):
+            if not name.endswith(".tmp"):
+                continue
+            pid = name.rsplit(".", 2)[-2]
+            if pid.isdigit() and _pid_alive(int(pid)):
+                continue
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(self.directory, name))
+
+    # ---------- writes ----------
+
+    def register_case(self, ip=None, device_id=None, doc_hash=None, sequence=None):
+        """نكتب الحالة في الـ log المشترك ثم نطبقها على الـ graph (نفس ترتيب الـ lsn)."""
+        return self.register_cases([(ip, device_id, doc_hash, sequence)])
+
+    def register_cases(self, cases):
+        """
+        دفعة حالات [(ip, device_id, doc_hash, sequence)]: file lock واحد، write واحد
+        لكل الـ records (lsn ورا بعض) وfsync واحد لو fsync_interval = 0. نرجّع آخر lsn.
+        """
+        cases = [
+            (ip, device_id, doc_hash, tuple(sequence) if sequence else ())
+            for ip, device_id, doc_hash, sequence in cases
+        ]
+        with self._lock:
+            if self._write_fd is None:
+                raise RuntimeError("graph store is not open")
+            if not cases:
+                return self.lsn
+            with self._file_lock():
+                # نلحق اللي كتبته الـ processes الثانية عشان ناخذ الـ lsn الصح
+                self._catch_up(repair=True)
+                self._reopen_write()
+                first = self.lsn + 1
+                now = self.graph.clock()
+                records = b"".join(
+                    encode_case(first + i, now, *case) for i, case in enumerate(cases)
+                )
+                _write_all(self._write_fd, records)
+                self._dirty = True
+                self._offset += len(records)
+                self.graph.register_cases(cases, now=now, version=first)
+                self.lsn = first + len(cases) - 1
+
+                if self.fsync_interval <= 0:
+                    self.sync()
+            self._check_snapshot_due()
+            return self.lsn
+
+    def refresh(self):
+        """نطبق الحالات الجديدة من الـ processes الثانية. نرجّع عددها."""
+        with self._lock:
+            if self._read_fd is None:
+                return 0
+            applied = self._catch_up(repair=False)
+            self._check_snapshot_due()
+            return applied
+
+    def evict_expired(self):
+        """
+        aging بدون حالات جديدة: register_case يشيل المنتهية بس لما تجي حالة، فبدون
+        هذا الـ asset المنتهي يبقى في الـ graph و /graph-data لين أول تأكيد.
+        """
+        with self._lock:
+            self.graph.evict_expired()
+
+    def sync(self):
+        """fsync للـ log لو فيه كتابات ما انثبتت."""
+        with self._sync_lock:
+            if self._dirty and self._write_fd is not None:
+                self._dirty = False
+                os.fsync(self._write_fd)
+
+    def snapshot(self, only_if_due=False):
+        """
+        snapshot للـ graph الحالي + segment جديد للـ log من بعده.
+        الكتابة (والـ processes الثانية) تتوقف بس وقت جمع البيانات من الـ graph،
+        مو وقت الكتابة للقرص. only_if_due: نتخطى لو process ثاني سوى snapshot قريب.
+        """
+        with self._snapshot_lock:
+            with self._lock, self._file_lock():
+                self._snapshot_due = False
+                self._catch_up(repair=True)
+                lsn = self.lsn
+                if lsn == self.snapshot_lsn:
+                    return None
+                if only_if_due and lsn - self.snapshot_lsn < self.snapshot_every:
+                    return None
+                with self.graph._lock:
+                    arrays, header = _collect_snapshot(self.graph, lsn)
+
+                # segment جديد يبدأ بعد الـ snapshot (الـ processes الثانية تنتقل له)
+                path = self._segment_path(lsn + 1)
+                _create_file(path)
+                self._switch_segment(path, lsn + 1)
+                self._reopen_write()
+
+            started = time.perf_counter()
+            snapshot_path = os.path.join(self.directory, f"snapshot-{lsn:020d}.bin")
+            _write_collected(snapshot_path, arrays, header)
+            self._prune()
+            self.stats["last_snapshot_seconds"] = round(time.perf_counter() - started, 3)
+            return snapshot_path
+
+    def close(self):
+        """نوقف الـ thread الخلفي ونثبت الـ log (fsync) قبل الخروج."""
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        with self._lock:
+            self.sync()
+            with self._sync_lock:
+                self._close_fd("_write_fd")
+            self._close_fd("_read_fd")
+            self._close_fd("_lock_fd")
+
+    # ---------- internals ----------
+
+    def _catch_up(self, repair):
+        """
+        نطبق كل الحالات الجديدة في الـ log من موقعنا، وننتقل للـ segment اللي بعده
+        لما process ثاني يسوي snapshot. repair (تحت الـ flock): ما فيه أحد يكتب الحين،
+        فأي record ناقص في الآخر خربان (writer انقتل وسط الكتابة) ونقصه.
+        """
+        applied = 0
+        while True:
+            size = os.fstat(self._read_fd).st_size
+            if size > self._offset:
+                data = _read_from(self._read_fd, self._offset)
+                count, consumed, gap = self._apply_records(data)
+                applied += count
+                self._offset += consumed
+                if gap:
+                    # الـ log ما يمشي بالترتيب من عندنا (segments انحذفت) - نعيد البناء
+                    self._reload(repair)
+                    return applied
+                if consumed < len(data):
+                    if not repair:
+                        return applied   # record لسه ينكتب - نكمله المرة الجاية
+                    print(
+                        f"[raqeeb] fraud graph log {self._read_path}: dropped "
+                        f"{len(data) - consumed} bytes after lsn {self.lsn} (incomplete write)"
+                    )
+                    os.truncate(self._read_path, self._offset)
+
+            # الـ segment خلص؟ الـ snapshot عند lsn يفتح segment اسمه lsn + 1
+            next_path = self._segment_path(self.lsn + 1)
+            if next_path != self._read_path and os.path.exists(next_path):
+                self._switch_segment(next_path, self.lsn + 1)
+                continue
+            if self._latest(_SNAPSHOT_NAME) > self.lsn:
+                if os.fstat(self._read_fd).st_size > self._offset:
+                    continue  # انكتب شي بعد ما قرينا - نكمل منه أول
+                # متأخرين أكثر من الـ segments المحفوظة
+                self._reload(repair)
+            return applied
+
+    def _apply_records(self, data):
+        """(عدد الحالات المطبقة، البايتات المستهلكة، فيه فجوة في الـ lsn؟)"""
+        consumed = 0
+        gap = False
+        cases = []
+        timestamps = []
+        first = self.lsn + 1
+        for end, case in iter_cases(data):
+            if case.lsn > first + len(cases):
+                gap = True
+                break
+            consumed = end
+            if case.lsn < first:
+                continue
+            cases.append((case.ip, case.device_id, case.doc_hash, case.sequence))
+            timestamps.append(case.timestamp)
+        # دفعة وحدة: الـ graph ينشر view كل VIEW_PUBLISH_SECONDS مو مع كل حالة. وبدون ترك
+        # الـ GIL مثل ما كانت حالة حالة (الإقلاع ما فيه أحد ينتظره، وكل ترك ~60µs)
+        self.graph.register_cases(cases, version=first, timestamps=timestamps, yield_seconds=float("inf"))
+        self.lsn += len(cases)
+        return len(cases), consumed, gap
+
+    def _reload(self, repair):
+        """
+        الـ graph المحلي متأخر عن الـ log (segments انحذفت بعد snapshot): نبنيه من جديد.
+        load_snapshot يستبدل محتوى الـ graph كله. بدون snapshot سليم نبدأ من graph فاضي
+        (وإلا الـ log ينطبق فوق الحالات اللي فيه وتنحسب مرتين)، وهذا يحتاج log من lsn 1؛
+        لو ما فيه نبقى على الـ graph الحالي ونرفع StoreRecoveryError (الكتابة تفشل) بدل
+        ما يرجع الـ lsn لورا وتتكرر أرقام الحالات الجديدة.
+        """
+        print(f"[raqeeb] fraud graph fell behind the log at lsn {self.lsn}: reloading")
+        snapshot_lsn = self._load_snapshot()
+        if not snapshot_lsn:
+            segments = self._files(_SEGMENT_NAME)
+            if not segments or segments[0][0] != 1:
+                raise StoreRecoveryError(
+                    f"fraud graph at lsn {self.lsn} fell behind the log in {self.directory}, and there is "
+                    f"no readable snapshot or log from lsn 1 to rebuild it from: keeping the current graph"
+                )
+            self.graph.install({}, SequencePool(), version=0)
+        self._recover(repair, snapshot_lsn)
+        if self._read_path is not None:
+            self._reopen_write()
+
+    def _switch_segment(self, path, first_lsn):
+        self._close_fd("_read_fd")
+        self._read_fd = os.open(path, os.O_RDONLY)
+        self._read_path = path
+        self._offset = 0
+        # segment يبدأ بعد lsn معناها فيه snapshot عند lsn
+        self.snapshot_lsn = max(self.snapshot_lsn, first_lsn - 1)
+
+    def _reopen_write(self):
+        """الكتابة دايماً في نفس الـ segment اللي نقرا منه (آخر segment)."""
+        if self._write_path == self._read_path and self._write_fd is not None:
+            return
+        with self._sync_lock:
+            if self._write_fd is not None:
+                if self._dirty:
+                    os.fsync(self._write_fd)
+                os.close(self._write_fd)
+            self._dirty = False
+            self._write_fd = os.open(self._read_path, os.O_WRONLY | os.O_APPEND)
+            self._write_path = self._read_path
+
+    def _check_snapshot_due(self):
+        if not self._snapshot_due and self.lsn - self.snapshot_lsn >= self.snapshot_every:
+            self._snapshot_due = True
+            self._wake.set()
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        if fcntl is None:   # بدون fcntl (Windows): process واحد بس
+            yield
+            return
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _start_thread(self):
+        self._thread = threading.Thread(target=self._run, name="graph-store", daemon=True)
+        self._thread.start()
+        if self._snapshot_due:
+            self._wake.set()
+
+    def _after_fork(self):
+        if self._closed or self._lock_fd is None:
+            return
+        self._init_locks()
+        # flock مربوط بالـ open file description: نفتح LOCK من جديد للـ process هذا
+        os.close(self._lock_fd)
+        self._lock_fd = os.open(os.path.join(self.directory, "LOCK"), os.O_RDWR)
+        self._start_thread()
+
+    def _run(self):
+        aging = self.graph.asset_ttl_seconds is not None and self.evict_interval > 0
+        intervals = [i for i in (self.fsync_interval, self.poll_interval) if i > 0]
+        if aging:
+            intervals.append(self.evict_interval)
+        timeout = min(intervals) if intervals else None
+        next_evict = time.monotonic() + self.evict_interval
+        while not self._closed:
+            self._wake.wait(timeout)
+            self._wake.clear()
+            if self._closed:
+                break
+            try:
+                self.sync()
+                self.refresh()
+                if aging and time.monotonic() >= next_evict:
+                    next_evict = time.monotonic() + self.evict_interval
+                    self.evict_expired()
+                if self._snapshot_due:
+                    self.snapshot(only_if_due=True)
+            except OSError as exc:
+                print(f"[raqeeb] fraud graph store error: {exc}")
+
+    def _prune(self):
+        """نخلي آخر SNAPSHOT_KEEP snapshots والـ segments اللي بعد أقدمها."""
+        snapshots = self._files(_SNAPSHOT_NAME)
+        for _, path in snapshots[:-SNAPSHOT_KEEP]:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+        oldest_kept = snapshots[-SNAPSHOT_KEEP:][0][0]
+
+        segments = self._files(_SEGMENT_NAME)
+        for (_, path), (next_first, _) in zip(segments, segments[1:]):
+            if next_first - 1 <= oldest_kept:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+
+    def _files(self, pattern):
+        """[(lsn, path)] مرتبة للملفات اللي أسماؤها تطابق pattern."""
+        found = []
+        for name in os.listdir(self.directory):
+            match = pattern.match(name)
+            if match:
+                found.append((int(match.group(1)), os.path.join(self.directory, name)))
+        return sorted(found)
+
+    def _latest(self, pattern):
+        files = self._files(pattern)
+        return files[-1][0] if files else 0
+
+    def _segment_path(self, first_lsn):
+        return os.path.join(self.directory, f"cases-{first_lsn:020d}.log")
+
+    def _close_fd(self, name):
+        fd = getattr(self, name)
+        if fd is not None:
+            os.close(fd)
+            setattr(self, name, None)
+
+
+def _read_from(fd, offset):
+    """كل اللي في الملف من offset لآخره."""
+    chunks = []
+    while True:
+        chunk = os.pread(fd, 1 << 20, offset)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+        offset += len(chunk)
+
+
+def _create_file(path):
+    os.close(os.open(path, os.O_WRONLY | os.O_CREAT, 0o644))
+    _fsync_dir(os.path.dirname(path) or ".")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
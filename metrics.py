@@ -0,0 +1,246 @@
+# metrics.py
+#
+# مقاييس خفيفة لـ /metrics بصيغة Prometheus text:
+#   - histograms لوقت كل طبقة لكل معاملة، ولكل نموذج ML لكل نداء
+#   - counters للقرارات (final_decision) ولأكواد الأسباب، ولجدول النقاط (hit / miss)
+#   - نموذج الـ shadow (model_registry.py): وقته الإضافي والقرار مقابل القرار الفعلي
+#
+# الهدف overhead بالمايكروثانية لكل طلب: الطلب يضيف tuple خام لـ deque (append
+# آمن بين الـ threads بدون lock)، والتجميع يصير دفعة وحدة وقت الـ scrape (أو لما
+# يتجمع MAX_PENDING): searchsorted + bincount لكل طبقة و Counter.update للأسباب.
+
+import threading
+from bisect import bisect_left
+from collections import Counter, deque
+from itertools import chain
+
+import numpy as np
+
+# حدود الـ buckets بالثواني (le) - من 5µs لين 1s
+LATENCY_BUCKETS = (
+    5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+    1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0,
+)
+
+# أقصى عدد تسجيلات تنتظر التجميع (لو ما فيه scrape) قبل ما يجمعها الطلب نفسه
+MAX_PENDING = 16_384
+
+
+class Histogram:
+    """عدد القيم في كل bucket (غير تراكمي) + المجموع. القيم بالـ ns."""
+
+    __slots__ = ("bounds_ns", "counts", "sum_ns")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds_ns = [int(bound * 1e9) for bound in bounds]
+        self.counts = [0] * (len(bounds) + 1)   # الأخير = +Inf
+        self.sum_ns = 0
+
+    def observe_ns(self, value_ns, times=1):
+        self.counts[bisect_left(self.bounds_ns, value_ns)] += times
+        self.sum_ns += value_ns * times
+
+    def observe_many_ns(self, values_ns, times=None):
+        """مصفوفة قيم (int64 ns) دفعة وحدة - نفس حدود observe_ns (le). times: تكرار كل قيمة."""
+        values_ns = np.asarray(values_ns, dtype=np.int64)
+        buckets = np.bincount(
+            np.searchsorted(self.bounds_ns, values_ns), weights=times, minlength=len(self.counts)
+        )
+        self.counts = [count + int(added) for count, added in zip(self.counts, buckets)]
+        self.sum_ns += int(values_ns @ np.asarray(times, dtype=np.int64) if times is not None else values_ns.sum())
+
+
+class Metrics:
+    """
+    transaction_layers: الطبقات المقاسة لكل معاملة في record_transaction (بنفس الترتيب)
+    batch_layers: الطبقات المقاسة لـ batch كامل (record_batch_layer)
+    models: النماذج داخل ai_anomaly_score (record_models بنفس الترتيب)
+    """
+
+    def __init__(self, transaction_layers, batch_layers, models):
+        self.transaction_layers = tuple(transaction_layers)
+        self.models = tuple(models)
+        self.layer_seconds = {layer: Histogram() for layer in (*transaction_layers, *batch_layers)}
+        self.model_seconds = {model: Histogram() for model in models}
+        self.model_rows = {model: 0 for model in models}
+        self.table_rows = {"hit": 0, "miss": 0}   # جدول النقاط (score_table.py)
+        self.decisions = Counter()
+        self.reasons = Counter()         # نص السبب كامل -> عدد (يتجمع بالكود وقت render)
+        self.shadow_seconds = {}         # version -> Histogram (الوقت الإضافي لكل معاملة)
+        self.shadow_decisions = Counter()   # (version، القرار الفعلي، قرار الـ shadow) -> عدد
+        self._transactions = deque()   # (layer_ns, decision, reasons)
+        self._batches = {layer: deque() for layer in batch_layers}   # (ns لكل معاملة، عدد المعاملات)
+        self._model_calls = deque()    # (model_ns, n_rows)
+        self._table_lookups = deque()  # (hits, misses)
+        self._lock = threading.Lock()  # للتجميع بس
+
+    def record_transaction(self, layer_ns, decision, reasons):
+        """معاملة وحدة: layer_ns = ns لكل طبقة بترتيب transaction_layers."""
+        self._transactions.append((layer_ns, decision, reasons))
+        if len(self._transactions) > MAX_PENDING:
+            self.flush()
+
+    def record_batch_layer(self, layer, value_ns, times):
+        """نفس القيمة لـ times معاملة (ai محسوب لـ batch كامل ومقسوم على عدده)."""
+        pending = self._batches[layer]
+        pending.append((value_ns, times))
+        if len(pending) > MAX_PENDING:
+            self.flush()
+
+    def record_models(self, model_ns, n_rows):
+        """نداء batch واحد لكل نموذج على n_rows صف: model_ns بترتيب models."""
+        self._model_calls.append((model_ns, n_rows))
+        if len(self._model_calls) > MAX_PENDING:
+            self.flush()
+
+    def record_table(self, hits, misses):
+        """batch واحد: كم معاملة نقاطها من جدول النقاط وكم راحت للنماذج."""
+        self._table_lookups.append((hits, misses))
+        if len(self._table_lookups) > MAX_PENDING:
+            self.flush()
+
+    def record_shadow(self, version, value_ns, decisions):
+        """
+        معاملات انقيّمت بنموذج الـ shadow: value_ns = الوقت الإضافي لكل معاملة،
+        decisions = [(القرار الفعلي، قرار الـ shadow)]. عينة بس من الطلبات، فمباشرة تحت الـ lock.
+        """
+        with self._lock:
+            histogram = self.shadow_seconds.get(version)
+            if histogram is None:
+                histogram = self.shadow_seconds[version] = Histogram()
+            histogram.observe_ns(value_ns, len(decisions))
+            self.shadow_decisions.update((version, primary, shadow) for primary, shadow in decisions)
+
+    def flush(self):
+        """نجمع التسجيلات المنتظرة في الـ histograms والـ counters."""
+        with self._lock:
+            pending = self._transactions
+            entries = [pending.popleft() for _ in range(len(pending))]
+            if entries:
+                layer_ns, decisions, reasons = zip(*entries)
+                columns = np.array(layer_ns, dtype=np.int64).T
+                for layer, values in zip(self.transaction_layers, columns):
+                    self.layer_seconds[layer].observe_many_ns(values)
+                self.decisions.update(decisions)
+                self.reasons.update(chain.from_iterable(reasons))
+
+            for layer, pending in self._batches.items():
+                entries = [pending.popleft() for _ in range(len(pending))]
+                if entries:
+                    values, times = zip(*entries)
+                    self.layer_seconds[layer].observe_many_ns(values, times)
+
+            pending = self._model_calls
+            entries = [pending.popleft() for _ in range(len(pending))]
+            if entries:
+                model_ns, n_rows = zip(*entries)
+                columns = np.array(model_ns, dtype=np.int64).T
+                rows = sum(n_rows)
+                for model, values in zip(self.models, columns):
+                    self.model_seconds[model].observe_many_ns(values)
+                    self.model_rows[model] += rows
+
+            pending = self._table_lookups
+            entries = [pending.popleft() for _ in range(len(pending))]
+            if entries:
+                hits, misses = zip(*entries)
+                self.table_rows["hit"] += sum(hits)
+                self.table_rows["miss"] += sum(misses)
+
+    def render(self):
+        """الـ histograms والـ counters بصيغة Prometheus text (بدون الـ gauges)."""
+        self.flush()
+        with self._lock:
+            layers = {name: _copy(h) for name, h in self.layer_seconds.items()}
+            models = {name: _copy(h) for name, h in self.model_seconds.items()}
+            model_rows = dict(self.model_rows)
+            table_rows = dict(self.table_rows)
+            decisions = dict(self.decisions)
+            shadow = {version: _copy(h) for version, h in self.shadow_seconds.items()}
+            shadow_decisions = dict(self.shadow_decisions)
+            reasons = Counter()
+            # أكواد الأسباب بدون الجزء المتغير بعد ":" (مثل ml_nn_high_risk_proba:0.83)
+            for reason, count in self.reasons.items():
+                reasons[reason.partition(":")[0]] += count
+
+        lines = []
+        lines += render_histogram(
+            "raqeeb_layer_seconds", "Time spent in each risk layer per transaction", "layer", layers
+        )
+        lines += render_histogram(
+            "raqeeb_model_seconds", "Time per batched call of each ML model", "model", models
+        )
+        lines += render_samples(
+            "raqeeb_model_rows_total", "counter", "Rows scored by each ML model",
+            [({"model": name}, value) for name, value in model_rows.items()],
+        )
+        lines += render_samples(
+            "raqeeb_score_table_rows_total", "counter",
+            "Transactions scored from the ML score table (hit) or by the models (miss)",
+            [({"result": name}, value) for name, value in table_rows.items()],
+        )
+        lines += render_samples(
+            "raqeeb_decisions_total", "counter", "Transactions by final decision",
+            [({"decision": name}, value) for name, value in sorted(decisions.items())],
+        )
+        lines += render_samples(
+            "raqeeb_reasons_total", "counter", "Reason codes returned by /evaluate",
+            [({"reason": name}, value) for name, value in sorted(reasons.items())],
+        )
+        lines += render_histogram(
+            "raqeeb_shadow_ai_seconds", "Extra AI layer time per transaction scored by the shadow models",
+            "version", shadow,
+        )
+        lines += render_samples(
+            "raqeeb_shadow_decisions_total", "counter", "Shadow-scored transactions by active and shadow decision",
+            [
+                ({"version": version, "primary": primary, "shadow": shadow_decision}, value)
+                for (version, primary, shadow_decision), value in sorted(shadow_decisions.items())
+            ],
+        )
+        return lines
+
+
+def render_samples(name, kind, help_text, samples):
+    """سطور metric بسيطة (gauge / counter): samples = [(labels dict, value)]."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels)} {_number(value)}")
+    return lines
+
+
+def render_histogram(name, help_text, label, histograms, scale=1e-9):
+    """
+    histograms: {قيمة الـ label: (bounds, counts, sum)} -> buckets تراكمية + _sum + _count.
+    scale: نحوّل الحدود والمجموع لوحدة الـ metric (ns -> ثواني افتراضياً).
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for value, (bounds, counts, total) in histograms.items():
+        cumulative = 0
+        for bound, count in zip(bounds, counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels({label: value, "le": _number(bound * scale)})} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'{name}_bucket{_labels({label: value, "le": "+Inf"})} {cumulative}')
+        lines.append(f"{name}_sum{_labels({label: value})} {_number(round(total * scale, 9))}")
+        lines.append(f"{name}_count{_labels({label: value})} {cumulative}")
+    return lines
+
+
+def _copy(histogram):
+    return histogram.bounds_ns, list(histogram.counts), histogram.sum_ns
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    parts = ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items())
+    return "{" + parts + "}"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -0,0 +1,255 @@
+# model_bundle.py
+#
+# model bundle: ملف واحد فيه النماذج الثلاثة (RF + IsolationForest + MLP مع الـ scaler)
+# كجداول NumPy مضغوطة، بدل 4 pickles حق sklearn مربوطة بنسخة sklearn.
+# ينقرأ بـ NumPy بس (بدون sklearn / joblib)، وينفتح بـ mmap.
+#
+# شكل الملف (نفس فكرة snapshots الـ graph_store.py):
+#   magic (8) | طول الـ manifest | crc32(manifest) | manifest (JSON) | المصفوفات (محاذاة 64)
+#
+# الـ manifest:
+#   feature_order     ترتيب الـ 8 features اللي تدربت عليه النماذج
+#   sources           sha256 لكل pickle انبنى منه الـ bundle (نعرف لو صار قديم)
+#   payload_sha256    sha256 لبايتات المصفوفات
+#   training          بيانات التدريب (حجم البيانات، الدقة، نسخة sklearn...)
+#   checks            نتيجة self-check الـ FusedMLP مقابل sklearn وقت البناء
+#   models / arrays   meta كل نموذج ومكان كل مصفوفة في الملف
+#
+# التصدير من pickles موجودة (نماذج قبل ما train_model.py يكتب الـ bundle):
+#   python model_bundle.py [models_dir]
+
+import datetime
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from compiled_models import (
+    CompiledIsolationForest,
+    CompiledRandomForest,
+    FusedMLP,
+    check_fused_mlp,
+    self_check_rows,
+)
+
+BUNDLE_MAGIC = b"RQMODEL1"
+BUNDLE_FORMAT = 1
+ARRAY_ALIGN = 64
+BUNDLE_NAME = "raqeeb_models.bundle"
+
+# ترتيب الـ features في train_model.py و build_model_features في app.py
+FEATURE_ORDER = (
+    "device_is_known",
+    "location_change_km",
+    "hour_of_day",
+    "ops_last_24h",
+    "is_sensitive_service",
+    "session_length",
+    "sensitive_count",
+    "repeated_flag",
+)
+
+# الـ pickles اللي ينبني منها الـ bundle (أسماء الملفات داخل مجلد models/)
+SOURCE_FILES = {
+    "rf": "security_risk_model.pkl",
+    "iso": "isolation_forest_model.pkl",
+    "nn": "neural_network_model.pkl",
+    "scaler": "scaler.pkl",
+}
+
+_MODEL_KINDS = {
+    "rf": CompiledRandomForest,
+    "iso": CompiledIsolationForest,
+    "nn": FusedMLP,
+}
+
+_HEAD = struct.Struct("<8sII")   # magic، طول الـ manifest، crc32(manifest)
+
+
+class BundleError(ValueError):
+    """bundle ناقص أو خربان أو بصيغة / features ما نعرفها."""
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_hashes(models_dir):
+    """sha256 لكل pickle في models_dir، أو None لو واحد منها مو موجود."""
+    paths = {name: os.path.join(models_dir, filename) for name, filename in SOURCE_FILES.items()}
+    if not all(os.path.exists(path) for path in paths.values()):
+        return None
+    return {name: file_sha256(path) for name, path in paths.items()}
+
+
+def compile_models(rf_model, iso_model, nn_model, scaler):
+    """النسخ المضغوطة من نماذج sklearn + نتيجة self-check الـ FusedMLP."""
+    models = {
+        "rf": CompiledRandomForest(rf_model),
+        "iso": CompiledIsolationForest(iso_model),
+        "nn": FusedMLP(nn_model, scaler),
+    }
+    ok, max_diff = check_fused_mlp(models["nn"], nn_model, scaler, self_check_rows())
+    return models, {"fused_mlp_ok": bool(ok), "fused_mlp_max_diff": max_diff}
+
+
+def write_bundle(path, models, checks, sources=None, training=None):
+    """
+    نكتب الـ bundle لملف مؤقت ثم rename (process ثاني يقرأ يا القديم يا الجديد كامل).
+    نرجّع الـ manifest.
+    """
+    arrays = {}
+    manifest_models = {}
+    for name, model in models.items():
+        model_arrays, meta = model.to_arrays()
+        for field, arr in model_arrays.items():
+            arrays[f"{name}.{field}"] = np.ascontiguousarray(arr)
+        manifest_models[name] = {"meta": meta, "arrays": sorted(model_arrays)}
+
+    layout = {}
+    offset = 0
+    payload_digest = hashlib.sha256()
+    for key, arr in arrays.items():
+        offset = _align(offset)
+        layout[key] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+        offset += arr.nbytes
+        payload_digest.update(arr.data)
+
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "feature_order": list(FEATURE_ORDER),
+        "sources": sources or {},
+        "payload_sha256": payload_digest.hexdigest(),
+        "training": training or {},
+        "checks": checks,
+        "numpy_version": np.__version__,
+        "models": manifest_models,
+        "arrays": layout,
+    }
+    manifest_bytes = json.dumps(manifest, separators=(",", ":")).encode()
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEAD.pack(BUNDLE_MAGIC, len(manifest_bytes), zlib.crc32(manifest_bytes)))
+        f.write(manifest_bytes)
+        data_start = _align(f.tell())
+        for key, arr in arrays.items():
+            f.write(b"\0" * (data_start + layout[key]["offset"] - f.tell()))
+            f.write(arr.data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def read_manifest(path):
+    """الـ manifest بس (بدون المصفوفات)."""
+    with open(path, "rb") as f:
+        manifest, _ = _parse_head(f.read(_HEAD.size), f.read)
+    return manifest
+
+
+def read_bundle(path, verify=True, timings=None):
+    """
+    نفتح الـ bundle بـ mmap: (models، manifest). المصفوفات views على الملف (read-only)
+    والـ worker processes تتشارك نفس الصفحات. verify: نتحقق من payload_sha256.
+    timings: dict نعبيه بوقت بناء كل نموذج (ثواني).
+    """
+    with open(path, "rb") as f:
+        view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    manifest, data_start = _parse_head(view[:_HEAD.size], _reader(view, _HEAD.size))
+
+    layout = manifest["arrays"]
+    end = data_start + max((entry["offset"] + _nbytes(entry) for entry in layout.values()), default=0)
+    if end > len(view):
+        raise BundleError("truncated model bundle")
+    if verify:
+        digest = hashlib.sha256()
+        for entry in layout.values():
+            start = data_start + entry["offset"]
+            digest.update(view[start:start + _nbytes(entry)])
+        if digest.hexdigest() != manifest["payload_sha256"]:
+            raise BundleError("model bundle checksum mismatch")
+
+    models = {}
+    for name, entry in manifest["models"].items():
+        started = time.perf_counter()
+        arrays = {}
+        for field in entry["arrays"]:
+            spec = layout[f"{name}.{field}"]
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"], dtype=np.int64))
+            arrays[field] = np.frombuffer(
+                view, dtype=dtype, count=count, offset=data_start + spec["offset"]
+            ).reshape(spec["shape"])
+        models[name] = _MODEL_KINDS[name].from_arrays(arrays, entry["meta"])
+        if timings is not None:
+            timings[name] = time.perf_counter() - started
+    return models, manifest
+
+
+def export_bundle(models_dir="models", training=None, path=None):
+    """نبني الـ bundle من الـ pickles في models_dir (يحتاج sklearn). نرجّع الـ manifest."""
+    import joblib
+
+    loaded = {
+        name: joblib.load(os.path.join(models_dir, filename))
+        for name, filename in SOURCE_FILES.items()
+    }
+    models, checks = compile_models(loaded["rf"], loaded["iso"], loaded["nn"], loaded["scaler"])
+    return write_bundle(
+        path or os.path.join(models_dir, BUNDLE_NAME),
+        models,
+        checks,
+        sources=source_hashes(models_dir),
+        training=training,
+    )
+
+
+def _parse_head(head, read):
+    if len(head) < _HEAD.size:
+        raise BundleError("truncated model bundle header")
+    magic, manifest_len, manifest_crc = _HEAD.unpack_from(head)
+    if magic != BUNDLE_MAGIC:
+        raise BundleError("not a raqeeb model bundle")
+    manifest_bytes = bytes(read(manifest_len))
+    if len(manifest_bytes) != manifest_len or zlib.crc32(manifest_bytes) != manifest_crc:
+        raise BundleError("model bundle manifest checksum mismatch")
+    manifest = json.loads(manifest_bytes)
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise BundleError(f"unsupported model bundle format {manifest.get('format')}")
+    if tuple(manifest.get("feature_order", ())) != FEATURE_ORDER:
+        raise BundleError(f"model bundle feature order {manifest.get('feature_order')} != {list(FEATURE_ORDER)}")
+    return manifest, _align(_HEAD.size + manifest_len)
+
+
+def _reader(view, offset):
+    return lambda n: view[offset:offset + n]
+
+
+def _nbytes(spec):
+    return int(np.prod(spec["shape"], dtype=np.int64)) * np.dtype(spec["dtype"]).itemsize
+
+
+def _align(offset):
+    return -(-offset // ARRAY_ALIGN) * ARRAY_ALIGN
+
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else "models"
+    manifest = export_bundle(directory)
+    bundle_path = os.path.join(directory, BUNDLE_NAME)
+    print(f"model bundle written: {bundle_path} ({os.path.getsize(bundle_path) / 1024:.0f} KB)")
+    if not manifest["checks"]["fused_mlp_ok"]:
+        print(f"WARNING: fused MLP differs from sklearn by {manifest['checks']['fused_mlp_max_diff']:.3g}")
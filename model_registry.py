@@ -0,0 +1,392 @@
+# model_registry.py
+#
+# registry للنماذج: نسخة active تخدم الطلبات + candidate اختياري بالظل (shadow).
+# - الطلب ياخذ registry.active مرة وحدة (ModelSet كامل)، فالتبديل = إسناد reference
+#   واحد: الطلبات الشغالة تكمل على النسخة القديمة، وما فيه طلب يشوف خليط نسختين
+# - reload يحمّل النسخة الجديدة (bundle أو pickles) ويتحقق منها على صفوف عشوائية
+#   في thread خلفي، و /evaluate ما ينتظر شي. لو فشل التحميل أو التحقق تبقى الحالية
+# - watch: thread يراقب ملفات مجلد النسخة الحالية (mtime + حجم) ويعيد التحميل لما
+#   تتغير وتثبت (نفس البصمة مرتين ورا بعض - train_model.py يكون خلّص الكتابة)
+# - shadow: candidate يتقيّم على نسبة من الطلبات بدون ما يأثر على القرار (app.py
+#   يسجل وقته والفرق في القرارات في /metrics)؛ promote يخليه active
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+from compiled_models import self_check_rows
+from model_bundle import (
+    SOURCE_FILES,
+    BundleError,
+    compile_models,
+    read_bundle,
+    source_hashes,
+    write_bundle,
+)
+from score_table import (
+    SCORE_TABLE_NAME,
+    TIE_PROBAS,
+    model_risk_parts,
+    read_score_table,
+    rf_parts,
+    score_table_manifest_path,
+)
+
+
+class ModelValidationError(ValueError):
+    """النسخة الجديدة انحملت لكن مخرجاتها على صفوف الـ self-check غلط."""
+
+
+class ModelSet(NamedTuple):
+    """نسخة كاملة من النماذج الثلاثة - كل predict_* ياخذ مصفوفة N×8."""
+
+    version: str
+    predict_rf: Callable      # X -> proba_risky
+    predict_iso: Callable     # X -> (iso_pred -1/1، iso_score)
+    predict_nn: Callable      # X -> nn_proba
+    sklearn: dict             # نماذج sklearn الأصلية لو انحملت (وإلا None)
+    score_table: object       # ScoreTable لنفس النسخة (score_table.py) أو None
+    info: dict                # مصدر ووقت تحميل كل نموذج، المجلد، المسار المستخدم، البصمة (لـ /health)
+
+
+class ModelRegistry:
+    """
+    models_dir: مجلد الـ pickles والـ bundle الافتراضي
+    bundle_path: الـ bundle لـ models_dir ("" = pickles دايماً)؛ لمجلد ثاني نستخدم
+                 نفس اسم الملف داخله
+    compiled_trees / fused_mlp / score_table: نفس RAQEEB_COMPILED_TREES / RAQEEB_FUSED_MLP /
+                 RAQEEB_SCORE_TABLE (الجدول من نفس مجلد النماذج)
+    """
+
+    def __init__(self, models_dir, bundle_path, compiled_trees=True, fused_mlp=True, score_table=True):
+        self.models_dir = models_dir
+        self.bundle_path = bundle_path
+        self.compiled_trees = compiled_trees
+        self.fused_mlp = fused_mlp
+        self.score_table = score_table
+
+        self.active = None
+        self.shadow = None
+        self.shadow_rate = 0.0
+        self.reloads = 0
+        self.last_error = None
+        self._load_lock = threading.Lock()   # تحميل واحد بس في نفس الوقت
+        self._watching = False
+
+    # ---------- التحميل ----------
+
+    def ensure_loaded(self):
+        """النسخة active (نحمّلها أول مرة - الإقلاع أو أول طلب). آمنة مع أكثر من thread."""
+        active = self.active
+        if active is not None:
+            return active
+        with self._load_lock:
+            if self.active is None:
+                self.active = self.load()
+            return self.active
+
+    def load(self, models_dir=None):
+        """نبني ModelSet من مجلد (bundle أو pickles) ونتحقق منه - بدون ما نبدّل."""
+        models_dir = models_dir or self.models_dir
+        started = time.perf_counter()
+        info = {"models_dir": models_dir, "models": {}, "sklearn": {}}
+        sk = None
+        version = None
+        use_fused = self.fused_mlp
+        compiled = {}
+
+        if self.compiled_trees or self.fused_mlp:
+            compiled, checks, version, sk = self._load_compiled(models_dir, info)
+            # لو FusedMLP طلع برّا الـ tolerance وقت البناء نرجع لمسار sklearn
+            if use_fused and not checks["fused_mlp_ok"]:
+                print(
+                    f"[raqeeb] WARNING: fused MLP differs from sklearn by {checks['fused_mlp_max_diff']:.3g} "
+                    f"(tolerance {compiled['nn'].tolerance:g}) - falling back to sklearn"
+                )
+                use_fused = False
+        if not (self.compiled_trees and use_fused) and sk is None:
+            sk = self._load_sklearn(models_dir, info)
+        if version is None:
+            version = _sources_version(source_hashes(models_dir))
+
+        if self.compiled_trees:
+            predict_rf = compiled["rf"].predict_proba_risky
+            predict_iso = compiled["iso"].predict_with_score
+        else:
+            rf_model, iso_model = sk["rf"], sk["iso"]
+            predict_rf = lambda X: rf_model.predict_proba(X)[:, 1]  # noqa: E731
+            predict_iso = lambda X: (iso_model.predict(X), iso_model.decision_function(X))  # noqa: E731
+        if use_fused:
+            predict_nn = compiled["nn"].predict_proba_risky
+        else:
+            nn_model, scaler = sk["nn"], sk["scaler"]
+            predict_nn = lambda X: nn_model.predict_proba(scaler.transform(X))[:, 1]  # noqa: E731
+
+        model_set = ModelSet(version, predict_rf, predict_iso, predict_nn, sk, None, info)
+        validate(model_set)
+        if self.score_table:
+            model_set = model_set._replace(score_table=self._load_score_table(models_dir, model_set))
+            info["score_table"] = model_set.score_table and model_set.score_table.describe()
+        info.update(
+            version=version,
+            compiled_trees=self.compiled_trees,
+            fused_mlp=use_fused,
+            fingerprint=fingerprint(models_dir, self._bundle_for(models_dir)),
+            loaded_at=time.time(),
+            load_ms=_ms_since(started),
+        )
+        return model_set
+
+    def _load_score_table(self, models_dir, model_set):
+        """جدول النقاط لو موجود ومبني لنفس النسخة ويطابق النماذج (وإلا None = النماذج دايماً)."""
+        path = os.path.join(models_dir, SCORE_TABLE_NAME)
+        try:
+            table = read_score_table(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as exc:
+            print(f"[raqeeb] WARNING: ignoring score table {path}: {exc}")
+            return None
+        if table.model_version != model_set.version:
+            print(f"[raqeeb] score table {path} is for models {table.model_version}, not {model_set.version} - "
+                  "using live inference (rebuild: python score_table.py)")
+            return None
+        mismatches = check_score_table(table, model_set)
+        if mismatches:
+            print(f"[raqeeb] WARNING: score table {path} disagrees with the models on {mismatches} grid points - ignoring it")
+            return None
+        return table
+
+    def _bundle_for(self, models_dir):
+        if not self.bundle_path:
+            return ""
+        if os.path.realpath(models_dir) == os.path.realpath(self.models_dir):
+            return self.bundle_path
+        return os.path.join(models_dir, os.path.basename(self.bundle_path))
+
+    def _load_sklearn(self, models_dir, info):
+        """نماذج sklearn الأصلية (joblib.load هنا اللي يسحب sklearn و scipy)."""
+        import joblib
+
+        loaded = {}
+        for name, filename in SOURCE_FILES.items():
+            started = time.perf_counter()
+            loaded[name] = joblib.load(os.path.join(models_dir, filename))
+            info["sklearn"][name] = {"load_ms": _ms_since(started)}
+        return loaded
+
+    def _compile_from_pickles(self, models_dir, info):
+        sk = self._load_sklearn(models_dir, info)
+        models, checks = compile_models(sk["rf"], sk["iso"], sk["nn"], sk["scaler"])
+        for name in models:
+            info["models"][name] = {"source": "pickle", "load_ms": info["sklearn"][name]["load_ms"]}
+        return models, checks, sk
+
+    def _load_compiled(self, models_dir, info):
+        """
+        النماذج المضغوطة من الـ bundle (mmap): (models، checks، version، sklearn أو None).
+        لو الـ bundle ما هو موجود، أو خربان، أو الـ pickles تغيرت بعده (تدريب جديد
+        بدون bundle)، نبنيها من الـ pickles ونكتب bundle جديد.
+        """
+        bundle_path = self._bundle_for(models_dir)
+        sources = source_hashes(models_dir)   # None = ما فيه pickles (deploy بالـ bundle بس)
+        if not bundle_path:
+            models, checks, sk = self._compile_from_pickles(models_dir, info)
+            return models, checks, _sources_version(sources), sk
+
+        timings = {}
+        try:
+            models, manifest = read_bundle(bundle_path, timings=timings)
+            if sources is None or manifest["sources"] == sources:
+                for name, seconds in timings.items():
+                    info["models"][name] = {"source": "bundle", "load_ms": round(seconds * 1000, 2)}
+                info["bundle"] = {"path": bundle_path, "created_at": manifest["created_at"]}
+                return models, manifest["checks"], manifest["payload_sha256"][:12], None
+            print(f"[raqeeb] model bundle {bundle_path} is older than the pickles - rebuilding")
+        except FileNotFoundError:
+            pass
+        except (OSError, BundleError) as exc:
+            print(f"[raqeeb] WARNING: ignoring model bundle {bundle_path}: {exc}")
+
+        models, checks, sk = self._compile_from_pickles(models_dir, info)
+        version = _sources_version(sources)
+        try:
+            manifest = write_bundle(bundle_path, models, checks, sources=sources)
+            version = manifest["payload_sha256"][:12]
+        except OSError as exc:
+            print(f"[raqeeb] WARNING: could not write model bundle {bundle_path}: {exc}")
+        return models, checks, version, sk
+
+    # ---------- التبديل ----------
+
+    def reload(self, models_dir=None, shadow=False, sample_rate=0.0, wait=False):
+        """
+        نحمّل نسخة جديدة ونخليها active (أو shadow بنسبة sample_rate من الطلبات).
+        wait=False: التحميل في thread خلفي ونرجع على طول. نرجّع False لو فيه
+        تحميل ثاني شغال.
+        """
+        if not self._load_lock.acquire(blocking=False):
+            return False
+
+        def run():
+            try:
+                self._swap(models_dir, shadow, sample_rate)
+            finally:
+                self._load_lock.release()
+
+        if wait:
+            run()
+        else:
+            threading.Thread(target=run, name="raqeeb-model-reload", daemon=True).start()
+        return True
+
+    def _swap(self, models_dir, shadow, sample_rate):
+        try:
+            model_set = self.load(models_dir)
+        # أي خطأ في التحميل (pickle من نسخة sklearn ثانية، ملف ناقص...) = نبقى على الحالية
+        except Exception as exc:
+            self.last_error = {"models_dir": models_dir or self.models_dir, "error": str(exc), "at": time.time()}
+            print(f"[raqeeb] WARNING: model reload from {models_dir or self.models_dir} failed: {exc}")
+            return
+        self.last_error = None
+        if shadow:
+            self.shadow_rate = sample_rate
+            self.shadow = model_set
+            print(f"[raqeeb] shadow models {model_set.version} loaded ({sample_rate:.0%} of traffic)")
+        else:
+            previous = self.active
+            self.active = model_set
+            self.reloads += 1
+            print(f"[raqeeb] models {previous.version if previous else None} -> {model_set.version}")
+
+    def promote(self):
+        """الـ shadow يصير active. نرجّع False لو ما فيه shadow."""
+        candidate = self.shadow
+        if candidate is None:
+            return False
+        self.active = candidate
+        self.shadow = None
+        self.reloads += 1
+        print(f"[raqeeb] shadow models {candidate.version} promoted")
+        return True
+
+    def drop_shadow(self):
+        self.shadow = None
+
+    def describe(self):
+        """حالة الـ registry (لـ /admin/models)."""
+        def summary(model_set):
+            if model_set is None:
+                return None
+            return dict(model_set.info, sklearn_loaded=model_set.sklearn is not None)
+
+        shadow = summary(self.shadow)
+        if shadow is not None:
+            shadow["sample_rate"] = self.shadow_rate
+        return {
+            "active": summary(self.active),
+            "shadow": shadow,
+            "reloads": self.reloads,
+            "loading": self._load_lock.locked(),
+            "watching": self._watching,
+            "last_error": self.last_error,
+        }
+
+    # ---------- المراقبة ----------
+
+    def watch(self, interval):
+        """thread يعيد التحميل لما تتغير ملفات مجلد النسخة active."""
+        self._watching = True
+        threading.Thread(target=self._watch, args=(interval,), name="raqeeb-model-watch", daemon=True).start()
+
+    def _watch(self, interval):
+        pending = None
+        while True:
+            time.sleep(interval)
+            active = self.active
+            if active is None:
+                continue
+            models_dir = active.info["models_dir"]
+            current = fingerprint(models_dir, self._bundle_for(models_dir))
+            if current == active.info["fingerprint"]:
+                pending = None
+            elif current != pending:
+                pending = current        # ننتظر لين تثبت الملفات
+            else:
+                print(f"[raqeeb] model files changed in {models_dir} - reloading")
+                if not self.reload(models_dir, wait=True):
+                    continue             # فيه تحميل ثاني شغال: pending باقي ونعيد المرة الجاية
+                # لو التحميل فشل ما نعيد المحاولة لين تتغير الملفات مرة ثانية
+                active.info["fingerprint"] = current
+                pending = None
+
+
+def validate(model_set, X=None):
+    """
+    نشغّل النماذج على صفوف الـ self-check ونتأكد من شكل المخرجات ونطاقها
+    (وتسخن صفحات الـ mmap قبل ما النسخة تخدم طلبات).
+    """
+    X = self_check_rows() if X is None else X
+    proba = np.asarray(model_set.predict_rf(X))
+    iso_pred, iso_score = (np.asarray(a) for a in model_set.predict_iso(X))
+    nn_proba = np.asarray(model_set.predict_nn(X))
+    for name, values in (("rf", proba), ("iso", iso_score), ("nn", nn_proba)):
+        if values.shape != (len(X),) or not np.all(np.isfinite(values)):
+            raise ModelValidationError(f"{name}: bad output shape {values.shape} or non-finite values")
+    if np.any((proba < 0) | (proba > 1)) or np.any((nn_proba < 0) | (nn_proba > 1)):
+        raise ModelValidationError("probabilities outside [0, 1]")
+    if iso_pred.shape != (len(X),) or not np.all(np.isin(iso_pred, (-1, 1))):
+        raise ModelValidationError("iso: predictions must be -1 / 1")
+
+
+def check_score_table(table, model_set, X=None):
+    """
+    صفوف الـ self-check (location زي ما هو): نقاط الغابتين من الجدول لازم تطابق
+    model_risk_parts على مخرجات النماذج بالضبط، ومعها ترميز الجدول لاحتمالات RF على
+    .xx5 (TIE_PROBAS). نرجّع عدد الصفوف المختلفة.
+    """
+    X = self_check_rows() if X is None else X
+    indexes = [table.index_of(row) for row in X]
+    X = X[[i for i, index in enumerate(indexes) if index is not None]]
+    indexes = [index for index in indexes if index is not None]
+    proba_risky = model_set.predict_rf(X)
+    iso_pred, iso_score = model_set.predict_iso(X)
+    mismatches = sum(
+        table.parts(index) != model_risk_parts(proba_risky[i], iso_pred[i], iso_score[i], 0.0)[:2]
+        for i, index in enumerate(indexes)
+    )
+    return mismatches + sum(
+        part != model_risk_parts(proba, 1, 0.0, 0.0)[0] for proba, part in zip(TIE_PROBAS, rf_parts(TIE_PROBAS))
+    )
+
+
+def fingerprint(models_dir, bundle_path):
+    """(اسم، mtime_ns، حجم) لكل ملف نموذج موجود (مع جدول النقاط) - يتغير مع أي كتابة."""
+    paths = [os.path.join(models_dir, filename) for filename in SOURCE_FILES.values()]
+    table_path = os.path.join(models_dir, SCORE_TABLE_NAME)
+    paths += [table_path, score_table_manifest_path(table_path)]
+    if bundle_path:
+        paths.append(bundle_path)
+    result = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        result.append((os.path.basename(path), stat.st_mtime_ns, stat.st_size))
+    return result
+
+
+def _sources_version(sources):
+    if not sources:
+        return "unknown"
+    return hashlib.sha256(json.dumps(sources, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _ms_since(started):
+    return round((time.perf_counter() - started) * 1000, 2)
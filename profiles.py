@@ -0,0 +1,456 @@
+# profiles.py
+#
+# ملف تعريف لكل مستخدم بالسيرفر نفسه: الأجهزة المعروفة وآخر موقع تقريبي، عشان
+# /evaluate يحسب device_is_known و location_change_km بنفسه بدل ما الـ gateway
+# يسوي query لقاعدة البيانات مع كل معاملة.
+#
+# - الجدول أعمدة NumPy (open addressing + linear probing) بسعة ثابتة من max_users:
+#   مفتاح المستخدم = blake2b 64-bit لـ user_id (ما نخزن الـ string)، ~33 byte لكل خانة
+#   (المفتاح + آخر نشاط + lat/lon بدقة 0.01° + 4 بصمات أجهزة 32-bit)
+# - الأجهزة: لحد EXACT_DEVICES بصمات بالضبط؛ المستخدم اللي يتعدى (heavy user)
+#   ينقل لـ Bloom filter بحجم ثابت BLOOM_BYTES (ذاكرة محدودة لكل مستخدم، مع احتمال
+#   false positive صغير = جهاز جديد نحسبه معروف)
+# - القراءة والتحديث من Python على memoryviews (بدون NumPy scalars): probe أو اثنين
+# - الحذف: المستخدم اللي ما له نشاط من inactive_seconds، أو الأقدم نشاطاً لما يمتلي
+#   الجدول، يصير tombstone (عمليات vectorized على الأعمدة)، ولما تكثر الـ tombstones
+#   نعيد بناء الجدول vectorized
+# - snapshot: المستخدمين الموجودين بس (.npz) -> tmp (لكل process) -> fsync -> rename؛
+#   التحميل يعيد البناء بأي سعة
+# - لكل process مثل عدادات السرعة: مع gunicorn -w N كل worker له نسخته، والـ snapshot
+#   ينكتب تحت flock (ملف .lock جنبه) بعد ما ندمج فيه الـ snapshot الموجود (merge_columns):
+#   كل worker يضيف مستخدمينه بدل ما يمسح اللي كتبه غيره
+
+import contextlib
+import hashlib
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: بدون قفل بين الـ processes
+    fcntl = None
+
+from graph_store import _fsync_dir
+
+SNAPSHOT_NAME = "profiles.npz"
+SNAPSHOT_FORMAT = 1
+
+EXACT_DEVICES = 4             # بصمات الأجهزة المخزنة بالضبط لكل مستخدم
+BLOOM_BYTES = 64              # Bloom filter للمستخدم اللي أجهزته أكثر (512 bit)
+BLOOM_HASHES = 4
+BLOOM_MODE = 255              # n_devices = BLOOM_MODE -> الأجهزة في الـ Bloom filter
+
+MAX_LOAD = 0.7                # أقصى نسبة امتلاء للجدول (مستخدمين / خانات)
+REBUILD_TOMBSTONES = 0.1      # نعيد البناء لما الـ tombstones تتعدى هالنسبة من الخانات
+EVICT_FRACTION = 0.01         # لما يمتلي الجدول: نشيل هالنسبة من الأقدم نشاطاً
+
+GEO_SCALE = 100               # lat / lon مخزنة int16 بوحدة 0.01° (~1 km)
+NO_GEO = -32768
+EARTH_RADIUS_KM = 6371.0
+
+EMPTY = 0
+TOMBSTONE = 1
+
+
+def user_key(user_id):
+    """مفتاح 64-bit ثابت بين الـ processes والتشغيلات (0 و 1 محجوزة)."""
+    key = int.from_bytes(hashlib.blake2b(str(user_id).encode(), digest_size=8).digest(), "little")
+    return key if key > TOMBSTONE else key + 2
+
+
+def device_fingerprint(device_id):
+    """بصمة 32-bit للجهاز (0 = خانة فاضية)."""
+    fp = int.from_bytes(hashlib.blake2b(str(device_id).encode(), digest_size=4).digest(), "little")
+    return fp or 1
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _bloom_bits(fp):
+    # double hashing: BLOOM_HASHES مواقع من بصمة وحدة
+    a, b = fp & 0xFFFF, (fp >> 16) | 1
+    n_bits = BLOOM_BYTES * 8
+    return [(a + i * b) % n_bits for i in range(BLOOM_HASHES)]
+
+
+def _bloom_add(bloom, fp):
+    for bit in _bloom_bits(fp):
+        bloom[bit >> 3] |= 1 << (bit & 7)
+
+
+def _bloom_has(bloom, fp):
+    return all(bloom[bit >> 3] & (1 << (bit & 7)) for bit in _bloom_bits(fp))
+
+
+def _capacity(max_users):
+    return 1 << max(4, math.ceil(math.log2(max_users / MAX_LOAD)))
+
+
+COLUMNS = ("keys", "last_seen", "lat", "lon", "n_devices", "devices")
+
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """flock حصري على path (بين الـ workers اللي يكتبون نفس الـ snapshot)."""
+    if fcntl is None:   # بدون fcntl (Windows): process واحد بس
+        yield
+        return
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)    # يفك الـ flock
+
+
+def read_snapshot(path):
+    """(columns، blooms) من ملف snapshot. ValueError لو الصيغة غير."""
+    with np.load(path) as data:
+        if int(data["format"]) != SNAPSHOT_FORMAT:
+            raise ValueError(f"unsupported profile snapshot {path}")
+        columns = {name: data[name] for name in COLUMNS}
+        blooms = {
+            key: bytearray(bits.tobytes())
+            for key, bits in zip(data["bloom_keys"].tolist(), data["bloom_bits"])
+        }
+    return columns, blooms
+
+
+def merge_columns(ours, our_blooms, theirs, their_blooms):
+    """
+    مستخدمين snapshot ثاني (worker ثاني) + مستخدمينا. المستخدم اللي عند الاثنين: آخر نشاط
+    وموقع من الأحدث، وأجهزته اتحاد الاثنين (فوق EXACT_DEVICES -> Bloom filter).
+    """
+    rows = {name: np.concatenate([ours[name], theirs[name]]) for name in COLUMNS}
+    blooms = {**their_blooms, **our_blooms}
+    # مرتب بالمفتاح ثم آخر نشاط: آخر صف لكل مفتاح = الأحدث (كل مفتاح مرتين بالكثير)
+    order = np.lexsort((rows["last_seen"], rows["keys"]))
+    keys = rows["keys"][order]
+    newest = np.append(keys[1:] != keys[:-1], True)
+    merged = {name: column[order[newest]] for name, column in rows.items()}
+
+    # المستخدم عند الاثنين: نمر بـ Python بس على اللي أجهزة صفه القديم مو كلها في الأحدث
+    older = np.flatnonzero(~newest)
+    old, new = order[older], order[older + 1]
+    n_devices, devices = rows["n_devices"], rows["devices"]
+    exact = (n_devices[old] != BLOOM_MODE) & (n_devices[new] != BLOOM_MODE)
+    covered = ((devices[old][:, :, None] == devices[new][:, None, :]).any(2) | (devices[old] == 0)).all(1)
+    todo = (n_devices[old] != 0) & ~(exact & covered)
+    pairs = zip(
+        old[todo].tolist(), new[todo].tolist(), np.searchsorted(merged["keys"], keys[older[todo]]).tolist()
+    )
+    for old, new, slot in pairs:
+        key = int(merged["keys"][slot])
+        fps, bloom = [], None
+        for row in (new, old):
+            if n_devices[row] == BLOOM_MODE:
+                bits = (our_blooms if row < len(ours["keys"]) else their_blooms)[key]
+                bloom = bytearray(bits) if bloom is None else bytearray(a | b for a, b in zip(bloom, bits))
+            else:
+                fps += [fp for fp in devices[row][:n_devices[row]].tolist() if fp not in fps]
+        if bloom is None and len(fps) <= EXACT_DEVICES:
+            merged["n_devices"][slot] = len(fps)
+            merged["devices"][slot] = fps + [0] * (EXACT_DEVICES - len(fps))
+            continue
+        bloom = bloom or bytearray(BLOOM_BYTES)
+        for fp in fps:
+            _bloom_add(bloom, fp)
+        blooms[key] = bloom
+        merged["n_devices"][slot] = BLOOM_MODE
+        merged["devices"][slot] = 0
+
+    heavy = set(merged["keys"][merged["n_devices"] == BLOOM_MODE].tolist())
+    return merged, {key: bits for key, bits in blooms.items() if key in heavy}
+
+
+class ProfileStore:
+    """
+    ملفات المستخدمين (أجهزة + آخر موقع) بذاكرة ثابتة.
+    max_users: أقصى عدد مستخدمين (لما نوصله نشيل الأقدم نشاطاً)
+    inactive_seconds: المستخدم اللي ما له نشاط من هالمدة ينشال (None = بدون)
+    """
+
+    def __init__(self, max_users=1_000_000, inactive_seconds=None, clock=time.time):
+        self.max_users = max_users
+        self.inactive_seconds = inactive_seconds
+        self.clock = clock
+        self.evicted_users = 0
+        self.updates = 0                 # يزيد مع كل update (نكتب snapshot بس لو تغير)
+        self._lock = threading.Lock()
+        self._allocate(_capacity(max_users))
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self._mask = capacity - 1
+        self.keys = np.zeros(capacity, np.uint64)
+        self.last_seen = np.zeros(capacity, np.uint32)
+        self.lat = np.full(capacity, NO_GEO, np.int16)
+        self.lon = np.full(capacity, NO_GEO, np.int16)
+        self.n_devices = np.zeros(capacity, np.uint8)
+        self.devices = np.zeros(capacity * EXACT_DEVICES, np.uint32)
+        self.blooms = {}                 # user key -> bytearray(BLOOM_BYTES) للـ heavy users
+        self.size = 0
+        self.tombstones = 0
+        # memoryviews للقراءة والكتابة من Python (أسرع من NumPy scalars)
+        self._keys = memoryview(self.keys)
+        self._last_seen = memoryview(self.last_seen)
+        self._lat = memoryview(self.lat)
+        self._lon = memoryview(self.lon)
+        self._n_devices = memoryview(self.n_devices)
+        self._devices = memoryview(self.devices)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def approx_bytes(self):
+        columns = (self.keys, self.last_seen, self.lat, self.lon, self.n_devices, self.devices)
+        return sum(column.nbytes for column in columns) + len(self.blooms) * (BLOOM_BYTES + 120)
+
+    # ---------- الطلب ----------
+
+    def lookup(self, user_id, device_id=None, lat=None, lon=None):
+        """
+        (device_is_known، location_change_km) من ملف المستخدم، و None لأي قيمة ما نقدر
+        نحسبها (مستخدم جديد، بدون device_id، أو بدون موقع حالي / سابق).
+        """
+        key = user_key(user_id)
+        with self._lock:
+            slot = self._find(key)
+            if slot < 0:
+                return None, None
+            known = None
+            if device_id:
+                known = self._has_device(slot, key, device_fingerprint(device_id))
+            distance = None
+            if lat is not None and lon is not None and self._lat[slot] != NO_GEO:
+                distance = haversine_km(self._lat[slot] / GEO_SCALE, self._lon[slot] / GEO_SCALE, lat, lon)
+            return known, distance
+
+    def update(self, user_id, device_id=None, lat=None, lon=None, now=None):
+        """نضيف الجهاز ونحفظ الموقع (لو موجودين) ونحدث آخر نشاط."""
+        if now is None:
+            now = self.clock()
+        key = user_key(user_id)
+        with self._lock:
+            slot = self._find(key)
+            if slot < 0:
+                if self.size >= self.max_users:
+                    self._evict(now)
+                slot = self._insert(key)
+            self._last_seen[slot] = int(now)
+            self.updates += 1
+            if device_id:
+                self._add_device(slot, key, device_fingerprint(device_id))
+            if lat is not None and lon is not None:
+                self._lat[slot] = round(max(-90.0, min(90.0, lat)) * GEO_SCALE)
+                self._lon[slot] = round(max(-180.0, min(180.0, lon)) * GEO_SCALE)
+
+    # ---------- الجدول ----------
+
+    def _find(self, key):
+        keys, mask = self._keys, self._mask
+        slot = key & mask
+        while True:
+            current = keys[slot]
+            if current == key:
+                return slot
+            if current == EMPTY:
+                return -1
+            slot = (slot + 1) & mask
+
+    def _insert(self, key):
+        """خانة لمفتاح مو موجود: أول tombstone في الطريق أو أول خانة فاضية."""
+        keys, mask = self._keys, self._mask
+        slot = key & mask
+        while keys[slot] > TOMBSTONE:
+            slot = (slot + 1) & mask
+        if keys[slot] == TOMBSTONE:
+            self.tombstones -= 1
+        keys[slot] = key
+        self.size += 1
+        return slot
+
+    def _has_device(self, slot, key, fp):
+        count = self._n_devices[slot]
+        if count == BLOOM_MODE:
+            return _bloom_has(self.blooms[key], fp)
+        base = slot * EXACT_DEVICES
+        return fp in self._devices[base:base + count]
+
+    def _add_device(self, slot, key, fp):
+        count = self._n_devices[slot]
+        if count == BLOOM_MODE:
+            _bloom_add(self.blooms[key], fp)
+            return
+        base = slot * EXACT_DEVICES
+        if fp in self._devices[base:base + count]:
+            return
+        if count < EXACT_DEVICES:
+            self._devices[base + count] = fp
+            self._n_devices[slot] = count + 1
+            return
+        # heavy user: البصمات الحالية + الجديد في Bloom filter
+        bloom = bytearray(BLOOM_BYTES)
+        for known in self._devices[base:base + count]:
+            _bloom_add(bloom, known)
+        _bloom_add(bloom, fp)
+        self.blooms[key] = bloom
+        for i in range(base, base + count):
+            self._devices[i] = 0
+        self._n_devices[slot] = BLOOM_MODE
+
+    # ---------- الحذف وإعادة البناء (vectorized) ----------
+
+    def evict_inactive(self, now=None):
+        """نشيل المستخدمين اللي ما لهم نشاط من inactive_seconds. نرجّع عددهم."""
+        if self.inactive_seconds is None:
+            return 0
+        if now is None:
+            now = self.clock()
+        with self._lock:
+            live = self.keys > TOMBSTONE
+            return self._remove(live & (self.last_seen < now - self.inactive_seconds))
+
+    def _evict(self, now):
+        """الجدول ممتلي: غير النشطين، ولو ما فيه كفاية الأقدم نشاطاً (EVICT_FRACTION)."""
+        live = self.keys > TOMBSTONE
+        removed = 0
+        if self.inactive_seconds is not None:
+            removed = self._remove(live & (self.last_seen < now - self.inactive_seconds))
+            live = self.keys > TOMBSTONE
+        if removed == 0:
+            n = max(1, int(self.size * EVICT_FRACTION))
+            seen = self.last_seen[live]
+            cutoff = np.partition(seen, n - 1)[n - 1]
+            self._remove(live & (self.last_seen <= cutoff))
+
+    def _remove(self, mask):
+        slots = np.flatnonzero(mask)
+        if not len(slots):
+            return 0
+        for key in self.keys[slots][self.n_devices[slots] == BLOOM_MODE].tolist():
+            self.blooms.pop(key, None)
+        self.keys[slots] = TOMBSTONE
+        self.n_devices[slots] = 0
+        self.lat[slots] = NO_GEO
+        self.lon[slots] = NO_GEO
+        self.devices.reshape(-1, EXACT_DEVICES)[slots] = 0
+        self.size -= len(slots)
+        self.tombstones += len(slots)
+        self.evicted_users += len(slots)
+        if self.tombstones > self.capacity * REBUILD_TOMBSTONES:
+            self._rebuild(self.capacity)
+        return len(slots)
+
+    def _columns(self):
+        """نسخة من المستخدمين الموجودين بس (للـ snapshot وإعادة البناء)."""
+        live = np.flatnonzero(self.keys > TOMBSTONE)
+        return {
+            "keys": self.keys[live],
+            "last_seen": self.last_seen[live],
+            "lat": self.lat[live],
+            "lon": self.lon[live],
+            "n_devices": self.n_devices[live],
+            "devices": self.devices.reshape(-1, EXACT_DEVICES)[live],
+        }
+
+    def _rebuild(self, capacity, columns=None, blooms=None):
+        columns = self._columns() if columns is None else columns
+        blooms = self.blooms if blooms is None else blooms
+        self._allocate(capacity)
+        self._install(columns, blooms)
+
+    def _install(self, columns, blooms):
+        """نحط مستخدمين (مفاتيح مميزة) في جدول فاضي: linear probing بجولات vectorized."""
+        keys = columns["keys"].astype(np.uint64)
+        slots = np.empty(len(keys), np.int64)
+        position = (keys & np.uint64(self._mask)).astype(np.int64)
+        pending = np.arange(len(keys))
+        while len(pending):
+            candidate = position[pending]
+            free = self.keys[candidate] == EMPTY
+            # أول مفتاح لكل خانة فاضية ياخذها، والباقي يكمل للخانة اللي بعدها
+            taken, first = np.unique(candidate[free], return_index=True)
+            winners = pending[free][first]
+            self.keys[taken] = keys[winners]
+            slots[winners] = taken
+            placed = np.zeros(len(pending), bool)
+            placed[np.flatnonzero(free)[first]] = True
+            pending = pending[~placed]
+            position[pending] = (position[pending] + 1) & self._mask
+        self.last_seen[slots] = columns["last_seen"]
+        self.lat[slots] = columns["lat"]
+        self.lon[slots] = columns["lon"]
+        self.n_devices[slots] = columns["n_devices"]
+        self.devices.reshape(-1, EXACT_DEVICES)[slots] = columns["devices"]
+        self.blooms = dict(blooms)
+        self.size = len(keys)
+
+    # ---------- snapshot ----------
+
+    def snapshot(self, path, now=None):
+        """
+        المستخدمين الموجودين في path بشكل ذري (tmp -> fsync -> rename). تحت flock على
+        path.lock: لو فيه snapshot (من worker ثاني) ندمجه مع مستخدمينا قبل ما نكتب، بنفس
+        حدود الجدول (غير النشطين ينشالون، وفوق max_users الأحدث نشاطاً). نرجّع عدد المستخدمين.
+        """
+        with self._lock:
+            columns = self._columns()
+            blooms = {key: bytes(bits) for key, bits in self.blooms.items()}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with _file_lock(path + ".lock"):
+            if os.path.exists(path):
+                try:
+                    columns, blooms = merge_columns(columns, blooms, *read_snapshot(path))
+                except (OSError, ValueError, KeyError) as exc:
+                    print(f"[raqeeb] profile snapshot {path} not merged (overwritten): {exc}")
+                if self.inactive_seconds is not None:
+                    now = self.clock() if now is None else now
+                    columns, blooms = self._keep(columns, blooms, columns["last_seen"] >= now - self.inactive_seconds)
+                columns, blooms = self._newest(columns, blooms)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f, format=np.array(SNAPSHOT_FORMAT),
+                    bloom_keys=np.array(list(blooms), np.uint64),
+                    bloom_bits=np.frombuffer(b"".join(blooms.values()), np.uint8).reshape(-1, BLOOM_BYTES),
+                    **columns,
+                )
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            _fsync_dir(os.path.dirname(path) or ".")
+        return len(columns["keys"])
+
+    def restore(self, path):
+        """نحمّل snapshot (لو أكثر من max_users نخلي الأحدث نشاطاً). نرجّع عدد المستخدمين."""
+        columns, blooms = self._newest(*read_snapshot(path))
+        with self._lock:
+            self._rebuild(self.capacity, columns, blooms)
+        return self.size
+
+    def _newest(self, columns, blooms):
+        """لو أكثر من max_users: الأحدث نشاطاً بس."""
+        if len(columns["keys"]) <= self.max_users:
+            return columns, blooms
+        newest = np.zeros(len(columns["keys"]), bool)
+        newest[np.argsort(columns["last_seen"], kind="stable")[-self.max_users:]] = True
+        return self._keep(columns, blooms, newest)
+
+    @staticmethod
+    def _keep(columns, blooms, mask):
+        columns = {name: column[mask] for name, column in columns.items()}
+        kept = set(columns["keys"].tolist())
+        return columns, {key: bits for key, bits in blooms.items() if key in kept}
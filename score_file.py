@@ -0,0 +1,234 @@
+# score_file.py
+#
+# تقييم ملف معاملات تاريخي (JSONL أو CSV) offline بدون Flask:
+# نفس الطبقات الأربع ونفس مسار /evaluate-batch بالضبط
+# (parse_transaction -> ai_anomaly_scores_batch -> score_transaction)، فالقرار
+# والسكورات لكل معاملة مطابقة لرد الـ HTTP.
+#
+# - نقرأ الملف stream على دفعات (chunks) - الذاكرة ثابتة مهما كبر الملف
+# - كل chunk يروح لـ worker process ويتقيم بنداء batch وحد لكل نموذج ML
+# - النتائج تنكتب بنفس ترتيب الإدخال، سطر لكل معاملة (أو سطر error)
+# - نطبع rows/sec على stderr أثناء الشغل وفي الآخر
+#
+# الـ Fraud Graph يتحمل مرة وحدة من RAQEEB_GRAPH_DIR (أو --graph-dir) ويتجمد
+# وقت التقييم: حالات /confirm-fraud الجديدة ما تأثر على تشغيل شغال.
+# عدادات السرعة (velocity.py) وملفات المستخدمين (profiles.py) ونماذج التنقل
+# (sequence_model.py) للطلبات الحية بس: ops_last_24h و device_is_known و location_change_km
+# هنا من الملف نفسه وبدون sequence_drift، فالنتيجة مطابقة لـ /evaluate-batch مع
+# RAQEEB_VELOCITY=0 و RAQEEB_PROFILES=0 و RAQEEB_SEQUENCE_MODEL=0.
+#
+# التشغيل (من جذر المشروع، عشان models/):
+#   python score_file.py transactions.jsonl decisions.jsonl
+#   python score_file.py history.csv decisions.csv --workers 4 --chunk-size 2000
+
+import argparse
+import csv
+import gc
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+# حجم الدفعة الافتراضي (نفس حد /evaluate-batch)
+CHUNK_SIZE = 1000
+# كم chunk نخليه "في الطريق" لكل worker (يحدد سقف الذاكرة)
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+PROGRESS_EVERY_SECONDS = 5.0
+
+# أعمدة CSV اللي قيمها نصية لازم تتحول قبل parse_transaction
+# (bool("false") = True، فما نقدر نمررها كنص مثل الـ JSON)
+CSV_BOOL_FIELDS = {"device_is_known", "is_sensitive_service"}
+CSV_NUMBER_FIELDS = {"location_change_km", "hour_of_day", "ops_last_24h"}
+CSV_TRUE = {"1", "true", "yes", "y", "t"}
+
+LAYER_FIELDS = ["behavior_risk", "ai_risk", "sequence_risk", "graph_risk"]
+CSV_OUTPUT_FIELDS = ["row", "decision", "total_risk"] + LAYER_FIELDS + ["reasons", "error"]
+
+# يتعبى في الـ parent قبل الـ fork، والـ workers يورثونه
+raqeeb = None
+_csv_header = None
+_output_format = "jsonl"
+
+
+def detect_format(path, explicit=None):
+    if explicit:
+        return explicit
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def csv_value(field, value):
+    """قيمة عمود CSV -> نفس النوع اللي يجي في JSON."""
+    if field in CSV_BOOL_FIELDS:
+        return value.strip().lower() in CSV_TRUE
+    if field in CSV_NUMBER_FIELDS:
+        try:
+            return int(value)
+        except ValueError:
+            return float(value)
+    # session_sequence يبقى "login,home,payment" - summarize_session يقبله
+    return value
+
+
+def csv_record(row):
+    """صف CSV -> dict معاملة. الخانات الفاضية ما نمررها عشان تنطبق القيم الافتراضية."""
+    return {
+        field: csv_value(field, value)
+        for field, value in zip(_csv_header, row)
+        if value != ""
+    }
+
+
+def read_chunks(f, fmt, chunk_size):
+    """(رقم أول صف، صفوف خام) - JSONL: أسطر نصية (نتجاهل الفاضية)، CSV: lists."""
+    rows = csv.reader(f) if fmt == "csv" else (line for line in f if line.strip())
+    chunk, first = [], 1
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield first, chunk
+            first += len(chunk)
+            chunk = []
+    if chunk:
+        yield first, chunk
+
+
+def score_chunk(first, chunk, fmt):
+    """
+    نقيّم chunk كامل بنفس مسار /evaluate-batch ونرجّع (أسطر الإخراج، decisions).
+    صف ما نقدر نقراه يطلع كـ error بدون ما يوقف باقي الـ chunk.
+    """
+    records = [None] * len(chunk)
+    errors = {}
+    batch, positions = [], []
+    for i, raw in enumerate(chunk):
+        try:
+            req = json.loads(raw) if fmt == "jsonl" else csv_record(raw)
+            if not isinstance(req, dict):
+                raise ValueError("expected a JSON object")
+            batch.append(raqeeb.parse_transaction(req))
+            positions.append(i)
+        except (ValueError, TypeError, KeyError) as exc:
+            errors[i] = f"{type(exc).__name__}: {exc}"
+
+    ai_results = raqeeb.ai_anomaly_scores_batch(batch)
+    for i, features, ai_result in zip(positions, batch, ai_results):
+        records[i] = raqeeb.score_transaction(features, ai_result)
+    for i, message in errors.items():
+        records[i] = {"error": message}
+
+    decisions = Counter(record.get("decision", "ERROR") for record in records)
+    return [format_record(first + i, record) for i, record in enumerate(records)], decisions
+
+
+def format_record(row, record):
+    if _output_format == "csv":
+        return {
+            "row": row,
+            **{field: record.get(field, "") for field in CSV_OUTPUT_FIELDS[1:-2]},
+            "reasons": "|".join(record.get("reasons", [])),
+            "error": record.get("error", ""),
+        }
+    return json.dumps({"row": row, **record}, ensure_ascii=False)
+
+
+def open_writer(f, fmt):
+    """دالة تكتب list من السجلات المنسقة (format_record) للملف."""
+    if fmt == "csv":
+        writer = csv.DictWriter(f, fieldnames=CSV_OUTPUT_FIELDS)
+        writer.writeheader()
+        return writer.writerows
+    return lambda lines: f.write("".join(line + "\n" for line in lines))
+
+
+def load_app(graph_dir):
+    """نستورد app كـ library (بدون تشغيل السيرفر) ونجمد الـ graph."""
+    global raqeeb
+    if graph_dir is not None:
+        os.environ["RAQEEB_GRAPH_DIR"] = graph_dir
+    # النماذج لازم تكون محمّلة قبل الـ fork (مو في thread خلفي)
+    os.environ["RAQEEB_LAZY_STARTUP"] = "0"
+    # نماذج التنقل تتعلم من الطلبات الحية، وهنا ما فيه شي تتعلم منه
+    os.environ["RAQEEB_SEQUENCE_MODEL"] = "0"
+    import app
+
+    # نوقف متابعة الـ log (thread خلفي) قبل الـ fork: الـ workers يشوفون نفس الـ graph
+    if app.graph_store is not None:
+        app.graph_store.close()
+    raqeeb = app
+    return app
+
+
+def run(args):
+    global _csv_header, _output_format
+    in_format = detect_format(args.input, args.format)
+    _output_format = detect_format(args.output, args.output_format)
+    load_app(args.graph_dir)
+
+    workers = max(1, args.workers)
+    started = time.perf_counter()
+    last_report = started
+    total = 0
+    decisions = Counter()
+
+    with open(args.input, newline="" if in_format == "csv" else None, encoding="utf-8") as fin, \
+            open(args.output, "w", newline="" if _output_format == "csv" else None, encoding="utf-8") as fout:
+        if in_format == "csv":
+            _csv_header = [name.strip() for name in next(csv.reader(fin), [])]
+        write = open_writer(fout, _output_format)
+        chunks = read_chunks(fin, in_format, args.chunk_size)
+
+        def consume(result):
+            nonlocal total, last_report
+            lines, chunk_decisions = result
+            write(lines)
+            total += len(lines)
+            decisions.update(chunk_decisions)
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_EVERY_SECONDS:
+                last_report = now
+                print(f"[raqeeb] {total} rows ({total / (now - started):.0f} rows/sec)", file=sys.stderr)
+
+        if workers == 1:
+            for first, chunk in chunks:
+                consume(score_chunk(first, chunk, in_format))
+        else:
+            # الـ objects الموجودة (النماذج + الـ graph) ما تتغير بعد الـ fork:
+            # نطلعها من الـ GC عشان ما ينسخ صفحاتها في كل worker (copy-on-write)
+            gc.freeze()
+            context = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                pending = deque()
+                for first, chunk in chunks:
+                    pending.append(pool.submit(score_chunk, first, chunk, in_format))
+                    if len(pending) >= workers * CHUNKS_IN_FLIGHT_PER_WORKER:
+                        consume(pending.popleft().result())
+                while pending:
+                    consume(pending.popleft().result())
+
+    elapsed = time.perf_counter() - started
+    summary = ", ".join(f"{name} {count}" for name, count in sorted(decisions.items()))
+    print(
+        f"[raqeeb] scored {total} rows in {elapsed:.2f}s "
+        f"({total / elapsed if elapsed else 0:.0f} rows/sec, {workers} workers): {summary}",
+        file=sys.stderr,
+    )
+    return decisions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline bulk scoring for transaction files (JSONL / CSV).")
+    parser.add_argument("input", help="transactions file (.jsonl or .csv)")
+    parser.add_argument("output", help="decisions file (.jsonl or .csv)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="input format (default: from extension)")
+    parser.add_argument("--output-format", choices=["jsonl", "csv"], help="output format (default: from extension)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="scoring processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="transactions per model batch")
+    parser.add_argument("--graph-dir", help="fraud graph directory (default: RAQEEB_GRAPH_DIR)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parse_args())
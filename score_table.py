@@ -0,0 +1,425 @@
+# score_table.py
+#
+# جدول نقاط الغابات (RF + IsolationForest) محسوب مسبقاً: 7 من الـ 8 features قيم صحيحة
+# بنطاق صغير (نفس نطاقات train_model.py)، و location_change_km بس مستمر. الأشجار ما تشوف
+# من location إلا جهته من كل threshold، فنقسمه buckets على اتحاد thresholds الغابتين له:
+# كل قيم الـ bucket تمشي نفس المسار في كل شجرة، فنقاط الجدول = النماذج بالضبط.
+# لكل نقطة شبكة (7 features صحيحة) نخزن بس الـ buckets اللي يتغير عندها code النقاط
+# (CSR: offsets لكل نقطة، وأول bucket + code بايت لكل نموذج لكل تغيير)، فطبقة الـ ML
+# لمعاملة داخل النطاق = bisect على الـ thresholds + bisect داخل نقطتها + قراءة بايتين.
+# الـ MLP دالة مستمرة في location (ما ينفع buckets)، فيشتغل حي دايماً (FusedMLP، صف واحد
+# ~15 µs) والقرار نفس النماذج بالضبط.
+#
+# - البناء بـ CompiledForest.grid_values_sum على نقطة من كل bucket (نفس النتيجة بالـ bits)
+# - أي feature صحيحة برّا الشبكة (قيمة مو صحيحة، ops > 20، جلسة أطول من 10...) أو
+#   location مو رقم -> النماذج الحقيقية
+# - الجدول مربوط بنسخة النماذج (payload_sha256 حق الـ bundle): لو تغيرت ما ينستخدم
+#
+# الملفات: raqeeb_score_table.npz (thresholds + CSR) + .json (الشبكة والـ codebooks)
+#
+# البناء (من جذر المشروع، بعد train_model.py اللي يبنيه تلقائياً):
+#   python score_table.py [models_dir]
+
+import argparse
+import bisect
+import datetime
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+from model_bundle import BUNDLE_NAME, FEATURE_ORDER, export_bundle, read_bundle, read_manifest, source_hashes
+
+SCORE_TABLE_FORMAT = 3
+SCORE_TABLE_NAME = "raqeeb_score_table.npz"
+
+# الشبكة: (أول قيمة، عدد القيم) للـ features الصحيحة.
+# session_length يبدأ من 0 (جلسة فاضية) مع إن التدريب 1-10.
+DISCRETE_AXES = {
+    "device_is_known": (0, 2),
+    "hour_of_day": (0, 24),
+    "ops_last_24h": (0, 21),
+    "is_sensitive_service": (0, 2),
+    "session_length": (0, 11),
+    "sensitive_count": (0, 4),
+    "repeated_flag": (0, 2),
+}
+LOCATION_FEATURE = "location_change_km"
+
+# ترتيب أبعاد الشبكة: الصغيرة أول و location آخر شي، فأوراق الأشجار blocks متصلة
+# في الذاكرة وقت البناء (أسرع 4x تقريباً من ترتيب FEATURE_ORDER)
+GRID_ORDER = (
+    "device_is_known",
+    "is_sensitive_service",
+    "repeated_flag",
+    "sensitive_count",
+    "session_length",
+    "ops_last_24h",
+    "hour_of_day",
+    LOCATION_FEATURE,
+)
+
+# عدد buckets الـ location اللي نقيّمها مع بعض وقت البناء (حجم الـ buffers)
+BUILD_LOCATION_BLOCK = 64
+VALIDATION_ROWS = 100_000
+# احتمالات RF على .xx5 بالضبط وحولها: التقريب لخانتين هنا يختلف بين round حق Python
+# و NumPy، وصفوف الـ self-check العشوائية نادراً توصلها (check_score_table)
+_TIES = np.arange(50, 100) / 100 + 0.005
+TIE_PROBAS = np.concatenate([np.nextafter(_TIES, 0.0), _TIES, np.nextafter(_TIES, 1.0)])
+
+TABLE_PARTS = ("rf", "iso")
+RF_REASON = "ml_supervised_high_risk_proba"
+ISO_REASON = "ml_unsupervised_anomaly_detected"
+NN_REASON = "ml_nn_high_risk_proba"
+
+
+def model_risk_parts(proba_risky, iso_pred, iso_score, nn_pred_proba):
+    """
+    مخرجات النماذج الثلاثة لمعاملة وحدة -> (risk، reason أو None) لكل نموذج.
+    نفس القواعد في combine_ai_risk (app.py) وفي الجدول (_proba_keys و _iso_keys).
+    """
+    # ----- 2.1 RandomForest (إشرافي) -----
+    # خفض العتبة من 0.6 إلى 0.5 لتقليل False Negatives
+    rf = (int(proba_risky * 25), f"{RF_REASON}:{round(proba_risky, 2)}" if proba_risky > 0.5 else None)
+
+    # ----- 2.2 IsolationForest (أنومالي) -----
+    iso = (min(int(abs(iso_score) * 80), 25), ISO_REASON) if iso_pred == -1 else (0, None)
+
+    return rf, iso, nn_risk_part(nn_pred_proba)
+
+
+def nn_risk_part(nn_pred_proba):
+    """(risk، reason أو None) للـ MLP (حي دايماً، حتى مع الجدول)."""
+    # ----- 2.3 MLP Neural Network -----
+    return (int(nn_pred_proba * 25), f"{NN_REASON}:{round(nn_pred_proba, 2)}" if nn_pred_proba > 0.5 else None)
+
+
+class ScoreTable:
+    """
+    thresholds: thresholds الـ location (float32 مرتبة) - bucket = كم threshold أصغر من القيمة
+    offsets: لكل نقطة شبكة (7 features صحيحة) أول وآخر صف لها في starts / codes
+    starts: أول bucket للصف، codes: (صفوف، 2) uint8 - code لكل نموذج بترتيب TABLE_PARTS
+    codebooks: لكل نموذج list من (risk، reason أو None) حسب الـ code
+    """
+
+    def __init__(self, thresholds, offsets, starts, codes, manifest):
+        self.thresholds = thresholds
+        self.offsets = offsets
+        self.starts = starts
+        self.codes = codes
+        self.manifest = manifest
+        self.model_version = manifest["model_version"]
+        self.codebooks = [
+            [(risk, reason) for risk, reason in manifest["codebooks"][name]] for name in TABLE_PARTS
+        ]
+        # bisect من Python على lists / memoryviews (أسرع من NumPy scalars)
+        self._thresholds = thresholds.tolist()
+        self._offsets = memoryview(offsets)
+        self._starts = memoryview(starts)
+        self._location = FEATURE_ORDER.index(LOCATION_FEATURE)
+        # لكل feature صحيحة بترتيب FEATURE_ORDER: (رقمها، أول قيمة، عدد القيم، stride)
+        shape = grid_shape()
+        strides = dict(zip(GRID_ORDER[:-1], np.cumprod((shape[1:] + (1,))[::-1])[::-1]))
+        self._axes = tuple(
+            (i, *DISCRETE_AXES[feature], int(strides[feature]))
+            for i, feature in enumerate(FEATURE_ORDER) if feature != LOCATION_FEATURE
+        )
+
+    def index_of(self, row):
+        """رقم صف الجدول لصف features (بترتيب FEATURE_ORDER)، أو None لو برّا الشبكة."""
+        cell = 0
+        for i, low, size, stride in self._axes:
+            k = row[i] - low
+            if not (0 <= k < size and k == int(k)):
+                return None
+            cell += int(k) * stride
+        location = row[self._location]
+        if not -1e30 < location < 1e30:    # NaN / inf / برّا float32
+            return None
+        # الشجرة تقارن float32(x) <= threshold، فالـ bucket = كم threshold أصغر من float32(x)
+        bucket = bisect.bisect_left(self._thresholds, float(np.float32(location)))
+        offsets = self._offsets
+        return bisect.bisect_right(self._starts, bucket, offsets[cell], offsets[cell + 1]) - 1
+
+    def parts(self, index):
+        """((risk، reason) للـ RF و IsolationForest) لصف - نفس أول جزئين من model_risk_parts."""
+        rf_code, iso_code = self.codes[index]
+        rf, iso = self.codebooks
+        return rf[rf_code], iso[iso_code]
+
+    def describe(self):
+        """ملخص للـ /health."""
+        return {
+            "model_version": self.model_version,
+            "location_buckets": len(self._thresholds) + 1,
+            "cells": len(self.offsets) - 1,
+            "entries": len(self.starts),
+            "mbytes": round(sum(a.nbytes for a in (self.thresholds, self.offsets, self.starts, self.codes)) / 2**20, 1),
+            "validation": self.manifest.get("validation"),
+        }
+
+
+# ---------- الشبكة ----------
+
+def grid_shape():
+    """شكل شبكة الـ features الصحيحة بترتيب GRID_ORDER (بدون location)."""
+    return tuple(DISCRETE_AXES[feature][1] for feature in GRID_ORDER[:-1])
+
+
+def location_thresholds(models):
+    """اتحاد thresholds الـ location في كل عقد RF و IsolationForest (float32 مرتبة)."""
+    location = FEATURE_ORDER.index(LOCATION_FEATURE)
+    thresholds = []
+    for name in TABLE_PARTS:
+        forest = models[name].forest
+        internal = forest.left != np.arange(len(forest.left))
+        thresholds.append(forest.threshold[internal & (forest.feature == location)])
+    return np.unique(np.concatenate(thresholds).astype(np.float32))
+
+
+def bucket_values(thresholds):
+    """
+    قيمة location من كل bucket (float64): bucket k < n = (thresholds[k-1], thresholds[k]]
+    فـ thresholds[k] نفسه منه، والأخير = أول float32 بعد آخر threshold.
+    """
+    last = np.nextafter(thresholds[-1:], np.float32(np.inf)) if len(thresholds) else np.zeros(1, np.float32)
+    return np.concatenate([thresholds, last]).astype(np.float64)
+
+
+def grid_axes(locations):
+    """قيم كل feature على الشبكة (float64) بترتيب FEATURE_ORDER، و location = locations."""
+    return [
+        np.asarray(locations, dtype=np.float64) if f == LOCATION_FEATURE
+        else DISCRETE_AXES[f][0] + np.arange(DISCRETE_AXES[f][1], dtype=np.float64)
+        for f in FEATURE_ORDER
+    ]
+
+
+# ---------- البناء ----------
+
+def _proba_keys(proba):
+    """
+    (risk، reason) لـ RF كرقم وحد: risk * 128 + (round(p, 2) * 100 + 1 لو p > 0.5 وإلا 0).
+    المسار الحي يعطي model_risk_parts احتمال np.float64، و round(p, 2) له = np.round
+    (rint(p * 100) / 100)، فنفس الحساب هنا يطابقه حتى على .xx5 بالضبط.
+    """
+    risk = (proba * 25).astype(np.int16)
+    percent = np.round(proba * 100)
+    return risk * 128 + np.where(proba > 0.5, percent + 1, 0).astype(np.int16)
+
+
+def rf_parts(proba):
+    """(risk، reason) لكل احتمال RF (float64) مثل ما يخزنها الجدول."""
+    return [tuple(_codebook_entry("rf", key)) for key in _proba_keys(np.asarray(proba, dtype=np.float64))]
+
+
+def _iso_keys(iso_pred, iso_score):
+    risk = np.minimum((np.abs(iso_score) * 80).astype(np.int16), 25)
+    anomaly = iso_pred == -1
+    return np.where(anomaly, risk * 128 + 1, 0).astype(np.int16)
+
+
+def _codebook_entry(name, key):
+    risk, flag = divmod(int(key), 128)
+    if not flag:
+        return [risk, None]
+    if name == "iso":
+        return [risk, ISO_REASON]
+    # (flag - 1) / 100 = نفس الـ float اللي يرجعه round(p, 2)
+    return [risk, f"{RF_REASON}:{(flag - 1) / 100}"]
+
+
+def build_score_table(models, model_version):
+    """
+    models: النماذج المضغوطة من read_bundle. نرجّع (arrays، manifest) - الـ codebooks
+    تنبني من المفاتيح اللي طلعت فعلاً (أقل من 256 لكل نموذج).
+    """
+    started = time.perf_counter()
+    thresholds = location_thresholds(models)
+    locations = bucket_values(thresholds)
+    if len(locations) > np.iinfo(np.uint16).max:
+        raise ValueError(f"{len(locations)} location buckets do not fit a uint16 start")
+    n_cells = math.prod(grid_shape())
+    order = [FEATURE_ORDER.index(feature) for feature in GRID_ORDER]
+
+    # لكل block من الـ buckets: مفاتيح النموذجين (نقاط × buckets) ونخزن بس اللي يتغير
+    # عن الـ bucket اللي قبله (وأول bucket لكل نقطة)
+    previous = None
+    found = []     # (نقاط، buckets، مفاتيح rf، مفاتيح iso) لكل block
+    for start in range(0, len(locations), BUILD_LOCATION_BLOCK):
+        axes = grid_axes(locations[start:start + BUILD_LOCATION_BLOCK])
+        rf = _proba_keys(models["rf"].predict_proba_risky_grid(axes, order)).reshape(n_cells, -1)
+        iso = _iso_keys(*models["iso"].predict_with_score_grid(axes, order)).reshape(n_cells, -1)
+        key = rf.astype(np.int32) << 16 | iso.astype(np.int32)
+        changed = np.empty(key.shape, dtype=bool)
+        changed[:, 0] = True if previous is None else key[:, 0] != previous
+        changed[:, 1:] = key[:, 1:] != key[:, :-1]
+        previous = key[:, -1].copy()
+        cells, columns = np.nonzero(changed)
+        found.append((cells, columns + start, rf[cells, columns], iso[cells, columns]))
+
+    cells, starts, rf, iso = (np.concatenate(column) for column in zip(*found))
+    by_cell = np.lexsort((starts, cells))
+    cells, starts = cells[by_cell], starts[by_cell].astype(np.uint16)
+    keys = np.column_stack([rf[by_cell], iso[by_cell]])
+    offsets = np.zeros(n_cells + 1, dtype=np.uint32)
+    np.cumsum(np.bincount(cells, minlength=n_cells), out=offsets[1:])
+
+    codes = np.empty(keys.shape, dtype=np.uint8)
+    codebooks = {}
+    for j, name in enumerate(TABLE_PARTS):
+        # المفاتيح أرقام صغيرة (risk * 128 + ...)، فـ bincount + lookup أسرع من np.unique
+        unique = np.flatnonzero(np.bincount(keys[:, j]))
+        if len(unique) > 256:
+            raise ValueError(f"{name}: {len(unique)} distinct risk values do not fit a uint8 code")
+        lookup = np.zeros(unique[-1] + 1, dtype=np.uint8)
+        lookup[unique] = np.arange(len(unique))
+        codes[:, j] = lookup[keys[:, j]]
+        codebooks[name] = [_codebook_entry(name, key) for key in unique]
+
+    arrays = {"thresholds": thresholds, "offsets": offsets, "starts": starts, "codes": codes}
+    manifest = {
+        "format": SCORE_TABLE_FORMAT,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "model_version": model_version,
+        "feature_order": list(FEATURE_ORDER),
+        "location_buckets": len(locations),
+        "shape": [n_cells, len(starts)],
+        "codebooks": codebooks,
+        "build_seconds": round(time.perf_counter() - started, 2),
+    }
+    return arrays, manifest
+
+
+def validate_score_table(table, models, rows=VALIDATION_ROWS, seed=0):
+    """
+    نقارن الجدول مع الغابات الحقيقية (model_risk_parts) على صفوف عشوائية داخل الشبكة
+    (لازم 0 اختلاف في الاثنين):
+      thresholds  = location على thresholds الأشجار بالضبط أو أول float32 بعدها
+      continuous  = location أي قيمة بين 0 و 2000 كم
+    """
+    rng = np.random.default_rng(seed)
+    discrete = np.column_stack([
+        np.zeros(rows) if f == LOCATION_FEATURE
+        else rng.integers(DISCRETE_AXES[f][0], DISCRETE_AXES[f][0] + DISCRETE_AXES[f][1], rows)
+        for f in FEATURE_ORDER
+    ]).astype(float)
+    location = FEATURE_ORDER.index(LOCATION_FEATURE)
+    report = {"rows": rows}
+
+    for label in ("thresholds", "continuous"):
+        X = discrete.copy()
+        if label == "thresholds":
+            values = bucket_values(table.thresholds)
+            X[:, location] = values[rng.integers(0, len(values), rows)]
+        else:
+            X[:, location] = rng.uniform(0, 2000, rows)
+        proba_risky = models["rf"].predict_proba_risky(X)
+        iso_pred, iso_score = models["iso"].predict_with_score(X)
+
+        per_model = [0] * len(TABLE_PARTS)
+        any_mismatch = 0
+        for i, row in enumerate(X):
+            live = model_risk_parts(proba_risky[i], iso_pred[i], iso_score[i], 0.0)[:2]
+            cached = table.parts(table.index_of(row))
+            differs = [a != b for a, b in zip(live, cached)]
+            per_model = [n + d for n, d in zip(per_model, differs)]
+            any_mismatch += any(differs)
+        report[label] = {
+            "mismatches": any_mismatch,
+            "mismatch_rate": round(any_mismatch / rows, 5),
+            "per_model": dict(zip(TABLE_PARTS, per_model)),
+        }
+    return report
+
+
+# ---------- الملفات ----------
+
+def score_table_manifest_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+
+def write_score_table(path, arrays, manifest):
+    """المصفوفات (.npz) ثم الـ manifest (.json)، كل واحد لملف مؤقت ثم rename."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    manifest_path = score_table_manifest_path(path)
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, manifest_path)
+
+
+def read_score_table(path):
+    """الجدول (بالذاكرة، ~25 MB). ValueError لو الملفين ما يتطابقون."""
+    with open(score_table_manifest_path(path)) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SCORE_TABLE_FORMAT or tuple(manifest.get("feature_order", ())) != FEATURE_ORDER:
+        raise ValueError(f"unsupported score table {path}")
+    with np.load(path) as data:
+        arrays = {name: data[name] for name in ("thresholds", "offsets", "starts", "codes")}
+    n_cells, n_entries = math.prod(grid_shape()), manifest["shape"][1]
+    expected = {
+        "thresholds": (np.float32, (manifest["location_buckets"] - 1,)),
+        "offsets": (np.uint32, (n_cells + 1,)),
+        "starts": (np.uint16, (n_entries,)),
+        "codes": (np.uint8, (n_entries, len(TABLE_PARTS))),
+    }
+    for name, (dtype, shape) in expected.items():
+        if arrays[name].dtype != dtype or arrays[name].shape != shape:
+            raise ValueError(f"score table {path}: {name} has shape {arrays[name].shape}, expected {shape}")
+    if int(arrays["offsets"][-1]) != n_entries:
+        raise ValueError(f"score table {path}: offsets do not cover {n_entries} entries")
+    return ScoreTable(**arrays, manifest=manifest)
+
+
+def export_score_table(models_dir="models", validate=True):
+    """
+    نبني الجدول من الـ bundle في models_dir (ونبني الـ bundle أول لو ناقص أو أقدم من
+    الـ pickles) ونكتبه جنبه. نرجّع الـ manifest.
+    """
+    bundle_path = os.path.join(models_dir, BUNDLE_NAME)
+    sources = source_hashes(models_dir)
+    if not os.path.exists(bundle_path) or (sources is not None and read_manifest(bundle_path)["sources"] != sources):
+        export_bundle(models_dir)
+    models, bundle_manifest = read_bundle(bundle_path)
+
+    arrays, manifest = build_score_table(models, bundle_manifest["payload_sha256"][:12])
+    if validate:
+        manifest["validation"] = validate_score_table(ScoreTable(**arrays, manifest=manifest), models)
+    write_score_table(os.path.join(models_dir, SCORE_TABLE_NAME), arrays, manifest)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the precomputed forest score table next to the model bundle")
+    parser.add_argument("models_dir", nargs="?", default="models")
+    parser.add_argument("--no-validate", action="store_true", help="skip the comparison with the live models")
+    args = parser.parse_args()
+
+    manifest = export_score_table(args.models_dir, validate=not args.no_validate)
+    path = os.path.join(args.models_dir, SCORE_TABLE_NAME)
+    print(f"score table written: {path} ({os.path.getsize(path) / 2**20:.1f} MB, {manifest['shape'][0]} cells x "
+          f"{manifest['location_buckets']} location buckets -> {manifest['shape'][1]} entries, "
+          f"{manifest['build_seconds']}s) for models {manifest['model_version']}")
+    validation = manifest.get("validation")
+    if validation:
+        for label in ("thresholds", "continuous"):
+            result = validation[label]
+            print(f"  {label:<10} {result['mismatches']} of {validation['rows']} rows differ from the live models "
+                  f"({result['mismatch_rate'] * 100:.2f}%) {result['per_model']}")
+        if validation["thresholds"]["mismatches"] or validation["continuous"]["mismatches"]:
+            print("WARNING: the table disagrees with the models")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+# sequence_index.py
+#
+# فهرس تشابه لسيكوانسات الاحتيال المخزنة على asset واحد (IP / device / doc).
+#
+# compute_graph_risk يحتاج أعلى SequenceMatcher.ratio() بين الجلسة الحالية
+# وكل سيكوانس احتيال سابق. بدل ما نمشي على الكل:
+#   1) نخزن كل سيكوانس مميز مرة وحدة (dedup) مع عدد كل action فيه
+#   2) ratio = 2*M / (len_a + len_b) و M <= تقاطع الـ multisets، فنحسب
+#      upper bound لكل المرشحين دفعة وحدة بـ NumPy ونستبعد اللي تحت العتبة
+#   3) نحسب الـ ratio الحقيقي بس للمرشحين بالترتيب من الأعلى bound،
+#      ونوقف أول ما يصير أعلى bound باقي <= أفضل نتيجة
+# النتيجة نفس أعلى ratio بالضبط (مو تقريب) لما تكون >= العتبة.
+#
+# التخزين struct-of-arrays:
+#   SequencePool  = كل السيكوانسات المميزة في الـ graph (مرة وحدة) + مصفوفة عدّ مشتركة
+#   SequenceIndex = لكل asset مجرد array('I') من أرقام السيكوانسات (ring buffer)
+# والسيكوانس نفسه bytes من أرقام actions.py (uint16 لكل خطوة)، والتشابه على الأرقام:
+# نفس النتيجة لأن كل اسم له رقم واحد، و UNKNOWN ما يطابق شي (comparable تحت): خطوة
+# ما نعرفها في الجلسة مو نفس خطوة ما نعرفها في سيكوانس مخزن.
+#
+# القراء (GraphView في fraud_graph.py) يقرون الـ pool بدون lock وهو يتعدل: slot ما
+# يرجع فاضي وينعاد استخدامه لين تموت كل view ممكن تشير له (retire / reclaim)،
+# والصفوف اللي يقراها أحد ما تتغير (الـ writer يكتب بس في slots جديدة).
+
+from array import array
+from collections import deque
+from difflib import SequenceMatcher
+
+import numpy as np
+
+from actions import UNKNOWN, vocabulary
+
+# أقصى عدد أعمدة في مصفوفة العدّ (العمود 0 = الطول). أول actions تاخذ عمود خاص
+# فيها، والباقي (أسماء غريبة من الـ client) تتوزع برقمها على نفس الأعمدة.
+# دمج actions في عمود واحد يكبّر التقاطع بس، فالـ bound يظل upper bound صحيح.
+MAX_ACTION_COLUMNS = 64
+
+# تقدير تقريبي للذاكرة (bytes) لكل سيكوانس مميز في الـ pool
+SEQUENCE_BASE_BYTES = 120     # bytes object + مدخل في الـ dict + refcount
+SEQUENCE_TOKEN_BYTES = 2      # رقم uint16 لكل خطوة
+
+
+class SequencePool:
+    """
+    السيكوانسات المميزة المشتركة بين كل الـ assets مع reference count.
+    counts[seq_id] = [طول السيكوانس، عدد كل action] (int32)، العمود حسب columns.
+    السيكوانس = bytes (أرقام actions بصيغة 'H')؛ decode يرجّع الأسماء.
+    deferred: سيكوانس refcount حقه صفر يبقى مكانه (وممكن يرجع) لين reclaim بعد ما تموت
+    الـ views اللي كانت منشورة وقتها.
+    """
+
+    def __init__(self):
+        self.sequences = []     # seq_id -> bytes (None = slot فاضي)
+        self.refcounts = []     # seq_id -> كم asset يشير له
+        self.ids = {}           # bytes -> seq_id
+        self.columns = {}       # رقم الـ action -> رقم العمود (العمود 0 = الطول)
+        self.counts = np.zeros((16, 16), dtype=np.int32)
+        self.token_count = 0
+        self._free = []
+        # True = فيه قراء بدون lock (FraudGraph): اللي وصل صفر ينتظر reclaim بدل ما ينمسح فوراً
+        self.deferred = False
+        self._dead = 0                # refcount صفر وما انمسح (ينتظر reclaim)
+        self._released = []           # اللي وصل صفر من آخر retire
+        self._released_in = {}        # seq_id -> generation آخر مرة وصل صفر
+        self._limbo = deque()         # (epoch الـ view اللي ما تشير لها، generation، seq_ids)
+        self._generation = 0
+
+    def __len__(self):
+        return len(self.ids) - self._dead
+
+    def acquire(self, key):
+        """seq_id لسيكوانس (bytes) مع زيادة الـ refcount - نضيفه لو جديد."""
+        seq_id = self.ids.get(key)
+        if seq_id is not None:
+            if not self.refcounts[seq_id]:
+                self._dead -= 1   # رجع قبل reclaim
+                self.token_count += len(key) // 2
+            self.refcounts[seq_id] += 1
+            return seq_id
+
+        codes = memoryview(key).cast("H")
+        cols = [self.column(code, create=True) for code in codes]
+
+        if self._free:
+            seq_id = self._free.pop()
+            self.sequences[seq_id] = key
+            self.refcounts[seq_id] = 1
+        else:
+            seq_id = len(self.sequences)
+            self.sequences.append(key)
+            self.refcounts.append(1)
+        self._reserve(seq_id + 1, max(cols) + 1)
+
+        row = self.counts[seq_id]
+        row[0] = len(codes)
+        for col in cols:
+            row[col] += 1
+
+        self.ids[key] = seq_id
+        self.token_count += len(codes)
+        return seq_id
+
+    def column(self, code, create=False):
+        """رقم عمود الـ action (رقمه) في counts (None لو ما شفناه و create=False)."""
+        col = self.columns.get(code)
+        if col is not None:
+            return col
+        if len(self.columns) < MAX_ACTION_COLUMNS - 1:
+            if not create:
+                return None
+            col = self.columns[code] = len(self.columns) + 1
+            return col
+        return 1 + code % (MAX_ACTION_COLUMNS - 1)
+
+    def release(self, seq_id):
+        """ننقص الـ refcount - لو صار صفر السيكوانس ينمسح ويرجع الـ slot بعد reclaim."""
+        self.refcounts[seq_id] -= 1
+        if self.refcounts[seq_id] > 0:
+            return
+        # الأعداد (len / token_count / approx_bytes) للحية بس: نفسها في كل process
+        # مهما كان وقت الـ reclaim
+        self._dead += 1
+        self.token_count -= len(self.sequences[seq_id]) // 2
+        self._released_in[seq_id] = self._generation
+        if self.deferred:
+            self._released.append(seq_id)
+        else:
+            self._clear(seq_id)
+
+    def retire(self, epoch):
+        """
+        انتشرت view بـ epoch: اللي وصل صفر من آخر retire ما تشير له، بس الـ views الأقدم
+        ممكن (القراء ماسكينها بس طول الطلب)، فما ينمسح لين reclaim بعدها.
+        """
+        if self._released:
+            self._limbo.append((epoch, self._generation, self._released))
+            self._released = []
+            self._generation += 1
+
+    def reclaim(self, oldest):
+        """نمسح السيكوانسات اللي ما تشير لها أي view من oldest (أقدم view حية) وأحدث."""
+        limbo = self._limbo
+        while limbo and limbo[0][0] <= oldest:
+            _, generation, released = limbo.popleft()
+            for seq_id in released:
+                # رجع بعدها (refcount) أو وصل صفر مرة ثانية بعدها (generation أحدث) = مو الحين
+                if not self.refcounts[seq_id] and self._released_in.get(seq_id) == generation:
+                    self._clear(seq_id)
+
+    def _clear(self, seq_id):
+        key = self.sequences[seq_id]
+        del self.ids[key]
+        del self._released_in[seq_id]
+        self.sequences[seq_id] = None
+        self.counts[seq_id] = 0
+        self._dead -= 1
+        self._free.append(seq_id)
+
+    def approx_bytes(self):
+        return (
+            len(self) * SEQUENCE_BASE_BYTES
+            + self.token_count * SEQUENCE_TOKEN_BYTES
+            + len(self.sequences) * self.counts.shape[1] * self.counts.itemsize
+        )
+
+    def _reserve(self, n_rows, n_cols):
+        """نكبّر مصفوفة العدّ (doubling) لو احتجنا صفوف أو أعمدة أكثر."""
+        rows, cols = self.counts.shape
+        if n_rows <= rows and n_cols <= cols:
+            return
+        new_rows = rows if n_rows <= rows else max(rows * 2, n_rows)
+        new_cols = cols if n_cols <= cols else min(max(cols * 2, n_cols), MAX_ACTION_COLUMNS)
+
+        counts = np.zeros((new_rows, new_cols), dtype=np.int32)
+        counts[:rows, :cols] = self.counts
+        self.counts = counts
+
+
+class SequenceIndex:
+    """
+    سيكوانسات الاحتيال المميزة لـ asset واحد (أرقام في SequencePool).
+    capacity: أقصى عدد سيكوانسات مميزة (ring buffer) - لما يمتلي نشيل الأقدم
+    (سيكوانس يتكرر يرجع "أحدث" واحد). None = بدون حد.
+    """
+
+    __slots__ = ("pool", "capacity", "ids")
+
+    def __init__(self, capacity=None, pool=None):
+        self.pool = pool if pool is not None else SequencePool()
+        self.capacity = capacity
+        self.ids = array("I")   # من الأقدم للأحدث
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        """السيكوانسات المخزنة (tuples أسماء) من الأقدم للأحدث."""
+        sequences = self.pool.sequences
+        return (vocabulary.decode(sequences[seq_id]) for seq_id in self.ids)
+
+    def add(self, key):
+        """
+        نضيف سيكوانس: key = vocabulary.encode(actions, intern=True).tobytes().
+        نرجّع False لو كان موجود من قبل.
+        """
+        if not key:
+            return False
+
+        seq_id = self.pool.ids.get(key)
+        if seq_id is not None and seq_id in self.ids:
+            self.ids.remove(seq_id)   # نرجعه الأحدث
+            self.ids.append(seq_id)
+            return False
+
+        if self.capacity is not None and len(self.ids) >= self.capacity:
+            # ring buffer: نشيل أقدم سيكوانس
+            self.pool.release(self.ids.pop(0))
+
+        self.ids.append(self.pool.acquire(key))
+        return True
+
+    def clear(self):
+        """نرجّع كل السيكوانسات للـ pool (لما الـ asset ينشال)."""
+        for seq_id in self.ids:
+            self.pool.release(seq_id)
+        del self.ids[:]
+
+    def best_similarity(self, codes, threshold=0.6, matcher=None):
+        """best_similarity (تحت) على السيكوانسات المخزنة في هالـ index."""
+        # tobytes = نسخة، عشان ما نمسك buffer export على الـ array (writer ممكن يكبّره)
+        return best_similarity(self.pool, self.ids.tobytes(), codes, threshold, matcher)
+
+
+def best_similarity(pool, ids, codes, threshold=0.6, matcher=None):
+    """
+    أعلى SequenceMatcher(None, codes, seq).ratio() بين الجلسة (array('H') من
+    vocabulary.encode) والسيكوانسات ids (bytes بصيغة uint32، أرقام في pool) -
+    نفس النتيجة على الأسماء.
+    لو النتيجة >= threshold فهي مطابقة للبحث الخطي؛ لو أقل نرجّع قيمة < threshold.
+    matcher: SequenceMatcher جاهز للجلسة الحالية (seq1 = comparable(codes)) لو موجود.
+    """
+    if not ids or not codes:
+        return 0.0
+    query_codes = comparable(codes)
+
+    ids = np.frombuffer(ids, dtype=np.uint32)
+    # مرجع واحد: _reserve ممكن يستبدل المصفوفة وسط الطلب (الصفوف اللي نحتاجها نفسها في الثنتين)
+    pool_counts = pool.counts
+
+    # تطابق كامل = 1.0 مباشرة (جلسة فيها UNKNOWN ما تطابق شي بالكامل)
+    if query_codes is codes:
+        seq_id = pool.ids.get(codes.tobytes())
+        if seq_id is not None and (ids == seq_id).any():
+            return 1.0
+
+    # upper bound: 2 * |multiset intersection| / (len_a + len_b)
+    query = {}
+    width = pool_counts.shape[1]
+    for code in codes:
+        if code == UNKNOWN:
+            continue
+        col = pool.column(code)
+        if col is not None and col < width:
+            query[col] = query.get(col, 0) + 1
+    if not query:
+        return 0.0
+
+    # العمود 0 (الطول) + أعمدة actions الجلسة بس
+    cols = np.fromiter((0, *query.keys()), dtype=np.intp, count=len(query) + 1)
+    q_counts = np.fromiter(query.values(), dtype=np.int32, count=len(query))
+    counts = pool_counts[ids[:, None], cols]
+    overlap = np.minimum(counts[:, 1:], q_counts).sum(axis=1)
+    bounds = 2.0 * overlap / (len(codes) + counts[:, 0])
+
+    candidates = np.flatnonzero(bounds >= threshold)
+    if candidates.size == 0:
+        return 0.0
+
+    if matcher is None:
+        matcher = SequenceMatcher(None, query_codes)
+
+    best = 0.0
+    for pos in candidates[np.argsort(-bounds[candidates], kind="stable")]:
+        if bounds[pos] <= best:
+            break  # باقي المرشحين ما يقدرون يتجاوزون أفضل نتيجة
+        matcher.set_seq2(memoryview(pool.sequences[ids[pos]]).cast("H"))
+        best = max(best, matcher.ratio())
+    return best
+
+
+def comparable(codes):
+    """
+    الجلسة زي ما تنقارن بالسيكوانسات المخزنة: كل خطوة UNKNOWN رقم سالب خاص فيها، فما
+    تطابق أي خطوة مخزنة (ولا UNKNOWN مخزن لو القاموس كان ممتلي وقت التأكيد) ولا بعضها.
+    بدون UNKNOWN = codes نفسها.
+    """
+    if UNKNOWN not in codes:
+        return codes
+    return [code if code != UNKNOWN else -1 - i for i, code in enumerate(codes)]
@@ -0,0 +1,282 @@
+# sequence_model.py
+#
+# نموذج تنقل (Markov من الدرجة الأولى) لكل مستخدم: احتمال كل انتقال action -> action
+# متعلم من جلساته اللي طلع قرارها ALLOW، ونموذج عام لكل المستخدمين كـ prior / fallback.
+# sequence_risk في app.py يحسب متوسط -log P لانتقالات الجلسة (surprise) ويطلع
+# sequence_drift لو الجلسة غريبة على نمط المستخدم.
+#
+# - الجلسة = أرقام القاموس المشترك (actions.py): 0 = بداية الجلسة، 1 = غير معروف،
+#   والأرقام من MAX_ACTIONS وفوق تنحسب UNKNOWN هنا (الجداول byte لكل action)
+# - جدول المستخدم = array('I') بـ open addressing: كل خانة ((prev << 8 | next) << 16 | count)،
+#   ومجموع الصف (prev -> أي شي) بنفس الجدول بـ next = 0 (بداية الجلسة ما تجي بعد شي).
+#   التحديث والقراءة O(1) لكل انتقال، والـ surprise للجلسة O(len)
+# - لكل نموذج "surprise المعتاد" (متوسط متحرك لجلسات ALLOW قبل ما نتعلمها)، فالـ drift
+#   = surprise الجلسة ناقص المعتاد: مستخدم تنقله عشوائي أصلاً ما ينحسب عليه كل مرة
+# - الحجم محدود: لما مجموع صف يوصل ROW_CAP أو الجدول يمتلي (MAX_SLOTS) نقسم كل
+#   العدادات على 2 (aging) واللي صار صفر ينشال، فتكلفة الطلب وحجم الجدول ثابتة
+#   مهما طال تاريخ المستخدم، والنموذج يلحق تغير سلوكه
+# - النموذج العام جدول كثيف MAX_ACTIONS × MAX_ACTIONS (uint32، 256 KB)
+# - عدد المستخدمين محدود: OrderedDict مرتب حسب آخر تعلم (LRU مثل VelocityStore)
+#   + حذف اللي ما تعلمنا منهم من inactive_seconds
+# - النماذج لكل process وبالذاكرة بس: مع gunicorn -w N كل worker يتعلم من طلباته
+
+import math
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from actions import START, UNKNOWN, vocabulary
+
+MAX_ACTIONS = 256
+
+# خانات جدول المستخدم (قوة 2): نبدأ صغير ونكبر لين MAX_SLOTS، والحمل <= 3/4
+INITIAL_SLOTS = 16
+MAX_SLOTS = 128
+# مجموع صف (عدد مرات prev) قبل الـ aging - العدادات 16 bit
+ROW_CAP = 255
+GLOBAL_ROW_CAP = 1 << 24
+MAX_SESSIONS = 0xFFFF
+
+# وزن النموذج العام في احتمال المستخدم (Dirichlet prior بعدد "جلسات" وهمية)
+PRIOR_WEIGHT = 2.0
+# وزن الجلسة الجديدة في المتوسط المتحرك للـ surprise المعتاد
+TYPICAL_SMOOTHING = 1 / 16
+# أقل عدد جلسات متعلمة عشان نحكم بنموذج المستخدم، أو بالعام لو المستخدم جديد
+MIN_USER_SESSIONS = 5
+MIN_GLOBAL_SESSIONS = 50
+
+# تقدير تقريبي (bytes) لكل مستخدم غير الخانات: UserTransitions + array + المفتاح + مدخل الـ OrderedDict
+USER_BASE_BYTES = 360
+SLOT_BYTES = 4
+
+
+class UserTransitions:
+    """عدادات انتقالات مستخدم واحد."""
+
+    __slots__ = ("slots", "used", "sessions", "typical", "last_seen")
+
+    def __init__(self):
+        self.slots = array("I", bytes(SLOT_BYTES * INITIAL_SLOTS))
+        self.used = 0
+        self.sessions = 0
+        self.typical = None                 # surprise المعتاد لجلساته
+        self.last_seen = 0.0
+
+
+def _find(slots, key):
+    """خانة key أو الخانة الفاضية اللي مكانه (الحمل < 1 دايماً فاللوب ينتهي)."""
+    mask = len(slots) - 1
+    i = (key * 40503) & mask
+    while True:
+        entry = slots[i]
+        if not entry or entry >> 16 == key:
+            return i
+        i = (i + 1) & mask
+
+
+def _count(slots, key):
+    return slots[_find(slots, key)] & 0xFFFF
+
+
+class SequenceModels:
+    """
+    نماذج الانتقالات لكل user_id + النموذج العام.
+    max_users: حد عدد المستخدمين (الأقدم تعلماً ينشال أول)
+    inactive_seconds: المستخدم اللي ما تعلمنا منه من هالمدة ينشال (None = بدون)
+    """
+
+    def __init__(self, max_users=None, inactive_seconds=None, clock=time.time):
+        self.max_users = max_users
+        self.inactive_seconds = inactive_seconds
+        self.clock = clock
+        # global[prev * MAX_ACTIONS + next]، ومجموع الصف في next = 0
+        self.global_counts = array("I", bytes(4 * MAX_ACTIONS * MAX_ACTIONS))
+        self.global_sessions = 0
+        self.global_typical = None
+        self.users = OrderedDict()          # user_id -> UserTransitions، الأقدم تعلماً أول
+        self.evicted_users = 0
+        self.updates = 0
+        self._slots_total = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.users)
+
+    @property
+    def approx_bytes(self):
+        return len(self.users) * USER_BASE_BYTES + self._slots_total * SLOT_BYTES + len(self.global_counts) * 4
+
+    # ---------- التعلم ----------
+
+    def learn(self, user_id, codes, weight=1, now=None):
+        """
+        نضيف انتقالات الجلسة (أرقام vocabulary.encode، من بدايتها) لنموذج المستخدم والنموذج
+        العام، weight مرة (للـ seeding بأنماط معروفة). O(len) والـ aging مقسوم على الانتقالات.
+        """
+        codes = _clamp(codes)
+        if not codes or not user_id:
+            return
+        if now is None:
+            now = self.clock()
+        with self._lock:
+            users = self.users
+            user = users.get(user_id)
+            if user is None:
+                user = users[user_id] = UserTransitions()
+                self._slots_total += len(user.slots)
+            else:
+                users.move_to_end(user_id)
+            # الـ surprise المعتاد يتحدث بالجلسة قبل ما نتعلمها (نفس اللي يشوفه التقييم)
+            user_before = self._surprise(codes, user.slots) if user.sessions >= MIN_USER_SESSIONS else None
+            global_before = self._surprise(codes, None) if self.global_sessions >= MIN_GLOBAL_SESSIONS else None
+            prev = START
+            for code in codes:
+                self._learn_global(prev, code, weight)
+                self._learn_user(user, prev, code, weight)
+                prev = code
+            user.sessions = min(user.sessions + weight, MAX_SESSIONS)
+            user.last_seen = now
+            self.global_sessions += weight
+            # أول ما يصير النموذج جاهز (seeding) نبدأ المعتاد من الجلسة نفسها بعد التعلم
+            if user_before is None and user.sessions >= MIN_USER_SESSIONS:
+                user_before = self._surprise(codes, user.slots)
+            if global_before is None and self.global_sessions >= MIN_GLOBAL_SESSIONS:
+                global_before = self._surprise(codes, None)
+            user.typical = _smooth(user.typical, user_before)
+            self.global_typical = _smooth(self.global_typical, global_before)
+            self.updates += 1
+            self._evict(now)
+
+    def _learn_global(self, prev, code, weight):
+        counts = self.global_counts
+        row = prev * MAX_ACTIONS
+        if counts[row] + weight > GLOBAL_ROW_CAP:
+            # aging للصف بس (MAX_ACTIONS خانة)
+            total = 0
+            for i in range(row + 1, row + MAX_ACTIONS):
+                counts[i] >>= 1
+                total += counts[i]
+            counts[row] = total
+        counts[row] += weight
+        counts[row + code] += weight
+
+    def _learn_user(self, user, prev, code, weight):
+        row_key = prev << 8
+        pair_key = row_key | code
+        slots = user.slots
+        row_total = _count(slots, row_key)
+        if row_total + weight > ROW_CAP:
+            self._rebuild(user, halve=True)
+        # الانتقال والصف ممكن يحتاجون خانتين جديدة
+        if (user.used + 2) * 4 > len(user.slots) * 3:
+            self._rebuild(user, halve=len(user.slots) >= MAX_SLOTS)
+            if (user.used + 2) * 4 > len(user.slots) * 3:
+                return  # حتى بعد الـ aging ممتلي: نتجاهل الانتقال لهالمستخدم
+        slots = user.slots
+        for key in (row_key, pair_key):
+            i = _find(slots, key)
+            entry = slots[i]
+            if entry:
+                slots[i] = entry + weight
+            else:
+                slots[i] = key << 16 | weight
+                user.used += 1
+
+    def _rebuild(self, user, halve):
+        """
+        نعيد بناء الجدول: halve = نقسم عدادات الانتقالات على 2 (واللي صار صفر ينشال)
+        ونحسب مجاميع الصفوف من جديد. O(MAX_SLOTS) كل ~ROW_CAP / 2 انتقال.
+        """
+        pairs = []
+        rows = {}
+        shift = 1 if halve else 0
+        for entry in user.slots:
+            key = entry >> 16
+            if not entry or not key & 0xFF:
+                continue
+            count = (entry & 0xFFFF) >> shift
+            if count:
+                pairs.append((key, count))
+                rows[key >> 8] = rows.get(key >> 8, 0) + count
+        used = len(pairs) + len(rows)
+        size = INITIAL_SLOTS
+        while size < MAX_SLOTS and (used + 2) * 4 > size * 3:
+            size *= 2
+        slots = array("I", bytes(SLOT_BYTES * size))
+        for key, count in pairs + [(prev << 8, total) for prev, total in rows.items()]:
+            slots[_find(slots, key)] = key << 16 | count
+        self._slots_total += size - len(user.slots)
+        user.slots = slots
+        user.used = used
+
+    def _evict(self, now):
+        users = self.users
+        if self.inactive_seconds:
+            while users:
+                user_id = next(iter(users))
+                if now - users[user_id].last_seen < self.inactive_seconds:
+                    break
+                self._slots_total -= len(users.pop(user_id).slots)
+                self.evicted_users += 1
+        if self.max_users:
+            while len(users) > self.max_users:
+                self._slots_total -= len(users.popitem(last=False)[1].slots)
+                self.evicted_users += 1
+
+    # ---------- التقييم ----------
+
+    def surprise(self, user_id, codes):
+        """
+        متوسط -log P لانتقالات الجلسة (من بدايتها) بـ O(len)، والـ surprise المعتاد للنموذج:
+          نموذج المستخدم لو له >= MIN_USER_SESSIONS، مع النموذج العام كـ prior:
+            P(b|a) = (user[a,b] + PRIOR_WEIGHT * P_global(b|a)) / (user[a] + PRIOR_WEIGHT)
+          وإلا النموذج العام لو له >= MIN_GLOBAL_SESSIONS:
+            P_global(b|a) = (global[a,b] + 1) / (global[a] + عدد الـ actions)
+        نرجّع (surprise, typical) أو (None, None) لو ما فيه نموذج كافي أو الجلسة فاضية.
+        ما يعدل شي (بدون lock): الجدول يتبدل كامل وقت الـ aging، والقراءة على النسخة اللي مسكناها.
+        """
+        codes = _clamp(codes)
+        if not codes:
+            return None, None
+        user = self.users.get(user_id)
+        if user is not None and user.sessions >= MIN_USER_SESSIONS:
+            return self._surprise(codes, user.slots), user.typical
+        if self.global_sessions >= MIN_GLOBAL_SESSIONS:
+            return self._surprise(codes, None), self.global_typical
+        return None, None
+
+    def _surprise(self, codes, slots):
+        """slots = جدول المستخدم، أو None للنموذج العام بس."""
+        counts = self.global_counts
+        n_actions = min(len(vocabulary), MAX_ACTIONS) - 1
+        total = 0.0
+        prev = START
+        for code in codes:
+            row = prev * MAX_ACTIONS
+            p = (counts[row + code] + 1) / (counts[row] + n_actions)
+            if slots is not None:
+                row_key = prev << 8
+                p = (_count(slots, row_key | code) + PRIOR_WEIGHT * p) / (_count(slots, row_key) + PRIOR_WEIGHT)
+            total -= math.log(p)
+            prev = code
+        return total / len(codes)
+
+    def user_bytes(self, user_id):
+        user = self.users.get(user_id)
+        return None if user is None else USER_BASE_BYTES + len(user.slots) * SLOT_BYTES
+
+
+def _clamp(codes):
+    """الأرقام >= MAX_ACTIONS -> UNKNOWN (نادراً: القاموس فيه أكثر من MAX_ACTIONS اسم)."""
+    if len(vocabulary) > MAX_ACTIONS and codes and max(codes) >= MAX_ACTIONS:
+        return [code if code < MAX_ACTIONS else UNKNOWN for code in codes]
+    return codes
+
+
+def _smooth(typical, value):
+    if value is None:
+        return typical
+    if typical is None:
+        return value
+    return typical + (value - typical) * TYPICAL_SMOOTHING
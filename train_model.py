@@ -9,9 +9,23 @@
 # - خصائص سلوكية (جهاز معروف، تغيير الموقع، الوقت، عدد العمليات، خدمة حساسة)
 # - خصائص من ملخص الجلسة (طول الجلسة، عدد الخدمات الحساسة، تكرار login/payment)
 #
-# ويحفظ النماذج داخل مجلد models/
+# ويحفظ النماذج داخل مجلد models/ (pickles + model bundle مضغوط يقراه app.py بدون sklearn)
+# + جدول النقاط المحسوب مسبقاً (score_table.py) إلا مع --no-score-table
+#
+# الـ pipeline:
+# - الـ dataset المقسوم (train/test) ينحفظ .npy في data/training_cache ويُقرا mmap في التشغيلات الجاية
+# - النماذج الثلاثة تتدرب مع بعض في process pool، وأشجار الغابات تنبني بالتوازي (n_jobs)
+# - --refresh: تحديث تدريجي للنماذج الحالية ببيانات جديدة (أشجار إضافية + epochs للـ MLP)
+#
+#   python train_model.py                                   # تدريب كامل
+#   python train_model.py --refresh --data data/new_rows    # تحديث بـ X.npy / y.npy جديدة
+#   python train_model.py --generate data/synthetic         # توليد dataset كبير بس
 
+import argparse
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier, IsolationForest
 from sklearn.neural_network import MLPClassifier
@@ -22,13 +36,32 @@ from sklearn.metrics import (
     confusion_matrix
 )
 import joblib
+import sklearn
 from sklearn.preprocessing import StandardScaler
+from sklearn.utils.class_weight import compute_class_weight
+
+from model_bundle import BUNDLE_NAME, SOURCE_FILES, compile_models, source_hashes, write_bundle
+from score_table import SCORE_TABLE_NAME, export_score_table
 
 
 # -------- 1) توليد بيانات مصطنعة تشبه سلوك منصة حكومية --------
+
+# حجم الدفعة الافتراضي للتوليد المتدفق (صف = 8 أعمدة int64 ≈ 64 bytes في الذاكرة)
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+# نوع الأعمدة في ملفات .npy (أكبر قيمة 2000 km) والـ labels
+NPY_FEATURE_DTYPE = np.int16
+NPY_LABEL_DTYPE = np.int8
+
+
 def generate_synthetic_data(n_samples=4000, random_state=42):
     rng = np.random.default_rng(random_state)
+    X = draw_features(rng, n_samples)
+    return X, label_transactions(X, rng)
 
+
+def draw_features(rng, n_samples):
+    """مصفوفة n_samples×8 عشوائية (عمود عمود بنفس ترتيب السحب من rng)."""
     # ----- Features سلوكية أساسية -----
     device_is_known   = rng.integers(0, 2,   size=n_samples)   # 0/1
     location_change   = rng.integers(0, 2001, size=n_samples)  # km
@@ -53,7 +86,7 @@ def generate_synthetic_data(n_samples=4000, random_state=42):
     #  [5] session_length
     #  [6] sensitive_count
     #  [7] repeated_flag
-    X = np.vstack([
+    return np.vstack([
         device_is_known,
         location_change,
         hour_of_day,
@@ -64,134 +97,382 @@ def generate_synthetic_data(n_samples=4000, random_state=42):
         repeated_flag,
     ]).T
 
-    # ----- labels y: 0 = طبيعي, 1 = risky -----
-    y = np.zeros(n_samples, dtype=int)
-
-    # قواعد تقريبية + noise لتوليد y
-    for i in range(n_samples):
-        risk_score = 0
-
-        # (أ) نفس القواعد القديمة تقريباً
-        if device_is_known[i] == 0 and is_sensitive[i] == 1 and location_change[i] > 800:
-            risk_score += 3
-
-        if 2 <= hour_of_day[i] <= 5 and ops_last_24h[i] > 5:
-            risk_score += 2
-
-        if is_sensitive[i] == 1 and location_change[i] > 500:
-            risk_score += 1
-
-        if ops_last_24h[i] > 10:
-            risk_score += 1
-
-        # (ب) قواعد لها علاقة بالسيكونس
-        # أكثر من خدمة حساسة في نفس الجلسة
-        if sensitive_count[i] >= 2:
-            risk_score += 2
-
-        # تكرار login/payment
-        if repeated_flag[i] == 1:
-            risk_score += 1
-
-        # جلسة طويلة جداً (حوسة في الجلسة)
-        if session_length[i] >= 7:
-            risk_score += 1
-
-        # (ج) شوية noise عشان الواقع مو perfect rules
-        if risk_score == 0 and rng.random() < 0.03:
-            risk_score = 1
-
-        y[i] = 1 if risk_score >= 2 else 0
 
-    return X, y
+def label_transactions(X, rng):
+    """
+    labels y: 0 = طبيعي, 1 = risky - قواعد تقريبية + noise، كلها عمليات على
+    المصفوفة كاملة. الـ noise يسحب rng.random() بس للصفوف اللي risk_score = 0
+    وبنفس ترتيبها، فالنتيجة (وحالة rng بعدها) مثل loop صف صف بالضبط.
+    """
+    (device_is_known, location_change, hour_of_day, ops_last_24h,
+     is_sensitive, session_length, sensitive_count, repeated_flag) = X.T
+
+    risk_score = np.zeros(len(X), dtype=np.int8)
+
+    # (أ) نفس القواعد القديمة تقريباً
+    risk_score += 3 * ((device_is_known == 0) & (is_sensitive == 1) & (location_change > 800))
+    risk_score += 2 * ((hour_of_day >= 2) & (hour_of_day <= 5) & (ops_last_24h > 5))
+    risk_score += (is_sensitive == 1) & (location_change > 500)
+    risk_score += ops_last_24h > 10
+
+    # (ب) قواعد لها علاقة بالسيكونس
+    # أكثر من خدمة حساسة في نفس الجلسة
+    risk_score += 2 * (sensitive_count >= 2)
+    # تكرار login/payment
+    risk_score += repeated_flag == 1
+    # جلسة طويلة جداً (حوسة في الجلسة)
+    risk_score += session_length >= 7
+
+    # (ج) شوية noise عشان الواقع مو perfect rules
+    quiet = np.flatnonzero(risk_score == 0)
+    risk_score[quiet[rng.random(len(quiet)) < 0.03]] = 1
+
+    return (risk_score >= 2).astype(int)
+
+
+def generate_synthetic_chunks(n_samples, chunk_size=DEFAULT_CHUNK_SIZE, random_state=42):
+    """
+    نفس التوزيع على دفعات (X, y) بحجم chunk_size - الذاكرة على قد دفعة وحدة.
+    كل دفعة لها seed مشتق (SeedSequence.spawn)، فنفس random_state + chunk_size
+    يعطي نفس البيانات دايماً (لكن مو نفس أرقام generate_synthetic_data لنفس الحجم).
+    """
+    n_chunks = -(-n_samples // chunk_size)
+    seeds = np.random.SeedSequence(random_state).spawn(n_chunks)
+    for index, seed in enumerate(seeds):
+        rows = min(chunk_size, n_samples - index * chunk_size)
+        yield generate_synthetic_data(rows, random_state=seed)
+
+
+def write_synthetic_data(directory, n_samples, chunk_size=DEFAULT_CHUNK_SIZE, random_state=42):
+    """
+    نكتب generate_synthetic_chunks لـ X.npy و y.npy في directory دفعة دفعة
+    (open_memmap) ونرجّعها مفتوحة mmap_mode="r": التدريب يقرا من الصفحات على
+    القرص بدل ما تكون المصفوفة كاملة في الذاكرة.
+    """
+    os.makedirs(directory, exist_ok=True)
+    x_path = os.path.join(directory, "X.npy")
+    y_path = os.path.join(directory, "y.npy")
+    X_out = np.lib.format.open_memmap(x_path, mode="w+", dtype=NPY_FEATURE_DTYPE, shape=(n_samples, 8))
+    y_out = np.lib.format.open_memmap(y_path, mode="w+", dtype=NPY_LABEL_DTYPE, shape=(n_samples,))
+    offset = 0
+    for X, y in generate_synthetic_chunks(n_samples, chunk_size, random_state):
+        X_out[offset:offset + len(X)] = X
+        y_out[offset:offset + len(y)] = y
+        offset += len(X)
+        X_out.flush()
+        y_out.flush()
+    del X_out, y_out
+    return np.load(x_path, mmap_mode="r"), np.load(y_path, mmap_mode="r")
+
+
+# -------- 2) الـ dataset مقسوم train/test مع cache بين التشغيلات --------
+
+TEST_SIZE = 0.2
+RANDOM_STATE = 42
+# نغيره لو تغير التوليد أو التقسيم (الـ cache القديم ما ينفع)
+DATASET_VERSION = 1
+DATASET_PARTS = ("X_train", "X_test", "y_train", "y_test")
+
+
+def load_dataset(cache_dir=None, n_samples=4000, random_state=RANDOM_STATE, test_size=TEST_SIZE,
+                 chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    (parts, path, cached): parts = {X_train, X_test, y_train, y_test}.
+    لو cache_dir: نقراها من ملفات .npy (mmap) لو موجودة لنفس الإعدادات، وإلا نولّد
+    ونقسم ونحفظها هناك. أكبر من chunk_size = توليد متدفق (write_synthetic_data).
+    """
+    key = f"v{DATASET_VERSION}-n{n_samples}-seed{random_state}-test{test_size}-chunk{chunk_size}"
+    path = os.path.join(cache_dir, key) if cache_dir else None
+    if path and all(os.path.exists(os.path.join(path, f"{part}.npy")) for part in DATASET_PARTS):
+        parts = {part: np.load(os.path.join(path, f"{part}.npy"), mmap_mode="r") for part in DATASET_PARTS}
+        return parts, path, True
+
+    if n_samples <= chunk_size or not path:
+        X, y = generate_synthetic_data(n_samples, random_state)
+    else:
+        X, y = write_synthetic_data(os.path.join(path, "full"), n_samples, chunk_size, random_state)
 
-
-def main():
-    print("Generating synthetic data...")
-    X, y = generate_synthetic_data()
-
-    print("Data shape:", X.shape)          # (4000, 8)
-    print("Risky samples:", y.sum(), "/", len(y))
-
-    # split
     X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
-    )
-
-    # ---------------------------------------------------------
-    # 2) RandomForestClassifier
-    # ---------------------------------------------------------
-    print("\nTraining RandomForest classifier...")
-    clf = RandomForestClassifier(
-        n_estimators=150,
-        max_depth=8,
-        random_state=42,
-        class_weight="balanced"
+        X, y, test_size=test_size, random_state=random_state, stratify=y
     )
-    clf.fit(X_train, y_train)
-
-    y_pred = clf.predict(X_test)
-    acc_rf = accuracy_score(y_test, y_pred)
-    print(f"\nRandomForest Accuracy: {acc_rf * 100:.2f}%")
-    print("\nConfusion Matrix (RF):")
-    print(confusion_matrix(y_test, y_pred))
-    print("\nClassification Report (RF):")
-    print(classification_report(y_test, y_pred, digits=3))
-
-    # ---------------------------------------------------------
-    # 3) IsolationForest
-    # ---------------------------------------------------------
-    print("\nTraining IsolationForest...")
-    iso = IsolationForest(
-        contamination=0.15,
-        random_state=42
-    )
-    iso.fit(X_train)
-
-    # ---------------------------------------------------------
-    # 4) MLPClassifier (Neural Network)
-    # ---------------------------------------------------------
-    print("\nTraining Neural Network (MLPClassifier)...")
-
-    mlp = MLPClassifier(
+    parts = {
+        "X_train": X_train.astype(NPY_FEATURE_DTYPE),
+        "X_test": X_test.astype(NPY_FEATURE_DTYPE),
+        "y_train": y_train.astype(NPY_LABEL_DTYPE),
+        "y_test": y_test.astype(NPY_LABEL_DTYPE),
+    }
+    if path:
+        os.makedirs(path, exist_ok=True)
+        for part, arr in parts.items():
+            # ملف مؤقت ثم rename: تشغيل انقطع بالنص ما يخلي cache ناقص
+            tmp_path = os.path.join(path, f"{part}.{os.getpid()}.tmp.npy")
+            np.save(tmp_path, arr)
+            os.replace(tmp_path, os.path.join(path, f"{part}.npy"))
+    return parts, path, False
+
+
+# -------- 3) النماذج الثلاثة: بالتوازي + تحديث تدريجي --------
+
+MODEL_NAMES = ("rf", "iso", "nn")
+
+
+def build_model(name, n_jobs=None):
+    """نموذج جديد بنفس الإعدادات (n_jobs لبناء الأشجار بالتوازي)."""
+    if name == "rf":
+        return RandomForestClassifier(
+            n_estimators=150,
+            max_depth=8,
+            random_state=RANDOM_STATE,
+            class_weight="balanced",
+            n_jobs=n_jobs,
+        )
+    if name == "iso":
+        return IsolationForest(
+            contamination=0.15,
+            random_state=RANDOM_STATE,
+            n_jobs=n_jobs,
+        )
+    return MLPClassifier(
         hidden_layer_sizes=(32, 16, 8),
         activation='relu',
         solver='adam',
         max_iter=500,
-        random_state=42
+        random_state=RANDOM_STATE,
     )
 
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled  = scaler.transform(X_test)
-
-    mlp.fit(X_train_scaled, y_train)
-    y_pred_mlp = mlp.predict(X_test_scaled)
-
 
+def fit_model(name, X_train, y_train, n_jobs=None):
+    """
+    ندرب نموذج واحد: (النموذج، ثواني). للـ nn النموذج = (mlp, scaler).
+    X_train / y_train مصفوفات أو مسارات .npy (الـ worker يفتحها mmap بدل نسخها).
+    """
+    if isinstance(X_train, str):
+        X_train, y_train = np.load(X_train, mmap_mode="r"), np.load(y_train, mmap_mode="r")
+    y_train = np.asarray(y_train, dtype=int)   # الـ cache يحفظها int8؛ classes_ تظل int مثل قبل
+    started = time.perf_counter()
+    model = build_model(name, n_jobs)
+    if name == "nn":
+        scaler = StandardScaler()
+        model.fit(scaler.fit_transform(X_train), y_train)
+        model = (model, scaler)
+    elif name == "iso":
+        model.fit(X_train)
+    else:
+        model.fit(X_train, y_train)
+    _single_threaded(model)
+    return model, time.perf_counter() - started
+
+
+def _single_threaded(model):
+    """n_jobs للتدريب بس: الـ fallback في app.py يتنبأ بصف واحد، و threads لكل نداء أبطأ."""
+    if not isinstance(model, tuple):
+        model.set_params(n_jobs=None)
+
+
+def train_models(data, workers=len(MODEL_NAMES), n_jobs=None, cache_path=None):
+    """
+    ندرب الثلاثة مع بعض في process pool (workers=1 = وحدة ورا الثانية هنا).
+    cache_path: مجلد الـ dataset - الـ workers يفتحون X_train منه بدل ما ننسخه لهم.
+    نرجّع ({name: model}, {name: ثواني}).
+    """
+    if cache_path:
+        args = (os.path.join(cache_path, "X_train.npy"), os.path.join(cache_path, "y_train.npy"))
+    else:
+        args = (data["X_train"], data["y_train"])
+
+    if workers <= 1:
+        results = {name: fit_model(name, *args, n_jobs) for name in MODEL_NAMES}
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(MODEL_NAMES))) as pool:
+            # الـ MLP أطول وحدة فنبداها أول
+            futures = {name: pool.submit(fit_model, name, *args, n_jobs) for name in ("nn", "rf", "iso")}
+            results = {name: futures[name].result() for name in MODEL_NAMES}
+    return {name: r[0] for name, r in results.items()}, {name: round(r[1], 3) for name, r in results.items()}
+
+
+def refresh_models(models, X_new, y_new, add_trees=50, mlp_epochs=20, n_jobs=None):
+    """
+    تحديث تدريجي بدل إعادة التدريب من الصفر:
+      - الغابات: warm_start + add_trees شجرة جديدة تتدرب على البيانات الجديدة بس
+        (الأشجار القديمة تبقى كما هي)
+      - الـ MLP: mlp_epochs epoch من partial_fit يكمل من الأوزان الحالية؛
+        الـ scaler يبقى نفسه عشان الأوزان القديمة تظل على نفس المقياس
+    نعدّل النماذج في مكانها ونرجّع {name: ثواني}.
+    """
+    y_new = np.asarray(y_new, dtype=int)
+    timings = {}
+    for name in ("rf", "iso"):
+        started = time.perf_counter()
+        forest = models[name]
+        forest.set_params(warm_start=True, n_estimators=forest.n_estimators + add_trees, n_jobs=n_jobs)
+        if name == "rf":
+            # "balanced" مع warm_start يحسب الأوزان من البيانات الجديدة بس (و sklearn يحذر)،
+            # فنعطيه نفس الأوزان صريحة ونرجّع الإعداد بعد التدريب
+            weights = compute_class_weight("balanced", classes=forest.classes_, y=y_new)
+            forest.set_params(class_weight=dict(zip(forest.classes_.tolist(), weights)))
+            forest.fit(X_new, y_new)
+            forest.set_params(class_weight="balanced")
+        else:
+            forest.fit(X_new)
+        forest.set_params(warm_start=False)
+        _single_threaded(forest)
+        timings[name] = round(time.perf_counter() - started, 3)
+
+    started = time.perf_counter()
+    mlp, scaler = models["nn"]
+    X_scaled = scaler.transform(X_new)
+    for _ in range(mlp_epochs):
+        mlp.partial_fit(X_scaled, y_new)
+    timings["nn"] = round(time.perf_counter() - started, 3)
+    return timings
+
+
+def evaluate_models(models, X_test, y_test, verbose=True):
+    """دقة RF و MLP على الـ test set (+ نسبة الأنومالي من IsolationForest)."""
+    mlp, scaler = models["nn"]
+    y_pred = models["rf"].predict(X_test)
+    y_pred_mlp = mlp.predict(scaler.transform(X_test))
+    acc_rf = accuracy_score(y_test, y_pred)
     acc_mlp = accuracy_score(y_test, y_pred_mlp)
-
-    print(f"\nMLPClassifier Accuracy: {acc_mlp * 100:.2f}%")
-    print("\nConfusion Matrix (MLP):")
-    print(confusion_matrix(y_test, y_pred_mlp))
-    print("\nClassification Report (MLP):")
-    print(classification_report(y_test, y_pred_mlp, digits=3))
-
-    # ---------------------------------------------------------
-    # 5) Save models
-    # ---------------------------------------------------------
-
-    os.makedirs("models", exist_ok=True)
-    joblib.dump(clf,   "models/security_risk_model.pkl")
-    joblib.dump(iso,   "models/isolation_forest_model.pkl")
-    joblib.dump(mlp,   "models/neural_network_model.pkl")
-    joblib.dump(scaler,"models/scaler.pkl")
+    anomaly_rate = float(np.mean(models["iso"].predict(X_test) == -1))
+
+    if verbose:
+        print(f"\nRandomForest Accuracy: {acc_rf * 100:.2f}%")
+        print("\nConfusion Matrix (RF):")
+        print(confusion_matrix(y_test, y_pred))
+        print("\nClassification Report (RF):")
+        print(classification_report(y_test, y_pred, digits=3))
+
+        print(f"\nIsolationForest anomalies on test set: {anomaly_rate * 100:.2f}%")
+
+        print(f"\nMLPClassifier Accuracy: {acc_mlp * 100:.2f}%")
+        print("\nConfusion Matrix (MLP):")
+        print(confusion_matrix(y_test, y_pred_mlp))
+        print("\nClassification Report (MLP):")
+        print(classification_report(y_test, y_pred_mlp, digits=3))
+
+    return {
+        "rf_accuracy": round(float(acc_rf), 4),
+        "mlp_accuracy": round(float(acc_mlp), 4),
+        "iso_anomaly_rate": round(anomaly_rate, 4),
+    }
+
+
+def load_trained_models(models_dir):
+    """النماذج المحفوظة من تدريب سابق (للتحديث التدريجي)."""
+    loaded = {name: joblib.load(os.path.join(models_dir, filename)) for name, filename in SOURCE_FILES.items()}
+    return {"rf": loaded["rf"], "iso": loaded["iso"], "nn": (loaded["nn"], loaded["scaler"])}
+
+
+def save_models(models, models_dir, training):
+    """الـ pickles + الـ model bundle (model_bundle.py) مع بيانات التدريب في الـ manifest."""
+    mlp, scaler = models["nn"]
+    os.makedirs(models_dir, exist_ok=True)
+    joblib.dump(models["rf"], os.path.join(models_dir, SOURCE_FILES["rf"]))
+    joblib.dump(models["iso"], os.path.join(models_dir, SOURCE_FILES["iso"]))
+    joblib.dump(mlp, os.path.join(models_dir, SOURCE_FILES["nn"]))
+    joblib.dump(scaler, os.path.join(models_dir, SOURCE_FILES["scaler"]))
+
+    # model bundle: نفس النماذج كجداول NumPy + manifest (ترتيب الـ features، hashes، بيانات التدريب)
+    compiled, checks = compile_models(models["rf"], models["iso"], mlp, scaler)
+    write_bundle(
+        os.path.join(models_dir, BUNDLE_NAME),
+        compiled,
+        checks,
+        sources=source_hashes(models_dir),
+        training=dict(training, sklearn_version=sklearn.__version__),
+    )
 
     print("\nModels saved:")
-    print(" - models/security_risk_model.pkl")
-    print(" - models/isolation_forest_model.pkl")
-    print(" - models/neural_network_model.pkl")
+    for filename in SOURCE_FILES.values():
+        print(f" - {os.path.join(models_dir, filename)}")
+    print(f" - {os.path.join(models_dir, BUNDLE_NAME)}")
+
+
+def save_score_table(models_dir):
+    """جدول النقاط (score_table.py) للنماذج اللي انحفظت توها، مع مقارنته بالنماذج الحقيقية."""
+    print("\nBuilding score table...")
+    manifest = export_score_table(models_dir)
+    validation = manifest["validation"]
+    print(f" - {os.path.join(models_dir, SCORE_TABLE_NAME)} ({manifest['shape'][0]} cells x "
+          f"{manifest['location_buckets']} location buckets -> {manifest['shape'][1]} entries, "
+          f"{manifest['build_seconds']}s)")
+    for label in ("thresholds", "continuous"):
+        print(f"   {label} rows differing from the models: {validation[label]['mismatches']} / {validation['rows']}")
+
+
+def main(args):
+    started = time.perf_counter()
+    data, cache_path, cached = load_dataset(
+        args.cache_dir or None, args.samples, args.seed, TEST_SIZE, args.chunk_size
+    )
+    X_train, y_train = data["X_train"], data["y_train"]
+    print(f"Dataset: {len(X_train) + len(data['X_test'])} rows "
+          f"({'cached' if cached else 'generated'}{f' in {cache_path}' if cache_path else ''})")
+    print("Risky samples:", int(y_train.sum() + data["y_test"].sum()), "/", len(X_train) + len(data["X_test"]))
+
+    if args.refresh:
+        if args.data:
+            X_new, y_new = np.load(os.path.join(args.data, "X.npy")), np.load(os.path.join(args.data, "y.npy"))
+        else:
+            X_new, y_new = generate_synthetic_data(args.refresh_samples, args.refresh_seed)
+        print(f"\nRefreshing models in {args.models_dir} with {len(X_new)} new rows "
+              f"(+{args.add_trees} trees per forest, {args.mlp_epochs} MLP epochs)...")
+        models = load_trained_models(args.models_dir)
+        fit_seconds = refresh_models(models, X_new, y_new, args.add_trees, args.mlp_epochs, args.n_jobs)
+        training = {"mode": "refresh", "refresh_samples": int(len(X_new)), "refresh_risky": int(y_new.sum())}
+    else:
+        print(f"\nTraining RandomForest, IsolationForest and MLP "
+              f"({args.workers} worker process(es), n_jobs={args.n_jobs})...")
+        models, fit_seconds = train_models(data, args.workers, args.n_jobs, cache_path)
+        training = {"mode": "full"}
+    print("Fit seconds:", fit_seconds)
+
+    report = evaluate_models(models, data["X_test"], data["y_test"])
+    training.update(
+        n_samples=int(len(X_train) + len(data["X_test"])),
+        risky_samples=int(y_train.sum() + data["y_test"].sum()),
+        test_size=TEST_SIZE,
+        random_state=args.seed,
+        rf_trees=int(models["rf"].n_estimators),
+        iso_trees=int(models["iso"].n_estimators),
+        fit_seconds=fit_seconds,
+        **report,
+    )
+    save_models(models, args.models_dir, training)
+    if args.score_table:
+        save_score_table(args.models_dir)
+    print(f"\nTotal: {time.perf_counter() - started:.2f}s")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Train the Raqeeb models on synthetic data")
+    parser.add_argument("--generate", metavar="DIR",
+                        help="only write a synthetic dataset to DIR/X.npy and DIR/y.npy, then exit")
+    parser.add_argument("--samples", type=int, default=None,
+                        help="rows to generate (default 4000 for training, 10M with --generate)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--seed", type=int, default=RANDOM_STATE)
+    parser.add_argument("--models-dir", default="models")
+    parser.add_argument("--cache-dir", default="data/training_cache",
+                        help="cache for the generated train/test split ('' = no cache)")
+    parser.add_argument("--workers", type=int, default=min(len(MODEL_NAMES), os.cpu_count() or 1),
+                        help="processes fitting the three models concurrently (1 = one after another)")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="threads per forest for building trees")
+    parser.add_argument("--refresh", action="store_true",
+                        help="update the models in --models-dir with new data instead of retraining")
+    parser.add_argument("--data", metavar="DIR", help="new rows for --refresh (X.npy / y.npy from --generate)")
+    parser.add_argument("--refresh-samples", type=int, default=4000)
+    parser.add_argument("--refresh-seed", type=int, default=RANDOM_STATE + 1)
+    parser.add_argument("--add-trees", type=int, default=50)
+    parser.add_argument("--mlp-epochs", type=int, default=20)
+    parser.add_argument("--no-score-table", dest="score_table", action="store_false",
+                        help="skip building the precomputed score table (score_table.py)")
+    args = parser.parse_args()
+
+    if args.generate:
+        X, y = write_synthetic_data(args.generate, args.samples or 10_000_000, args.chunk_size, args.seed)
+        print(f"Wrote {len(X)} rows to {args.generate} (risky: {int(y.sum())})")
+    else:
+        args.samples = args.samples or 4000
+        main(args)
@@ -0,0 +1,161 @@
+# velocity.py
+#
+# عدادات السرعة (velocity) بالسيرفر نفسه بدل ops_last_24h اللي يرسله الـ client:
+# كم عملية لكل user / ip / device_id خلال آخر دقيقة، ساعة، 24 ساعة.
+#
+# - كل مفتاح = VelocityCounter بـ __slots__: لكل نافذة ring من buckets زمنية
+#   (النافذة مقسومة لـ n buckets بعرض seconds/n) + المجموع الحالي
+# - التسجيل والقراءة O(1): نصفّر الـ buckets اللي طلعت من النافذة من آخر تحديث
+#   (كل bucket ينصفر مرة وحدة) ونزيد bucket الحالي والمجموع
+# - النافذة "منزلقة" بدقة bucket واحد: العدد = الـ bucket الحالي + n-1 قبله، يعني
+#   آخر (n-1)/n من النافذة مضمونة والجزء الأقدم حسب موقعنا داخل الـ bucket
+# - الذاكرة محدودة: OrderedDict مرتب من الأقدم تحديثاً للأحدث؛ المفتاح اللي ما
+#   تحدث طول أطول نافذة (كل عداداته صفر) ينشال، وفوق max_keys / memory budget
+#   نشيل الأقدم (LRU) مثل FraudGraph
+# - العدادات لكل process: مع gunicorn -w N كل worker يشوف الطلبات اللي وصلته بس
+
+import threading
+import time
+from collections import OrderedDict
+
+# (اسم، طول النافذة بالثواني، عدد الـ buckets)
+DEFAULT_WINDOWS = (
+    ("1m", 60, 6),
+    ("1h", 3600, 12),
+    ("24h", 86400, 24),
+)
+
+# تقدير تقريبي للذاكرة (bytes) لكل مفتاح: VelocityCounter + قوائمه + المفتاح + مدخل
+# الـ OrderedDict، والـ buckets فوقها (8 bytes لكل bucket في الـ list)
+COUNTER_BASE_BYTES = 520
+BUCKET_BYTES = 8
+
+
+class VelocityCounter:
+    """عدادات مفتاح واحد لكل النوافذ."""
+
+    __slots__ = ("heads", "totals", "buckets", "last_seen")
+
+    def __init__(self, n_windows, n_buckets):
+        self.heads = [-1] * n_windows       # رقم آخر bucket (now // width) تحدث في كل نافذة
+        self.totals = [0] * n_windows       # مجموع buckets النافذة
+        self.buckets = [0] * n_buckets      # buckets كل النوافذ ورا بعض
+        self.last_seen = 0.0
+
+
+class VelocityStore:
+    """
+    عدادات منزلقة لكل (kind, key).
+    windows: ((name, seconds, buckets), ...)
+    max_keys / memory_budget_bytes: حدود كلية، نشيل الأقدم تحديثاً (LRU) لما نتجاوزها
+    """
+
+    def __init__(self, windows=DEFAULT_WINDOWS, max_keys=None, memory_budget_bytes=None, clock=time.time):
+        self.windows = tuple(windows)
+        self.window_names = tuple(name for name, _, _ in self.windows)
+        self.clock = clock
+
+        # (offset في buckets، عدد الـ buckets، عرض الـ bucket بالثواني) لكل نافذة
+        self._layout = []
+        offset = 0
+        for _, seconds, n in self.windows:
+            self._layout.append((offset, n, seconds / n))
+            offset += n
+        self._n_buckets = offset
+        self._zeros = [[0] * n for _, _, n in self.windows]
+        self.idle_seconds = max(seconds for _, seconds, _ in self.windows)
+
+        self.key_bytes = COUNTER_BASE_BYTES + BUCKET_BYTES * self._n_buckets
+        limits = [limit for limit in (max_keys, memory_budget_bytes and memory_budget_bytes // self.key_bytes) if limit]
+        self.max_keys = min(limits) if limits else None
+
+        self.counters = OrderedDict()       # (kind, key) -> VelocityCounter، الأقدم تحديثاً أول
+        self.evicted_keys = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.counters)
+
+    @property
+    def approx_bytes(self):
+        return len(self.counters) * self.key_bytes
+
+    def observe(self, keys, now=None):
+        """
+        نسجل عملية لكل (kind, key) في keys ونرجّع عداداته بعد التسجيل
+        (tuple بترتيب window_names)، أو None للمفتاح الفاضي.
+        """
+        if now is None:
+            now = self.clock()
+        # رقم الـ bucket الحالي لكل نافذة (نفس الوقت لكل المفاتيح)
+        current = self._current(now)
+        results = []
+        with self._lock:
+            counters = self.counters
+            for item in keys:
+                if not item[1]:
+                    results.append(None)
+                    continue
+                counter = counters.get(item)
+                if counter is None:
+                    counter = counters[item] = VelocityCounter(len(self._layout), self._n_buckets)
+                else:
+                    counters.move_to_end(item)
+                results.append(self._advance(counter, current, 1))
+                counter.last_seen = now
+            self._evict_idle(now)
+            self._enforce_limits()
+        return results
+
+    def counts(self, kind, key, now=None):
+        """عدادات (kind, key) الحالية بدون تسجيل عملية (أصفار لو ما له عدادات)."""
+        if now is None:
+            now = self.clock()
+        with self._lock:
+            counter = self.counters.get((kind, key))
+            if counter is None:
+                return (0,) * len(self._layout)
+            return self._advance(counter, self._current(now), 0)
+
+    def _current(self, now):
+        return [int(now // width) for _, _, width in self._layout]
+
+    def _advance(self, counter, current, add):
+        """نطلّع الـ buckets القديمة من كل نافذة لين current ونزيد add على الحالي."""
+        heads, totals, buckets = counter.heads, counter.totals, counter.buckets
+        for w, (offset, n, _) in enumerate(self._layout):
+            head = heads[w]
+            bucket = current[w]
+            if bucket > head:
+                if bucket - head >= n:
+                    buckets[offset:offset + n] = self._zeros[w]
+                    totals[w] = 0
+                else:
+                    for k in range(head + 1, bucket + 1):
+                        i = offset + k % n
+                        totals[w] -= buckets[i]
+                        buckets[i] = 0
+                heads[w] = head = bucket
+            # وقت أقدم من آخر تحديث (الساعة رجعت ورا) -> يتحسب في الـ bucket الحالي
+            buckets[offset + head % n] += add
+            totals[w] += add
+        return tuple(totals)
+
+    def _evict_idle(self, now):
+        # مرتبة حسب آخر تحديث، فاللي عداداتها صفر كلها في البداية
+        counters = self.counters
+        while counters:
+            key = next(iter(counters))
+            if now - counters[key].last_seen < self.idle_seconds:
+                break
+            del counters[key]
+            self.evicted_keys += 1
+
+    def _enforce_limits(self):
+        max_keys = self.max_keys
+        if max_keys is None:
+            return
+        counters = self.counters
+        while len(counters) > max_keys:
+            counters.popitem(last=False)
+            self.evicted_keys += 1